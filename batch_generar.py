@@ -0,0 +1,216 @@
+"""Generación por lotes de situaciones de aprendizaje sin interfaz.
+
+Recorre todos los módulos de un ciclo (o de un nivel completo) y genera para cada uno
+la situación de aprendizaje y su rúbrica, guardándolas en Markdown y PDF (y en Word
+con --docx). El progreso se guarda en <salida>/progreso.json, así que si el proceso
+se interrumpe basta con relanzar el mismo comando para continuar donde se quedó.
+
+Ejemplos:
+    python batch_generar.py --nivel "Grado Medio" --salida salida/
+    python batch_generar.py --ciclo "Farmacia y Parafarmacia" --plantilla plantilla.json --rpm 30
+
+La plantilla es un JSON con los parámetros comunes (duracion, recursos, contexto,
+producto_final, creatividad, metodologia...). Si no indica resultados_aprendizaje ni
+criterios_evaluacion se usan todos los del módulo.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from services.gemini_service import Consumo
+from services.historial import HISTORIAL_PATH, HistorialGeneraciones
+from services.metricas import metricas
+from services.registro import registro
+from utils.curriculum_index import NIVELES
+from utils.curriculum_loader import DATA_PATH, cargar_curriculo
+from utils.rate_limiter import TokenBucket
+
+PLANTILLA_POR_DEFECTO = {
+    "duracion": "1-2 semanas (12-20 horas)",
+    "recursos": [],
+    "contexto": "",
+    "producto_final": "Caso práctico resuelto",
+    "metodologia": "Aprendizaje Basado en Problemas (ABP)",
+    "creatividad": 0.7,
+}
+
+
+def slug(texto):
+    """Convierte un nombre en un fragmento seguro para nombres de archivo"""
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-zA-Z0-9]+", "_", texto).strip("_").lower()
+
+
+def listar_trabajos(indice, nivel=None, ciclo=None):
+    """Devuelve la lista de módulos a generar para el nivel y/o ciclo indicados"""
+
+    return [
+        {
+            "id": f"{modulo.ciclo.nivel_key}/{modulo.ciclo.codigo}/{modulo.codigo}",
+            "nivel": modulo.ciclo.nivel,
+            "ciclo": modulo.ciclo.nombre,
+            "modulo": modulo.nombre,
+            "codigo": modulo.codigo,
+            "resultados_aprendizaje": list(modulo.opciones_resultados),
+            "criterios_evaluacion": list(modulo.opciones_criterios),
+        }
+        for modulo in indice.iter_modulos(nivel, ciclo)
+    ]
+
+
+def construir_prompt_data(trabajo, plantilla):
+    """Combina la plantilla de parámetros con los datos del módulo"""
+
+    prompt_data = {**PLANTILLA_POR_DEFECTO, **plantilla}
+    prompt_data.update({
+        "nivel": trabajo["nivel"],
+        "ciclo": trabajo["ciclo"],
+        "modulo": trabajo["modulo"],
+    })
+    prompt_data.setdefault("resultados_aprendizaje", trabajo["resultados_aprendizaje"])
+    prompt_data.setdefault("criterios_evaluacion", trabajo["criterios_evaluacion"])
+    return prompt_data
+
+
+class Progreso:
+    """Registro de módulos terminados, persistido de forma atómica en un JSON"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        if os.path.exists(ruta):
+            with open(ruta, "r", encoding="utf-8") as file:
+                self.estado = json.load(file)
+        else:
+            self.estado = {}
+
+    def terminado(self, trabajo_id):
+        return self.estado.get(trabajo_id, {}).get("estado") == "ok"
+
+    def registrar(self, trabajo_id, **datos):
+        with self._lock:
+            self.estado[trabajo_id] = datos
+            temporal = self.ruta + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as file:
+                json.dump(self.estado, file, ensure_ascii=False, indent=2)
+            # os.replace es atómico: un corte nunca deja un progreso a medio escribir
+            os.replace(temporal, self.ruta)
+
+
+def procesar(servicio, trabajo, plantilla, salida, con_pdf=True, historial=None, con_docx=False):
+    """Genera la situación y la rúbrica de un módulo, escribe sus archivos y la guarda en el historial"""
+
+    prompt_data = construir_prompt_data(trabajo, plantilla)
+    consumo = Consumo()
+    inicio = time.perf_counter()
+    resultados = dict(servicio.generar_en_paralelo(prompt_data, consumo=consumo))
+    latencia = time.perf_counter() - inicio
+    metricas.observar("generacion", latencia, modo="lotes")
+    if historial is not None:
+        historial.guardar(
+            resultados["situacion"], resultados["rubrica"], prompt_data, consumo.modelo(servicio.model_name),
+            latencia, consumo.tokens_entrada, consumo.tokens_salida
+        )
+
+    directorio = os.path.join(salida, slug(trabajo["ciclo"]))
+    os.makedirs(directorio, exist_ok=True)
+    base = os.path.join(directorio, f"{trabajo['codigo']}_{slug(trabajo['modulo'])}")
+
+    with open(base + ".md", "w", encoding="utf-8") as file:
+        file.write(resultados["situacion"])
+        file.write("\n\n---\n\n")
+        file.write(resultados["rubrica"])
+
+    archivos = {"md": base + ".md"}
+    if con_pdf:
+        from services.pdf_generator import generate_pdf
+
+        with open(base + ".pdf", "wb") as file, metricas.medir("render", formato="pdf"):
+            file.write(generate_pdf(resultados["situacion"], resultados["rubrica"], prompt_data))
+        archivos["pdf"] = base + ".pdf"
+    if con_docx:
+        from services.docx_generator import escribir_docx
+
+        with metricas.medir("render", formato="docx"):
+            escribir_docx(base + ".docx", resultados["situacion"], resultados["rubrica"], prompt_data)
+        archivos["docx"] = base + ".docx"
+    return archivos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera situaciones de aprendizaje para todos los módulos de un ciclo")
+    parser.add_argument("--nivel", choices=list(NIVELES), help="Nivel formativo completo a generar")
+    parser.add_argument("--ciclo", help="Nombre exacto del ciclo formativo a generar")
+    parser.add_argument("--plantilla", help="JSON con los parámetros comunes de generación")
+    parser.add_argument("--salida", default="salida_lotes", help="Directorio de resultados")
+    parser.add_argument("--datos", default=DATA_PATH, help="JSON de ciclos formativos")
+    parser.add_argument("--concurrencia", type=int, default=4, help="Módulos generados a la vez")
+    parser.add_argument("--rpm", type=float, default=15, help="Máximo de llamadas a Gemini por minuto (0 = sin límite)")
+    parser.add_argument("--sin-pdf", action="store_true", help="Genera solo los archivos Markdown")
+    parser.add_argument("--docx", action="store_true", help="Genera también el documento Word")
+    parser.add_argument("--base-url", help="URL alternativa de la API (p. ej. tools/fake_gemini_server.py)")
+    parser.add_argument("--historial", default=HISTORIAL_PATH, help="Base de datos del historial de la app")
+    parser.add_argument("--sin-historial", action="store_true", help="No guarda las generaciones en el historial")
+    args = parser.parse_args(argv)
+
+    if not args.nivel and not args.ciclo:
+        parser.error("Indica al menos --nivel o --ciclo")
+    if args.rpm < 0:
+        parser.error("--rpm no puede ser negativo")
+
+    plantilla = {}
+    if args.plantilla:
+        with open(args.plantilla, "r", encoding="utf-8") as file:
+            plantilla = json.load(file)
+
+    trabajos = listar_trabajos(cargar_curriculo(args.datos).indice, args.nivel, args.ciclo)
+    if not trabajos:
+        print("No se ha encontrado ningún módulo para esa selección", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.salida, exist_ok=True)
+    progreso = Progreso(os.path.join(args.salida, "progreso.json"))
+    pendientes = [t for t in trabajos if not progreso.terminado(t["id"])]
+    print(f"{len(trabajos)} módulos, {len(trabajos) - len(pendientes)} ya generados, {len(pendientes)} pendientes")
+
+    # METRICAS_PATH / METRICAS_PUERTO: tiempos, tokens y coste del lote en formato Prometheus
+    metricas.iniciar_exportadores()
+    servicio = registro.gemini(base_url=args.base_url)
+    salud = servicio.salud()
+    if not salud.ok:
+        print(f"La API de Gemini no responde: {salud.error}", file=sys.stderr)
+        return 1
+    # Como con GEMINI_RPM en services.enrutador, 0 deja las llamadas sin limitar
+    servicio.limitador = TokenBucket.por_minuto(args.rpm) if args.rpm else None
+    historial = None if args.sin_historial else HistorialGeneraciones(args.historial)
+
+    errores = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrencia)) as executor:
+        futuros = {
+            executor.submit(procesar, servicio, trabajo, plantilla, args.salida, not args.sin_pdf, historial, args.docx): trabajo
+            for trabajo in pendientes
+        }
+        for futuro in as_completed(futuros):
+            trabajo = futuros[futuro]
+            try:
+                archivos = futuro.result()
+                progreso.registrar(trabajo["id"], estado="ok", modulo=trabajo["modulo"], **archivos)
+                print(f"✔ {trabajo['ciclo']} / {trabajo['modulo']}")
+            except Exception as e:
+                errores += 1
+                progreso.registrar(trabajo["id"], estado="error", modulo=trabajo["modulo"], error=str(e))
+                print(f"✘ {trabajo['ciclo']} / {trabajo['modulo']}: {e}", file=sys.stderr)
+
+    print(f"Terminado: {len(pendientes) - errores} generados, {errores} con error")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import math
+import os
+from datetime import datetime
+
+import streamlit as st
+
+from services.exportacion import exportar_lote, slug
+from services.pdf_worker import DOCX, PDF
+
+FORMATOS_LOTE = {"PDF": PDF, "Word": DOCX}
+
+def _abrir_documento(historial, documento_id):
+    """Callback: carga un documento del historial como resultado actual, sin llamar a Gemini"""
+    documento = historial.obtener(documento_id)
+    if documento is None:
+        return
+    st.session_state['ultima_situacion'] = documento.situacion
+    st.session_state['ultima_rubrica'] = documento.rubrica
+    st.session_state['ultimos_parametros'] = documento.parametros
+    st.session_state['documento_historial'] = documento_id
+    # El historial guarda Markdown: los documentos estructurados eran de la generación anterior
+    st.session_state.pop('ultimos_documentos', None)
+    st.session_state.pop('criterios_desfasados', None)
+
+def _volver_a_primera_pagina():
+    st.session_state['hist_pagina'] = 1
+
+def _render_exportacion(historial, renderizador_pdf, ciclo):
+    """Zip con la última situación de cada módulo del ciclo, renderizado en el pool de procesos"""
+
+    entradas = historial.ultimos_por_modulo(ciclo)
+    with st.expander("📦 Exportar la programación del ciclo"):
+        st.caption(f"{len(entradas)} módulos con situaciones guardadas; de cada uno se usa la más reciente.")
+        formatos = st.multiselect("Formatos", list(FORMATOS_LOTE), default=list(FORMATOS_LOTE), key="lote_formatos")
+        if st.button("Preparar zip", use_container_width=True, key="lote_boton", disabled=not formatos):
+            barra = st.progress(0.0, text="Renderizando documentos...")
+            resultado = exportar_lote(
+                historial, renderizador_pdf, entradas, [FORMATOS_LOTE[f] for f in formatos], ciclo,
+                progreso=lambda hechos, total: barra.progress(hechos / total, text=f"{hechos} de {total} módulos")
+            )
+            barra.empty()
+            st.session_state['lote_zip'] = (ciclo, resultado.ruta, resultado.errores)
+
+        lote = st.session_state.get('lote_zip')
+        if not lote or lote[0] != ciclo or not os.path.exists(lote[1]):
+            return
+        for modulo, formato, mensaje in lote[2]:
+            st.warning(f"{modulo}{f' ({formato})' if formato else ''}: {mensaje}")
+        with open(lote[1], "rb") as file:
+            st.download_button(
+                "📥 Descargar zip",
+                data=file,
+                file_name=f"programacion_{slug(ciclo)}.zip",
+                mime="application/zip",
+                on_click="ignore",
+                use_container_width=True,
+                key="lote_descarga"
+            )
+
+def render_historial(historial, por_pagina=10, renderizador_pdf=None):
+    """Renderiza el historial de generaciones con búsqueda, filtros y paginación
+
+    historial es un services.historial.HistorialGeneraciones. Solo se leen de la base
+    de datos los resúmenes de la página visible; los textos se cargan al abrir uno.
+    Con renderizador_pdf, al filtrar por ciclo se puede exportar su programación en un zip.
+    """
+
+    st.markdown("### 📚 Historial compartido")
+    # No hay cuentas de usuario: el historial es uno para toda la instalación
+    st.caption(
+        "Situaciones generadas por todos los profesores que usan esta aplicación. "
+        "Lo que generes también lo verán los demás."
+    )
+
+    texto = st.text_input(
+        "Buscar en el historial",
+        placeholder="Palabras del título, el módulo o el contenido...",
+        key="hist_texto",
+        on_change=_volver_a_primera_pagina
+    )
+
+    ciclo = st.selectbox(
+        "Ciclo",
+        ["Todos", *historial.ciclos()],
+        key="hist_ciclo",
+        on_change=_volver_a_primera_pagina
+    )
+    ciclo = None if ciclo == "Todos" else ciclo
+    if ciclo and renderizador_pdf is not None:
+        _render_exportacion(historial, renderizador_pdf, ciclo)
+
+    modulo = st.selectbox(
+        "Módulo",
+        ["Todos", *historial.modulos(ciclo)],
+        key="hist_modulo",
+        on_change=_volver_a_primera_pagina
+    )
+    modulo = None if modulo == "Todos" else modulo
+
+    total = historial.contar(ciclo, modulo, texto)
+    if not total:
+        st.caption("Todavía no hay situaciones guardadas." if not (texto or ciclo or modulo)
+                   else "No hay situaciones que coincidan con la búsqueda.")
+        return
+
+    paginas = math.ceil(total / por_pagina)
+    # Si los filtros reducen el número de páginas, la página guardada puede quedar fuera de rango
+    if st.session_state.get('hist_pagina', 1) > paginas:
+        st.session_state['hist_pagina'] = 1
+    pagina = 1
+    if paginas > 1:
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, step=1, key="hist_pagina")
+    st.caption(f"{total} situaciones · página {pagina} de {paginas}")
+
+    for entrada in historial.listar(pagina - 1, por_pagina, ciclo, modulo, texto):
+        fecha = datetime.fromtimestamp(entrada.creado).strftime('%d/%m/%Y %H:%M')
+        # Sin HTML: el título sale del texto de Gemini y el historial lo ven todos los profesores
+        st.markdown(f"**{entrada.titulo or entrada.modulo}**")
+        st.caption(f"{entrada.modulo} · {fecha}")
+        st.button(
+            "Abrir",
+            key=f"hist_abrir_{entrada.id}",
+            on_click=_abrir_documento,
+            args=(historial, entrada.id),
+            use_container_width=True
+        )
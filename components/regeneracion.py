@@ -0,0 +1,98 @@
+import streamlit as st
+
+from services import regeneracion
+from services.estructura import EstructuraInvalidaError
+from services.gemini_service import Consumo
+from services.pdf_worker import DOCX, PDF
+from services.resiliencia import ServicioNoDisponibleError
+
+DOCUMENTOS = ("Situación de aprendizaje", "Rúbrica de evaluación")
+
+
+def _markdown(documento):
+    return documento if isinstance(documento, str) else documento.a_markdown()
+
+
+def _aplicar(historial, renderizador_pdf, parametros, situacion, rubrica, consumo):
+    """Guarda el documento con el apartado nuevo y encarga su PDF y su Word en segundo plano"""
+    st.session_state['ultima_situacion'] = _markdown(situacion)
+    st.session_state['ultima_rubrica'] = _markdown(rubrica)
+    st.session_state['ultimos_documentos'] = (situacion, rubrica)
+    documento_id = st.session_state.get('documento_historial')
+    if documento_id is not None:
+        historial.actualizar(
+            documento_id, st.session_state['ultima_situacion'], st.session_state['ultima_rubrica'],
+            consumo.tokens_entrada, consumo.tokens_salida
+        )
+    for formato in (PDF, DOCX):
+        renderizador_pdf.solicitar(situacion, rubrica, parametros, formato=formato)
+
+
+def render_regeneracion(gemini_service, historial, renderizador_pdf, parametros):
+    """Reescribe un solo apartado de la situación o de la rúbrica sin regenerar el resto.
+
+    Si cambia una sección de la situación, se señalan los criterios de la rúbrica que
+    pueden haber quedado desfasados para regenerar solo esos.
+    """
+
+    situacion, rubrica = st.session_state.get(
+        'ultimos_documentos', (st.session_state['ultima_situacion'], st.session_state['ultima_rubrica'])
+    )
+    desfasados = st.session_state.get('criterios_desfasados', {})
+
+    with st.expander("✏️ Regenerar solo un apartado", expanded=bool(desfasados)):
+        if desfasados:
+            st.warning(
+                "Tras el cambio en la situación conviene revisar estos criterios de la rúbrica: "
+                + ", ".join(desfasados.values())
+            )
+
+        nombre_documento = st.radio("Documento", DOCUMENTOS, horizontal=True, key="regen_documento")
+        es_situacion = nombre_documento == DOCUMENTOS[0]
+        documento = situacion if es_situacion else rubrica
+        lista = regeneracion.apartados(documento)
+        if not lista:
+            st.caption("Este documento no tiene apartados que se puedan regenerar por separado.")
+            return
+
+        # El índice se guarda por documento: la lista de apartados de cada uno es distinta
+        elegido = st.selectbox(
+            "Apartado", range(len(lista)), format_func=lambda i: lista[i].titulo,
+            key=f"regen_apartado_{'situacion' if es_situacion else 'rubrica'}"
+        )
+        indicaciones = st.text_area(
+            "Indicaciones para la IA (opcional)",
+            placeholder="Por ejemplo: añade una fase de simulación con paciente estandarizado",
+            key="regen_indicaciones"
+        )
+        if not st.button("🔁 Regenerar este apartado", use_container_width=True, key="regen_boton"):
+            return
+
+        anterior = lista[elegido]
+        consumo = Consumo()
+        with st.spinner(f"⏳ Reescribiendo «{anterior.titulo}»..."):
+            try:
+                nuevo = gemini_service.regenerar_apartado(
+                    parametros, documento, anterior.clave, indicaciones, consumo
+                )
+            except ServicioNoDisponibleError as e:
+                st.warning(f"⏳ {e}")
+                return
+            except EstructuraInvalidaError as e:
+                st.warning(f"🧩 La IA devolvió un apartado incompleto ({e}). Vuelve a intentarlo.")
+                return
+            except Exception as e:
+                st.error(f"❌ Vaya, algo fue mal: {e}")
+                return
+
+        if es_situacion:
+            reescrito = regeneracion.apartado(nuevo, anterior.clave)
+            afectados = regeneracion.afectados(rubrica, anterior.titulo, anterior.texto, reescrito.texto)
+            titulos = {a.clave: a.titulo for a in regeneracion.apartados(rubrica)}
+            st.session_state['criterios_desfasados'] = {**desfasados, **{c: titulos[c] for c in afectados}}
+            _aplicar(historial, renderizador_pdf, parametros, nuevo, rubrica, consumo)
+        else:
+            desfasados.pop(anterior.clave, None)
+            st.session_state['criterios_desfasados'] = desfasados
+            _aplicar(historial, renderizador_pdf, parametros, situacion, nuevo, consumo)
+        st.rerun()
@@ -1,11 +1,61 @@
 import streamlit as st
 import json
 
-def render_selectors(ciclos_data):
-    """Renderiza todos los selectores de la interfaz y retorna los datos seleccionados"""
+def _aplicar_resultado_busqueda(resultado):
+    """Callback: rellena los selectores con el módulo encontrado y sus RA/CE coincidentes"""
+    modulo = resultado.modulo
+    st.session_state["sel_nivel"] = modulo.ciclo.nivel
+    st.session_state["sel_ciclo"] = modulo.ciclo.nombre
+    st.session_state["sel_modulo"] = modulo.nombre
+    st.session_state["sel_resultados"] = list(resultado.resultados)
+    st.session_state["sel_criterios"] = list(resultado.criterios)
+
+def render_busqueda(buscador):
+    """Renderiza el buscador por palabra clave que salta directamente a un módulo"""
+
+    consulta = st.text_input(
+        "🔎 Buscar módulo por palabra clave",
+        placeholder="Por ejemplo: movilización, radioprotección, dispensación...",
+        help="Busca en los nombres de los módulos, sus resultados de aprendizaje y sus criterios de evaluación"
+    )
+    if not consulta.strip():
+        return
+
+    resultados = buscador.buscar(consulta, limite=8)
+    if not resultados:
+        st.caption("No se ha encontrado ningún módulo con esas palabras.")
+        return
+
+    for i, resultado in enumerate(resultados):
+        modulo = resultado.modulo
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(
+                f"**{modulo.nombre}** ({modulo.codigo}) · {modulo.ciclo.nombre} · {modulo.ciclo.nivel}  \n"
+                f"<small>{len(resultado.resultados)} RA y {len(resultado.criterios)} CE coincidentes</small>",
+                unsafe_allow_html=True
+            )
+        with col2:
+            st.button(
+                "Usar",
+                key=f"busqueda_{i}",
+                on_click=_aplicar_resultado_busqueda,
+                args=(resultado,),
+                use_container_width=True
+            )
+
+def render_selectors(indice, buscador=None):
+    """Renderiza todos los selectores de la interfaz y retorna los datos seleccionados
+
+    indice es el CurriculumIndex cargado con utils.data_loader.load_curriculum_index().
+    Si se pasa un BuscadorCurriculo se muestra además el buscador por palabra clave.
+    """
     
     selection_data = {}
     
+    if buscador is not None:
+        render_busqueda(buscador)
+    
     # Selector de nivel formativo
     st.markdown("### 🎓 Selección del Ciclo Formativo")
     
@@ -14,42 +64,44 @@ def render_selectors(ciclos_data):
     with col1:
         nivel = st.selectbox(
             "Nivel formativo",
-            ["Seleccionar...", "Grado Medio", "Grado Superior"]
+            ["Seleccionar...", *indice.opciones_niveles],
+            key="sel_nivel"
         )
         
         if nivel != "Seleccionar...":
             selection_data["nivel"] = nivel
-            nivel_key = "grado_medio" if nivel == "Grado Medio" else "grado_superior"
             
             # Selector de ciclo formativo
-            ciclos_disponibles = ["Seleccionar..."] + list(ciclos_data[nivel_key].keys())
+            ciclos_disponibles = ["Seleccionar...", *indice.opciones_ciclos[nivel]]
             ciclo_seleccionado = st.selectbox(
                 "Ciclo Formativo",
-                ciclos_disponibles
+                ciclos_disponibles,
+                key="sel_ciclo"
             )
             
             if ciclo_seleccionado != "Seleccionar...":
                 selection_data["ciclo"] = ciclo_seleccionado
-                ciclo_data = ciclos_data[nivel_key][ciclo_seleccionado]
+                ciclo = indice.ciclo(nivel, ciclo_seleccionado)
                 
                 # Mostrar información del ciclo
-                st.info(f"**Código:** {ciclo_data['codigo']} | **Duración:** {ciclo_data['duracion']}")
+                st.info(f"**Código:** {ciclo.codigo} | **Duración:** {ciclo.duracion}")
     
     with col2:
         if "ciclo" in selection_data:
             # Selector de módulo
-            modulos_disponibles = ["Seleccionar..."] + list(ciclo_data["modulos"].keys())
+            modulos_disponibles = ["Seleccionar...", *ciclo.opciones_modulos]
             modulo_seleccionado = st.selectbox(
                 "Módulo Profesional",
-                modulos_disponibles
+                modulos_disponibles,
+                key="sel_modulo"
             )
             
             if modulo_seleccionado != "Seleccionar...":
                 selection_data["modulo"] = modulo_seleccionado
-                modulo_data = ciclo_data["modulos"][modulo_seleccionado]
+                modulo = ciclo.modulos[modulo_seleccionado]
                 
                 # Mostrar información del módulo
-                st.info(f"**Código:** {modulo_data['codigo']} | **Horas:** {modulo_data['horas']}")
+                st.info(f"**Código:** {modulo.codigo} | **Horas:** {modulo.horas}")
 
     # Si hay módulo seleccionado, mostrar más opciones
     if "modulo" in selection_data:
@@ -59,24 +111,26 @@ def render_selectors(ciclos_data):
         
         with col1:
             # Selector de resultados de aprendizaje
-            resultados_disponibles = modulo_data.get("resultados_aprendizaje", [])
+            resultados_disponibles = modulo.opciones_resultados
             if resultados_disponibles:
                 resultados_seleccionados = st.multiselect(
                     "Resultados de Aprendizaje (RA)",
                     resultados_disponibles,
-                    help="Selecciona uno o más resultados de aprendizaje del módulo"
+                    help="Selecciona uno o más resultados de aprendizaje del módulo",
+                    key="sel_resultados"
                 )
                 if resultados_seleccionados:
                     selection_data["resultados_aprendizaje"] = resultados_seleccionados
         
         with col2:
             # Selector de criterios de evaluación
-            criterios_disponibles = modulo_data.get("criterios_evaluacion", [])
+            criterios_disponibles = modulo.opciones_criterios
             if criterios_disponibles:
                 criterios_seleccionados = st.multiselect(
                     "Criterios de Evaluación (CE)",
                     criterios_disponibles,
-                    help="Selecciona uno o más criterios de evaluación"
+                    help="Selecciona uno o más criterios de evaluación",
+                    key="sel_criterios"
                 )
                 if criterios_seleccionados:
                     selection_data["criterios_evaluacion"] = criterios_seleccionados
@@ -89,7 +143,7 @@ def render_selectors(ciclos_data):
         with col1:
             metodologia_seleccionada = st.selectbox(
                 "Metodología Activa Principal",
-                ["Seleccionar..."] + ciclos_data["metodologias_activas"]
+                ["Seleccionar...", *indice.metodologias]
             )
             
             if metodologia_seleccionada != "Seleccionar...":
@@ -98,7 +152,7 @@ def render_selectors(ciclos_data):
             # Metodologías secundarias
             metodologias_secundarias = st.multiselect(
                 "Metodologías Complementarias (opcional)",
-                [m for m in ciclos_data["metodologias_activas"] if m != metodologia_seleccionada],
+                [m for m in indice.metodologias if m != metodologia_seleccionada],
                 help="Selecciona metodologías adicionales que se integrarán"
             )
             if metodologias_secundarias:
@@ -108,7 +162,7 @@ def render_selectors(ciclos_data):
             # Competencias profesionales
             competencias_prof = st.multiselect(
                 "Competencias Profesionales",
-                ciclos_data["competencias"]["profesionales"],
+                indice.competencias_profesionales,
                 help="Selecciona las competencias profesionales a desarrollar"
             )
             if competencias_prof:
@@ -117,7 +171,7 @@ def render_selectors(ciclos_data):
             # Competencias personales y sociales
             competencias_pers = st.multiselect(
                 "Competencias Personales",
-                ciclos_data["competencias"]["personales"][:4],  # Limitar para no saturar
+                indice.competencias_personales[:4],  # Limitar para no saturar
                 help="Selecciona las competencias personales a desarrollar"
             )
             if competencias_pers:
@@ -125,7 +179,7 @@ def render_selectors(ciclos_data):
             
             competencias_soc = st.multiselect(
                 "Competencias Sociales", 
-                ciclos_data["competencias"]["sociales"][:4],  # Limitar para no saturar
+                indice.competencias_sociales[:4],  # Limitar para no saturar
                 help="Selecciona las competencias sociales a desarrollar"
             )
             if competencias_soc:
@@ -0,0 +1,158 @@
+"""Página de administración con las métricas del proceso (services.metricas).
+
+Muestra p50 y p95 de cada etapa (construcción del prompt, llamada a Gemini, primer
+fragmento, render del PDF/Word, generación completa) a lo largo del tiempo, los
+tokens y el coste estimado, los aciertos de la caché, los reintentos, los errores y
+el estado de cada ruta (clave y modelo) de Gemini.
+Solo se muestra a quien introduce ADMIN_PASSWORD; sin esa variable la página está cerrada.
+"""
+
+import hmac
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import streamlit as st
+
+from services.metricas import DURACION, PREFIJO, metricas
+from services.registro import registro
+
+st.set_page_config(page_title="Métricas - Asistente IA FP Sanitaria", page_icon="📊", layout="wide")
+
+st.title("📊 Métricas del servicio")
+
+# Costes, cuota por clave y estado de las rutas: nunca a la vista de los profesores
+clave_admin = os.getenv("ADMIN_PASSWORD")
+if not clave_admin:
+    st.warning("Página de administración desactivada: define ADMIN_PASSWORD para acceder a las métricas.")
+    st.stop()
+introducida = st.text_input("Contraseña de administración", type="password")
+if not hmac.compare_digest(introducida.encode("utf-8"), clave_admin.encode("utf-8")):
+    st.stop()
+
+VENTANAS = {"Última hora": 3600, "Últimas 24 horas": 24 * 3600, "Desde el arranque": None}
+INTERVALOS = {"1 minuto": 60, "5 minutos": 300, "1 hora": 3600}
+
+col1, col2 = st.columns(2)
+with col1:
+    ventana = VENTANAS[st.selectbox("Periodo", list(VENTANAS))]
+with col2:
+    intervalo = INTERVALOS[st.selectbox("Agrupar por", list(INTERVALOS))]
+desde = time.time() - ventana if ventana else None
+
+st.caption(
+    "Métricas de este proceso desde su arranque (los percentiles, de las últimas muestras). "
+    "Con METRICAS_PATH o METRICAS_PUERTO se exportan en formato Prometheus."
+)
+
+# --- Tiempos por etapa ---
+st.markdown("### ⏱️ Tiempos por etapa")
+resumenes = metricas.percentiles(desde)
+if not resumenes:
+    st.info("Todavía no hay datos en este periodo: genera una situación de aprendizaje y vuelve aquí.")
+else:
+    filas = []
+    for clave, resumen in sorted(resumenes.items()):
+        etiquetas = dict(clave)
+        filas.append({
+            "Etapa": etiquetas.pop("etapa"),
+            "Detalle": ", ".join(f"{k}={v}" for k, v in etiquetas.items()),
+            "Muestras": resumen.n,
+            "p50 (s)": round(resumen.p50, 3),
+            "p95 (s)": round(resumen.p95, 3),
+            "Media (s)": round(resumen.media, 3),
+        })
+    st.dataframe(filas, hide_index=True, use_container_width=True)
+
+    etapas = sorted({dict(clave)["etapa"] for clave in resumenes})
+    etapa = st.selectbox("Evolución de la etapa", etapas, index=etapas.index("gemini") if "gemini" in etapas else 0)
+    serie = metricas.serie(etapa, intervalo, desde)
+    st.line_chart(
+        [{"Hora": datetime.fromtimestamp(inicio), "p50": r.p50, "p95": r.p95} for inicio, r in serie],
+        x="Hora", y=["p50", "p95"]
+    )
+
+# --- Contadores ---
+contadores = metricas.contadores()
+
+
+def _sumar(nombre, por):
+    """Suma los contadores de un nombre agrupando por la etiqueta `por`"""
+    totales = defaultdict(float)
+    for (actual, etiquetas), valor in contadores.items():
+        if actual == nombre:
+            totales[dict(etiquetas).get(por, "")] += valor
+    return dict(totales)
+
+
+st.markdown("### 🔢 Tokens, coste y caché")
+tokens = _sumar("gemini_tokens_total", "clase")
+coste = sum(_sumar("gemini_coste_dolares_total", "tipo").values())
+cache = _sumar("cache_respuestas_total", "resultado")
+consultas = sum(cache.values())
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Tokens de entrada", f"{tokens.get('entrada', 0):,.0f}".replace(",", "."))
+col2.metric("Tokens de salida", f"{tokens.get('salida', 0) + tokens.get('razonamiento', 0):,.0f}".replace(",", "."))
+col3.metric("Coste estimado", f"{coste:.4f} $")
+col4.metric("Aciertos de caché", f"{cache.get('acierto', 0) / consultas:.0%}" if consultas else "—")
+
+por_tipo = defaultdict(dict)
+for (nombre, etiquetas), valor in contadores.items():
+    etiquetas = dict(etiquetas)
+    if nombre == "gemini_tokens_total":
+        por_tipo[etiquetas["tipo"]][etiquetas["clase"]] = por_tipo[etiquetas["tipo"]].get(etiquetas["clase"], 0) + valor
+    elif nombre == "gemini_coste_dolares_total":
+        por_tipo[etiquetas["tipo"]]["coste ($)"] = round(valor, 5)
+if por_tipo:
+    columnas = sorted({columna for valores in por_tipo.values() for columna in valores})
+    st.dataframe(
+        [{"Tipo": tipo, **{columna: valores.get(columna, 0) for columna in columnas}}
+         for tipo, valores in sorted(por_tipo.items())],
+        hide_index=True, use_container_width=True
+    )
+
+st.markdown("### 🔁 Reintentos y errores")
+col1, col2 = st.columns(2)
+with col1:
+    eventos = _sumar("resiliencia_total", "evento")
+    coalescidas = sum(_sumar("coalescidas_total", "tipo").values())
+    st.dataframe(
+        [{"Evento": evento, "Total": total} for evento, total in [*eventos.items(), ("coalescidas", coalescidas)]],
+        hide_index=True, use_container_width=True
+    )
+with col2:
+    errores = [
+        {**dict(etiquetas), "Total": int(valor)}
+        for (nombre, etiquetas), valor in sorted(contadores.items()) if nombre == "errores_total"
+    ]
+    if errores:
+        st.dataframe(errores, hide_index=True, use_container_width=True)
+    else:
+        st.caption("Sin errores registrados.")
+
+st.markdown("### 🔀 Rutas de Gemini")
+st.caption(
+    "Cada ruta es una clave de API (GEMINI_API_KEYS) con un modelo. Las rúbricas pasan al modelo de "
+    "respaldo cuando el principal no tiene cuota."
+)
+rutas = registro.gemini().enrutador.estado()
+st.dataframe([
+    {
+        "Ruta": ruta["ruta"],
+        "Respaldo": "sí" if ruta["respaldo"] else "no",
+        "Disponible": "sí" if ruta["disponible"] else f"en {ruta['espera_s']:.0f} s",
+        "Quedan hoy": ruta["restantes_hoy"],
+        "Latencia (s)": ruta["latencia_s"],
+        "En curso": ruta["en_curso"],
+        "Servidas": ruta["servidas"],
+        "Errores": ruta["errores"],
+    }
+    for ruta in rutas
+], hide_index=True, use_container_width=True)
+
+with st.expander("Texto para Prometheus"):
+    texto = metricas.a_prometheus()
+    st.download_button("Descargar", texto, file_name="metricas.prom", mime="text/plain", on_click="ignore")
+    st.code(texto, language="text")
+    st.caption(f"Histograma {PREFIJO}{DURACION} y contadores {PREFIJO}*_total.")
@@ -0,0 +1,506 @@
+"""Backend de Gemini sin red para desarrollo, pruebas y pruebas de carga.
+
+ClienteFalso tiene la misma interfaz que registro.ClienteGemini (genai, salud() y
+cerrar()) y su atributo genai imita la parte de google-genai que usa
+GeminiService: models.generate_content, models.generate_content_stream,
+models.get y caches. Responde con Markdown determinista (o JSON válido para el
+modo estructurado) que depende solo del prompt, con la latencia, el troceado en
+streaming y los fallos (503, 429 y cuelgues) configurados. Con realista=True el
+texto tiene el tamaño y la forma de una respuesta real (doce secciones con una
+secuencia didáctica larga y rúbricas de cinco criterios con sus tablas), de modo
+que el render de los PDF y el consumo de memoria se parecen a los de producción.
+
+Se activa para todo el proceso con GEMINI_BACKEND=falso (ver services.registro),
+configurado con GEMINI_FALSO_LATENCIA, GEMINI_FALSO_LATENCIA_FRAGMENTO,
+GEMINI_FALSO_ERROR_503 y GEMINI_FALSO_ERROR_429, o se pasa a mano:
+
+    servicio = GeminiService(backend=ClienteFalso(latencia=1.5, fallos=Fallos(error_503=0.05)))
+
+tools/fake_gemini_server.py sirve los mismos textos a través de HTTP.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+MARCA_APARTADO = "## APARTADO QUE HAY QUE REESCRIBIR\n"
+
+# Segundos hasta el primer fragmento y entre fragmentos (gemini-2.5-flash con salidas largas)
+LATENCIA = float(os.getenv("GEMINI_FALSO_LATENCIA", "1.0"))
+LATENCIA_FRAGMENTO = float(os.getenv("GEMINI_FALSO_LATENCIA_FRAGMENTO", "0.02"))
+
+# Caracteres por fragmento en streaming (la API real manda trozos de unos cientos)
+TAMANO_FRAGMENTO = 400
+
+# Tokens mínimos de un contenido en caché, como en la API real
+MINIMO_TOKENS_CACHE = 1024
+
+TITULOS_SITUACION = (
+    "IDENTIFICACIÓN", "CONTEXTUALIZACIÓN Y JUSTIFICACIÓN", "OBJETIVOS Y COMPETENCIAS",
+    "RESULTADOS DE APRENDIZAJE Y CRITERIOS DE EVALUACIÓN", "SABERES BÁSICOS/CONTENIDOS", "METODOLOGÍA",
+    "SECUENCIA DIDÁCTICA", "RECURSOS Y MATERIALES", "EVALUACIÓN", "PRODUCTO FINAL",
+    "BIBLIOGRAFÍA Y REFERENCIAS", "ANEXOS",
+)
+
+# Frases con las que se rellena el texto realista
+FRASES = (
+    "El alumnado trabaja en equipos de cuatro personas que rotan los roles de técnico, paciente y observador.",
+    "La actividad reproduce una jornada real en la unidad de hospitalización con casos clínicos adaptados.",
+    "Cada equipo documenta el procedimiento en la hoja de registro y justifica las decisiones tomadas.",
+    "El docente plantea preguntas guía que conectan la práctica con los criterios de evaluación seleccionados.",
+    "Se refuerzan las medidas de higiene de manos, uso de equipos de protección y prevención de infecciones.",
+    "La comunicación con el paciente se trabaja mediante role-playing con guiones de situaciones habituales.",
+    "Los estudiantes consultan protocolos del Servicio Aragonés de Salud y los comparan con la bibliografía.",
+    "Se utilizan simuladores y material sanitario del aula taller para practicar cada técnica paso a paso.",
+    "Al terminar cada sesión se realiza una puesta en común breve sobre las dificultades encontradas.",
+    "Las tareas se adaptan al ritmo de cada estudiante con apoyos visuales y fichas de trabajo graduadas.",
+    "Se integra la perspectiva de género en el análisis de los cuidados y en el reparto de responsabilidades.",
+    "La plataforma digital del centro recoge las evidencias de aprendizaje y la retroalimentación del docente.",
+    "El trabajo se vincula con las competencias profesionales, personales y sociales del título.",
+    "Se promueve la sostenibilidad reduciendo residuos y separando correctamente el material desechable.",
+    "Los criterios de calificación se comparten desde el inicio para que el alumnado conozca lo que se espera.",
+    "El caso práctico incorpora imprevistos que obligan a priorizar y a pedir ayuda al profesional responsable.",
+    "Se revisan los errores más frecuentes y se proponen estrategias para evitarlos en el entorno laboral.",
+    "La lista de verificación permite la autoevaluación y la coevaluación entre los miembros del equipo.",
+)
+
+NOMBRES_FASES = ("Activación", "Exploración", "Desarrollo", "Aplicación", "Síntesis y evaluación")
+
+CRITERIOS = (
+    "Aplicación de protocolos", "Seguridad del paciente", "Comunicación y trato", "Registro y documentación",
+    "Trabajo en equipo", "Resolución de imprevistos",
+)
+
+NIVELES_RUBRICA = (
+    ("EXCELENTE (4)", "sin errores, con autonomía y justificando cada paso"),
+    ("SATISFACTORIO (3)", "con errores leves que corrige por sí mismo"),
+    ("EN DESARROLLO (2)", "con errores que corrige con ayuda del docente"),
+    ("INSUFICIENTE (1)", "de forma incompleta o con errores que comprometen la seguridad"),
+)
+
+
+def _huella(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+
+
+def _titulo_apartado(prompt):
+    """Primera línea del apartado que pide reescribir services.prompts.PLANTILLA_APARTADO"""
+    return prompt.split(MARCA_APARTADO, 1)[1].splitlines()[0]
+
+
+def _parrafo(azar, frases=5):
+    return " ".join(azar.choice(FRASES) for _ in range(frases))
+
+
+def _vinetas(azar, cuantas=4):
+    return "\n".join(f"- {azar.choice(FRASES)}" for _ in range(cuantas))
+
+
+def _situacion_realista(huella, azar):
+    """Situación con el tamaño de una respuesta real (unos 25 000 caracteres)"""
+
+    secciones = []
+    for n, titulo in enumerate(TITULOS_SITUACION, 1):
+        if titulo == "SECUENCIA DIDÁCTICA":
+            fases = []
+            for f, nombre in enumerate(NOMBRES_FASES, 1):
+                actividades = "\n".join(f"{a}. {_parrafo(azar, 2)}" for a in range(1, 6))
+                fases.append(
+                    f"### Fase {f}: {nombre}\n**Duración:** {2 + f % 3} horas\n\n{_parrafo(azar)}\n\n"
+                    f"**Actividades:**\n{actividades}\n\n**Recursos:** {azar.choice(FRASES)}\n\n"
+                    f"**Evaluación:** {azar.choice(FRASES)}"
+                )
+            cuerpo = "\n\n".join(fases)
+        elif titulo == "RECURSOS Y MATERIALES":
+            cuerpo = "\n\n".join(
+                f"### {apartado}\n{_vinetas(azar)}"
+                for apartado in ("Recursos Humanos", "Recursos Materiales", "Recursos Tecnológicos", "Espacios")
+            )
+        elif titulo == "EVALUACIÓN":
+            cuerpo = (
+                "### Instrumentos de Evaluación\n"
+                "| Instrumento | Momento | Peso |\n|-------------|---------|------|\n"
+                "| Rúbrica analítica | Final | 60% |\n| Lista de cotejo | Cada fase | 25% |\n"
+                "| Diario reflexivo | Semanal | 15% |\n\n"
+                f"### Criterios de Calificación\n{_parrafo(azar)}\n\n"
+                f"### Procedimientos de Evaluación\n{_vinetas(azar)}\n\n### Evaluación Inclusiva\n{_parrafo(azar, 3)}"
+            )
+        else:
+            cuerpo = f"{_parrafo(azar)}\n\n{_parrafo(azar, 4)}\n\n{_vinetas(azar)}"
+        secciones.append(f"## {n}. {titulo}\n{cuerpo}")
+    return f"# SITUACIÓN DE APRENDIZAJE: Caso clínico {huella}\n\n" + "\n\n".join(secciones) + "\n"
+
+
+def _rubrica_realista(huella, azar):
+    """Rúbrica con cinco criterios y sus tablas (unos 9 000 caracteres)"""
+
+    cabecera = " | ".join(nivel for nivel, _ in NIVELES_RUBRICA)
+    criterios = []
+    for n, nombre in enumerate(CRITERIOS[:5], 1):
+        descripciones = " | ".join(f"Realiza la {nombre.lower()} {detalle}" for _, detalle in NIVELES_RUBRICA)
+        indicadores = " | ".join(
+            " <br> ".join(f"• {azar.choice(FRASES)}" for _ in range(2)) for _ in NIVELES_RUBRICA
+        )
+        criterios.append(
+            f"### Criterio {n}: {nombre}\n**Peso:** 20%\n\n"
+            f"| NIVEL | {cabecera} |\n|-------|{'|'.join('---' for _ in NIVELES_RUBRICA)}|\n"
+            f"| **Descripción** | {descripciones} |\n| **Indicadores** | {indicadores} |"
+        )
+    return (
+        f"# RÚBRICA DE EVALUACIÓN\n\n## Información General\n- **Situación de Aprendizaje:** Caso clínico {huella}\n"
+        "- **Instrumento:** Rúbrica analítica\n- **Peso en la calificación final:** 60%\n\n"
+        "## Criterios de Evaluación y Niveles de Desempeño\n\n" + "\n\n".join(criterios) + "\n\n"
+        f"## Competencias Transversales\n### Competencias Profesionales\n{_parrafo(azar, 3)}\n\n"
+        f"### Competencias Personales y Sociales\n{_parrafo(azar, 3)}\n\n"
+        f"## Evaluación del Proceso\n### Participación y Actitud (10%)\n| {cabecera} |\n"
+        f"|{'|'.join('---' for _ in NIVELES_RUBRICA)}|\n| {' | '.join(azar.choice(FRASES) for _ in NIVELES_RUBRICA)} |\n\n"
+        "## Cálculo de la Calificación Final\nCriterio N: ___ × % = ___\n\n**NOTA FINAL = Σ (Puntuación)**\n\n"
+        "## Escala de Calificación\n- **EXCELENTE (9-10):** Supera ampliamente los objetivos\n"
+        "- **SATISFACTORIO (7-8):** Alcanza completamente los objetivos\n"
+        "- **EN DESARROLLO (5-6):** Alcanza parcialmente los objetivos\n"
+        "- **INSUFICIENTE (0-4):** No alcanza los objetivos mínimos\n\n"
+        f"## Observaciones y Feedback\n{_parrafo(azar, 3)}\n\n## Autoevaluación del Estudiante\n{_parrafo(azar, 3)}\n"
+    )
+
+
+def texto_falso(prompt, realista=False):
+    """Devuelve un Markdown determinista que depende solo del prompt recibido"""
+
+    huella = _huella(prompt)
+    if MARCA_APARTADO in prompt:
+        return f"{_titulo_apartado(prompt)}\n\nContenido regenerado del apartado ({huella}).\n"
+    if "ESQUEMA" in prompt and "Responde ÚNICAMENTE" in prompt:
+        return (
+            f"# ESQUEMA: Situación de prueba {huella}\n"
+            "**Producto Final:** Informe de prácticas\n"
+            "**Fases:**\n1. Activación - 2 horas - Presentar el caso\n2. Desarrollo - 4 horas - Resolver el caso\n"
+        )
+    azar = random.Random(huella)
+    if "RÚBRICA" in prompt:
+        if realista:
+            return _rubrica_realista(huella, azar)
+        return (
+            f"# RÚBRICA DE EVALUACIÓN\n\n## Información General\n- **Situación de Aprendizaje:** {huella}\n\n"
+            "## Criterios de Evaluación y Niveles de Desempeño\n\n"
+            "### Criterio 1: Aplicación de protocolos\n**Peso:** 40%\n\n"
+            "| NIVEL | EXCELENTE (4) | SATISFACTORIO (3) | EN DESARROLLO (2) | INSUFICIENTE (1) |\n"
+            "|-------|---------------|-------------------|-------------------|------------------|\n"
+            "| **Descripción** | Aplica sin errores | Aplica con errores leves | Aplica con ayuda | No aplica |\n"
+        )
+    if realista:
+        return _situacion_realista(huella, azar)
+    secciones = "\n\n".join(
+        f"## {n}. SECCIÓN {n}\nContenido de prueba de la sección {n} ({huella})." for n in range(1, 13)
+    )
+    return f"# SITUACIÓN DE APRENDIZAJE: Prueba {huella}\n\n{secciones}\n"
+
+
+def json_falso(prompt, realista=False):
+    """Versión de texto_falso para el modo estructurado: JSON válido según services.estructura"""
+
+    huella = _huella(prompt)
+    azar = random.Random(huella)
+
+    def contenido(n):
+        if realista:
+            return f"{_parrafo(azar)}\n\n{_vinetas(azar)}"
+        return f"Contenido de prueba de la sección {n} ({huella})."
+
+    niveles = {
+        "excelente": "Aplica el protocolo sin errores y justifica cada paso",
+        "satisfactorio": "Aplica el protocolo con errores leves",
+        "en_desarrollo": "Aplica el protocolo con ayuda del docente",
+        "insuficiente": "No aplica el protocolo",
+    }
+    fases = [
+        {"nombre": f"Fase de prueba {n}", "duracion": f"{2 * n} horas",
+         "actividades": [
+             _parrafo(azar, 2) if realista else f"Actividad {n}.{k} {{con llaves}} y [corchetes]"
+             for k in range(1, 6 if realista else 4)
+         ],
+         "recursos": "Simulador clínico", "evaluacion": "Lista de cotejo"}
+        for n in range(1, 6 if realista else 4)
+    ]
+    if MARCA_APARTADO in prompt:
+        titulo = _titulo_apartado(prompt)
+        numero = re.match(r"^## (\d+)\.", titulo)
+        if titulo.startswith("### Criterio"):
+            documento = {"nombre": f"Criterio regenerado {huella}", "peso": 20, **niveles,
+                         "indicadores": ["Indicador regenerado"]}
+        elif numero:
+            documento = {"numero": int(numero.group(1)), "titulo": titulo.split(". ", 1)[-1],
+                         "contenido": f"Contenido regenerado del apartado ({huella})."}
+            if numero.group(1) == "7":
+                documento["fases"] = fases
+        else:
+            documento = {"titulo": titulo.lstrip("# "), "contenido": f"Contenido regenerado del apartado ({huella})."}
+        return json.dumps(documento, ensure_ascii=False)
+    if "RÚBRICA" in prompt:
+        documento = {
+            "titulo": f"Prueba {huella}",
+            "informacion": "- **Módulo:** Prueba\n- **Instrumento:** Rúbrica analítica",
+            "criterios": [
+                {"nombre": f"Criterio de prueba {n}", "peso": 20, **niveles,
+                 "indicadores": [f"Indicador {n}.1 con \"comillas\"", f"Indicador {n}.2"]}
+                for n in range(1, 6 if realista else 5)
+            ],
+            "secciones": [
+                {"titulo": "Evaluación del Proceso", "contenido": "Participación y actitud (10 %) y trabajo en equipo (10 %)."},
+                {"titulo": "Escala de Calificación", "contenido": "- **EXCELENTE (9-10):** Supera los objetivos"},
+            ],
+        }
+    else:
+        documento = {
+            "titulo": f"Prueba {huella}",
+            "secciones": [
+                {"numero": n, "titulo": TITULOS_SITUACION[n - 1] if realista else f"SECCIÓN {n}",
+                 "contenido": contenido(n)}
+                for n in range(1, 13)
+            ],
+        }
+        documento["secciones"][6]["fases"] = fases
+    return json.dumps(documento, ensure_ascii=False, indent=1)
+
+
+class Fallos:
+    """Fallos inyectados: probabilidades por petición y número de peticiones iniciales que fallan"""
+
+    def __init__(self, error_503=0.0, error_429=0.0, cuelgue=0.0, duracion_cuelgue=30.0, fallar_primeras=0,
+                 semilla=None):
+        self.error_503 = error_503
+        self.error_429 = error_429
+        self.cuelgue = cuelgue
+        self.duracion_cuelgue = duracion_cuelgue
+        self.fallar_primeras = fallar_primeras
+        self.peticiones = 0
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+
+    def sortear(self):
+        """Devuelve "503", "429", "cuelgue" o None para la siguiente petición"""
+
+        with self._lock:
+            self.peticiones += 1
+            if self.peticiones <= self.fallar_primeras:
+                return "503"
+            tirada = self._azar.random()
+        if tirada < self.error_503:
+            return "503"
+        tirada -= self.error_503
+        if tirada < self.error_429:
+            return "429"
+        tirada -= self.error_429
+        if tirada < self.cuelgue:
+            return "cuelgue"
+        return None
+
+
+def _error(codigo, estado, mensaje, detalles=None):
+    """Excepción de google-genai (ClientError o ServerError) con el cuerpo de error de la API"""
+    from google.genai import errors
+
+    cuerpo = {"error": {"code": codigo, "message": mensaje, "status": estado, "details": detalles or []}}
+    return (errors.ServerError if codigo >= 500 else errors.ClientError)(codigo, cuerpo)
+
+
+def _respuesta(texto, tokens_prompt, cacheados=0, generados=None):
+    """GenerateContentResponse; en streaming generados es el texto acumulado, como el uso que informa la API"""
+    from google.genai import types
+
+    tokens_salida = len(texto if generados is None else generados) // 4
+
+    return types.GenerateContentResponse.model_validate({
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": texto}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": tokens_prompt,
+            "candidatesTokenCount": tokens_salida,
+            "totalTokenCount": tokens_prompt + tokens_salida,
+            "cachedContentTokenCount": cacheados,
+        },
+    })
+
+
+def _fecha(instante):
+    return datetime.fromtimestamp(instante, timezone.utc)
+
+
+class _Modelos:
+    """client.models de google-genai"""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def _preparar(self, contents, config):
+        """Sortea el fallo, resuelve las instrucciones y espera la latencia; devuelve (texto, tokens, cacheados)"""
+
+        cliente = self._cliente
+        opciones = getattr(config, "http_options", None)
+        plazo = opciones.timeout / 1000 if opciones is not None and opciones.timeout else None
+
+        def esperar(segundos):
+            if plazo is not None and segundos > plazo:
+                time.sleep(plazo)
+                raise TimeoutError("Se ha agotado el plazo de la petición")
+            time.sleep(segundos)
+
+        fallo = cliente.fallos.sortear()
+        if fallo == "503":
+            raise _error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+        if fallo == "429":
+            raise _error(429, "RESOURCE_EXHAUSTED", "Quota exceeded", [
+                {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}
+            ])
+        if fallo == "cuelgue":
+            esperar(cliente.fallos.duracion_cuelgue)
+
+        instrucciones = str(getattr(config, "system_instruction", None) or "")
+        cacheados = 0
+        nombre = getattr(config, "cached_content", None)
+        if nombre:
+            cache = cliente.genai.caches.vigente(nombre)
+            if cache is None:
+                raise _error(404, "NOT_FOUND", "CachedContent not found (or permission denied)")
+            instrucciones = cache.texto + instrucciones
+            cacheados = len(cache.texto) // 4
+        prompt = instrucciones + (contents if isinstance(contents, str) else str(contents))
+        if getattr(config, "response_mime_type", None) == "application/json":
+            texto = json_falso(prompt, cliente.realista)
+        else:
+            texto = texto_falso(prompt, cliente.realista)
+        esperar(cliente.latencia)
+        return texto, len(prompt) // 4, cacheados
+
+    def generate_content(self, model, contents, config=None):
+        texto, tokens, cacheados = self._preparar(contents, config)
+        return _respuesta(texto, tokens, cacheados)
+
+    def generate_content_stream(self, model, contents, config=None):
+        # Como en el SDK, la petición sale al pedir el primer fragmento
+        texto, tokens, cacheados = self._preparar(contents, config)
+        tamano = self._cliente.tamano_fragmento
+        for inicio in range(0, len(texto), tamano):
+            if inicio:
+                time.sleep(self._cliente.latencia_fragmento)
+            yield _respuesta(texto[inicio:inicio + tamano], tokens, cacheados, texto[:inicio + tamano])
+
+    def get(self, model, config=None):
+        from google.genai import types
+
+        return types.Model(name=f"models/{model}", display_name=model)
+
+
+class _ContenidoCache:
+    __slots__ = ("nombre", "modelo", "display_name", "texto", "expira")
+
+    def __init__(self, nombre, modelo, display_name, texto, expira):
+        self.nombre = nombre
+        self.modelo = modelo
+        self.display_name = display_name
+        self.texto = texto
+        self.expira = expira
+
+    def a_tipo(self):
+        from google.genai import types
+
+        return types.CachedContent(
+            name=self.nombre, model=self.modelo, display_name=self.display_name, expire_time=_fecha(self.expira)
+        )
+
+
+class _Caches:
+    """client.caches de google-genai, en memoria del proceso"""
+
+    def __init__(self, minimo_tokens):
+        self.minimo_tokens = minimo_tokens
+        self._contenidos = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def vigente(self, nombre):
+        with self._lock:
+            cache = self._contenidos.get(nombre)
+        return cache if cache is not None and cache.expira > time.time() else None
+
+    def list(self, config=None):
+        ahora = time.time()
+        with self._lock:
+            return [c.a_tipo() for c in self._contenidos.values() if c.expira > ahora]
+
+    def create(self, model, config):
+        texto = str(config.system_instruction or "")
+        if len(texto) // 4 < self.minimo_tokens:
+            raise _error(400, "INVALID_ARGUMENT", f"Cached content is too small. total_token_count={len(texto) // 4}, "
+                                                  f"min_total_token_count={self.minimo_tokens}")
+        with self._lock:
+            nombre = f"cachedContents/{next(self._ids)}"
+            cache = self._contenidos[nombre] = _ContenidoCache(
+                nombre, model, config.display_name or "", texto, time.time() + float(str(config.ttl).rstrip("s"))
+            )
+        return cache.a_tipo()
+
+    def get(self, name, config=None):
+        cache = self.vigente(name)
+        if cache is None:
+            raise _error(404, "NOT_FOUND", "CachedContent not found (or permission denied)")
+        return cache.a_tipo()
+
+    def update(self, name, config):
+        cache = self.vigente(name)
+        if cache is None:
+            raise _error(404, "NOT_FOUND", "CachedContent not found (or permission denied)")
+        cache.expira = time.time() + float(str(config.ttl).rstrip("s"))
+        return cache.a_tipo()
+
+    def delete(self, name, config=None):
+        with self._lock:
+            self._contenidos.pop(name, None)
+
+
+class _GenaiFalso:
+    """Lo que GeminiService usa de genai.Client"""
+
+    def __init__(self, cliente, minimo_tokens_cache):
+        self.models = _Modelos(cliente)
+        self.caches = _Caches(minimo_tokens_cache)
+
+
+class ClienteFalso:
+    """Backend sin red con la interfaz de registro.ClienteGemini.
+
+    latencia es el tiempo hasta la respuesta (o hasta el primer fragmento) y
+    latencia_fragmento el tiempo entre fragmentos en streaming; fallos es un objeto
+    Fallos (por defecto con GEMINI_FALSO_ERROR_503 y GEMINI_FALSO_ERROR_429).
+    """
+
+    def __init__(self, api_key=None, base_url=None, latencia=None, latencia_fragmento=None,
+                 tamano_fragmento=TAMANO_FRAGMENTO, fallos=None, realista=True,
+                 minimo_tokens_cache=MINIMO_TOKENS_CACHE):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.latencia = LATENCIA if latencia is None else latencia
+        self.latencia_fragmento = LATENCIA_FRAGMENTO if latencia_fragmento is None else latencia_fragmento
+        self.tamano_fragmento = tamano_fragmento
+        self.fallos = fallos or Fallos(
+            error_503=float(os.getenv("GEMINI_FALSO_ERROR_503", "0")),
+            error_429=float(os.getenv("GEMINI_FALSO_ERROR_429", "0"))
+        )
+        self.realista = realista
+        self.genai = _GenaiFalso(self, minimo_tokens_cache)
+
+    def salud(self, modelo, max_antiguedad=30.0, plazo=5.0):
+        from services.registro import EstadoSalud
+
+        return EstadoSalud(True, 0.0)
+
+    def cerrar(self):
+        pass
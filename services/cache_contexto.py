@@ -0,0 +1,175 @@
+"""Caché de contexto de Gemini para las instrucciones fijas de los prompts.
+
+Las instrucciones de cada tipo de prompt (services.prompts) son idénticas en todas
+las llamadas. CacheContexto las sube una vez como contenido en caché de Gemini
+(client.caches) con un TTL, lo renueva antes de que caduque y devuelve el nombre
+que GeminiService pasa en cached_content: Gemini no vuelve a procesar esos tokens
+y los factura a precio de caché.
+
+Si la caché de contexto no está disponible (modelo sin soporte, instrucciones por
+debajo del mínimo de tokens, error de la API o GEMINI_CACHE_CONTEXTO=0), nombre()
+devuelve None y GeminiService envía las instrucciones como system instruction al
+principio de la petición, donde el prefijo común aprovecha la caché implícita de
+Gemini.
+
+Cada contenido se identifica por su display_name, una huella del modelo y de las
+instrucciones, así que los demás procesos (otros workers de Streamlit, el
+generador por lotes) reutilizan los ya creados en lugar de duplicarlos.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from services.prompts import contar_tokens
+
+# Segundos de vida de cada contenido en caché
+TTL = int(os.getenv("GEMINI_CACHE_CONTEXTO_TTL", "3600"))
+
+# Se renueva el TTL cuando quedan menos de estos segundos
+MARGEN_RENOVACION = 300
+
+# Tokens mínimos que Gemini admite en un contenido en caché (gemini-2.5-flash)
+MINIMO_TOKENS = int(os.getenv("GEMINI_CACHE_CONTEXTO_MIN_TOKENS", "1024"))
+
+# contar_tokens es una estimación: se intenta a partir del 80 % del mínimo y decide la API
+MARGEN_ESTIMACION = 0.8
+
+# Segundos sin volver a intentarlo tras un fallo transitorio de la API de cachés
+ESPERA_TRAS_FALLO = 600
+
+# Plazo en segundos de cada llamada a la API de cachés
+PLAZO = 10
+
+PREFIJO_NOMBRE = "situaciones-fp-"
+
+
+class _Entrada:
+    __slots__ = ("nombre", "expira", "bloqueada_hasta", "lock")
+
+    def __init__(self):
+        self.nombre = None
+        self.expira = 0.0
+        self.bloqueada_hasta = 0.0
+        self.lock = threading.Lock()
+
+
+class CacheContexto:
+    """Contenidos en caché de Gemini con las instrucciones fijas, uno por modelo e instrucciones"""
+
+    def __init__(self, cliente, ttl=TTL, minimo_tokens=MINIMO_TOKENS):
+        # Función que devuelve el genai.Client: el cliente se crea en la primera llamada
+        self._cliente = cliente
+        self.ttl = ttl
+        self.minimo_tokens = minimo_tokens
+        self._entradas = {}
+        self._lock = threading.Lock()
+        # Contadores acumulados desde el arranque (diagnóstico)
+        self.contadores = {"creadas": 0, "reutilizadas": 0, "renovadas": 0, "invalidadas": 0, "fallos": 0}
+
+    def _contar(self, nombre):
+        with self._lock:
+            self.contadores[nombre] += 1
+
+    def nombre(self, modelo, instrucciones):
+        """Nombre del contenido en caché con esas instrucciones, o None si hay que enviarlas en la petición.
+
+        Crea el contenido la primera vez y renueva su TTL cuando está a punto de caducar.
+        """
+
+        if contar_tokens(instrucciones) < self.minimo_tokens * MARGEN_ESTIMACION:
+            return None
+        huella = hashlib.sha256(f"{modelo}\n{instrucciones}".encode("utf-8")).hexdigest()[:24]
+        with self._lock:
+            entrada = self._entradas.get(huella)
+            if entrada is None:
+                entrada = self._entradas[huella] = _Entrada()
+
+        # Solo una llamada por contenido crea o renueva; las demás esperan su resultado
+        with entrada.lock:
+            ahora = time.time()
+            if entrada.bloqueada_hasta > ahora:
+                return None
+            if entrada.nombre and entrada.expira - ahora > MARGEN_RENOVACION:
+                return entrada.nombre
+            try:
+                if entrada.nombre and entrada.expira > ahora:
+                    self._renovar(entrada, modelo, huella, instrucciones)
+                else:
+                    self._crear(entrada, modelo, huella, instrucciones)
+            except Exception as e:
+                self._contar("fallos")
+                entrada.nombre = None
+                # Un 400 indica que el modelo no admite caché o que no se llega al mínimo: no va a cambiar
+                entrada.bloqueada_hasta = float("inf") if getattr(e, "code", None) == 400 else ahora + ESPERA_TRAS_FALLO
+                return None
+            return entrada.nombre
+
+    def invalidar(self, nombre, error):
+        """Olvida un contenido que Gemini ya no reconoce (caducado o borrado).
+
+        Devuelve True si el error se debe a ese contenido y la llamada se puede repetir
+        enviando las instrucciones en la petición.
+        """
+
+        codigo = getattr(error, "code", None)
+        if codigo not in (403, 404) and not (codigo == 400 and "cache" in str(error).lower()):
+            return False
+        with self._lock:
+            entradas = [e for e in self._entradas.values() if e.nombre == nombre]
+        for entrada in entradas:
+            with entrada.lock:
+                if entrada.nombre == nombre:
+                    entrada.nombre = None
+        self._contar("invalidadas")
+        return True
+
+    def _opciones(self):
+        from google.genai import types
+
+        return types.HttpOptions(timeout=PLAZO * 1000)
+
+    def _crear(self, entrada, modelo, huella, instrucciones):
+        from google.genai import types
+
+        cliente = self._cliente()
+        display_name = PREFIJO_NOMBRE + huella
+        for existente in cliente.caches.list(
+            config=types.ListCachedContentsConfig(page_size=100, http_options=self._opciones())
+        ):
+            expira = existente.expire_time.timestamp() if existente.expire_time else 0.0
+            if existente.display_name == display_name and expira - time.time() > MARGEN_RENOVACION:
+                entrada.nombre, entrada.expira = existente.name, expira
+                self._contar("reutilizadas")
+                return
+
+        creado = cliente.caches.create(
+            model=modelo,
+            config=types.CreateCachedContentConfig(
+                display_name=display_name,
+                system_instruction=instrucciones,
+                ttl=f"{self.ttl}s",
+                http_options=self._opciones()
+            )
+        )
+        entrada.nombre = creado.name
+        entrada.expira = creado.expire_time.timestamp() if creado.expire_time else time.time() + self.ttl
+        self._contar("creadas")
+
+    def _renovar(self, entrada, modelo, huella, instrucciones):
+        from google.genai import types
+
+        try:
+            actualizado = self._cliente().caches.update(
+                name=entrada.nombre,
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s", http_options=self._opciones())
+            )
+        except Exception as e:
+            if getattr(e, "code", None) != 404:
+                raise
+            # Lo ha borrado otro proceso o ha caducado entretanto
+            self._crear(entrada, modelo, huella, instrucciones)
+            return
+        entrada.expira = actualizado.expire_time.timestamp() if actualizado.expire_time else time.time() + self.ttl
+        self._contar("renovadas")
@@ -0,0 +1,172 @@
+"""Coalescencia de peticiones idénticas en curso (single-flight).
+
+Cuando varias sesiones piden a la vez exactamente la misma generación (misma clave
+de caché), solo la primera llama a Gemini; las demás esperan esa llamada y
+comparten su resultado. En streaming comparten también el flujo: cada suscriptor
+recibe desde el principio los fragmentos ya llegados y después los nuevos según
+llegan.
+
+El flujo compartido lo consume un hilo propio, así que si la sesión que lo inició
+se cancela (rerun de Streamlit) los demás siguen recibiéndolo. La llamada a Gemini
+solo se cancela cuando no queda ningún suscriptor.
+"""
+
+import threading
+
+
+class _Resultado:
+    """Resultado de una llamada bloqueante compartida"""
+
+    __slots__ = ("listo", "valor", "error")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.error = None
+
+
+class FlujoCompartido:
+    """Fragmentos de una respuesta en streaming que leen varios suscriptores a la vez"""
+
+    def __init__(self):
+        self.fragmentos = []
+        self.terminado = False
+        self.error = None
+        self.suscriptores = 0
+        # Se activa cuando no queda nadie leyendo: detiene la llamada a Gemini
+        self.cancelado = threading.Event()
+        self._condicion = threading.Condition()
+
+    def publicar(self, fragmento):
+        with self._condicion:
+            self.fragmentos.append(fragmento)
+            self._condicion.notify_all()
+
+    def terminar(self, error=None):
+        with self._condicion:
+            self.terminado = True
+            self.error = error
+            self._condicion.notify_all()
+
+    def leer(self, cancelar=None):
+        """Devuelve los fragmentos desde el primero; se detiene si se activa cancelar"""
+
+        posicion = 0
+        while True:
+            with self._condicion:
+                while posicion == len(self.fragmentos) and not self.terminado:
+                    # Espera con límite para poder atender la cancelación del suscriptor
+                    self._condicion.wait(0.1)
+                    if cancelar is not None and cancelar.is_set():
+                        return
+                nuevos = self.fragmentos[posicion:]
+                terminado = self.terminado
+                error = self.error
+            posicion += len(nuevos)
+            for fragmento in nuevos:
+                yield fragmento
+            if cancelar is not None and cancelar.is_set():
+                return
+            if terminado:
+                if error is not None:
+                    raise error
+                return
+
+
+class Coalescedor:
+    """Agrupa las llamadas con la misma clave mientras la primera sigue en curso"""
+
+    def __init__(self):
+        self._llamadas = {}
+        self._flujos = {}
+        self._lock = threading.Lock()
+        # "iniciadas": llamadas reales a Gemini; "coalescidas": peticiones que se unieron a una en curso
+        self.contadores = {"iniciadas": 0, "coalescidas": 0}
+
+    def llamar(self, clave, funcion):
+        """Ejecuta funcion() o, si ya hay una con la misma clave en curso, espera su resultado.
+
+        Devuelve (valor, coalescida).
+        """
+
+        with self._lock:
+            resultado = self._llamadas.get(clave)
+            lider = resultado is None
+            if lider:
+                resultado = self._llamadas[clave] = _Resultado()
+                self.contadores["iniciadas"] += 1
+            else:
+                self.contadores["coalescidas"] += 1
+
+        if not lider:
+            resultado.listo.wait()
+            if resultado.error is not None:
+                raise resultado.error
+            return resultado.valor, True
+
+        try:
+            resultado.valor = funcion()
+        except BaseException as e:
+            resultado.error = e
+            raise
+        finally:
+            # Las peticiones posteriores ya encontrarán la respuesta en la caché
+            with self._lock:
+                self._llamadas.pop(clave, None)
+            resultado.listo.set()
+        return resultado.valor, False
+
+    def flujo(self, clave, abrir, cancelar=None, al_unirse=None):
+        """Suscribe al flujo con esa clave, iniciándolo con abrir(cancelado) si no existe.
+
+        abrir recibe el threading.Event que se activa cuando ya nadie lee y devuelve un
+        iterable de fragmentos. al_unirse() se llama si la petición se une a un flujo en curso.
+        """
+
+        with self._lock:
+            compartido = self._flujos.get(clave)
+            lider = compartido is None
+            if lider:
+                compartido = self._flujos[clave] = FlujoCompartido()
+                self.contadores["iniciadas"] += 1
+            else:
+                self.contadores["coalescidas"] += 1
+            compartido.suscriptores += 1
+
+        if lider:
+            hilo = threading.Thread(
+                target=self._producir, args=(clave, compartido, abrir), name="flujo-compartido", daemon=True
+            )
+            hilo.start()
+        elif al_unirse is not None:
+            al_unirse()
+
+        try:
+            yield from compartido.leer(cancelar)
+        finally:
+            with self._lock:
+                compartido.suscriptores -= 1
+                if compartido.suscriptores == 0 and not compartido.terminado:
+                    compartido.cancelado.set()
+                    if self._flujos.get(clave) is compartido:
+                        del self._flujos[clave]
+
+    def _producir(self, clave, compartido, abrir):
+        error = None
+        fragmentos = None
+        try:
+            fragmentos = abrir(compartido.cancelado)
+            for fragmento in fragmentos:
+                if compartido.cancelado.is_set():
+                    break
+                compartido.publicar(fragmento)
+        except Exception as e:
+            error = e
+        finally:
+            cerrar = getattr(fragmentos, "close", None)
+            if cerrar:
+                cerrar()
+            with self._lock:
+                if self._flujos.get(clave) is compartido:
+                    del self._flujos[clave]
+            compartido.terminar(error)
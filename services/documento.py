@@ -0,0 +1,245 @@
+"""Modelo de bloques común a las exportaciones (PDF y Word).
+
+La situación y la rúbrica, tanto en Markdown como en el modo estructurado
+(services.estructura), se convierten en la misma secuencia de bloques: títulos,
+párrafos, listas, tablas, separadores y huecos. Cada exportador solo tiene que
+maquetar esos bloques, así que los dos formatos muestran exactamente lo mismo.
+
+El formato en línea (negrita, cursiva, código y saltos <br>) se queda en el texto
+de cada bloque; segmentos() lo reparte en tramos para los formatos que no usan
+marcado (DOCX). El Markdown se analiza por secciones ## con caché por sección.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+import re
+
+from services.estructura import NIVELES, Rubrica, Situacion
+
+# Tipos de bloque que produce parse_markdown
+TITULO = 'titulo'        # (TITULO, nivel 1-4, texto)
+PARRAFO = 'parrafo'      # (PARRAFO, texto)
+VINETA = 'vineta'        # (VINETA, nivel de anidamiento 0-1, texto)
+NUMERADO = 'numerado'    # (NUMERADO, nivel de anidamiento 0-1, número, texto)
+TABLA = 'tabla'          # (TABLA, filas, tiene_cabecera); filas es una lista de listas de celdas
+SEPARADOR = 'separador'  # (SEPARADOR,) línea horizontal ---
+HUECO = 'hueco'          # (HUECO,) una o más líneas en blanco seguidas
+
+TITULO_SITUACION = "SITUACIÓN DE APRENDIZAJE"
+SUBTITULO = "Formación Profesional Sanitaria - Aragón"
+TITULO_RUBRICA = "RÚBRICA DE EVALUACIÓN"
+PIE = ("Gobierno de Aragón - Departamento de Educación, Cultura y Deporte", "Generado con Asistente IA para FP Sanitaria")
+
+_TITULO = re.compile(r'^(#{1,6})\s+(.*)$')
+_VINETA = re.compile(r'^(\s*)[-*•+]\s+(.*)$')
+_NUMERADO = re.compile(r'^(\s*)(\d+)[.)]\s+(.*)$')
+_FILA_SEPARADORA = re.compile(r'^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$')
+_SEPARADOR = re.compile(r'^(-{3,}|\*{3,}|_{3,})$')
+
+# Formato en línea
+SALTO = re.compile(r'<br\s*/?>', re.IGNORECASE)
+CODIGO = re.compile(r'`([^`]+)`')
+NEGRITA = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__')
+CURSIVA = re.compile(r'(?<![*\w])\*(?=[^\s*])(.+?)(?<=[^\s*])\*(?![*\w])|(?<![_\w])_(?=\S)(.+?)(?<=\S)_(?![_\w])')
+
+
+def datos_generales(parametros):
+    """Filas de la tabla de información del ciclo con la que empiezan los documentos"""
+    return [
+        ['Ciclo Formativo:', f"{parametros.get('nivel', '')} - {parametros.get('ciclo', '')}"],
+        ['Módulo:', parametros.get('modulo', '')],
+        ['Metodología:', parametros.get('metodologia', '')],
+        ['Duración:', parametros.get('duracion', '')],
+        ['Fecha de generación:', datetime.now().strftime('%d/%m/%Y %H:%M')]
+    ]
+
+
+def _celdas(linea):
+    return [celda.strip() for celda in linea.strip().strip('|').split('|')]
+
+
+def parse_markdown(fuente):
+    """Analiza Markdown línea a línea y va devolviendo bloques según se completan.
+
+    fuente puede ser un texto o cualquier iterable de líneas (p. ej. un flujo de
+    Gemini ya partido en líneas). Las filas | ... | consecutivas se agrupan en un
+    único bloque TABLA; la fila |---| marca la anterior como cabecera.
+    """
+
+    lineas = fuente.splitlines() if isinstance(fuente, str) else fuente
+    filas = []
+    cabecera = False
+    hueco_pendiente = False
+
+    for linea in lineas:
+        limpia = linea.strip()
+
+        if filas and not limpia.startswith('|'):
+            yield (TABLA, filas, cabecera)
+            filas, cabecera = [], False
+
+        if not limpia:
+            hueco_pendiente = True
+            continue
+
+        if hueco_pendiente:
+            # Varias líneas en blanco seguidas generan un solo hueco
+            yield (HUECO,)
+            hueco_pendiente = False
+
+        if limpia.startswith('|'):
+            if _FILA_SEPARADORA.match(limpia):
+                cabecera = cabecera or len(filas) == 1
+            else:
+                filas.append(_celdas(limpia))
+            continue
+
+        coincidencia = _TITULO.match(limpia)
+        if coincidencia:
+            yield (TITULO, min(len(coincidencia.group(1)), 4), coincidencia.group(2).strip())
+            continue
+
+        if _SEPARADOR.match(limpia):
+            yield (SEPARADOR,)
+            continue
+
+        coincidencia = _VINETA.match(linea)
+        if coincidencia:
+            yield (VINETA, 1 if len(coincidencia.group(1).expandtabs(4)) >= 2 else 0, coincidencia.group(2).strip())
+            continue
+
+        coincidencia = _NUMERADO.match(linea)
+        if coincidencia:
+            nivel = 1 if len(coincidencia.group(1).expandtabs(4)) >= 2 else 0
+            yield (NUMERADO, nivel, coincidencia.group(2), coincidencia.group(3).strip())
+            continue
+
+        yield (PARRAFO, limpia)
+
+    if filas:
+        yield (TABLA, filas, cabecera)
+
+
+_INICIO_SECCION = re.compile(r'(?m)^(?=## )')
+
+
+@lru_cache(maxsize=256)
+def _bloques_seccion(texto):
+    """Bloques de una sección y si termina en línea en blanco (hueco pendiente para la siguiente)"""
+    lineas = texto.splitlines()
+    return tuple(parse_markdown(lineas)), bool(lineas) and not lineas[-1].strip()
+
+
+def bloques_markdown(markdown):
+    """parse_markdown por secciones ## con caché por sección.
+
+    Al regenerar un apartado (services.regeneracion) el documento solo cambia en una
+    sección, y al exportar a PDF y a Word se analiza el mismo texto dos veces: en los
+    dos casos el resto de secciones sale ya analizado de la caché del proceso.
+    """
+    hueco = False
+    for parte in _INICIO_SECCION.split(markdown):
+        if not parte:
+            continue
+        bloques, hueco_final = _bloques_seccion(parte)
+        if hueco and bloques:
+            yield (HUECO,)
+        yield from bloques
+        hueco = hueco_final
+
+
+def _bloques_seccion_estructurada(seccion):
+    titulo = f"{seccion.numero}. {seccion.titulo}" if seccion.numero is not None else seccion.titulo
+    yield (TITULO, 2, titulo)
+    if seccion.contenido:
+        yield from bloques_markdown(seccion.contenido)
+    for i, fase in enumerate(seccion.fases, 1):
+        yield (TITULO, 3, f"Fase {i}: {fase.nombre}")
+        yield (TABLA, [
+            ['**Duración**', fase.duracion],
+            ['**Recursos**', fase.recursos],
+            ['**Evaluación**', fase.evaluacion],
+        ], False)
+        for k, actividad in enumerate(fase.actividades, 1):
+            yield (NUMERADO, 0, str(k), actividad)
+
+
+def _bloques_situacion(situacion):
+    """Las fases se maquetan desde sus campos, sin analizar Markdown"""
+    yield (TITULO, 1, f"SITUACIÓN DE APRENDIZAJE: {situacion.titulo}")
+    for seccion in situacion.secciones:
+        yield from _bloques_seccion_estructurada(seccion)
+
+
+def _bloques_rubrica(rubrica):
+    """Una tabla de niveles por criterio y el resumen de pesos"""
+    yield (PARRAFO, f"**Situación de Aprendizaje:** {rubrica.titulo}")
+    if rubrica.informacion:
+        yield (TITULO, 2, "Información General")
+        yield from bloques_markdown(rubrica.informacion)
+
+    yield (TITULO, 2, "Criterios de Evaluación y Niveles de Desempeño")
+    for i, criterio in enumerate(rubrica.criterios, 1):
+        yield (TITULO, 3, f"Criterio {i}: {criterio.nombre} ({criterio.peso:g} %)")
+        yield (TABLA, [[etiqueta for _, etiqueta in NIVELES], list(criterio.descriptores)], True)
+        for indicador in criterio.indicadores:
+            yield (VINETA, 0, indicador)
+        yield (HUECO,)
+
+    resumen = [['Criterio', 'Peso']] + [[c.nombre, f"{c.peso:g} %"] for c in rubrica.criterios]
+    resumen.append(['**Total**', f"{rubrica.peso_total:g} %"])
+    yield (TITULO, 3, "Resumen de pesos")
+    yield (TABLA, resumen, True)
+
+    for seccion in rubrica.secciones:
+        yield from _bloques_seccion_estructurada(seccion)
+
+
+def bloques(contenido):
+    """Bloques de un contenido en Markdown o de un documento de services.estructura"""
+    if isinstance(contenido, Situacion):
+        return _bloques_situacion(contenido)
+    if isinstance(contenido, Rubrica):
+        return _bloques_rubrica(contenido)
+    return bloques_markdown(contenido)
+
+
+def _cursiva(texto, negrita):
+    inicio = 0
+    for coincidencia in CURSIVA.finditer(texto):
+        if coincidencia.start() > inicio:
+            yield (texto[inicio:coincidencia.start()], negrita, False, False)
+        yield (coincidencia.group(1) or coincidencia.group(2), negrita, True, False)
+        inicio = coincidencia.end()
+    if inicio < len(texto):
+        yield (texto[inicio:], negrita, False, False)
+
+
+def _negrita(texto):
+    inicio = 0
+    for coincidencia in NEGRITA.finditer(texto):
+        yield from _cursiva(texto[inicio:coincidencia.start()], False)
+        yield from _cursiva(coincidencia.group(1) or coincidencia.group(2), True)
+        inicio = coincidencia.end()
+    yield from _cursiva(texto[inicio:], False)
+
+
+@lru_cache(maxsize=4096)
+def segmentos(texto):
+    """Tramos (texto, negrita, cursiva, código) del formato en línea de un texto.
+
+    Los saltos <br> se devuelven como un tramo "\\n". El código se toma literal, sin
+    buscar negritas ni cursivas dentro. Se cachea porque las mismas celdas y viñetas
+    se repiten entre exportaciones del mismo documento.
+    """
+    resultado = []
+    for i, linea in enumerate(SALTO.split(texto)):
+        if i:
+            resultado.append(("\n", False, False, False))
+        inicio = 0
+        for coincidencia in CODIGO.finditer(linea):
+            resultado.extend(_negrita(linea[inicio:coincidencia.start()]))
+            resultado.append((coincidencia.group(1), False, False, True))
+            inicio = coincidencia.end()
+        resultado.extend(_negrita(linea[inicio:]))
+    return tuple(resultado)
@@ -0,0 +1,316 @@
+"""Exportación a Word (DOCX) desde el mismo modelo de bloques que el PDF.
+
+Un DOCX es un zip con varias partes XML (OOXML). Las pequeñas (estilos, relaciones,
+metadatos) son fijas; word/document.xml se escribe en streaming directamente dentro
+del zip, bloque a bloque de services.documento, con un búfer de unos 64 KB: nunca
+se construye el árbol XML del documento en memoria y no hace falta python-docx.
+
+Las tablas (las de niveles de la rúbrica incluidas) son tablas reales de Word, con
+la fila de cabecera repetida en cada página. Los estilos imitan los del PDF.
+"""
+
+import io
+import re
+import zipfile
+from datetime import datetime, timezone
+
+from services.documento import (
+    HUECO, NUMERADO, PIE, SEPARADOR, SUBTITULO, TABLA, TITULO, TITULO_RUBRICA, TITULO_SITUACION, VINETA,
+    bloques, datos_generales, segmentos,
+)
+
+MIME_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Tamaño del búfer antes de volcarlo al zip
+TAMANO_BUFER = 64 * 1024
+
+# A4 con márgenes de 1 pulgada, en veinteavos de punto (twips)
+ANCHO_PAGINA = 11906
+ALTO_PAGINA = 16838
+MARGEN = 1440
+ANCHO_UTIL = ANCHO_PAGINA - 2 * MARGEN
+
+_W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '<Override PartName="/docProps/core.xml" '
+    'ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" '
+    'Target="docProps/core.xml"/>'
+    '</Relationships>'
+)
+
+_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+
+def _estilo_parrafo(identificador, nombre, ppr="", rpr="", titulo=None):
+    # titulo es el nivel de esquema (0 = Título 1) para que aparezca en el panel de navegación
+    esquema = f'<w:outlineLvl w:val="{titulo}"/>' if titulo is not None else ""
+    herencia = '<w:basedOn w:val="Normal"/><w:next w:val="Normal"/>' if identificador != "Normal" else ""
+    return (
+        f'<w:style w:type="paragraph" w:styleId="{identificador}"><w:name w:val="{nombre}"/>{herencia}<w:qFormat/>'
+        f'<w:pPr>{ppr}{esquema}</w:pPr><w:rPr>{rpr}</w:rPr></w:style>'
+    )
+
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<w:styles {_W}>'
+    '<w:docDefaults><w:rPrDefault><w:rPr>'
+    '<w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:eastAsia="Calibri" w:cs="Calibri"/>'
+    '<w:sz w:val="20"/><w:szCs w:val="20"/><w:lang w:val="es-ES"/>'
+    '</w:rPr></w:rPrDefault><w:pPrDefault><w:pPr>'
+    '<w:spacing w:after="120" w:line="259" w:lineRule="auto"/>'
+    '</w:pPr></w:pPrDefault></w:docDefaults>'
+    + _estilo_parrafo("Normal", "Normal", '<w:jc w:val="both"/>')
+    + _estilo_parrafo(
+        "Title", "Title", '<w:keepNext/><w:spacing w:after="600"/><w:jc w:val="center"/>',
+        '<w:b/><w:color w:val="1F77B4"/><w:sz w:val="36"/><w:szCs w:val="36"/>'
+    )
+    + _estilo_parrafo(
+        "Subtitle", "Subtitle", '<w:keepNext/><w:spacing w:before="240" w:after="240"/><w:jc w:val="left"/>',
+        '<w:b/><w:color w:val="2C3E50"/><w:sz w:val="28"/><w:szCs w:val="28"/>'
+    )
+    + _estilo_parrafo(
+        "Heading1", "heading 1", '<w:keepNext/><w:spacing w:before="240" w:after="240"/><w:jc w:val="left"/>',
+        '<w:b/><w:color w:val="2C3E50"/><w:sz w:val="28"/><w:szCs w:val="28"/>', titulo=0
+    )
+    + _estilo_parrafo(
+        "Heading2", "heading 2", '<w:keepNext/><w:spacing w:before="200" w:after="160"/><w:jc w:val="left"/>',
+        '<w:b/><w:color w:val="2C3E50"/><w:sz w:val="24"/><w:szCs w:val="24"/>', titulo=1
+    )
+    + _estilo_parrafo(
+        "Heading3", "heading 3", '<w:keepNext/><w:spacing w:before="120" w:after="120"/><w:jc w:val="left"/>',
+        '<w:b/><w:sz w:val="22"/><w:szCs w:val="22"/>', titulo=2
+    )
+    + _estilo_parrafo("Lista", "Lista", '<w:spacing w:after="60"/><w:ind w:left="280" w:hanging="240"/>')
+    + _estilo_parrafo("ListaAnidada", "Lista anidada", '<w:spacing w:after="60"/><w:ind w:left="560" w:hanging="240"/>')
+    + _estilo_parrafo(
+        "Celda", "Celda", '<w:spacing w:after="0" w:line="240" w:lineRule="auto"/><w:jc w:val="left"/>',
+        '<w:sz w:val="16"/><w:szCs w:val="16"/>'
+    )
+    + _estilo_parrafo(
+        "CeldaCabecera", "Celda de cabecera",
+        '<w:spacing w:after="0" w:line="240" w:lineRule="auto"/><w:jc w:val="left"/>',
+        '<w:b/><w:color w:val="FFFFFF"/><w:sz w:val="16"/><w:szCs w:val="16"/>'
+    )
+    + _estilo_parrafo(
+        "CeldaEtiqueta", "Celda de etiqueta",
+        '<w:spacing w:after="0" w:line="240" w:lineRule="auto"/><w:jc w:val="left"/>',
+        '<w:b/><w:color w:val="2C3E50"/><w:sz w:val="18"/><w:szCs w:val="18"/>'
+    )
+    + _estilo_parrafo(
+        "Pie", "Pie", '<w:spacing w:before="600" w:after="0"/><w:jc w:val="center"/>',
+        '<w:color w:val="7F8C8D"/><w:sz w:val="16"/><w:szCs w:val="16"/>'
+    )
+    + '<w:style w:type="table" w:styleId="Tabla"><w:name w:val="Tabla"/><w:tblPr>'
+    '<w:tblBorders>'
+    + "".join(
+        f'<w:{borde} w:val="single" w:sz="4" w:space="0" w:color="BDC3C7"/>'
+        for borde in ("top", "left", "bottom", "right", "insideH", "insideV")
+    )
+    + '</w:tblBorders><w:tblCellMar>'
+    '<w:top w:w="60" w:type="dxa"/><w:left w:w="80" w:type="dxa"/>'
+    '<w:bottom w:w="60" w:type="dxa"/><w:right w:w="80" w:type="dxa"/>'
+    '</w:tblCellMar></w:tblPr></w:style>'
+    '</w:styles>'
+)
+
+_ESTILOS_TITULO = {1: "Heading1", 2: "Heading2", 3: "Heading3", 4: "Heading3"}
+_ESTILOS_LISTA = ("Lista", "ListaAnidada")
+
+# Caracteres de control que XML 1.0 no admite ni escapados
+_NO_XML = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_SEPARADOR_XML = (
+    '<w:p><w:pPr><w:pBdr><w:bottom w:val="single" w:sz="4" w:space="1" w:color="BDC3C7"/></w:pBdr>'
+    '<w:spacing w:before="80" w:after="80"/></w:pPr></w:p>'
+)
+_SALTO_PAGINA = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+_CABECERA = '<w:shd w:val="clear" w:color="auto" w:fill="2C3E50"/>'
+_PRIMERA_COLUMNA = '<w:shd w:val="clear" w:color="auto" w:fill="E8F4FD"/>'
+
+
+def _escapar(texto):
+    return _NO_XML.sub('', texto).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _runs(texto):
+    """Runs de Word del formato en línea de un texto (services.documento.segmentos)"""
+
+    partes = []
+    for contenido, negrita, cursiva, codigo in segmentos(texto):
+        if contenido == "\n":
+            partes.append('<w:r><w:br/></w:r>')
+            continue
+        propiedades = (
+            ('<w:rFonts w:ascii="Courier New" w:hAnsi="Courier New"/>' if codigo else '')
+            + ('<w:b/>' if negrita else '')
+            + ('<w:i/>' if cursiva else '')
+        )
+        rpr = f'<w:rPr>{propiedades}</w:rPr>' if propiedades else ''
+        partes.append(f'<w:r>{rpr}<w:t xml:space="preserve">{_escapar(contenido)}</w:t></w:r>')
+    return "".join(partes)
+
+
+def _parrafo(texto, estilo=None, prefijo=None):
+    # El prefijo (viñeta o número) va seguido de un tabulador que lo alinea con la sangría francesa
+    ppr = f'<w:pPr><w:pStyle w:val="{estilo}"/></w:pPr>' if estilo else ''
+    marca = f'<w:r><w:t xml:space="preserve">{_escapar(prefijo)}</w:t></w:r><w:r><w:tab/></w:r>' if prefijo else ''
+    return f'<w:p>{ppr}{marca}{_runs(texto)}</w:p>'
+
+
+def _tabla(filas, cabecera, anchos=None, etiquetas=False):
+    """Tabla real de Word; la cabecera se repite al partirse entre páginas.
+
+    Como en el PDF, con cabecera la primera columna va sombreada; etiquetas=True es el
+    estilo de la tabla de información del ciclo (primera columna en negrita).
+    """
+
+    columnas = max(len(fila) for fila in filas)
+    if anchos is None:
+        anchos = [ANCHO_UTIL // columnas] * columnas
+    partes = [
+        '<w:tbl><w:tblPr><w:tblStyle w:val="Tabla"/><w:tblW w:w="5000" w:type="pct"/>'
+        '<w:tblLayout w:type="fixed"/><w:tblLook w:val="04A0" w:firstRow="1" w:firstColumn="1"/></w:tblPr>'
+        '<w:tblGrid>',
+        *(f'<w:gridCol w:w="{ancho}"/>' for ancho in anchos),
+        '</w:tblGrid>',
+    ]
+    for i, fila in enumerate(filas):
+        es_cabecera = cabecera and i == 0
+        partes.append('<w:tr><w:trPr><w:cantSplit/><w:tblHeader/></w:trPr>' if es_cabecera else '<w:tr>')
+        for j, celda in enumerate(fila + [''] * (columnas - len(fila))):
+            if es_cabecera:
+                sombra, estilo = _CABECERA, "CeldaCabecera"
+            elif j == 0 and (cabecera or etiquetas):
+                sombra, estilo = _PRIMERA_COLUMNA, "CeldaEtiqueta" if etiquetas else "Celda"
+            else:
+                sombra, estilo = '', "Celda"
+            partes.append(
+                f'<w:tc><w:tcPr><w:tcW w:w="{anchos[j]}" w:type="dxa"/>{sombra}</w:tcPr>'
+                f'{_parrafo(celda, estilo)}</w:tc>'
+            )
+        partes.append('</w:tr>')
+    # Un párrafo tras la tabla para que dos tablas seguidas no se fusionen en Word
+    partes.append('</w:tbl><w:p><w:pPr><w:spacing w:after="0"/></w:pPr></w:p>')
+    return "".join(partes)
+
+
+def _bloques_xml(contenido):
+    """Fragmentos XML de word/document.xml para un contenido en Markdown o estructurado"""
+
+    for bloque in bloques(contenido):
+        tipo = bloque[0]
+
+        if tipo == HUECO:
+            # El espaciado de los párrafos ya separa los bloques
+            continue
+
+        if tipo == TITULO:
+            yield _parrafo(bloque[2], _ESTILOS_TITULO[bloque[1]])
+
+        elif tipo == VINETA:
+            yield _parrafo(bloque[2], _ESTILOS_LISTA[bloque[1]], '•')
+
+        elif tipo == NUMERADO:
+            yield _parrafo(bloque[3], _ESTILOS_LISTA[bloque[1]], f"{bloque[2]}.")
+
+        elif tipo == TABLA:
+            yield _tabla(bloque[1], bloque[2])
+
+        elif tipo == SEPARADOR:
+            yield _SEPARADOR_XML
+
+        else:
+            yield _parrafo(bloque[1])
+
+
+def _documento_xml(situacion, rubrica, parametros):
+    yield f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document {_W}><w:body>'
+    yield _parrafo(TITULO_SITUACION, "Title")
+    yield _parrafo(SUBTITULO, "Subtitle")
+    yield _tabla(datos_generales(parametros), False, [ANCHO_UTIL // 3, ANCHO_UTIL - ANCHO_UTIL // 3], etiquetas=True)
+    yield from _bloques_xml(situacion)
+    yield _SALTO_PAGINA
+    yield _parrafo(TITULO_RUBRICA, "Title")
+    yield from _bloques_xml(rubrica)
+    yield _parrafo("<br>".join(PIE), "Pie")
+    yield (
+        f'<w:sectPr><w:pgSz w:w="{ANCHO_PAGINA}" w:h="{ALTO_PAGINA}"/>'
+        f'<w:pgMar w:top="{MARGEN}" w:right="{MARGEN}" w:bottom="{MARGEN}" w:left="{MARGEN}" '
+        'w:header="708" w:footer="708" w:gutter="0"/></w:sectPr>'
+    )
+    yield '</w:body></w:document>'
+
+
+def _core_xml(parametros):
+    ahora = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    titulo = _escapar(f"{TITULO_SITUACION} - {parametros.get('modulo', '')}")
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:dcterms="http://purl.org/dc/terms/" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f'<dc:title>{titulo}</dc:title><dc:creator>Asistente IA para FP Sanitaria</dc:creator>'
+        f'<dcterms:created xsi:type="dcterms:W3CDTF">{ahora}</dcterms:created>'
+        '</cp:coreProperties>'
+    )
+
+
+def escribir_docx(destino, situacion_content, rubrica_content, parametros):
+    """Escribe el DOCX en destino (ruta o archivo binario abierto).
+
+    Cada contenido puede ser Markdown o el documento del modo estructurado, igual que
+    en generate_pdf.
+    """
+
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED, compresslevel=6) as paquete:
+        paquete.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        paquete.writestr("_rels/.rels", _RELS)
+        paquete.writestr("word/_rels/document.xml.rels", _DOCUMENT_RELS)
+        paquete.writestr("word/styles.xml", _STYLES)
+        paquete.writestr("docProps/core.xml", _core_xml(parametros))
+
+        with paquete.open("word/document.xml", "w") as parte:
+            bufer, tamano = [], 0
+            for fragmento in _documento_xml(situacion_content, rubrica_content, parametros):
+                bufer.append(fragmento)
+                tamano += len(fragmento)
+                if tamano >= TAMANO_BUFER:
+                    parte.write("".join(bufer).encode("utf-8"))
+                    bufer, tamano = [], 0
+            parte.write("".join(bufer).encode("utf-8"))
+
+
+def generate_docx(situacion_content, rubrica_content, parametros):
+    """Genera el DOCX con la situación de aprendizaje y la rúbrica y devuelve sus bytes"""
+
+    buffer = io.BytesIO()
+    escribir_docx(buffer, situacion_content, rubrica_content, parametros)
+    return buffer.getvalue()
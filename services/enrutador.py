@@ -0,0 +1,324 @@
+"""Reparto de las llamadas a Gemini entre varias claves de API y modelos.
+
+Cada Ruta es una clave con un modelo y lleva la cuenta de su cuota (peticiones por
+minuto y por día, y el bloqueo que impone un 429 de Gemini), de su latencia reciente
+y de las llamadas en curso. El Enrutador elige para cada llamada la ruta del modelo
+principal con cuota y menor latencia esperada; si todas están saturadas, las
+peticiones de rúbrica pasan a las rutas del modelo de respaldo (más barato y rápido)
+y el resto espera a que alguna recupere cuota dentro del plazo.
+
+    GEMINI_API_KEYS=clave1,clave2,clave3    claves además de GEMINI_API_KEY
+    GEMINI_MODELO=gemini-2.5-flash          modelo principal
+    GEMINI_MODELO_RESPALDO=gemini-2.5-flash-lite   ("" para no usar respaldo)
+    GEMINI_RPM=60   GEMINI_RPD=0            cuota de cada clave y modelo (0 = sin límite)
+
+Las rutas creadas a partir del registro son únicas por proceso, así que todas las
+sesiones de Streamlit de un worker comparten la cuota de cada clave. Las claves no
+aparecen nunca en los nombres de las rutas, las métricas ni el historial.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from services.cache_contexto import CacheContexto
+from services.metricas import metricas
+from services.resiliencia import ServicioNoDisponibleError, retraso_sugerido
+from utils.rate_limiter import TokenBucket
+
+MODELO = os.getenv("GEMINI_MODELO", "gemini-2.5-flash")
+MODELO_RESPALDO = os.getenv("GEMINI_MODELO_RESPALDO", "gemini-2.5-flash-lite")
+
+# Tipos de petición que pueden servirse con el modelo de respaldo si el principal está saturado
+TIPOS_RESPALDO = ("rubrica", "rubrica_json")
+
+# Segundos que una ruta queda fuera tras un 429 sin retryDelay
+BLOQUEO_429 = 10.0
+
+# Peso de la última muestra en la media móvil exponencial de la latencia
+PESO_LATENCIA = 0.2
+
+# Cada cuánto se vuelve a mirar si alguna ruta ha recuperado cuota mientras se espera
+INTERVALO_ESPERA = 0.5
+
+# La cuota diaria de Gemini se reinicia a medianoche en la hora del Pacífico
+try:
+    from zoneinfo import ZoneInfo
+
+    ZONA_CUOTA = ZoneInfo("America/Los_Angeles")
+except Exception:
+    ZONA_CUOTA = None
+
+
+def claves_api(api_key=None):
+    """Claves disponibles: la indicada (o GEMINI_API_KEY) seguida de las de GEMINI_API_KEYS, sin repetir"""
+
+    claves = [api_key or os.getenv("GEMINI_API_KEY")]
+    claves += [c.strip() for c in os.getenv("GEMINI_API_KEYS", "").split(",")]
+    unicas = []
+    for clave in claves:
+        if clave and clave not in unicas:
+            unicas.append(clave)
+    # Sin ninguna clave el SDK la busca por su cuenta (GOOGLE_API_KEY)
+    return unicas or [None]
+
+
+def _dia_cuota():
+    return datetime.now(ZONA_CUOTA).date()
+
+
+def _segundos_hasta_manana():
+    ahora = datetime.now(ZONA_CUOTA)
+    return 24 * 3600 - (ahora.hour * 3600 + ahora.minute * 60 + ahora.second)
+
+
+class Ruta:
+    """Una clave de API con un modelo: cuota, latencia y llamadas en curso, seguro entre hilos"""
+
+    def __init__(self, nombre, modelo, backend, cache_contexto=None, rpm=0, rpd=0, respaldo=False):
+        self.nombre = nombre
+        self.modelo = modelo
+        # Función que devuelve el backend (registro.ClienteGemini o compatible): se crea en la primera llamada
+        self._backend = backend
+        self.cache_contexto = cache_contexto
+        self.respaldo = respaldo
+        # Ráfaga de hasta 3 llamadas: el esquema, la situación y la rúbrica de una generación
+        self.limitador = TokenBucket.por_minuto(rpm, capacidad=3) if rpm > 0 else None
+        self.rpd = rpd
+        self.usadas_hoy = 0
+        self._dia = _dia_cuota()
+        # Tras un 429 la ruta no se usa hasta este instante (time.monotonic)
+        self.bloqueada_hasta = 0.0
+        # Media móvil de los segundos hasta la respuesta (o el primer fragmento); None sin muestras
+        self.latencia = None
+        self.en_curso = 0
+        self.servidas = 0
+        self.errores = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return self._backend()
+
+    @property
+    def cliente(self):
+        """genai.Client de la clave de esta ruta"""
+        return self.backend.genai
+
+    def _cuota_diaria(self):
+        """Peticiones que quedan hoy (None = sin límite); se llama con el lock tomado"""
+        if not self.rpd:
+            return None
+        dia = _dia_cuota()
+        if dia != self._dia:
+            self._dia, self.usadas_hoy = dia, 0
+        return max(0, self.rpd - self.usadas_hoy)
+
+    def espera(self):
+        """Segundos hasta que la ruta vuelva a tener cuota (0 si la tiene ya)"""
+        with self._lock:
+            if self._cuota_diaria() == 0:
+                return _segundos_hasta_manana()
+            bloqueo = self.bloqueada_hasta - time.monotonic()
+        limitador = self.limitador.espera() if self.limitador else 0.0
+        return max(0.0, bloqueo, limitador)
+
+    def tomar(self):
+        """Reserva una petición si la ruta tiene cuota ahora mismo; no espera"""
+        with self._lock:
+            if self._cuota_diaria() == 0 or self.bloqueada_hasta > time.monotonic():
+                return False
+            if self.limitador is not None and not self.limitador.adquirir(espera_maxima=0):
+                return False
+            self.usadas_hoy += 1
+            self.en_curso += 1
+            return True
+
+    def exito(self, segundos):
+        with self._lock:
+            self.en_curso -= 1
+            self.servidas += 1
+            if self.latencia is None:
+                self.latencia = segundos
+            else:
+                self.latencia += PESO_LATENCIA * (segundos - self.latencia)
+
+    def fallo(self, error):
+        with self._lock:
+            self.en_curso -= 1
+            self.errores += 1
+            if getattr(error, "code", None) == 429:
+                # Cuota agotada en esta clave: otra ruta puede atender la siguiente petición
+                bloqueo = retraso_sugerido(error) or BLOQUEO_429
+                self.bloqueada_hasta = max(self.bloqueada_hasta, time.monotonic() + bloqueo)
+
+    def coste(self, latencia_tipica):
+        """Latencia esperada de la siguiente llamada: la media de la ruta por las llamadas que ya atiende"""
+        latencia = self.latencia if self.latencia is not None else latencia_tipica
+        return latencia * (1 + self.en_curso)
+
+    def estado(self):
+        """Resumen para la página de métricas"""
+        espera = self.espera()
+        with self._lock:
+            restantes = self._cuota_diaria()
+            return {
+                "ruta": self.nombre,
+                "modelo": self.modelo,
+                "respaldo": self.respaldo,
+                "disponible": espera == 0,
+                "espera_s": round(espera, 1),
+                "restantes_hoy": restantes,
+                "latencia_s": round(self.latencia, 3) if self.latencia is not None else None,
+                "en_curso": self.en_curso,
+                "servidas": self.servidas,
+                "errores": self.errores,
+            }
+
+
+class Peticion:
+    """Una llamada lógica a Gemini: su tipo y la ruta que la ha servido (None hasta que responde)"""
+
+    __slots__ = ("tipo", "ruta")
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.ruta = None
+
+
+class Enrutador:
+    """Elige la ruta de cada llamada entre las del modelo principal y, para las rúbricas, las de respaldo"""
+
+    def __init__(self, rutas, tipos_respaldo=TIPOS_RESPALDO):
+        self.rutas = list(rutas)
+        self.principales = [r for r in self.rutas if not r.respaldo]
+        self.respaldo = [r for r in self.rutas if r.respaldo]
+        self.tipos_respaldo = frozenset(tipos_respaldo)
+        self._lock = threading.Lock()
+
+    def _candidatas(self, tipo):
+        """Rutas por orden de preferencia: primero las del modelo principal, después las de respaldo"""
+        grupos = [self.principales]
+        if tipo in self.tipos_respaldo and self.respaldo:
+            grupos.append(self.respaldo)
+        return grupos
+
+    def _libre(self, rutas):
+        """La ruta con cuota y menor latencia esperada, ya reservada; None si ninguna tiene cuota"""
+        medidas = [r.latencia for r in rutas if r.latencia is not None]
+        # Las rutas sin muestras se tratan como la media de las demás para que reciban tráfico
+        tipica = sum(medidas) / len(medidas) if medidas else 1.0
+        with self._lock:
+            for ruta in sorted(rutas, key=lambda r: (r.coste(tipica), r.servidas)):
+                if ruta.tomar():
+                    return ruta
+        return None
+
+    def elegir(self, tipo, espera_maxima):
+        """Reserva la mejor ruta para una petición de ese tipo, esperando como mucho espera_maxima segundos.
+
+        Lanza ServicioNoDisponibleError si ninguna ruta recupera cuota a tiempo.
+        """
+
+        limite = time.monotonic() + espera_maxima
+        while True:
+            grupos = self._candidatas(tipo)
+            for grupo in grupos:
+                ruta = self._libre(grupo)
+                if ruta is not None:
+                    if ruta.respaldo:
+                        metricas.contar("gemini_respaldo_total", tipo=tipo, modelo=ruta.modelo)
+                    return ruta
+            espera = min(r.espera() for grupo in grupos for r in grupo)
+            if time.monotonic() + espera > limite:
+                raise ServicioNoDisponibleError(
+                    "Se ha agotado la cuota de Gemini de todas las claves; inténtalo de nuevo más tarde",
+                    reintentar_en=espera
+                )
+            time.sleep(min(max(espera, 0.01), INTERVALO_ESPERA))
+
+    def disponible(self, tipo):
+        """Indica si alguna ruta para ese tipo tiene cuota ahora mismo"""
+        return any(r.espera() == 0 for grupo in self._candidatas(tipo) for r in grupo)
+
+    def ejecutar(self, tipo, plazo, llamada):
+        """Llama a llamada(ruta, plazo_restante) por la mejor ruta y devuelve (ruta, resultado).
+
+        Si una ruta responde 429 y otra tiene cuota, se repite al momento por esa otra;
+        los demás errores (y el 429 cuando no queda ninguna) se propagan a
+        LlamadaResiliente, que decide si reintentar.
+        """
+
+        limite = time.monotonic() + plazo
+        while True:
+            ruta = self.elegir(tipo, max(0.0, limite - time.monotonic()))
+            inicio = time.perf_counter()
+            try:
+                resultado = llamada(ruta, limite - time.monotonic())
+            except Exception as e:
+                ruta.fallo(e)
+                metricas.contar("gemini_rutas_total", ruta=ruta.nombre, modelo=ruta.modelo, tipo=tipo,
+                                resultado=f"error {getattr(e, 'code', None) or type(e).__name__}")
+                if getattr(e, "code", None) == 429 and self.disponible(tipo):
+                    continue
+                raise
+            segundos = time.perf_counter() - inicio
+            ruta.exito(segundos)
+            metricas.contar("gemini_rutas_total", ruta=ruta.nombre, modelo=ruta.modelo, tipo=tipo, resultado="ok")
+            metricas.observar("gemini_ruta", segundos, ruta=ruta.nombre, modelo=ruta.modelo)
+            return ruta, resultado
+
+    def estado(self):
+        """Estado de cada ruta (cuota, latencia, llamadas) para la página de métricas"""
+        return [ruta.estado() for ruta in self.rutas]
+
+
+_rutas_proceso = {}
+_rutas_lock = threading.Lock()
+
+
+def crear_rutas(claves, modelo=MODELO, respaldo=MODELO_RESPALDO, backend=None, base_url=None,
+                cache_contexto=True):
+    """Rutas de cada clave con el modelo principal y, si lo hay, con el de respaldo.
+
+    backend es una función clave -> backend; por defecto el cliente compartido del
+    registro. Las rutas de una misma clave comparten su CacheContexto, porque los
+    contenidos en caché de Gemini pertenecen al proyecto de la clave.
+    """
+
+    if backend is None:
+        from services.registro import registro
+
+        def backend(clave):
+            return registro.cliente_gemini(clave, base_url)
+
+    rpm = float(os.getenv("GEMINI_RPM", "60"))
+    rpd = int(os.getenv("GEMINI_RPD", "0"))
+    modelos = [(modelo, False)] + ([(respaldo, True)] if respaldo and respaldo != modelo else [])
+    rutas = []
+    for n, clave in enumerate(claves, 1):
+        def obtener(clave=clave):
+            return backend(clave)
+
+        contexto = CacheContexto(lambda obtener=obtener: obtener().genai) if cache_contexto else None
+        for nombre_modelo, es_respaldo in modelos:
+            rutas.append(Ruta(f"clave{n}:{nombre_modelo}", nombre_modelo, obtener, contexto, rpm, rpd, es_respaldo))
+    return rutas
+
+
+def rutas_del_proceso(claves, modelo=MODELO, respaldo=MODELO_RESPALDO, base_url=None, cache_contexto=True):
+    """crear_rutas compartidas por todo el proceso para esas claves, modelos y URL.
+
+    Así todas las instancias de GeminiService de un proceso respetan juntas la cuota
+    de cada clave.
+    """
+
+    clave = (tuple(claves), modelo, respaldo, base_url, cache_contexto)
+    with _rutas_lock:
+        rutas = _rutas_proceso.get(clave)
+        if rutas is None:
+            rutas = _rutas_proceso[clave] = crear_rutas(
+                claves, modelo, respaldo, base_url=base_url, cache_contexto=cache_contexto
+            )
+        return rutas
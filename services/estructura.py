@@ -0,0 +1,483 @@
+"""Situación de aprendizaje y rúbrica como documentos estructurados.
+
+En el modo estructurado GeminiService pide a Gemini un JSON que cumpla
+ESQUEMA_SITUACION o ESQUEMA_RUBRICA (response_json_schema) en lugar de Markdown
+libre. La respuesta se valida a medida que llega: LectorIncremental detecta en el
+flujo cada sección o criterio en cuanto se cierra su objeto JSON y se convierte en
+su clase, así que un elemento mal formado se detecta en cuanto aparece y la
+interfaz puede ir mostrando el documento por partes.
+
+generate_pdf recibe estos objetos directamente (fases y criterios se maquetan desde
+sus campos, sin analizar Markdown) y a_markdown() da el texto que se muestra en la
+interfaz y se guarda en el historial.
+"""
+
+import json
+
+# Número de secciones de la situación (ver services.prompts.PLANTILLA_SITUACION)
+SECCIONES_SITUACION = 12
+SECCION_SECUENCIA = 7
+
+# (campo del JSON, etiqueta) de los cuatro niveles de desempeño, del mejor al peor
+NIVELES = (
+    ("excelente", "EXCELENTE (4)"),
+    ("satisfactorio", "SATISFACTORIO (3)"),
+    ("en_desarrollo", "EN DESARROLLO (2)"),
+    ("insuficiente", "INSUFICIENTE (1)"),
+)
+
+_TEXTO = {"type": "string"}
+_LISTA_TEXTOS = {"type": "array", "items": _TEXTO}
+
+ESQUEMA_FASE = {
+    "type": "object",
+    "properties": {
+        "nombre": _TEXTO,
+        "duracion": _TEXTO,
+        "actividades": _LISTA_TEXTOS,
+        "recursos": _TEXTO,
+        "evaluacion": _TEXTO,
+    },
+    "required": ["nombre", "duracion", "actividades", "recursos", "evaluacion"],
+}
+
+ESQUEMA_SECCION = {
+    "type": "object",
+    "properties": {
+        "numero": {"type": "integer", "minimum": 1, "maximum": SECCIONES_SITUACION},
+        "titulo": _TEXTO,
+        "contenido": _TEXTO,
+        "fases": {"type": "array", "items": ESQUEMA_FASE},
+    },
+    "required": ["numero", "titulo", "contenido"],
+}
+
+ESQUEMA_SITUACION = {
+    "type": "object",
+    "properties": {
+        "titulo": _TEXTO,
+        "secciones": {"type": "array", "items": ESQUEMA_SECCION},
+    },
+    "required": ["titulo", "secciones"],
+}
+
+ESQUEMA_SECCION_LIBRE = {
+    "type": "object",
+    "properties": {"titulo": _TEXTO, "contenido": _TEXTO},
+    "required": ["titulo", "contenido"],
+}
+
+ESQUEMA_CRITERIO = {
+    "type": "object",
+    "properties": {
+        "nombre": _TEXTO,
+        "peso": {"type": "number", "minimum": 0, "maximum": 100},
+        **{campo: _TEXTO for campo, _ in NIVELES},
+        "indicadores": _LISTA_TEXTOS,
+    },
+    "required": ["nombre", "peso", *(campo for campo, _ in NIVELES), "indicadores"],
+}
+
+ESQUEMA_RUBRICA = {
+    "type": "object",
+    "properties": {
+        "titulo": _TEXTO,
+        "informacion": _TEXTO,
+        "criterios": {"type": "array", "items": ESQUEMA_CRITERIO},
+        "secciones": {"type": "array", "items": ESQUEMA_SECCION_LIBRE},
+    },
+    "required": ["titulo", "informacion", "criterios", "secciones"],
+}
+
+
+class EstructuraInvalidaError(ValueError):
+    """La respuesta de Gemini no cumple el esquema del documento"""
+
+
+def _campo(datos, nombre, tipo, ruta):
+    if not isinstance(datos, dict):
+        raise EstructuraInvalidaError(f"{ruta}: se esperaba un objeto")
+    valor = datos.get(nombre)
+    if tipo is float and isinstance(valor, int) and not isinstance(valor, bool):
+        valor = float(valor)
+    if not isinstance(valor, tipo) or isinstance(valor, bool):
+        raise EstructuraInvalidaError(f"{ruta}.{nombre}: falta o no es {tipo.__name__}")
+    if tipo is str:
+        valor = valor.strip()
+        if not valor:
+            raise EstructuraInvalidaError(f"{ruta}.{nombre}: está vacío")
+    return valor
+
+
+def _textos(datos, nombre, ruta):
+    valores = _campo(datos, nombre, list, ruta)
+    textos = [v.strip() for v in valores if isinstance(v, str) and v.strip()]
+    if len(textos) != len(valores) or not textos:
+        raise EstructuraInvalidaError(f"{ruta}.{nombre}: debe ser una lista de textos no vacía")
+    return textos
+
+
+class Fase:
+    __slots__ = ("nombre", "duracion", "actividades", "recursos", "evaluacion")
+
+    def __init__(self, nombre, duracion, actividades, recursos, evaluacion):
+        self.nombre = nombre
+        self.duracion = duracion
+        self.actividades = actividades
+        self.recursos = recursos
+        self.evaluacion = evaluacion
+
+    @classmethod
+    def desde_json(cls, datos, ruta="fase"):
+        return cls(
+            _campo(datos, "nombre", str, ruta),
+            _campo(datos, "duracion", str, ruta),
+            _textos(datos, "actividades", ruta),
+            _campo(datos, "recursos", str, ruta),
+            _campo(datos, "evaluacion", str, ruta),
+        )
+
+    def a_json(self):
+        return {
+            "nombre": self.nombre,
+            "duracion": self.duracion,
+            "actividades": list(self.actividades),
+            "recursos": self.recursos,
+            "evaluacion": self.evaluacion,
+        }
+
+    def a_markdown(self, numero):
+        actividades = "\n".join(f"   {i}. {actividad}" for i, actividad in enumerate(self.actividades, 1))
+        return (
+            f"### Fase {numero}: {self.nombre}\n"
+            f"- **Duración:** {self.duracion}\n"
+            f"- **Actividades:**\n{actividades}\n"
+            f"- **Recursos:** {self.recursos}\n"
+            f"- **Evaluación:** {self.evaluacion}"
+        )
+
+
+class Seccion:
+    """Sección de un documento: título y contenido en Markdown (numero y fases solo en la situación)"""
+
+    __slots__ = ("numero", "titulo", "contenido", "fases")
+
+    def __init__(self, titulo, contenido, numero=None, fases=()):
+        self.numero = numero
+        self.titulo = titulo
+        self.contenido = contenido
+        self.fases = list(fases)
+
+    @classmethod
+    def desde_json(cls, datos, ruta="seccion"):
+        if not isinstance(datos, dict):
+            raise EstructuraInvalidaError(f"{ruta}: se esperaba un objeto")
+        numero = datos.get("numero")
+        if numero is not None:
+            numero = _campo(datos, "numero", int, ruta)
+        fases = datos.get("fases") or []
+        if not isinstance(fases, list):
+            raise EstructuraInvalidaError(f"{ruta}.fases: debe ser una lista")
+        # El contenido puede quedar vacío si la sección se desarrolla entera en sus fases
+        contenido = datos.get("contenido") or ""
+        if not isinstance(contenido, str):
+            raise EstructuraInvalidaError(f"{ruta}.contenido: no es str")
+        return cls(
+            _campo(datos, "titulo", str, ruta),
+            contenido.strip(),
+            numero,
+            [Fase.desde_json(fase, f"{ruta}.fases[{i}]") for i, fase in enumerate(fases)],
+        )
+
+    def a_json(self):
+        datos = {"titulo": self.titulo, "contenido": self.contenido}
+        if self.numero is not None:
+            datos = {"numero": self.numero, **datos}
+        if self.fases:
+            datos["fases"] = [fase.a_json() for fase in self.fases]
+        return datos
+
+    def a_markdown(self):
+        titulo = f"## {self.numero}. {self.titulo}" if self.numero is not None else f"## {self.titulo}"
+        partes = [titulo]
+        if self.contenido:
+            partes.append(self.contenido)
+        partes += [fase.a_markdown(i) for i, fase in enumerate(self.fases, 1)]
+        return "\n\n".join(partes)
+
+
+class Situacion:
+    """Situación de aprendizaje; completa=False mientras llegan las secciones"""
+
+    __slots__ = ("titulo", "secciones", "completa")
+
+    # Listas de primer nivel que se leen elemento a elemento y campos de texto que se copian al llegar
+    LISTAS = {"secciones": Seccion}
+    TEXTOS = ("titulo",)
+
+    def __init__(self, titulo="", secciones=(), completa=False):
+        self.titulo = titulo
+        self.secciones = list(secciones)
+        self.completa = completa
+
+    @classmethod
+    def desde_json(cls, datos):
+        """Valida el documento completo: título y las 12 secciones en orden, con fases en la 7"""
+
+        secciones = _campo(datos, "secciones", list, "situacion")
+        situacion = cls(
+            _campo(datos, "titulo", str, "situacion"),
+            [Seccion.desde_json(s, f"situacion.secciones[{i}]") for i, s in enumerate(secciones)],
+            completa=True,
+        )
+        numeros = [seccion.numero for seccion in situacion.secciones]
+        faltan = sorted(set(range(1, SECCIONES_SITUACION + 1)) - set(numeros))
+        if faltan:
+            raise EstructuraInvalidaError(f"Faltan las secciones {', '.join(map(str, faltan))} de la situación")
+        if numeros != sorted(numeros):
+            raise EstructuraInvalidaError("Las secciones de la situación no están en orden")
+        secuencia = situacion.seccion(SECCION_SECUENCIA)
+        if secuencia is not None and not secuencia.fases:
+            raise EstructuraInvalidaError("La secuencia didáctica no tiene fases")
+        return situacion
+
+    def seccion(self, numero):
+        return next((s for s in self.secciones if s.numero == numero), None)
+
+    @property
+    def fases(self):
+        return [fase for seccion in self.secciones for fase in seccion.fases]
+
+    def a_json(self):
+        return {"titulo": self.titulo, "secciones": [seccion.a_json() for seccion in self.secciones]}
+
+    def a_markdown(self):
+        partes = [f"# SITUACIÓN DE APRENDIZAJE: {self.titulo}" if self.titulo else "# SITUACIÓN DE APRENDIZAJE"]
+        partes += [seccion.a_markdown() for seccion in self.secciones]
+        return "\n\n".join(partes)
+
+
+class Criterio:
+    __slots__ = ("nombre", "peso", "excelente", "satisfactorio", "en_desarrollo", "insuficiente", "indicadores")
+
+    def __init__(self, nombre, peso, excelente, satisfactorio, en_desarrollo, insuficiente, indicadores):
+        self.nombre = nombre
+        self.peso = peso
+        self.excelente = excelente
+        self.satisfactorio = satisfactorio
+        self.en_desarrollo = en_desarrollo
+        self.insuficiente = insuficiente
+        self.indicadores = indicadores
+
+    @classmethod
+    def desde_json(cls, datos, ruta="criterio"):
+        peso = _campo(datos, "peso", float, ruta)
+        if not 0 < peso <= 100:
+            raise EstructuraInvalidaError(f"{ruta}.peso: debe estar entre 0 y 100")
+        return cls(
+            _campo(datos, "nombre", str, ruta),
+            peso,
+            *(_campo(datos, campo, str, ruta) for campo, _ in NIVELES),
+            _textos(datos, "indicadores", ruta),
+        )
+
+    @property
+    def descriptores(self):
+        """Descriptores de los cuatro niveles, del mejor al peor"""
+        return [getattr(self, campo) for campo, _ in NIVELES]
+
+    def a_json(self):
+        return {
+            "nombre": self.nombre,
+            "peso": self.peso,
+            **{campo: getattr(self, campo) for campo, _ in NIVELES},
+            "indicadores": list(self.indicadores),
+        }
+
+    def a_markdown(self, numero):
+        cabecera = "| NIVEL | " + " | ".join(etiqueta for _, etiqueta in NIVELES) + " |"
+        separador = "|" + "---|" * (len(NIVELES) + 1)
+        descripcion = "| **Descripción** | " + " | ".join(d.replace("|", "/") for d in self.descriptores) + " |"
+        indicadores = "\n".join(f"- {indicador}" for indicador in self.indicadores)
+        return (
+            f"### Criterio {numero}: {self.nombre}\n**Peso:** {self.peso:g}%\n\n"
+            f"{cabecera}\n{separador}\n{descripcion}\n\n**Indicadores:**\n{indicadores}"
+        )
+
+
+class Rubrica:
+    """Rúbrica de evaluación; completa=False mientras llegan los criterios"""
+
+    __slots__ = ("titulo", "informacion", "criterios", "secciones", "completa")
+
+    LISTAS = {"criterios": Criterio, "secciones": Seccion}
+    TEXTOS = ("titulo", "informacion")
+
+    def __init__(self, titulo="", informacion="", criterios=(), secciones=(), completa=False):
+        self.titulo = titulo
+        self.informacion = informacion
+        self.criterios = list(criterios)
+        self.secciones = list(secciones)
+        self.completa = completa
+
+    @classmethod
+    def desde_json(cls, datos):
+        criterios = _campo(datos, "criterios", list, "rubrica")
+        secciones = _campo(datos, "secciones", list, "rubrica")
+        if not criterios:
+            raise EstructuraInvalidaError("La rúbrica no tiene criterios")
+        return cls(
+            _campo(datos, "titulo", str, "rubrica"),
+            _campo(datos, "informacion", str, "rubrica"),
+            [Criterio.desde_json(c, f"rubrica.criterios[{i}]") for i, c in enumerate(criterios)],
+            [Seccion.desde_json(s, f"rubrica.secciones[{i}]") for i, s in enumerate(secciones)],
+            completa=True,
+        )
+
+    @property
+    def peso_total(self):
+        return sum(criterio.peso for criterio in self.criterios)
+
+    def advertencias(self):
+        """Incoherencias que no impiden usar la rúbrica pero conviene revisar"""
+
+        avisos = []
+        if self.completa and self.criterios and not 0 < self.peso_total <= 100.5:
+            avisos.append(f"Los pesos de los criterios suman {self.peso_total:g} % y no deberían pasar del 100 %.")
+        return avisos
+
+    def a_json(self):
+        return {
+            "titulo": self.titulo,
+            "informacion": self.informacion,
+            "criterios": [criterio.a_json() for criterio in self.criterios],
+            "secciones": [seccion.a_json() for seccion in self.secciones],
+        }
+
+    def a_markdown(self):
+        partes = ["# RÚBRICA DE EVALUACIÓN"]
+        if self.titulo:
+            partes.append(f"**Situación de Aprendizaje:** {self.titulo}")
+        if self.informacion:
+            partes.append(f"## Información General\n\n{self.informacion}")
+        if self.criterios:
+            partes.append("## Criterios de Evaluación y Niveles de Desempeño")
+            partes += [criterio.a_markdown(i) for i, criterio in enumerate(self.criterios, 1)]
+        partes += [seccion.a_markdown() for seccion in self.secciones]
+        return "\n\n".join(partes)
+
+
+class LectorIncremental:
+    """Analiza un JSON que llega por fragmentos y avisa de cada elemento completo.
+
+    alimentar(fragmento) devuelve los pares (lista, objeto) de los objetos que se han
+    cerrado dentro de las listas de primer nivel indicadas (p. ej. "secciones"). Los
+    valores de primer nivel ya completos quedan en valores (p. ej. el título). Cada
+    carácter se recorre una sola vez.
+    """
+
+    def __init__(self, listas):
+        self.listas = frozenset(listas)
+        self.valores = {}
+        self._texto = ""
+        self._posicion = 0
+        self._pila = []
+        self._en_cadena = False
+        self._escape = False
+        self._inicio_cadena = None
+        self._esperando_clave = False
+        self._clave = None
+        self._inicio_valor = None
+        self._lista = None
+        self._inicio_elemento = None
+
+    def alimentar(self, fragmento):
+        self._texto += fragmento
+        texto = self._texto
+        completos = []
+        for i in range(self._posicion, len(texto)):
+            caracter = texto[i]
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif caracter == "\\":
+                    self._escape = True
+                elif caracter == '"':
+                    self._en_cadena = False
+                    if len(self._pila) == 1 and self._esperando_clave:
+                        self._clave = json.loads(texto[self._inicio_cadena:i + 1])
+                        self._esperando_clave = False
+                continue
+
+            profundidad = len(self._pila)
+            if caracter == '"':
+                self._en_cadena = True
+                self._inicio_cadena = i
+            elif caracter in "{[":
+                self._pila.append(caracter)
+                if caracter == "[" and profundidad == 1 and self._clave in self.listas:
+                    self._lista = self._clave
+                elif caracter == "{" and profundidad == 0:
+                    self._esperando_clave = True
+                elif caracter == "{" and profundidad == 2 and self._lista is not None:
+                    self._inicio_elemento = i
+            elif caracter in "}]":
+                if profundidad == 1:
+                    self._fin_valor(texto, i)
+                if self._pila:
+                    self._pila.pop()
+                if caracter == "}" and profundidad == 3 and self._inicio_elemento is not None:
+                    completos.append((self._lista, self._decodificar(texto[self._inicio_elemento:i + 1])))
+                    self._inicio_elemento = None
+                elif caracter == "]" and profundidad == 2:
+                    self._lista = None
+            elif caracter == ":" and profundidad == 1:
+                self._inicio_valor = i + 1
+            elif caracter == "," and profundidad == 1:
+                self._fin_valor(texto, i)
+                self._esperando_clave = True
+        self._posicion = len(texto)
+        return completos
+
+    def _fin_valor(self, texto, fin):
+        if self._inicio_valor is not None and self._clave is not None:
+            self.valores[self._clave] = self._decodificar(texto[self._inicio_valor:fin])
+        self._inicio_valor = None
+
+    def _decodificar(self, texto):
+        try:
+            return json.loads(texto)
+        except ValueError as e:
+            raise EstructuraInvalidaError(f"JSON mal formado en la respuesta: {e}") from e
+
+    def terminar(self):
+        """Devuelve el JSON completo ya decodificado"""
+        if not self._texto.strip():
+            raise EstructuraInvalidaError("La respuesta está vacía")
+        return self._decodificar(self._texto)
+
+
+def leer_flujo(clase, fragmentos, cancelar=None):
+    """Construye un documento de clase (Situacion o Rubrica) a partir de su JSON en streaming.
+
+    Devuelve el documento parcial cada vez que llega un fragmento, con las secciones o
+    criterios ya cerrados validados uno a uno, y al final el documento completo ya
+    validado (completa=True). Lanza EstructuraInvalidaError en cuanto un elemento no
+    cumple el esquema. Si el flujo se cancela no hay documento final.
+    """
+
+    documento = clase()
+    lector = LectorIncremental(clase.LISTAS)
+    for fragmento in fragmentos:
+        for lista, datos in lector.alimentar(fragmento):
+            elementos = getattr(documento, lista)
+            elementos.append(clase.LISTAS[lista].desde_json(datos, f"{lista}[{len(elementos)}]"))
+        for campo in clase.TEXTOS:
+            valor = lector.valores.get(campo)
+            if isinstance(valor, str):
+                setattr(documento, campo, valor.strip())
+        yield documento
+
+    if cancelar is not None and cancelar.is_set():
+        return
+    yield clase.desde_json(lector.terminar())
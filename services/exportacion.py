@@ -0,0 +1,165 @@
+"""Exportación por lotes: la programación completa de un ciclo en un único zip.
+
+Los documentos guardados en el historial se renderizan en el pool de procesos del
+RenderizadorPDF (y pasan por su caché de artefactos: lo ya exportado no se vuelve a
+renderizar) y se copian al zip desde disco por bloques, en el orden de la lista.
+Solo hay unos pocos documentos en vuelo a la vez (VENTANA por proceso), así que la
+memoria del proceso no depende de si el ciclo tiene 8 o 20 módulos.
+
+El zip lleva un PDF y/o un DOCX por módulo y un indice.md con la relación de
+módulos. Se escribe directamente en el directorio de la caché de artefactos, con una
+clave que depende de las de todos sus documentos, y su expulsión LRU lo limpia. Si
+ya existe un zip completo con esa clave se devuelve sin volver a generarlo; los
+zips con errores se guardan con otro nombre para no reutilizarlos.
+"""
+
+import contextlib
+import hashlib
+import os
+import re
+import threading
+import zipfile
+from collections import deque
+from datetime import datetime
+
+from services.pdf_worker import DOCX, ERROR, LISTO, PDF, clave_artefacto
+from utils.curriculum_search import normalizar
+
+ZIP = "zip"
+
+# Documentos encargados por delante del que se está copiando al zip, por proceso del pool
+VENTANA = 2
+
+# Los DOCX ya son zips comprimidos: volver a comprimirlos solo gasta CPU
+_COMPRESION = {PDF: zipfile.ZIP_DEFLATED, DOCX: zipfile.ZIP_STORED}
+
+
+def slug(texto):
+    """Fragmento seguro para nombres de archivo (sin acentos, en minúsculas)"""
+    return re.sub(r'[^a-z0-9]+', '_', normalizar(texto)).strip('_')
+
+
+def nombre_archivo(numero, modulo):
+    """Nombre ordenable para el documento de un módulo (01_farmacia_galenica)"""
+    return f"{numero:02d}_{slug(modulo)}"
+
+
+class ResultadoLote:
+    """Zip generado y documentos que no se pudieron exportar"""
+
+    __slots__ = ("ruta", "documentos", "errores")
+
+    def __init__(self, ruta, documentos, errores):
+        self.ruta = ruta
+        self.documentos = documentos
+        # [(módulo, formato, mensaje)]
+        self.errores = errores
+
+
+def _indice(ciclo, filas):
+    # Sin fecha de exportación: el zip se reutiliza en exportaciones posteriores idénticas
+    lineas = [
+        f"# Programación: {ciclo}",
+        "",
+        "| Nº | Módulo | Situación de aprendizaje | Generada | Archivos |",
+        "|----|--------|--------------------------|----------|----------|",
+    ]
+    for numero, entrada, archivos in filas:
+        fecha = datetime.fromtimestamp(entrada.creado).strftime('%d/%m/%Y')
+        lineas.append(
+            f"| {numero} | {entrada.modulo} | {(entrada.titulo or '').replace('|', '/')} | {fecha} "
+            f"| {', '.join(archivos) or '—'} |"
+        )
+    return "\n".join(lineas) + "\n"
+
+
+def _firma(historial, entradas, formatos, ciclo):
+    """Clave del zip: todo lo que escribe, del ciclo del índice a la clave de artefacto de cada documento"""
+
+    firma = hashlib.sha256(f"ciclo:{ciclo}".encode("utf-8"))
+    for numero, entrada in enumerate(entradas, 1):
+        base = nombre_archivo(numero, entrada.modulo)
+        firma.update(f"{base}:{entrada.titulo}:{entrada.creado}".encode("utf-8"))
+        documento = historial.obtener(entrada.id)
+        if documento is None:
+            firma.update(f"{base}:ausente".encode("utf-8"))
+            continue
+        for formato in formatos:
+            clave = clave_artefacto(documento.situacion, documento.rubrica, documento.parametros, formato)
+            firma.update(f"{base}.{formato}:{clave}".encode("utf-8"))
+    return firma.hexdigest()
+
+
+def exportar_lote(historial, renderizador, entradas, formatos=(PDF, DOCX), ciclo="", progreso=None):
+    """Exporta las EntradaHistorial dadas a un zip en la caché de artefactos.
+
+    progreso(hechos, total), si se indica, se llama tras añadir cada documento. Un
+    documento que falla no detiene el lote: se anota en ResultadoLote.errores. Si el
+    mismo lote ya se exportó completo, se devuelve ese zip sin renderizar nada.
+    """
+
+    cache = renderizador.cache
+    ruta = cache.ruta(_firma(historial, entradas, formatos, ciclo), ZIP)
+    if os.path.exists(ruta):
+        with contextlib.suppress(OSError):
+            # Se marca como usado para la expulsión LRU
+            os.utime(ruta)
+        if progreso:
+            progreso(len(entradas), len(entradas))
+        return ResultadoLote(ruta, len(entradas), [])
+
+    ventana = max(1, renderizador.procesos * VENTANA)
+    pendientes = deque()
+    filas, errores = [], []
+
+    def encargar(numero, entrada):
+        documento = historial.obtener(entrada.id)
+        claves = {}
+        if documento is not None:
+            for formato in formatos:
+                claves[formato] = renderizador.solicitar(
+                    documento.situacion, documento.rubrica, documento.parametros, formato=formato
+                )
+        # El texto del documento no se queda en memoria: basta con las claves de sus artefactos
+        pendientes.append((numero, entrada, claves))
+
+    def copiar(paquete, numero, entrada, claves):
+        base = nombre_archivo(numero, entrada.modulo)
+        archivos = []
+        if not claves:
+            errores.append((entrada.modulo, None, "el documento ya no está en el historial"))
+        for formato, clave in claves.items():
+            estado = renderizador.esperar(clave, formato=formato)
+            try:
+                if estado != LISTO:
+                    raise RuntimeError(renderizador.error(clave) if estado == ERROR else "no se renderizó")
+                # write() copia el archivo por bloques: nunca está entero en memoria
+                paquete.write(cache.ruta(clave, formato), f"{base}.{formato}", _COMPRESION[formato])
+                archivos.append(f"{base}.{formato}")
+            except (OSError, RuntimeError) as e:
+                errores.append((entrada.modulo, formato, str(e)))
+        filas.append((numero, entrada, archivos))
+        if progreso:
+            progreso(len(filas), len(entradas))
+
+    temporal = f"{cache.ruta('lote', ZIP)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with zipfile.ZipFile(temporal, "w") as paquete:
+            for numero, entrada in enumerate(entradas, 1):
+                encargar(numero, entrada)
+                if len(pendientes) >= ventana:
+                    copiar(paquete, *pendientes.popleft())
+            while pendientes:
+                copiar(paquete, *pendientes.popleft())
+            paquete.writestr("indice.md", _indice(ciclo, filas), zipfile.ZIP_DEFLATED)
+    except BaseException:
+        # Un lote a medias no se deja en la caché; si falló al crearlo, no hay nada que borrar
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporal)
+        raise
+
+    if errores:
+        # Solo los zips completos se reutilizan: a este le faltan documentos
+        ruta = ruta[:-len(ZIP) - 1] + f"_incompleto.{ZIP}"
+    os.replace(temporal, ruta)
+    return ResultadoLote(ruta, len(filas), errores)
@@ -1,273 +1,912 @@
 import os
 import json
-from google import genai
-from google.genai import types
+import time
+import queue
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from services import estructura, prompts, regeneracion
+from services.coalescencia import Coalescedor
+from services.enrutador import MODELO, MODELO_RESPALDO, Enrutador, Peticion, claves_api, crear_rutas, rutas_del_proceso
+from services.metricas import metricas
+from services.resiliencia import LlamadaResiliente, ServicioNoDisponibleError
+
+# Versión de las plantillas de prompt. Cambiarla invalida todas las respuestas en caché.
+PROMPT_VERSION = "3"
+
+# Precio en dólares por millón de tokens (entrada, entrada desde la caché de contexto, salida) de la
+# tarifa de pago de la API, para estimar el coste en las métricas. Revisar si Google cambia la tarifa.
+PRECIOS_POR_MILLON = {
+    "gemini-2.5-flash": (0.30, 0.03, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.025, 0.40),
+}
+
+# Tipo con el que se etiquetan en las métricas las llamadas sin cache_info (regenerar_apartado)
+TIPO_APARTADO = "apartado"
+
+# Ancho de los tramos de creatividad que comparten entrada de caché (0.6 y 0.7 -> 0.6)
+TRAMO_CREATIVIDAD = 0.2
+
+
+def normalizar_prompt_data(datos):
+    """Normaliza los datos de selección para que combinaciones equivalentes den la misma clave"""
+
+    normalizados = {}
+    for campo, valor in datos.items():
+        if isinstance(valor, (list, tuple)):
+            # El orden de selección en los multiselect no cambia el contenido pedido
+            valor = sorted(str(v).strip() for v in valor)
+        elif isinstance(valor, str):
+            valor = " ".join(valor.split())
+        if valor in ("", [], None):
+            continue
+        normalizados[campo] = valor
+
+    if "creatividad" in datos:
+        # Se trabaja en centésimas para evitar errores de coma flotante (0.7 / 0.2 = 3.4999...)
+        ancho = int(round(TRAMO_CREATIVIDAD * 100))
+        tramo = int(round(float(datos["creatividad"]) * 100)) // ancho
+        normalizados["creatividad"] = tramo * ancho / 100
+
+    return normalizados
+
+
+def clave_cache(tipo, datos, model_name, contexto=None):
+    """Calcula la clave de caché de una generación a partir de sus datos normalizados"""
+
+    contenido = {
+        "tipo": tipo,
+        "modelo": model_name,
+        "version_prompt": PROMPT_VERSION,
+        "datos": normalizar_prompt_data(datos),
+        "contexto": contexto or "",
+    }
+    serializado = json.dumps(contenido, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+
+class RespuestaCache:
+    """Caché en disco (SQLite en modo WAL) de las respuestas de Gemini.
+
+    Es segura entre hilos y entre procesos de Streamlit: cada hilo abre su propia
+    conexión y SQLite serializa las escrituras. Las entradas caducan a los ttl segundos
+    y, si se superan max_entradas o max_bytes, se eliminan las menos usadas (LRU).
+    """
+
+    def __init__(self, ruta, ttl=30 * 24 * 3600, max_entradas=5000, max_bytes=200 * 1024 * 1024):
+        self.ruta = ruta
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    clave TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    tamano INTEGER NOT NULL,
+                    creado REAL NOT NULL,
+                    accedido REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_accedido ON respuestas (accedido)")
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def obtener(self, clave):
+        """Devuelve la respuesta guardada o None si no existe o ha caducado"""
+
+        ahora = time.time()
+        with self._conexion() as conn:
+            fila = conn.execute(
+                "SELECT valor FROM respuestas WHERE clave = ? AND creado >= ?",
+                (clave, ahora - self.ttl)
+            ).fetchone()
+            if fila is None:
+                return None
+            conn.execute("UPDATE respuestas SET accedido = ? WHERE clave = ?", (ahora, clave))
+        return fila[0]
+
+    def guardar(self, clave, tipo, valor):
+        """Guarda una respuesta y aplica la política de expulsión"""
+
+        ahora = time.time()
+        with self._conexion() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, tipo, valor, tamano, creado, accedido) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (clave, tipo, valor, len(valor.encode("utf-8")), ahora, ahora)
+            )
+            self._expulsar(conn, ahora)
+
+    def descartar(self, clave):
+        """Elimina una respuesta guardada (p. ej. un JSON que no ha pasado la validación)"""
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+
+    def limpiar(self):
+        """Elimina todas las respuestas guardadas"""
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM respuestas")
+
+    def _expulsar(self, conn, ahora):
+        conn.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl,))
+
+        entradas, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM respuestas"
+        ).fetchone()
+        if entradas <= self.max_entradas and total_bytes <= self.max_bytes:
+            return
+
+        # Se recorren las entradas de la menos a la más reciente hasta volver a los límites
+        sobrantes = []
+        for clave, tamano in conn.execute("SELECT clave, tamano FROM respuestas ORDER BY accedido"):
+            if entradas <= self.max_entradas and total_bytes <= self.max_bytes:
+                break
+            sobrantes.append((clave,))
+            entradas -= 1
+            total_bytes -= tamano
+        conn.executemany("DELETE FROM respuestas WHERE clave = ?", sobrantes)
+
+
+class Consumo:
+    """Llamadas y tokens de una generación completa (esquema, situación y rúbrica).
+
+    Se pasa a los métodos de GeminiService en el parámetro consumo; es seguro entre
+    hilos porque la generación en paralelo registra desde varios a la vez.
+    """
 
-class GeminiService:
     def __init__(self):
-        """Inicializa el servicio de Gemini con la API Key"""
+        self.llamadas = 0
+        self.desde_cache = 0
+        # Peticiones resueltas uniéndose a una llamada idéntica de otra sesión
+        self.coalescidas = 0
+        self.tokens_entrada = 0
+        # Parte de tokens_entrada servida desde la caché de contexto de Gemini (más barata)
+        self.tokens_cacheados = 0
+        self.tokens_salida = 0
+        # Llamadas servidas por cada ruta (clave y modelo, ver services.enrutador)
+        self.rutas = {}
+        self.modelos = set()
+        self._lock = threading.Lock()
+
+    def registrar_llamada(self, uso, ruta=None):
+        """Suma el usage_metadata de una respuesta de Gemini (puede ser None) y la ruta que la sirvió"""
+        with self._lock:
+            self.llamadas += 1
+            if ruta is not None:
+                self.rutas[ruta.nombre] = self.rutas.get(ruta.nombre, 0) + 1
+                self.modelos.add(ruta.modelo)
+            if uso is not None:
+                self.tokens_entrada += uso.prompt_token_count or 0
+                self.tokens_cacheados += uso.cached_content_token_count or 0
+                self.tokens_salida += uso.candidates_token_count or 0
+
+    def modelo(self, por_defecto):
+        """Modelos que han generado el documento (por_defecto si todo vino de la caché)"""
+        with self._lock:
+            return ", ".join(sorted(self.modelos)) or por_defecto
+
+    def registrar_cache(self):
+        with self._lock:
+            self.desde_cache += 1
+
+    def registrar_coalescida(self):
+        with self._lock:
+            self.coalescidas += 1
+
+
+def _con_titulo(texto, original):
+    """Texto del apartado regenerado con el título del original si el modelo lo ha omitido"""
+
+    texto = texto.strip()
+    # Algunas respuestas llegan envueltas en un bloque de código Markdown
+    if texto.startswith("```"):
+        texto = texto.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+    if not texto.startswith("#"):
+        texto = f"{original.splitlines()[0]}\n\n{texto}"
+    return texto
+
+
+class GeminiService:
+    def __init__(self, api_key=None, base_url=None, backend=None):
+        """Inicializa el servicio de Gemini con la API Key.
+
+        backend sustituye al cliente del registro (p. ej. services.backend_falso.ClienteFalso);
+        tiene que ofrecer genai, salud() y cerrar() como registro.ClienteGemini. Las llamadas
+        se reparten entre las claves de GEMINI_API_KEYS y los modelos GEMINI_MODELO y
+        GEMINI_MODELO_RESPALDO (ver services.enrutador).
+        """
         # La clave API se lee aquí. Aunque Streamlit ya hace un chequeo, es bueno tener el fallback.
-        api_key = os.getenv("GEMINI_API_KEY", None)
-        if api_key:
-            self.client = genai.Client(api_key=api_key)
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY", None)
+        # GEMINI_BASE_URL permite apuntar a un servidor local (tools/fake_gemini_server.py) en pruebas
+        self.base_url = base_url or os.getenv("GEMINI_BASE_URL", None)
+
+        # Modelo principal; el de respaldo solo atiende rúbricas cuando el principal está saturado
+        self.model_name = MODELO
+
+        # Instrucciones fijas de los prompts en la caché de contexto de Gemini de cada clave
+        # (GEMINI_CACHE_CONTEXTO=0 para enviarlas siempre como system instruction)
+        contexto = os.getenv("GEMINI_CACHE_CONTEXTO", "1") != "0"
+        claves = claves_api(self.api_key)
+        if backend is not None:
+            rutas = crear_rutas(claves, MODELO, MODELO_RESPALDO, backend=lambda clave: backend,
+                                cache_contexto=contexto)
         else:
-            # Intentar inicializar sin clave si no se encuentra (Streamlit debería haber detenido la app antes)
-            self.client = genai.Client()
-            
-        self.model_name = "gemini-2.5-flash"
+            # El SDK de google-genai tarda ~0.4 s en importarse: los clientes se crean en la primera llamada
+            rutas = rutas_del_proceso(claves, MODELO, MODELO_RESPALDO, self.base_url, contexto)
+        self.enrutador = Enrutador(rutas)
+
+        # Plazo, reintentos y cortocircuito; la cuota (GEMINI_RPM) la lleva cada ruta del enrutador
+        self.resiliencia = LlamadaResiliente(plazo=float(os.getenv("GEMINI_PLAZO", "180")))
+
+        # Las peticiones idénticas simultáneas de varias sesiones comparten una sola llamada
+        # (GEMINI_COALESCER=0 para desactivarlo)
+        self.coalescedor = Coalescedor() if os.getenv("GEMINI_COALESCER", "1") != "0" else None
+
+        # Caché de respuestas compartida por todas las sesiones (GEMINI_CACHE=0 para desactivarla)
+        if os.getenv("GEMINI_CACHE", "1") != "0":
+            self.cache = RespuestaCache(os.getenv("GEMINI_CACHE_PATH", ".cache/gemini_respuestas.sqlite3"))
+        else:
+            self.cache = None
+
+    @property
+    def limitador(self):
+        """TokenBucket global que se consulta antes de cada llamada, además de la cuota de cada ruta"""
+        return self.resiliencia.limitador
+
+    @limitador.setter
+    def limitador(self, limitador):
+        self.resiliencia.limitador = limitador
+
+    @property
+    def backend(self):
+        """Backend de la primera clave: el indicado al crear el servicio o el cliente compartido del registro"""
+        return self.enrutador.principales[0].backend
+
+    @property
+    def client(self):
+        """genai.Client de la primera clave"""
+        return self.backend.genai
+
+    @property
+    def cache_contexto(self):
+        """CacheContexto de la primera clave (None si está desactivada)"""
+        return self.enrutador.principales[0].cache_contexto
 
-    def generar_situacion_aprendizaje(self, datos_seleccion):
+    def salud(self, max_antiguedad=30.0):
+        """EstadoSalud de la API de Gemini (comprobación ligera, reutilizada unos segundos)"""
+        return self.backend.salud(self.model_name, max_antiguedad)
+
+    def generar_esquema(self, datos_seleccion, regenerar=False, consumo=None):
+        """Genera un esquema breve (título, RA/CE, producto final y fases) de la situación"""
+
+        from google.genai import types
+
+        prompt = self._construir_prompt_esquema(datos_seleccion)
+        # El esquema es corto: solo sirve de guía común para la situación y la rúbrica
+        config = types.GenerateContentConfig(
+            temperature=datos_seleccion.get("creatividad", 0.7),
+            max_output_tokens=1024
+        )
+
+        try:
+            return self._generar(prompt, config, ("esquema", datos_seleccion, None), regenerar, consumo) or ""
+
+        except ServicioNoDisponibleError:
+            raise
+
+        except Exception as e:
+            raise Exception(f"Error al generar el esquema de la situación: {str(e)}")
+
+    def generar_en_paralelo(self, datos_seleccion, regenerar=False, consumo=None):
+        """Genera situación y rúbrica a la vez a partir de un esquema común.
+
+        Devuelve un generador de tuplas (tipo, texto) con tipo "esquema", "situacion"
+        o "rubrica", en el orden en que van terminando.
+        """
+
+        esquema = self.generar_esquema(datos_seleccion, regenerar, consumo)
+        yield "esquema", esquema
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futuros = {
+                executor.submit(self.generar_situacion_aprendizaje, datos_seleccion, esquema, regenerar, consumo): "situacion",
+                executor.submit(
+                    self.generar_rubrica, datos_seleccion, esquema=esquema, regenerar=regenerar, consumo=consumo
+                ): "rubrica",
+            }
+            for futuro in as_completed(futuros):
+                yield futuros[futuro], futuro.result()
+
+    def generar_situacion_aprendizaje(self, datos_seleccion, esquema=None, regenerar=False, consumo=None):
         """Genera una situación de aprendizaje completa usando Gemini AI"""
-        # El texto de la instrucción estricta se ha movido a _construir_prompt_situacion para evitar un SyntaxError aquí.
-        
-        prompt = self._construir_prompt_situacion(datos_seleccion)
+        prompt = self._construir_prompt_situacion(datos_seleccion, esquema)
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    # Ajustamos la temperatura (creatividad) según el input del usuario
-                    temperature=datos_seleccion.get("creatividad", 0.7),
-                    # Aumentamos los tokens a 8192 para forzar la longitud del Punto 7
-                    max_output_tokens=8192 
-                )
+            texto = self._generar(
+                prompt, self._config_situacion(datos_seleccion), ("situacion", datos_seleccion, esquema), regenerar,
+                consumo
             )
             
-            return response.text or "Error: No se pudo generar la situación de aprendizaje"
+            return texto or "Error: No se pudo generar la situación de aprendizaje"
+            
+        except ServicioNoDisponibleError:
+            raise
             
         except Exception as e:
             # Propagar el error para que Streamlit lo maneje
             raise Exception(f"Error al generar situación de aprendizaje: {str(e)}")
     
-    def generar_rubrica(self, datos_seleccion, situacion_aprendizaje):
-        """Genera una rúbrica de evaluación basada en la situación de aprendizaje"""
+    def generar_rubrica(self, datos_seleccion, situacion_aprendizaje=None, esquema=None, regenerar=False,
+                        consumo=None):
+        """Genera una rúbrica de evaluación basada en la situación de aprendizaje o en su esquema"""
         
-        prompt = self._construir_prompt_rubrica(datos_seleccion, situacion_aprendizaje)
+        prompt = self._construir_prompt_rubrica(datos_seleccion, situacion_aprendizaje, esquema)
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=0.5,  # Menos creatividad para rúbricas más estructuradas
-                    max_output_tokens=4000
-                )
+            texto = self._generar(
+                prompt, self._config_rubrica(), ("rubrica", datos_seleccion, esquema or situacion_aprendizaje),
+                regenerar, consumo
             )
             
-            return response.text or "Error: No se pudo generar la rúbrica"
+            return texto or "Error: No se pudo generar la rúbrica"
+            
+        except ServicioNoDisponibleError:
+            raise
             
         except Exception as e:
             raise Exception(f"Error al generar rúbrica: {str(e)}")
-    
-    def _construir_prompt_situacion(self, datos):
-        """Construye el prompt para generar la situación de aprendizaje"""
-        
-        prompt = f"""
-        Actúa como un experto en pedagogía y formación profesional sanitaria en España. Necesito que generes una SITUACIÓN DE APRENDIZAJE completa y detallada para Formación Profesional Sanitaria en Aragón, totalmente alineada con:
 
-        - LOMLOE (Ley Orgánica 3/2020)
-        - ORDEN ECD/842/2024 (Grado Medio) y ORDEN ECD/843/2024 (Grado Superior)
-        - Decreto 91/2024 del Gobierno de Aragón
-        - Real Decreto de enseñanzas mínimas correspondiente
+    def generar_situacion_aprendizaje_stream(self, datos_seleccion, esquema=None, cancelar=None, regenerar=False,
+                                             consumo=None):
+        """Genera la situación de aprendizaje devolviendo los fragmentos de texto según llegan.
 
-        ## DATOS DE LA SITUACIÓN:
-        
-        **Ciclo Formativo:** {datos.get('nivel', '')} - {datos.get('ciclo', '')}
-        **Módulo Profesional:** {datos.get('modulo', '')}
-        **Metodología Principal:** {datos.get('metodologia', '')}
-        **Metodologías Complementarias:** {', '.join(datos.get('metodologias_secundarias', []))}
-        **Duración:** {datos.get('duracion', '')}
-        **Recursos Necesarios:** {', '.join(datos.get('recursos', []))}
-        **Contexto Profesional:** {datos.get('contexto', '')}
-        **Producto Final:** {datos.get('producto_final', '')}
-
-        **Resultados de Aprendizaje seleccionados:**
-        {chr(10).join(f"- {ra}" for ra in datos.get('resultados_aprendizaje', []))}
-
-        **Criterios de Evaluación seleccionados:**
-        {chr(10).join(f"- {ce}" for ce in datos.get('criterios_evaluacion', []))}
-
-        **Competencias Profesionales:**
-        {chr(10).join(f"- {cp}" for cp in datos.get('competencias_profesionales', []))}
-
-        **Competencias Personales:**
-        {chr(10).join(f"- {cp}" for cp in datos.get('competencias_personales', []))}
-
-        **Competencias Sociales:**
-        {chr(10).join(f"- {cs}" for cs in datos.get('competencias_sociales', []))}
-
-        ## ESTRUCTURA REQUERIDA DE LA SITUACIÓN DE APRENDIZAJE:
-
-        Genera una situación de aprendizaje completa con la siguiente estructura en formato Markdown:
-
-        # SITUACIÓN DE APRENDIZAJE: [Título atractivo y específico]
-
-        ## 1. IDENTIFICACIÓN
-        - **Título:** - **Ciclo Formativo:** - **Módulo Profesional:** - **Nivel:** - **Duración:** - **Temporalización:** ## 2. CONTEXTUALIZACIÓN Y JUSTIFICACIÓN
-        [Descripción del contexto profesional real donde se desarrolla, justificación pedagógica alineada con LOMLOE y normativa aragonesa]
-
-        ## 3. OBJETIVOS Y COMPETENCIAS
-        ### Objetivos Didácticos:
-        [3-5 objetivos específicos y medibles]
-
-        ### Competencias a Desarrollar:
-        - **Competencia general del ciclo:** - **Competencias profesionales:** - **Competencias personales y sociales:** ## 4. RESULTADOS DE APRENDIZAJE Y CRITERIOS DE EVALUACIÓN
-        [Especificar exactamente los RA y CE seleccionados y cómo se trabajan]
-
-        ## 5. SABERES BÁSICOS/CONTENIDOS
-        ### Contenidos Conceptuales:
-        ### Contenidos Procedimentales:
-        ### Contenidos Actitudinales:
-
-        ## 6. METODOLOGÍA
-        ### Metodología Principal: {datos.get('metodologia', '')}
-        [Descripción detallada de cómo se aplicará]
-
-        ### Metodologías Complementarias:
-        [Si existen metodologías secundarias, explicar su integración]
-
-        ### Estrategias Inclusivas:
-        [Medidas de atención a la diversidad y accesibilidad universal]
-
-        ## 7. SECUENCIA DIDÁCTICA
-        ### Fase 1: [Nombre de la fase]
-        - **Duración:** - **Actividades:** - **Recursos:** - **Evaluación:** ### Fase 2: [Nombre de la fase]
-        - **Duración:** - **Actividades:** - **Recursos:** - **Evaluación:** [Continuar con las fases necesarias según la duración]
-
-        ## 8. RECURSOS Y MATERIALES
-        ### Recursos Humanos:
-        ### Recursos Materiales:
-        ### Recursos Tecnológicos:
-        ### Espacios:
-
-        ## 9. EVALUACIÓN
-        ### Instrumentos de Evaluación:
-        ### Criterios de Calificación:
-        ### Procedimientos de Evaluación:
-        ### Evaluación Inclusiva:
-
-        ## 10. PRODUCTO FINAL
-        **Producto:** {datos.get('producto_final', '')}
-        [Descripción detallada del producto final esperado, criterios de calidad, presentación]
-
-        ## 11. BIBLIOGRAFÍA Y REFERENCIAS
-        [Referencias normativas y bibliográficas actualizadas]
-
-        ## 12. ANEXOS
-        ### Anexo I: Fichas de trabajo
-        ### Anexo II: Lista de verificación
-        ### Anexo III: Recursos complementarios
-
-        IMPORTANTE:
-        - La situación debe ser REALISTA y APLICABLE en un centro de FP sanitaria
-        - Debe integrar perfectamente la metodología seleccionada
-        - Debe estar completamente alineada con la normativa LOMLOE y aragonesa
-        - Debe ser específica del ámbito sanitario y profesionalizante
-        - Incluir aspectos de digitalización y sostenibilidad cuando sea pertinente
-        - Considerar la perspectiva de género y diversidad
-        - Ser innovadora pero factible con los recursos indicados
-        
-        """
-        
-        # INSTRUCCIÓN ESTRICTA AÑADIDA PARA FORZAR LA COMPLETITUD DEL DOCUMENTO
-        instruccion_estricta = """
-        Genera el documento completo con todas las secciones de la estructura (1. a 12.). El **Punto 7: SECUENCIA DIDÁCTICA** (actividades) debe ser la **sección más larga y detallada** (usa un mínimo de 500 palabras). Utiliza una **lista numerada o subpuntos** para describir las actividades claras. **TU TAREA MÁS IMPORTANTE ES COMPLETAR ÍNTEGRAMENTE EL DOCUMENTO, INCLUYENDO EL PUNTO 7 Y EL PUNTO 8, SIN DETENERTE POR NINGÚN MOTIVO.**
+        Si se pasa un threading.Event en cancelar, la generación se detiene en cuanto se activa.
         """
-        
-        prompt += instruccion_estricta
-        return prompt
 
-    def _construir_prompt_rubrica(self, datos, situacion):
-        """Construye el prompt para generar la rúbrica de evaluación"""
-        
-        prompt = f"""
-        Basándote en la siguiente SITUACIÓN DE APRENDIZAJE que has generado, crea una RÚBRICA DE EVALUACIÓN completa y detallada:
+        prompt = self._construir_prompt_situacion(datos_seleccion, esquema)
 
-        {situacion[:2000]}...
+        try:
+            yield from self._stream(
+                prompt, self._config_situacion(datos_seleccion), cancelar,
+                ("situacion", datos_seleccion, esquema), regenerar, consumo
+            )
+        except ServicioNoDisponibleError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error al generar situación de aprendizaje: {str(e)}")
 
-        ## DATOS PARA LA RÚBRICA:
-        **Resultados de Aprendizaje:**
-        {chr(10).join(f"- {ra}" for ra in datos.get('resultados_aprendizaje', []))}
+    def generar_rubrica_stream(self, datos_seleccion, situacion_aprendizaje=None, esquema=None, cancelar=None,
+                               regenerar=False, consumo=None):
+        """Genera la rúbrica devolviendo los fragmentos de texto según llegan"""
 
-        **Criterios de Evaluación:**
-        {chr(10).join(f"- {ce}" for ce in datos.get('criterios_evaluacion', []))}
+        prompt = self._construir_prompt_rubrica(datos_seleccion, situacion_aprendizaje, esquema)
 
-        **Producto Final:** {datos.get('producto_final', '')}
+        try:
+            yield from self._stream(
+                prompt, self._config_rubrica(), cancelar,
+                ("rubrica", datos_seleccion, esquema or situacion_aprendizaje), regenerar, consumo
+            )
+        except ServicioNoDisponibleError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error al generar rúbrica: {str(e)}")
 
-        ## ESTRUCTURA REQUERIDA PARA LA RÚBRICA:
+    def generar_situacion_estructurada(self, datos_seleccion, esquema=None, regenerar=False, consumo=None):
+        """Genera la situación de aprendizaje como estructura.Situacion validada"""
+        return self._ultimo(self.generar_situacion_estructurada_stream(
+            datos_seleccion, esquema, regenerar=regenerar, consumo=consumo
+        ))
+
+    def generar_rubrica_estructurada(self, datos_seleccion, situacion_aprendizaje=None, esquema=None, regenerar=False,
+                                     consumo=None):
+        """Genera la rúbrica como estructura.Rubrica validada"""
+        return self._ultimo(self.generar_rubrica_estructurada_stream(
+            datos_seleccion, situacion_aprendizaje, esquema, regenerar=regenerar, consumo=consumo
+        ))
+
+    def generar_situacion_estructurada_stream(self, datos_seleccion, esquema=None, cancelar=None, regenerar=False,
+                                              consumo=None):
+        """Genera la situación en modo JSON devolviendo el estructura.Situacion según crece.
+
+        Cada sección se valida en cuanto llega; el último valor es la situación completa
+        y validada (completa=True), salvo que se cancele.
+        """
 
-        # RÚBRICA DE EVALUACIÓN
+        prompt = self._construir_prompt_situacion(datos_seleccion, esquema, estructurado=True)
 
-        ## Información General
-        - **Situación de Aprendizaje:** [Título]
-        - **Módulo:** {datos.get('modulo', '')}
-        - **Producto Final:** {datos.get('producto_final', '')}
-        - **Instrumento:** Rúbrica analítica
-        - **Peso en la calificación final:** [Especificar porcentaje]
+        try:
+            yield from self._stream_estructurado(
+                estructura.Situacion, prompt,
+                self._config_estructurado(self._config_situacion(datos_seleccion), estructura.ESQUEMA_SITUACION),
+                cancelar, ("situacion_json", datos_seleccion, esquema), regenerar, consumo
+            )
+        except (ServicioNoDisponibleError, estructura.EstructuraInvalidaError):
+            raise
+        except Exception as e:
+            raise Exception(f"Error al generar situación de aprendizaje: {str(e)}")
 
-        ## Criterios de Evaluación y Niveles de Desempeño
+    def generar_rubrica_estructurada_stream(self, datos_seleccion, situacion_aprendizaje=None, esquema=None,
+                                            cancelar=None, regenerar=False, consumo=None):
+        """Genera la rúbrica en modo JSON devolviendo el estructura.Rubrica según crece.
 
-        ### Criterio 1: [Nombre del criterio basado en los CE seleccionados]
-        **Peso:** [% sobre nota final]
+        situacion_aprendizaje puede ser el Markdown o una estructura.Situacion.
+        """
 
-        | NIVEL | EXCELENTE (4) | SATISFACTORIO (3) | EN DESARROLLO (2) | INSUFICIENTE (1) |
-        |-------|---------------|-------------------|-------------------|------------------|
-        | **Descripción** | [Descripción detallada del nivel excelente] | [Descripción nivel satisfactorio] | [Descripción nivel en desarrollo] | [Descripción nivel insuficiente] |
-        | **Indicadores** | • [Indicador específico] <br> • [Indicador específico] | • [Indicador específico] <br> • [Indicador específico] | • [Indicador específico] <br> • [Indicador específico] | • [Indicador específico] <br> • [Indicador específico] |
+        if isinstance(situacion_aprendizaje, estructura.Situacion):
+            situacion_aprendizaje = situacion_aprendizaje.a_markdown()
+        prompt = self._construir_prompt_rubrica(datos_seleccion, situacion_aprendizaje, esquema, estructurado=True)
 
-        [Repetir para cada criterio identificado - mínimo 4-6 criterios]
+        try:
+            yield from self._stream_estructurado(
+                estructura.Rubrica, prompt,
+                self._config_estructurado(self._config_rubrica(), estructura.ESQUEMA_RUBRICA),
+                cancelar, ("rubrica_json", datos_seleccion, esquema or situacion_aprendizaje), regenerar, consumo
+            )
+        except (ServicioNoDisponibleError, estructura.EstructuraInvalidaError):
+            raise
+        except Exception as e:
+            raise Exception(f"Error al generar rúbrica: {str(e)}")
 
-        ## Competencias Transversales
+    def regenerar_apartado(self, datos_seleccion, documento, clave, indicaciones="", consumo=None):
+        """Reescribe un solo apartado (ver services.regeneracion) y devuelve el documento con él.
 
-        ### Competencias Profesionales
-        [Evaluar las competencias profesionales seleccionadas]
+        documento es el Markdown o la estructura.Situacion/Rubrica; el resto del documento
+        se envía resumido como contexto y no se modifica. No usa la caché de respuestas:
+        quien pide regenerar un apartado quiere una versión nueva.
+        """
 
-        ### Competencias Personales y Sociales  
-        [Evaluar las competencias personales y sociales seleccionadas]
+        from google.genai import types
 
-        ## Evaluación del Proceso
+        actual = regeneracion.apartado(documento, clave)
+        estructurado = isinstance(documento, (estructura.Situacion, estructura.Rubrica))
+        with metricas.medir("prompt", tipo=TIPO_APARTADO):
+            prompt = prompts.prompt_apartado(
+                datos_seleccion, actual.texto, regeneracion.contexto(documento, clave), indicaciones,
+                estructurado=estructurado
+            )
+        # Un apartado es una fracción del documento: la secuencia didáctica, el más largo, cabe de sobra
+        config = types.GenerateContentConfig(
+            temperature=datos_seleccion.get("creatividad", 0.7),
+            max_output_tokens=4096
+        )
 
-        ### Participación y Actitud (10%)
-        | EXCELENTE | SATISFACTORIO | EN DESARROLLO | INSUFICIENTE |
-        |-----------|---------------|---------------|--------------|
-        | [Descripción] | [Descripción] | [Descripción] | [Descripción] |
+        try:
+            if not estructurado:
+                texto = self._generar(prompt, config, None, consumo=consumo) or ""
+                return regeneracion.reemplazar(documento, clave, _con_titulo(texto, actual.texto))
+
+            if clave[0] == regeneracion.CRITERIO:
+                clase, esquema = estructura.Criterio, estructura.ESQUEMA_CRITERIO
+            elif isinstance(documento, estructura.Situacion):
+                clase, esquema = estructura.Seccion, estructura.ESQUEMA_SECCION
+            else:
+                clase, esquema = estructura.Seccion, estructura.ESQUEMA_SECCION_LIBRE
+            texto = self._generar(prompt, self._config_estructurado(config, esquema), None, consumo=consumo) or ""
+            try:
+                nuevo = clase.desde_json(json.loads(texto), clave[0])
+            except ValueError as e:
+                raise estructura.EstructuraInvalidaError(f"El apartado regenerado no es válido: {e}") from e
+            if isinstance(nuevo, estructura.Seccion) and isinstance(documento, estructura.Situacion):
+                # La sección conserva su número aunque el modelo devuelva otro
+                nuevo.numero = documento.secciones[clave[1]].numero
+            return regeneracion.reemplazar(documento, clave, nuevo)
+
+        except (ServicioNoDisponibleError, estructura.EstructuraInvalidaError):
+            raise
+        except Exception as e:
+            raise Exception(f"Error al regenerar «{actual.titulo}»: {str(e)}")
 
-        ### Trabajo en Equipo (10%)
-        | EXCELENTE | SATISFACTORIO | EN DESARROLLO | INSUFICIENTE |
-        |-----------|---------------|---------------|--------------|
-        | [Descripción] | [Descripción] | [Descripción] | [Descripción] |
+    def generar_en_paralelo_stream(self, datos_seleccion, cancelar=None, regenerar=False, consumo=None,
+                                   estructurado=False):
+        """Versión en streaming de generar_en_paralelo.
 
-        ## Cálculo de la Calificación Final
+        Devuelve tuplas (tipo, fragmento) intercaladas de la situación y la rúbrica. Tras el
+        esquema completo, cada flujo termina con una tupla (tipo, None). Con estructurado=True
+        cada fragmento es el documento (estructura.Situacion o Rubrica) con lo recibido hasta
+        entonces y el último antes del None es el documento completo.
+        """
 
-        **Fórmula de cálculo:**
-        - Criterio 1: ___ × % = ___
-        - Criterio 2: ___ × % = ___
-        - [...]
-        - **NOTA FINAL = Σ (Puntuación)**
+        esquema = self.generar_esquema(datos_seleccion, regenerar, consumo)
+        yield "esquema", esquema
+
+        # Evento propio para detener los hilos si el consumidor deja de leer
+        detener = threading.Event()
+        cola = queue.Queue()
+
+        def producir(tipo, fragmentos):
+            try:
+                for fragmento in fragmentos:
+                    if detener.is_set():
+                        break
+                    cola.put((tipo, fragmento))
+            except Exception as e:
+                cola.put((tipo, e))
+            finally:
+                fragmentos.close()
+                cola.put((tipo, None))
+
+        generar_situacion, generar_rubrica = self._generadores_stream(estructurado)
+        flujos = {
+            "situacion": generar_situacion(datos_seleccion, esquema, cancelar, regenerar, consumo),
+            "rubrica": generar_rubrica(
+                datos_seleccion, esquema=esquema, cancelar=cancelar, regenerar=regenerar, consumo=consumo
+            ),
+        }
+        hilos = [
+            threading.Thread(target=producir, args=(tipo, fragmentos), daemon=True)
+            for tipo, fragmentos in flujos.items()
+        ]
+        for hilo in hilos:
+            hilo.start()
 
-        ## Escala de Calificación
-        - **EXCELENTE (9-10):** Supera ampliamente los objetivos
-        - **SATISFACTORIO (7-8):** Alcanza completamente los objetivos  
-        - **EN DESARROLLO (5-6):** Alcanza parcialmente los objetivos
-        - **INSUFICIENTE (0-4):** No alcanza los objetivos mínimos
+        try:
+            pendientes = len(hilos)
+            while pendientes:
+                tipo, fragmento = cola.get()
+                if isinstance(fragmento, Exception):
+                    raise fragmento
+                if fragmento is None:
+                    pendientes -= 1
+                yield tipo, fragmento
+        finally:
+            detener.set()
+
+    def generar_secuencial_stream(self, datos_seleccion, cancelar=None, regenerar=False, consumo=None,
+                                  estructurado=False):
+        """Genera en streaming primero la situación y después la rúbrica basada en ella.
+
+        Devuelve las mismas tuplas (tipo, fragmento) que generar_en_paralelo_stream, sin esquema.
+        """
+
+        generar_situacion, generar_rubrica = self._generadores_stream(estructurado)
+        situacion = ""
+        for fragmento in generar_situacion(datos_seleccion, cancelar=cancelar, regenerar=regenerar, consumo=consumo):
+            # En modo estructurado cada fragmento es la situación entera hasta ese momento
+            situacion = fragmento if estructurado else situacion + fragmento
+            yield "situacion", fragmento
+        yield "situacion", None
+
+        if cancelar is not None and cancelar.is_set():
+            return
+
+        yield from (
+            ("rubrica", f)
+            for f in generar_rubrica(datos_seleccion, situacion, cancelar=cancelar, regenerar=regenerar, consumo=consumo)
+        )
+        yield "rubrica", None
+
+    def _generadores_stream(self, estructurado):
+        """Funciones de streaming de la situación y la rúbrica en texto o en modo estructurado"""
+        if estructurado:
+            return self.generar_situacion_estructurada_stream, self.generar_rubrica_estructurada_stream
+        return self.generar_situacion_aprendizaje_stream, self.generar_rubrica_stream
+
+    @staticmethod
+    def _ultimo(documentos):
+        documento = None
+        for documento in documentos:
+            pass
+        return documento
+
+    def _generar(self, prompt, config, cache_info, regenerar=False, consumo=None):
+        """Llama a Gemini salvo que la respuesta ya esté en caché.
+
+        cache_info es una tupla (tipo, datos, contexto) con la que se calcula la clave.
+        Con regenerar=True se ignora la caché, pero la nueva respuesta sí se guarda.
+        Si se pasa un Consumo se le suman la llamada y sus tokens. Si otra sesión ya
+        está pidiendo lo mismo, se espera su respuesta en lugar de repetir la llamada.
+        """
+
+        tipo = cache_info[0] if cache_info else TIPO_APARTADO
+        clave = self._clave(cache_info)
+        texto = self._desde_cache(clave, regenerar, tipo, consumo)
+        if texto is not None:
+            return texto
+
+        def llamar():
+            peticion = Peticion(tipo)
+            with metricas.medir("gemini", tipo=tipo):
+                response = self.resiliencia.ejecutar(
+                    lambda restante: self._llamar_api(prompt, config, restante, peticion)
+                )
+            self._registrar_uso(peticion, response.usage_metadata, consumo)
+
+            # Las respuestas del modelo de respaldo no se guardan: la próxima vez se pide al principal
+            if clave and response.text and not peticion.ruta.respaldo:
+                self.cache.guardar(clave, cache_info[0], response.text)
+            return response.text
 
-        ## Observaciones y Feedback
-        **Espacio para comentarios del evaluador:**
-        - Fortalezas observadas:
-        - Áreas de mejora:
-        - Recomendaciones para el desarrollo profesional:
+        vuelo = self._clave_vuelo(cache_info, regenerar)
+        if vuelo is None:
+            return llamar()
+        texto, coalescida = self.coalescedor.llamar(vuelo, llamar)
+        if coalescida:
+            self._registrar_coalescida(tipo, consumo)
+        return texto
 
-        ## Autoevaluación del Estudiante
-        [Incluir apartado para que el estudiante reflexione sobre su propio aprendizaje]
+    def _stream(self, prompt, config, cancelar=None, cache_info=None, regenerar=False, consumo=None):
+        """Itera sobre la respuesta en streaming de Gemini y se detiene si se cancela.
 
-        IMPORTANTE:
-        - La rúbrica debe estar perfectamente alineada con los resultados de aprendizaje y criterios de evaluación seleccionados
-        - Debe ser específica y observable (evitar términos vagos)
-        - Debe incluir indicadores cuantitativos y cualitativos
-        - Debe permitir evaluación formativa y sumativa
-        - Debe ser comprensible para estudiantes y profesores
-        - Incluir aspectos del ámbito sanitario específico
+        Las peticiones idénticas simultáneas comparten un único flujo (ver services.coalescencia).
         """
-        
-        return prompt
+
+        tipo = cache_info[0] if cache_info else TIPO_APARTADO
+        clave = self._clave(cache_info)
+        texto = self._desde_cache(clave, regenerar, tipo, consumo)
+        if texto is not None:
+            yield texto
+            return
+
+        vuelo = self._clave_vuelo(cache_info, regenerar)
+        if vuelo is None:
+            yield from self._stream_api(prompt, config, cancelar, clave, cache_info, consumo)
+            return
+
+        # El flujo compartido se cancela por su cuenta cuando ya no lo lee ninguna sesión
+        yield from self.coalescedor.flujo(
+            vuelo,
+            lambda cancelado: self._stream_api(prompt, config, cancelado, clave, cache_info, consumo),
+            cancelar,
+            al_unirse=lambda: self._registrar_coalescida(tipo, consumo)
+        )
+
+    def _stream_estructurado(self, clase, prompt, config, cancelar, cache_info, regenerar, consumo):
+        """_stream en modo JSON: devuelve el documento de clase según se va validando.
+
+        Si la respuesta no cumple el esquema se borra de la caché para que el siguiente
+        intento vuelva a llamar a Gemini.
+        """
+
+        fragmentos = self._stream(prompt, config, cancelar, cache_info, regenerar, consumo)
+        try:
+            yield from estructura.leer_flujo(clase, fragmentos, cancelar)
+        except estructura.EstructuraInvalidaError:
+            clave = self._clave(cache_info)
+            if clave:
+                self.cache.descartar(clave)
+            raise
+        finally:
+            fragmentos.close()
+
+    def _stream_api(self, prompt, config, cancelar, clave, cache_info, consumo):
+        """Llamada en streaming a Gemini; guarda en caché la respuesta si llega completa"""
+
+        peticion = Peticion(cache_info[0] if cache_info else TIPO_APARTADO)
+        tipo = peticion.tipo
+        inicio = time.perf_counter()
+        # Los reintentos solo ocurren antes del primer fragmento
+        respuesta = self.resiliencia.flujo(lambda restante: self._abrir_flujo(prompt, config, restante, peticion))
+        partes = []
+        uso = None
+        try:
+            for chunk in respuesta:
+                if cancelar is not None and cancelar.is_set():
+                    break
+                # El uso de tokens llega acumulado: vale el del último fragmento que lo trae
+                uso = chunk.usage_metadata or uso
+                if chunk.text:
+                    if not partes:
+                        metricas.observar("gemini_primer_fragmento", time.perf_counter() - inicio, tipo=tipo)
+                    partes.append(chunk.text)
+                    yield chunk.text
+            else:
+                metricas.observar("gemini", time.perf_counter() - inicio, tipo=tipo)
+        except Exception as e:
+            metricas.contar("errores_total", etapa="gemini", error=type(e).__name__, tipo=tipo)
+            raise
+        finally:
+            # Cierra la conexión HTTP si el flujo se abandona antes de terminar
+            cerrar = getattr(respuesta, "close", None)
+            if cerrar:
+                cerrar()
+            # Sin ruta ninguna clave llegó a servir la petición (p. ej. se agotaron los
+            # reintentos antes del primer fragmento): no hay llamada que contar
+            if peticion.ruta is not None:
+                self._registrar_uso(peticion, uso, consumo)
+
+        # Solo se guardan las respuestas completas del modelo principal, nunca las canceladas
+        if clave and partes and not peticion.ruta.respaldo and not (cancelar is not None and cancelar.is_set()):
+            self.cache.guardar(clave, cache_info[0], "".join(partes))
+
+    def _desde_cache(self, clave, regenerar, tipo, consumo):
+        """Respuesta guardada en la caché de respuestas o None si hay que llamar a Gemini"""
+        if not clave or regenerar:
+            return None
+        texto = self.cache.obtener(clave)
+        metricas.contar("cache_respuestas_total", tipo=tipo, resultado="acierto" if texto is not None else "fallo")
+        if texto is not None and consumo is not None:
+            consumo.registrar_cache()
+        return texto
+
+    def _registrar_coalescida(self, tipo, consumo):
+        metricas.contar("coalescidas_total", tipo=tipo)
+        if consumo is not None:
+            consumo.registrar_coalescida()
+
+    def _registrar_uso(self, peticion, uso, consumo):
+        """Suma el usage_metadata de una llamada al Consumo y a las métricas de tokens y coste"""
+        tipo, ruta = peticion.tipo, peticion.ruta
+        if consumo is not None:
+            consumo.registrar_llamada(uso, ruta)
+        if uso is None:
+            return
+        entrada = uso.prompt_token_count or 0
+        cacheados = uso.cached_content_token_count or 0
+        # Los tokens de razonamiento de los modelos 2.5 se facturan como salida
+        salida = uso.candidates_token_count or 0
+        razonamiento = uso.thoughts_token_count or 0
+        for clase, cantidad in (("entrada", entrada), ("cacheados", cacheados), ("salida", salida),
+                                ("razonamiento", razonamiento)):
+            if cantidad:
+                metricas.contar("gemini_tokens_total", cantidad, tipo=tipo, clase=clase)
+        # Se factura según el modelo que ha servido la petición
+        precios = PRECIOS_POR_MILLON.get(ruta.modelo if ruta is not None else self.model_name)
+        if precios:
+            coste = ((entrada - cacheados) * precios[0] + cacheados * precios[1]
+                     + (salida + razonamiento) * precios[2]) / 1e6
+            metricas.contar("gemini_coste_dolares_total", coste, tipo=tipo)
+
+    def _llamar_api(self, prompt, config, restante, peticion):
+        """Llamada a Gemini por la ruta (clave y modelo) que elija el enrutador; la anota en peticion"""
+        peticion.ruta, response = self.enrutador.ejecutar(
+            peticion.tipo, restante, lambda ruta, plazo: self._respuesta(ruta, prompt, config, plazo)
+        )
+        return response
+
+    def _respuesta(self, ruta, prompt, config, restante):
+        """generate_content con las instrucciones desde la caché de contexto o como system instruction"""
+
+        config = self._con_plazo(config, restante)
+        cacheado = self._contexto_cacheado(ruta, prompt)
+        if cacheado:
+            try:
+                return ruta.cliente.models.generate_content(
+                    model=ruta.modelo,
+                    contents=prompt.peticion,
+                    config=config.model_copy(update={"cached_content": cacheado})
+                )
+            except Exception as e:
+                # Si el contenido ha caducado o se ha borrado se repite enviando las instrucciones
+                if not ruta.cache_contexto.invalidar(cacheado, e):
+                    raise
+        return ruta.cliente.models.generate_content(
+            model=ruta.modelo,
+            contents=prompt.peticion,
+            config=config.model_copy(update={"system_instruction": prompt.instrucciones})
+        )
+
+    def _abrir_flujo(self, prompt, config, restante, peticion):
+        """Versión en streaming de _llamar_api.
+
+        Es un generador: la petición sale al pedir el primer fragmento, de modo que los
+        errores llegan a LlamadaResiliente.flujo antes del primer fragmento, como con la
+        llamada directa. El enrutador mide la latencia de cada ruta hasta ese fragmento.
+        """
+
+        peticion.ruta, (respuesta, primero) = self.enrutador.ejecutar(
+            peticion.tipo, restante, lambda ruta, plazo: self._primer_fragmento(ruta, prompt, config, plazo)
+        )
+        try:
+            if primero is not None:
+                yield primero
+            yield from respuesta
+        finally:
+            respuesta.close()
+
+    def _primer_fragmento(self, ruta, prompt, config, restante):
+        """Abre el flujo por la ruta y espera su primer fragmento; devuelve (flujo, fragmento o None)"""
+
+        config = self._con_plazo(config, restante)
+        cacheado = self._contexto_cacheado(ruta, prompt)
+        if cacheado:
+            respuesta = ruta.cliente.models.generate_content_stream(
+                model=ruta.modelo,
+                contents=prompt.peticion,
+                config=config.model_copy(update={"cached_content": cacheado})
+            )
+            try:
+                return respuesta, next(respuesta, None)
+            except Exception as e:
+                respuesta.close()
+                if not ruta.cache_contexto.invalidar(cacheado, e):
+                    raise
+
+        respuesta = ruta.cliente.models.generate_content_stream(
+            model=ruta.modelo,
+            contents=prompt.peticion,
+            config=config.model_copy(update={"system_instruction": prompt.instrucciones})
+        )
+        try:
+            return respuesta, next(respuesta, None)
+        except Exception:
+            respuesta.close()
+            raise
+
+    def _contexto_cacheado(self, ruta, prompt):
+        """Nombre del contenido en caché con las instrucciones del prompt (None = enviarlas en la petición)"""
+        if ruta.cache_contexto is None:
+            return None
+        return ruta.cache_contexto.nombre(ruta.modelo, prompt.instrucciones)
+
+    def _clave_vuelo(self, cache_info, regenerar):
+        """Clave con la que se agrupan las peticiones idénticas en curso (None = sin agrupar)"""
+        if self.coalescedor is None or cache_info is None:
+            return None
+        tipo, datos, contexto = cache_info
+        clave = clave_cache(tipo, datos, self.model_name, contexto)
+        # Quien pide regenerar no debe recibir la respuesta de una petición normal ni al revés
+        return f"{clave}:regenerar" if regenerar else clave
+
+    def _con_plazo(self, config, restante):
+        """Copia de la configuración con el tiempo de espera HTTP ajustado al plazo que queda"""
+        from google.genai import types
+
+        return config.model_copy(update={"http_options": types.HttpOptions(timeout=int(max(restante, 1.0) * 1000))})
+
+    def _clave(self, cache_info):
+        if self.cache is None or cache_info is None:
+            return None
+        tipo, datos, contexto = cache_info
+        return clave_cache(tipo, datos, self.model_name, contexto)
+
+    def _config_situacion(self, datos):
+        """Configuración de generación para la situación de aprendizaje"""
+        from google.genai import types
+
+        return types.GenerateContentConfig(
+            # Ajustamos la temperatura (creatividad) según el input del usuario
+            temperature=datos.get("creatividad", 0.7),
+            # Aumentamos los tokens a 8192 para forzar la longitud del Punto 7
+            max_output_tokens=8192
+        )
+
+    def _config_estructurado(self, config, esquema):
+        """Copia de la configuración que pide la respuesta en JSON con el esquema dado"""
+        return config.model_copy(update={
+            "response_mime_type": "application/json",
+            "response_json_schema": esquema,
+            # Las claves y los escapes del JSON ocupan más que el mismo texto en Markdown
+            "max_output_tokens": config.max_output_tokens * 5 // 4,
+        })
+
+    def _config_rubrica(self):
+        """Configuración de generación para la rúbrica"""
+        from google.genai import types
+
+        return types.GenerateContentConfig(
+            temperature=0.5,  # Menos creatividad para rúbricas más estructuradas
+            max_output_tokens=4000
+        )
+    
+    def _construir_prompt_esquema(self, datos):
+        """Construye el prompt para generar el esquema previo de la situación"""
+        with metricas.medir("prompt", tipo="esquema"):
+            return prompts.prompt_esquema(datos)
+
+    def _construir_prompt_situacion(self, datos, esquema=None, estructurado=False):
+        """Construye el prompt para generar la situación de aprendizaje"""
+        with metricas.medir("prompt", tipo="situacion_json" if estructurado else "situacion"):
+            return prompts.prompt_situacion(datos, esquema, estructurado=estructurado)
+
+    def _construir_prompt_rubrica(self, datos, situacion=None, esquema=None, estructurado=False):
+        """Construye el prompt para generar la rúbrica de evaluación"""
+        # Sin esquema se envían las secciones de la situación más relevantes para los RA y CE
+        with metricas.medir("prompt", tipo="rubrica_json" if estructurado else "rubrica"):
+            return prompts.prompt_rubrica(datos, situacion, esquema, estructurado=estructurado)
@@ -0,0 +1,275 @@
+"""Historial persistente de generaciones (SQLite con búsqueda de texto completo FTS5).
+
+Cada situación de aprendizaje generada se guarda con su rúbrica, sus parámetros,
+el modelo, la latencia y los tokens consumidos, así que sobrevive a recargas de
+página y reinicios y se puede volver a exportar sin llamar a Gemini. Es un único
+historial para toda la instalación (la app no tiene cuentas de usuario): todos los
+profesores ven y buscan las generaciones de todos.
+
+Los listados solo leen las columnas pequeñas (las de texto largo van al final de
+cada fila y SQLite no recorre sus páginas de desbordamiento) y se paginan por
+índice, de modo que listar o filtrar miles de documentos sigue siendo instantáneo.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+HISTORIAL_PATH = os.getenv("HISTORIAL_PATH", ".cache/historial.sqlite3")
+
+_TITULO = re.compile(r"^\s*#{1,6}\s+(.+?)\s*#*\s*$", re.MULTILINE)
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+
+def extraer_titulo(situacion):
+    """Primer título Markdown de la situación, sin el prefijo habitual"""
+
+    coincidencia = _TITULO.search(situacion or "")
+    if coincidencia is None:
+        return ""
+    titulo = coincidencia.group(1).replace("**", "").strip()
+    # "SITUACIÓN DE APRENDIZAJE: Cuidados seguros..." -> "Cuidados seguros..."
+    prefijo, separador, resto = titulo.partition(":")
+    if separador and prefijo.strip().upper() == "SITUACIÓN DE APRENDIZAJE" and resto.strip():
+        return resto.strip()
+    return titulo
+
+
+def consulta_fts(texto):
+    """Convierte lo que escribe el usuario en una consulta FTS5 segura (prefijos con AND)"""
+
+    # Cada palabra va entre comillas: los operadores y signos de FTS5 no se interpretan
+    return " ".join(f'"{palabra}"*' for palabra in _PALABRA.findall(texto))
+
+
+class EntradaHistorial:
+    """Resumen de un documento para los listados (sin los textos largos)"""
+
+    __slots__ = ("id", "creado", "nivel", "ciclo", "modulo", "titulo", "modelo", "latencia",
+                 "tokens_entrada", "tokens_salida")
+
+    def __init__(self, id, creado, nivel, ciclo, modulo, titulo, modelo, latencia, tokens_entrada, tokens_salida):
+        self.id = id
+        self.creado = creado
+        self.nivel = nivel
+        self.ciclo = ciclo
+        self.modulo = modulo
+        self.titulo = titulo
+        self.modelo = modelo
+        self.latencia = latencia
+        self.tokens_entrada = tokens_entrada
+        self.tokens_salida = tokens_salida
+
+    def __repr__(self):
+        return f"EntradaHistorial({self.id}, {self.modulo!r}, {self.titulo!r})"
+
+
+class DocumentoHistorial:
+    """Documento completo, listo para mostrarse o volver a exportarse"""
+
+    __slots__ = ("entrada", "situacion", "rubrica", "parametros")
+
+    def __init__(self, entrada, situacion, rubrica, parametros):
+        self.entrada = entrada
+        self.situacion = situacion
+        self.rubrica = rubrica
+        self.parametros = parametros
+
+
+_COLUMNAS_ENTRADA = "id, creado, nivel, ciclo, modulo, titulo, modelo, latencia, tokens_entrada, tokens_salida"
+
+
+class HistorialGeneraciones:
+    """Almacén de generaciones en SQLite (modo WAL), seguro entre hilos y procesos.
+
+    Como RespuestaCache, cada hilo abre su propia conexión. La tabla virtual FTS5 es de
+    contenido externo: indexa los textos de `documentos` sin duplicarlos y unos
+    disparadores la mantienen al día.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        with self._conexion() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documentos (
+                    id INTEGER PRIMARY KEY,
+                    creado REAL NOT NULL,
+                    nivel TEXT NOT NULL,
+                    ciclo TEXT NOT NULL,
+                    modulo TEXT NOT NULL,
+                    titulo TEXT NOT NULL,
+                    modelo TEXT NOT NULL,
+                    latencia REAL,
+                    tokens_entrada INTEGER,
+                    tokens_salida INTEGER,
+                    parametros TEXT NOT NULL,
+                    situacion TEXT NOT NULL,
+                    rubrica TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_documentos_creado ON documentos (creado);
+                CREATE INDEX IF NOT EXISTS idx_documentos_ciclo ON documentos (ciclo, creado);
+                CREATE INDEX IF NOT EXISTS idx_documentos_modulo ON documentos (modulo, creado);
+
+                CREATE VIRTUAL TABLE IF NOT EXISTS documentos_fts USING fts5(
+                    titulo, ciclo, modulo, situacion, rubrica,
+                    content='documentos', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS documentos_ai AFTER INSERT ON documentos BEGIN
+                    INSERT INTO documentos_fts (rowid, titulo, ciclo, modulo, situacion, rubrica)
+                    VALUES (new.id, new.titulo, new.ciclo, new.modulo, new.situacion, new.rubrica);
+                END;
+                CREATE TRIGGER IF NOT EXISTS documentos_ad AFTER DELETE ON documentos BEGIN
+                    INSERT INTO documentos_fts (documentos_fts, rowid, titulo, ciclo, modulo, situacion, rubrica)
+                    VALUES ('delete', old.id, old.titulo, old.ciclo, old.modulo, old.situacion, old.rubrica);
+                END;
+                CREATE TRIGGER IF NOT EXISTS documentos_au AFTER UPDATE OF titulo, situacion, rubrica ON documentos BEGIN
+                    INSERT INTO documentos_fts (documentos_fts, rowid, titulo, ciclo, modulo, situacion, rubrica)
+                    VALUES ('delete', old.id, old.titulo, old.ciclo, old.modulo, old.situacion, old.rubrica);
+                    INSERT INTO documentos_fts (rowid, titulo, ciclo, modulo, situacion, rubrica)
+                    VALUES (new.id, new.titulo, new.ciclo, new.modulo, new.situacion, new.rubrica);
+                END;
+            """)
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def guardar(self, situacion, rubrica, parametros, modelo, latencia=None, tokens_entrada=None,
+                tokens_salida=None):
+        """Guarda una generación y devuelve su id"""
+
+        with self._conexion() as conn:
+            cursor = conn.execute(
+                "INSERT INTO documentos (creado, nivel, ciclo, modulo, titulo, modelo, latencia, tokens_entrada, "
+                "tokens_salida, parametros, situacion, rubrica) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    time.time(),
+                    parametros.get("nivel", ""),
+                    parametros.get("ciclo", ""),
+                    parametros.get("modulo", ""),
+                    extraer_titulo(situacion),
+                    modelo,
+                    latencia,
+                    tokens_entrada,
+                    tokens_salida,
+                    json.dumps(parametros, ensure_ascii=False, default=str),
+                    situacion,
+                    rubrica,
+                )
+            )
+        return cursor.lastrowid
+
+    def buscar(self, situacion, rubrica, parametros):
+        """Id del documento más reciente de ese módulo con los mismos textos, o None.
+
+        Sirve para no duplicar una generación que ha salido entera de la caché de respuestas.
+        """
+
+        fila = self._conexion().execute(
+            "SELECT id FROM documentos WHERE ciclo = ? AND modulo = ? AND situacion = ? AND rubrica = ? "
+            "ORDER BY creado DESC, id DESC LIMIT 1",
+            (parametros.get("ciclo", ""), parametros.get("modulo", ""), situacion, rubrica)
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def actualizar(self, documento_id, situacion, rubrica, tokens_entrada=None, tokens_salida=None):
+        """Sustituye los textos de una generación (p. ej. tras regenerar un apartado).
+
+        Los tokens se suman a los de la generación original.
+        """
+
+        with self._conexion() as conn:
+            conn.execute(
+                "UPDATE documentos SET titulo = ?, situacion = ?, rubrica = ?, "
+                "tokens_entrada = COALESCE(tokens_entrada, 0) + ?, tokens_salida = COALESCE(tokens_salida, 0) + ? "
+                "WHERE id = ?",
+                (extraer_titulo(situacion), situacion, rubrica, tokens_entrada or 0, tokens_salida or 0, documento_id)
+            )
+
+    def _filtros(self, ciclo, modulo, texto):
+        condiciones = []
+        argumentos = []
+        if ciclo:
+            condiciones.append("documentos.ciclo = ?")
+            argumentos.append(ciclo)
+        if modulo:
+            condiciones.append("documentos.modulo = ?")
+            argumentos.append(modulo)
+        consulta = consulta_fts(texto or "")
+        if consulta:
+            condiciones.append("documentos.id IN (SELECT rowid FROM documentos_fts WHERE documentos_fts MATCH ?)")
+            argumentos.append(consulta)
+        donde = (" WHERE " + " AND ".join(condiciones)) if condiciones else ""
+        return donde, argumentos
+
+    def listar(self, pagina=0, por_pagina=20, ciclo=None, modulo=None, texto=None):
+        """Devuelve una página de EntradaHistorial (de la más reciente a la más antigua)"""
+
+        donde, argumentos = self._filtros(ciclo, modulo, texto)
+        filas = self._conexion().execute(
+            f"SELECT {_COLUMNAS_ENTRADA} FROM documentos{donde} ORDER BY creado DESC, id DESC LIMIT ? OFFSET ?",
+            (*argumentos, por_pagina, pagina * por_pagina)
+        ).fetchall()
+        return [EntradaHistorial(*fila) for fila in filas]
+
+    def contar(self, ciclo=None, modulo=None, texto=None):
+        donde, argumentos = self._filtros(ciclo, modulo, texto)
+        return self._conexion().execute(f"SELECT COUNT(*) FROM documentos{donde}", argumentos).fetchone()[0]
+
+    def ciclos(self):
+        """Ciclos con algún documento guardado, para el filtro del listado"""
+        return [fila[0] for fila in self._conexion().execute("SELECT DISTINCT ciclo FROM documentos ORDER BY ciclo")]
+
+    def modulos(self, ciclo=None):
+        if ciclo:
+            filas = self._conexion().execute(
+                "SELECT DISTINCT modulo FROM documentos WHERE ciclo = ? ORDER BY modulo", (ciclo,)
+            )
+        else:
+            filas = self._conexion().execute("SELECT DISTINCT modulo FROM documentos ORDER BY modulo")
+        return [fila[0] for fila in filas]
+
+    def ultimos_por_modulo(self, ciclo):
+        """EntradaHistorial más reciente de cada módulo del ciclo, ordenadas por módulo.
+
+        Es la programación del ciclo: si un módulo se generó varias veces vale la última.
+        """
+
+        filas = self._conexion().execute(
+            f"SELECT {_COLUMNAS_ENTRADA} FROM documentos AS d WHERE ciclo = ? AND id = ("
+            "SELECT id FROM documentos WHERE ciclo = d.ciclo AND modulo = d.modulo "
+            "ORDER BY creado DESC, id DESC LIMIT 1) ORDER BY modulo",
+            (ciclo,)
+        ).fetchall()
+        return [EntradaHistorial(*fila) for fila in filas]
+
+    def obtener(self, documento_id):
+        """Devuelve el DocumentoHistorial completo o None si no existe"""
+
+        fila = self._conexion().execute(
+            f"SELECT {_COLUMNAS_ENTRADA}, situacion, rubrica, parametros FROM documentos WHERE id = ?",
+            (documento_id,)
+        ).fetchone()
+        if fila is None:
+            return None
+        *resumen, situacion, rubrica, parametros = fila
+        return DocumentoHistorial(EntradaHistorial(*resumen), situacion, rubrica, json.loads(parametros))
+
+    def borrar(self, documento_id):
+        with self._conexion() as conn:
+            conn.execute("DELETE FROM documentos WHERE id = ?", (documento_id,))
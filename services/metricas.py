@@ -0,0 +1,247 @@
+"""Métricas del proceso: tiempos por etapa, tokens, coste, caché, reintentos y errores.
+
+GeminiService, LlamadaResiliente y el RenderizadorPDF registran aquí lo que hacen:
+
+    from services.metricas import metricas
+    with metricas.medir("prompt", tipo="situacion"):
+        ...
+    metricas.contar("gemini_tokens_total", 1200, tipo="situacion", clase="entrada")
+
+Las duraciones van a un histograma por etapa (formato de Prometheus) y además a una
+ventana de muestras recientes con la que la página de administración calcula p50 y
+p95 a lo largo del tiempo. a_prometheus() devuelve el texto de exposición de
+Prometheus; iniciar_exportadores() lo escribe cada pocos segundos en METRICAS_PATH
+(colector textfile de node_exporter) y lo sirve en /metrics si se define
+METRICAS_PUERTO. Cada proceso tiene sus propias métricas: las de los procesos del
+pool de PDF las recoge el proceso principal al terminar cada tarea.
+"""
+
+import atexit
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+PREFIJO = "fp_"
+
+# Límites (en segundos) de los cubos del histograma de duraciones
+CUBOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+DURACION = "etapa_duracion_segundos"
+
+AYUDA = {
+    DURACION: "Duración de cada etapa (prompt, gemini, render...)",
+    "errores_total": "Etapas terminadas con una excepción",
+    "gemini_tokens_total": "Tokens de Gemini según el usage_metadata de las respuestas",
+    "gemini_coste_dolares_total": "Coste estimado de las llamadas a Gemini en dólares",
+    "cache_respuestas_total": "Consultas a la caché de respuestas por resultado",
+    "coalescidas_total": "Peticiones servidas por una llamada idéntica de otra sesión",
+    "resiliencia_total": "Llamadas, reintentos, agotadas y rechazadas por el cortocircuito",
+}
+
+
+class Resumen:
+    __slots__ = ("n", "p50", "p95", "media")
+
+    def __init__(self, n, p50, p95, media):
+        self.n = n
+        self.p50 = p50
+        self.p95 = p95
+        self.media = media
+
+    def __repr__(self):
+        return f"Resumen(n={self.n}, p50={self.p50:.3f}, p95={self.p95:.3f})"
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    return ordenados[max(0, math.ceil(p * len(ordenados)) - 1)]
+
+
+def _resumir(valores):
+    ordenados = sorted(valores)
+    return Resumen(len(ordenados), percentil(ordenados, 0.5), percentil(ordenados, 0.95),
+                   sum(ordenados) / len(ordenados))
+
+
+def _etiquetas(etiquetas):
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _texto_etiquetas(etiquetas, extra=()):
+    pares = [*etiquetas, *extra]
+    if not pares:
+        return ""
+    valores = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pares)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pares, valores)) + "}"
+
+
+class Metricas:
+    """Contadores e histogramas del proceso, seguros entre hilos.
+
+    max_muestras acota la ventana de duraciones recientes (unas horas de uso normal);
+    los histogramas y contadores son acumulados desde el arranque, como en Prometheus.
+    """
+
+    def __init__(self, max_muestras=20000):
+        self._lock = threading.Lock()
+        self._contadores = defaultdict(float)
+        # (etiquetas) -> [cuentas por cubo..., +Inf], suma
+        self._histogramas = {}
+        # (instante, etiquetas, segundos) de las duraciones recientes
+        self._muestras = deque(maxlen=max_muestras)
+        self._exportadores = False
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        with self._lock:
+            self._contadores[(nombre, _etiquetas(etiquetas))] += valor
+
+    def observar(self, etapa, segundos, **etiquetas):
+        """Registra la duración de una etapa"""
+        clave = _etiquetas({"etapa": etapa, **etiquetas})
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = [[0] * (len(CUBOS) + 1), 0.0]
+            cubos, _ = histograma
+            for i, limite in enumerate(CUBOS):
+                if segundos <= limite:
+                    cubos[i] += 1
+                    break
+            else:
+                cubos[-1] += 1
+            histograma[1] += segundos
+            self._muestras.append((time.time(), clave, segundos))
+
+    @contextmanager
+    def medir(self, etapa, **etiquetas):
+        """Mide el bloque como una etapa; si lanza una excepción la cuenta como error"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.contar("errores_total", etapa=etapa, error=type(e).__name__, **etiquetas)
+            raise
+        self.observar(etapa, time.perf_counter() - inicio, **etiquetas)
+
+    def contadores(self):
+        """{(nombre, ((etiqueta, valor), ...)): valor} de todos los contadores"""
+        with self._lock:
+            return dict(self._contadores)
+
+    def _recientes(self, desde):
+        with self._lock:
+            muestras = list(self._muestras)
+        return [m for m in muestras if desde is None or m[0] >= desde]
+
+    def percentiles(self, desde=None):
+        """{etiquetas: Resumen} de las duraciones recientes, por etapa y etiquetas"""
+        grupos = defaultdict(list)
+        for _, clave, segundos in self._recientes(desde):
+            grupos[clave].append(segundos)
+        return {clave: _resumir(valores) for clave, valores in grupos.items()}
+
+    def serie(self, etapa, intervalo=60, desde=None):
+        """[(inicio del intervalo, Resumen)] de una etapa (todas sus etiquetas juntas)"""
+        grupos = defaultdict(list)
+        for instante, clave, segundos in self._recientes(desde):
+            if dict(clave)["etapa"] == etapa:
+                grupos[instante // intervalo * intervalo].append(segundos)
+        return [(inicio, _resumir(grupos[inicio])) for inicio in sorted(grupos)]
+
+    def a_prometheus(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted((clave, (list(cubos), suma)) for clave, (cubos, suma) in self._histogramas.items())
+
+        lineas = []
+        nombre = PREFIJO + DURACION
+        if histogramas:
+            lineas += [f"# HELP {nombre} {AYUDA[DURACION]}", f"# TYPE {nombre} histogram"]
+        for clave, (cubos, suma) in histogramas:
+            acumulado = 0
+            for limite, cuenta in zip((*CUBOS, "+Inf"), cubos):
+                acumulado += cuenta
+                lineas.append(f"{nombre}_bucket{_texto_etiquetas(clave, (('le', limite),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_texto_etiquetas(clave)} {suma:.6f}")
+            lineas.append(f"{nombre}_count{_texto_etiquetas(clave)} {acumulado}")
+
+        anterior = None
+        for (nombre, clave), valor in contadores:
+            if nombre != anterior:
+                lineas += [f"# HELP {PREFIJO}{nombre} {AYUDA.get(nombre, nombre)}", f"# TYPE {PREFIJO}{nombre} counter"]
+                anterior = nombre
+            # Precisión completa: con :g un contador de tokens pasa a 1.23497e+06 y rate() va a saltos
+            lineas.append(f"{PREFIJO}{nombre}{_texto_etiquetas(clave)} {format(valor, '.17g')}")
+        return "\n".join(lineas) + "\n"
+
+    def exportar(self, ruta):
+        """Escribe a_prometheus() en ruta de forma atómica"""
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as file:
+            file.write(self.a_prometheus())
+        os.replace(temporal, ruta)
+
+    def iniciar_exportadores(self):
+        """Arranca (una sola vez) los exportadores configurados por variables de entorno.
+
+        METRICAS_PATH: archivo que se reescribe cada METRICAS_INTERVALO segundos (15).
+        METRICAS_PUERTO: servidor HTTP con el texto de Prometheus en /metrics, escuchando en
+        METRICAS_HOST (127.0.0.1; 0.0.0.0 solo si Prometheus está en otra máquina y la red lo protege).
+        """
+        with self._lock:
+            if self._exportadores:
+                return
+            self._exportadores = True
+
+        ruta = os.getenv("METRICAS_PATH")
+        if ruta:
+            intervalo = float(os.getenv("METRICAS_INTERVALO", "15"))
+
+            def escribir():
+                while True:
+                    time.sleep(intervalo)
+                    self.exportar(ruta)
+
+            threading.Thread(target=escribir, name="metricas-archivo", daemon=True).start()
+            # La última escritura recoge lo ocurrido desde la anterior
+            atexit.register(self.exportar, ruta)
+
+        puerto = os.getenv("METRICAS_PUERTO")
+        if puerto:
+            servidor = crear_servidor(self, int(puerto), os.getenv("METRICAS_HOST", "127.0.0.1"))
+            threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+            self._muestras.clear()
+
+
+def crear_servidor(registro_metricas, puerto, host="127.0.0.1"):
+    """ThreadingHTTPServer que responde a GET /metrics con el texto de Prometheus"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            cuerpo = registro_metricas.a_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, puerto), Manejador)
+
+
+metricas = Metricas()
@@ -1,189 +1,291 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
 import io
-from datetime import datetime
-import re
+from functools import lru_cache
 
-def generate_pdf(situacion_content, rubrica_content, parametros):
-    """Genera un PDF con la situación de aprendizaje y rúbrica"""
-    
-    # Crear buffer en memoria
-    buffer = io.BytesIO()
-    
-    # Crear documento PDF
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=18
-    )
-    
-    # Obtener estilos
-    styles = getSampleStyleSheet()
-    
-    # Estilos personalizados
-    title_style = ParagraphStyle(
+# El modelo de bloques se comparte con la exportación a Word (services.docx_generator)
+from services.documento import (
+    CODIGO, CURSIVA, HUECO, NEGRITA, NUMERADO, PIE, SALTO, SEPARADOR, SUBTITULO, TABLA, TITULO,
+    TITULO_RUBRICA, TITULO_SITUACION, VINETA, bloques, bloques_markdown, datos_generales,
+)
+
+# reportlab se importa dentro de las funciones: la mayoría de sesiones nunca exportan
+# a PDF y así no pagan su tiempo de importación al arrancar la app
+
+@lru_cache(maxsize=None)
+def _estilos():
+    """Registro de estilos del PDF, construido una sola vez por proceso.
+
+    Los ParagraphStyle y TableStyle son de solo lectura durante el renderizado, así que
+    se pueden compartir entre exportaciones e hilos.
+    """
+    from reportlab.platypus import TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+
+    base = getSampleStyleSheet()
+
+    title = ParagraphStyle(
         'CustomTitle',
-        parent=styles['Heading1'],
+        parent=base['Heading1'],
         fontSize=18,
         spaceAfter=30,
         alignment=TA_CENTER,
         textColor=colors.HexColor('#1f77b4')
     )
-    
-    subtitle_style = ParagraphStyle(
+
+    subtitle = ParagraphStyle(
         'CustomSubtitle',
-        parent=styles['Heading2'],
+        parent=base['Heading2'],
         fontSize=14,
         spaceAfter=12,
         textColor=colors.HexColor('#2c3e50')
     )
-    
-    normal_style = ParagraphStyle(
+
+    normal = ParagraphStyle(
         'CustomNormal',
-        parent=styles['Normal'],
+        parent=base['Normal'],
         fontSize=10,
         spaceAfter=6,
         alignment=TA_JUSTIFY
     )
-    
+
+    return {
+        'title': title,
+        'subtitle': subtitle,
+        'normal': normal,
+        'h3': ParagraphStyle(
+            'H3Style',
+            parent=subtitle,
+            fontSize=12,
+            spaceAfter=8
+        ),
+        'h4': ParagraphStyle(
+            'H4Style',
+            parent=normal,
+            fontSize=11,
+            fontName='Helvetica-Bold',
+            spaceAfter=6
+        ),
+        'lista': ParagraphStyle(
+            'ListStyle',
+            parent=normal,
+            leftIndent=14,
+            bulletIndent=2,
+            spaceAfter=3
+        ),
+        'lista_anidada': ParagraphStyle(
+            'NestedListStyle',
+            parent=normal,
+            leftIndent=28,
+            bulletIndent=16,
+            spaceAfter=3
+        ),
+        'celda': ParagraphStyle(
+            'CellStyle',
+            parent=base['Normal'],
+            fontSize=8,
+            leading=10
+        ),
+        'celda_cabecera': ParagraphStyle(
+            'HeaderCellStyle',
+            parent=base['Normal'],
+            fontSize=8,
+            leading=10,
+            fontName='Helvetica-Bold',
+            textColor=colors.white
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=base['Normal'],
+            fontSize=8,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#7f8c8d')
+        ),
+        'info_table': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f4fd')),
+            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2c3e50')),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#bdc3c7')),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 4),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]),
+        'markdown_table': TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 4),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+            ('TOPPADDING', (0, 0), (-1, -1), 3),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ]),
+        'markdown_table_header': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+            ('BACKGROUND', (0, 1), (0, -1), colors.HexColor('#e8f4fd')),
+        ]),
+    }
+
+def generate_pdf(situacion_content, rubrica_content, parametros):
+    """Genera un PDF con la situación de aprendizaje y rúbrica.
+
+    Cada contenido puede ser Markdown o el documento del modo estructurado
+    (services.estructura.Situacion o Rubrica).
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, PageBreak
+    from reportlab.lib.units import inch
+
+    estilos = _estilos()
+
+    # Crear buffer en memoria
+    buffer = io.BytesIO()
+
+    # Crear documento PDF
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=18
+    )
+
     # Lista de elementos del documento
     story = []
-    
+
     # Título principal
-    story.append(Paragraph("SITUACIÓN DE APRENDIZAJE", title_style))
-    story.append(Paragraph("Formación Profesional Sanitaria - Aragón", subtitle_style))
+    story.append(Paragraph(TITULO_SITUACION, estilos['title']))
+    story.append(Paragraph(SUBTITULO, estilos['subtitle']))
     story.append(Spacer(1, 20))
-    
+
     # Información del ciclo
-    info_data = [
-        ['Ciclo Formativo:', f"{parametros.get('nivel', '')} - {parametros.get('ciclo', '')}"],
-        ['Módulo:', parametros.get('modulo', '')],
-        ['Metodología:', parametros.get('metodologia', '')],
-        ['Duración:', parametros.get('duracion', '')],
-        ['Fecha de generación:', datetime.now().strftime('%d/%m/%Y %H:%M')]
-    ]
-    
+    info_data = datos_generales(parametros)
+
     info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f4fd')),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2c3e50')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#bdc3c7')),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-    ]))
-    
+    info_table.setStyle(estilos['info_table'])
+
     story.append(info_table)
     story.append(Spacer(1, 20))
-    
-    # Convertir el contenido markdown a párrafos para PDF
-    story.extend(_markdown_to_paragraphs(situacion_content, styles, normal_style, subtitle_style))
-    
+
+    # Convertir el contenido (Markdown o documento estructurado) a flowables para PDF
+    story.extend(contenido_to_flowables(situacion_content, doc.width))
+
     # Nueva página para la rúbrica
-    from reportlab.platypus import PageBreak
     story.append(PageBreak())
-    
+
     # Título de la rúbrica
-    story.append(Paragraph("RÚBRICA DE EVALUACIÓN", title_style))
+    story.append(Paragraph(TITULO_RUBRICA, estilos['title']))
     story.append(Spacer(1, 20))
-    
+
     # Convertir rúbrica
-    story.extend(_markdown_to_paragraphs(rubrica_content, styles, normal_style, subtitle_style))
-    
+    story.extend(contenido_to_flowables(rubrica_content, doc.width))
+
     # Footer
     story.append(Spacer(1, 30))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#7f8c8d')
-    )
-    
-    story.append(Paragraph(
-        "Gobierno de Aragón - Departamento de Educación, Cultura y Deporte<br/>Generado con Asistente IA para FP Sanitaria",
-        footer_style
-    ))
-    
+    story.append(Paragraph("<br/>".join(PIE), estilos['footer']))
+
     # Construir PDF
     doc.build(story)
-    
+
     # Obtener el contenido del buffer
     pdf_content = buffer.getvalue()
     buffer.close()
-    
+
     return pdf_content
 
-def _markdown_to_paragraphs(markdown_content, styles, normal_style, subtitle_style):
-    """Convierte contenido markdown básico a párrafos de ReportLab"""
-    
-    paragraphs = []
-    lines = markdown_content.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        
-        if not line:
-            paragraphs.append(Spacer(1, 6))
-            continue
-            
-        # Títulos con #
-        if line.startswith('# '):
-            title_text = line[2:].strip()
-            paragraphs.append(Paragraph(title_text, subtitle_style))
-            paragraphs.append(Spacer(1, 12))
-            
-        elif line.startswith('## '):
-            subtitle_text = line[3:].strip()
-            h3_style = ParagraphStyle(
-                'H3Style',
-                parent=subtitle_style,
-                fontSize=12,
-                spaceAfter=8
-            )
-            paragraphs.append(Paragraph(subtitle_text, h3_style))
-            
-        elif line.startswith('### '):
-            h4_text = line[4:].strip()
-            h4_style = ParagraphStyle(
-                'H4Style',
-                parent=normal_style,
-                fontSize=11,
-                fontName='Helvetica-Bold',
-                spaceAfter=6
-            )
-            paragraphs.append(Paragraph(h4_text, h4_style))
-            
-        elif line.startswith('- '):
-            # Lista con viñetas
-            bullet_text = line[2:].strip()
-            paragraphs.append(Paragraph(f"• {bullet_text}", normal_style))
-            
-        elif line.startswith('**') and line.endswith('**'):
-            # Texto en negrita
-            bold_text = line[2:-2]
-            bold_style = ParagraphStyle(
-                'BoldStyle',
-                parent=normal_style,
-                fontName='Helvetica-Bold'
-            )
-            paragraphs.append(Paragraph(bold_text, bold_style))
-            
+def _escapar(texto):
+    return texto.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def _texto_seguro(texto):
+    """Escapa el texto para el mini-HTML de ReportLab conservando los saltos <br>"""
+    return '<br/>'.join(_escapar(parte) for parte in SALTO.split(texto))
+
+def _markup(texto):
+    """Convierte el formato en línea de Markdown (negrita, cursiva, código, <br>) al de ReportLab"""
+    texto = _texto_seguro(texto)
+    texto = CODIGO.sub(r'<font face="Courier">\1</font>', texto)
+    texto = NEGRITA.sub(lambda m: f"<b>{m.group(1) or m.group(2)}</b>", texto)
+    return CURSIVA.sub(lambda m: f"<i>{m.group(1) or m.group(2)}</i>", texto)
+
+def _tabla(filas, cabecera, ancho, estilos):
+    """Crea una Table de ReportLab que repite la cabecera y se parte entre páginas por filas"""
+    from reportlab.platypus import Paragraph, Table
+
+    columnas = max(len(fila) for fila in filas)
+    datos = []
+    for i, fila in enumerate(filas):
+        estilo = estilos['celda_cabecera'] if cabecera and i == 0 else estilos['celda']
+        celdas = fila + [''] * (columnas - len(fila))
+        datos.append([Paragraph(_markup(celda), estilo) for celda in celdas])
+
+    tabla = Table(
+        datos,
+        colWidths=[ancho / columnas] * columnas,
+        repeatRows=1 if cabecera else 0,
+        splitByRow=1,
+        hAlign='LEFT'
+    )
+    tabla.setStyle(estilos['markdown_table'])
+    if cabecera:
+        tabla.setStyle(estilos['markdown_table_header'])
+    return tabla
+
+def bloques_to_flowables(bloques, ancho=None):
+    """Convierte bloques de services.documento a flowables de ReportLab en una sola pasada.
+
+    Usa el registro de estilos compartido (nunca crea estilos por línea) y convierte las
+    tablas en Table reales. ancho es el ancho útil de la página en puntos.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import Paragraph, Spacer
+    from reportlab.platypus.flowables import HRFlowable
+
+    estilos = _estilos()
+    if ancho is None:
+        ancho = A4[0] - 144
+    estilos_titulo = {1: estilos['subtitle'], 2: estilos['h3'], 3: estilos['h4'], 4: estilos['h4']}
+    estilos_lista = (estilos['lista'], estilos['lista_anidada'])
+
+    flowables = []
+
+    for bloque in bloques:
+        tipo = bloque[0]
+
+        if tipo == HUECO:
+            flowables.append(Spacer(1, 6))
+
+        elif tipo == TITULO:
+            flowables.append(Paragraph(_markup(bloque[2]), estilos_titulo[bloque[1]]))
+            if bloque[1] == 1:
+                flowables.append(Spacer(1, 12))
+
+        elif tipo == VINETA:
+            flowables.append(Paragraph(_markup(bloque[2]), estilos_lista[bloque[1]], bulletText='•'))
+
+        elif tipo == NUMERADO:
+            flowables.append(Paragraph(_markup(bloque[3]), estilos_lista[bloque[1]], bulletText=f"{bloque[2]}."))
+
+        elif tipo == TABLA:
+            flowables.append(_tabla(bloque[1], bloque[2], ancho, estilos))
+            flowables.append(Spacer(1, 6))
+
+        elif tipo == SEPARADOR:
+            flowables.append(HRFlowable(width='100%', thickness=0.5, color=colors.HexColor('#bdc3c7'),
+                                        spaceBefore=4, spaceAfter=4))
+
         else:
-            # Texto normal
-            if len(line) > 0:
-                paragraphs.append(Paragraph(line, normal_style))
-    
-    return paragraphs
+            flowables.append(Paragraph(_markup(bloque[1]), estilos['normal']))
+
+    return flowables
+
+def markdown_to_flowables(markdown_content, ancho=None):
+    """Convierte Markdown a flowables de ReportLab"""
+    return bloques_to_flowables(bloques_markdown(markdown_content), ancho)
+
+def contenido_to_flowables(contenido, ancho=None):
+    """Flowables de un contenido en Markdown o de un documento de services.estructura"""
+    return bloques_to_flowables(bloques(contenido), ancho)
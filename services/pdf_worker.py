@@ -0,0 +1,291 @@
+"""Renderizado de PDF (y DOCX) en segundo plano con caché de artefactos por contenido.
+
+generate_pdf tarda decenas de milisegundos por página y, dentro de un rerun de
+Streamlit, bloquea la interfaz. Aquí se encarga a un pool de procesos (el GIL no
+frena a ReportLab y un fallo del renderizador no tumba la app) y el resultado se
+guarda en disco con el hash de su contenido como nombre. Así el mismo documento
+se renderiza una sola vez aunque lo pidan varias sesiones o varios reruns.
+
+La exportación a Word (services.docx_generator) usa el mismo pool y la misma caché:
+cada formato es un artefacto distinto con su propia clave.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from services.metricas import metricas
+
+# Subir al cambiar el aspecto de los PDF: invalida los artefactos ya renderizados
+RENDER_VERSION = "2"
+
+PDF = "pdf"
+DOCX = "docx"
+
+PENDIENTE = "pendiente"
+LISTO = "listo"
+ERROR = "error"
+
+# Encargos cuyos datos se recuerdan para volver a renderizar un artefacto expulsado de la caché
+ENCARGOS_RECORDADOS = 64
+
+
+def _serializable(valor):
+    # Los documentos del modo estructurado (services.estructura) se identifican por su JSON
+    a_json = getattr(valor, "a_json", None)
+    return {"tipo": type(valor).__name__, "json": a_json()} if a_json else str(valor)
+
+
+def clave_artefacto(situacion, rubrica, parametros, formato="pdf"):
+    """Hash del contenido que determina el documento exportado"""
+
+    contenido = {
+        "formato": formato,
+        "version": RENDER_VERSION,
+        "situacion": situacion,
+        "rubrica": rubrica,
+        "parametros": parametros,
+    }
+    serializado = json.dumps(contenido, sort_keys=True, ensure_ascii=False, default=_serializable)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+
+class ArtefactoCache:
+    """Directorio de artefactos direccionados por contenido (<clave>.<formato>).
+
+    Las escrituras son atómicas (os.replace), así que varios procesos pueden escribir
+    y leer a la vez sin ver nunca un archivo a medias. Si se supera max_bytes se
+    eliminan los artefactos menos usados según su fecha de acceso.
+    """
+
+    def __init__(self, directorio, max_bytes=500 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        os.makedirs(directorio, exist_ok=True)
+
+    def ruta(self, clave, formato="pdf"):
+        return os.path.join(self.directorio, f"{clave}.{formato}")
+
+    def obtener(self, clave, formato="pdf"):
+        """Devuelve los bytes del artefacto o None si todavía no existe"""
+
+        ruta = self.ruta(clave, formato)
+        try:
+            with open(ruta, "rb") as file:
+                contenido = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # Se marca como usado para la expulsión LRU
+            os.utime(ruta)
+        except OSError:
+            pass
+        return contenido
+
+    def guardar(self, clave, contenido, formato="pdf"):
+        ruta = self.ruta(clave, formato)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as file:
+            file.write(contenido)
+        os.replace(temporal, ruta)
+        self._expulsar()
+        return ruta
+
+    def _expulsar(self):
+        artefactos = []
+        total = 0
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith(".tmp") or not entrada.is_file():
+                    continue
+                estado = entrada.stat()
+                artefactos.append((estado.st_mtime, estado.st_size, entrada.path))
+                total += estado.st_size
+        if total <= self.max_bytes:
+            return
+
+        for _, tamano, ruta in sorted(artefactos):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except FileNotFoundError:
+                pass
+
+
+def _generar(situacion, rubrica, parametros, formato=PDF):
+    if formato == DOCX:
+        from services.docx_generator import generate_docx as generar
+    else:
+        from services.pdf_generator import generate_pdf as generar
+    return generar(situacion, rubrica, parametros)
+
+
+def _renderizar(situacion, rubrica, parametros, directorio, max_bytes, clave, formato=PDF):
+    """Tarea del proceso hijo: genera el documento y lo deja en la caché de artefactos"""
+    inicio = time.perf_counter()
+    contenido = _generar(situacion, rubrica, parametros, formato)
+    segundos = time.perf_counter() - inicio
+    ArtefactoCache(directorio, max_bytes).guardar(clave, contenido, formato)
+    # Las métricas de este proceso se pierden: el tiempo se devuelve para registrarlo en el principal
+    return segundos
+
+
+class RenderizadorPDF:
+    """Pool de procesos que renderiza los PDF y los DOCX y los guarda en una ArtefactoCache.
+
+    solicitar() devuelve enseguida la clave del artefacto; varias peticiones del mismo
+    contenido comparten la misma tarea. El pool se crea en la primera petición.
+    estado() y obtener() tienen que recibir el formato con el que se solicitó.
+    """
+
+    def __init__(self, cache, procesos=2):
+        self.cache = cache
+        self.procesos = procesos
+        self._executor = None
+        # Reentrante: add_done_callback ejecuta la función en el acto si la tarea ya terminó
+        self._lock = threading.RLock()
+        # clave -> Future de las tareas en curso o terminadas con error
+        self._tareas = {}
+        # clave -> (situacion, rubrica, parametros, formato) de los últimos encargos
+        self._encargos = OrderedDict()
+
+    def _pool(self):
+        if self._executor is None:
+            import multiprocessing
+
+            # spawn: el servidor de Streamlit tiene muchos hilos y hacer fork con ellos es inseguro
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.procesos, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def solicitar(self, situacion, rubrica, parametros, reintentar=False, formato=PDF):
+        """Encarga el documento si no está ya en caché ni en curso y devuelve su clave.
+
+        Una tarea fallida no se repite en cada rerun salvo que se pida con reintentar=True.
+        """
+
+        clave = clave_artefacto(situacion, rubrica, parametros, formato)
+        with self._lock:
+            self._encargos[clave] = (situacion, rubrica, parametros, formato)
+            self._encargos.move_to_end(clave)
+            while len(self._encargos) > ENCARGOS_RECORDADOS:
+                self._encargos.popitem(last=False)
+        if os.path.exists(self.cache.ruta(clave, formato)):
+            return clave
+
+        with self._lock:
+            tarea = self._tareas.get(clave)
+            if tarea is not None and (not reintentar or not tarea.done() or tarea.exception() is None):
+                return clave
+            try:
+                tarea = self._pool().submit(
+                    _renderizar, situacion, rubrica, parametros, self.cache.directorio, self.cache.max_bytes, clave,
+                    formato
+                )
+            except BrokenProcessPool:
+                # Un proceso hijo murió (p. ej. por memoria): se recrea el pool y se reintenta
+                self._executor = None
+                tarea = self._pool().submit(
+                    _renderizar, situacion, rubrica, parametros, self.cache.directorio, self.cache.max_bytes, clave,
+                    formato
+                )
+            self._tareas[clave] = tarea
+            encargada = time.perf_counter()
+            tarea.add_done_callback(lambda t: self._terminada(clave, t, formato, encargada))
+        return clave
+
+    def _terminada(self, clave, tarea, formato, encargada):
+        if tarea.cancelled():
+            with self._lock:
+                self._tareas.pop(clave, None)
+            return
+        error = tarea.exception()
+        if error is not None:
+            metricas.contar("errores_total", etapa="render", error=type(error).__name__, formato=formato)
+            return
+        # render es lo que tarda el proceso hijo; render_total incluye la espera en la cola del pool
+        metricas.observar("render", tarea.result(), formato=formato)
+        metricas.observar("render_total", time.perf_counter() - encargada, formato=formato)
+        # Las tareas correctas ya están en disco; solo se recuerdan las fallidas
+        with self._lock:
+            self._tareas.pop(clave, None)
+
+    def estado(self, clave, formato=PDF):
+        """PENDIENTE, LISTO, ERROR o None si nunca se ha solicitado"""
+
+        if os.path.exists(self.cache.ruta(clave, formato)):
+            return LISTO
+        with self._lock:
+            tarea = self._tareas.get(clave)
+        if tarea is None:
+            return None
+        if not tarea.done():
+            return PENDIENTE
+        return ERROR if tarea.exception() is not None else LISTO
+
+    def error(self, clave):
+        with self._lock:
+            tarea = self._tareas.get(clave)
+        if tarea is None or not tarea.done():
+            return None
+        return tarea.exception()
+
+    def esperar(self, clave, espera=None, formato=PDF):
+        """Espera a que termine la tarea (como mucho `espera` segundos) y devuelve su estado"""
+
+        with self._lock:
+            tarea = self._tareas.get(clave)
+        if tarea is not None:
+            try:
+                tarea.exception(timeout=espera)
+            except (TimeoutError, CancelledError):
+                pass
+        return self.estado(clave, formato)
+
+    def obtener(self, clave, espera=0, formato=PDF):
+        """Devuelve los bytes del documento, esperando hasta `espera` segundos si está en curso.
+
+        Si el artefacto ya estaba listo pero la caché lo ha expulsado, se vuelve a
+        renderizar en este proceso a partir de los datos con los que se solicitó.
+        """
+
+        limite = time.monotonic() + espera
+        while True:
+            contenido = self.cache.obtener(clave, formato)
+            if contenido is not None:
+                return contenido
+            estado = self.estado(clave, formato)
+            if estado != PENDIENTE:
+                # Puede haber terminado justo después de la primera lectura
+                contenido = self.cache.obtener(clave, formato)
+                if contenido is None and estado != ERROR:
+                    contenido = self._renderizar_de_nuevo(clave)
+                return contenido
+            if time.monotonic() >= limite:
+                return None
+            time.sleep(0.05)
+
+    def _renderizar_de_nuevo(self, clave):
+        with self._lock:
+            encargo = self._encargos.get(clave)
+        if encargo is None:
+            return None
+        situacion, rubrica, parametros, formato = encargo
+        with metricas.medir("render", formato=formato):
+            contenido = _generar(situacion, rubrica, parametros, formato)
+        self.cache.guardar(clave, contenido, formato)
+        return contenido
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
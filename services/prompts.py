@@ -0,0 +1,553 @@
+"""Construcción de los prompts de Gemini con presupuesto de tokens de entrada.
+
+Las plantillas se compilan una sola vez al importar el módulo (texto sin sangría,
+string.Template y tokens de la parte fija ya contados). Cada prompt se mide
+localmente con contar_tokens, una estimación que no llama a la API, y se ajusta a
+GEMINI_PRESUPUESTO_TOKENS: primero se recorta el texto libre del contexto y, si
+aun así no cabe, se lanza PresupuestoExcedidoError.
+
+Cada prompt se devuelve como un Prompt con las instrucciones fijas de su tipo
+(rol, normativa, estructura y requisitos) separadas de la petición con los datos:
+GeminiService envía las instrucciones como system instruction o desde la caché de
+contexto de Gemini y solo la petición como contenido.
+
+La rúbrica que se genera a partir de una situación completa no recibe los primeros
+caracteres de la situación, sino sus secciones más relevantes para los RA, los CE
+y el producto final, enteras y con su título, hasta llenar el hueco del extracto.
+"""
+
+import os
+import re
+import string
+import textwrap
+
+from utils.curriculum_search import normalizar, tokenizar
+
+# Tokens de entrada máximos por prompt (estimados con contar_tokens)
+PRESUPUESTO_TOKENS = int(os.getenv("GEMINI_PRESUPUESTO_TOKENS", "4000"))
+
+# Tokens máximos del extracto de la situación que acompaña al prompt de la rúbrica
+TOKENS_EXTRACTO = 700
+
+# Por debajo de este hueco no merece la pena incluir una sección recortada
+TOKENS_MINIMOS_SECCION = 60
+
+MARCA_RECORTE = "[…]"
+
+# Peso de cada sección de la situación para la rúbrica según su título (sin acentos)
+PESOS_SECCION = (
+    ("resultados de aprendizaje", 3.0),
+    ("evaluacion", 3.0),
+    ("producto final", 2.5),
+    ("secuencia", 2.0),
+    ("objetivos", 1.5),
+    ("metodologia", 1.0),
+    ("saberes", 1.0),
+    ("contextualizacion", 0.8),
+    ("identificacion", 0.5),
+    ("recursos", 0.3),
+    ("bibliografia", 0.1),
+    ("anexo", 0.1),
+)
+PESO_SECCION_DEFECTO = 0.5
+
+_PIEZAS = re.compile(r"\w+|[^\w\s]+|\s+")
+
+
+class PresupuestoExcedidoError(ValueError):
+    """El prompt no cabe en el presupuesto de tokens ni recortando las partes recortables"""
+
+    def __init__(self, tipo, tokens, presupuesto):
+        super().__init__(
+            f"El prompt de {tipo} ocupa unos {tokens} tokens y el máximo es {presupuesto}. "
+            "Selecciona menos resultados de aprendizaje, criterios o competencias."
+        )
+        self.tokens = tokens
+        self.presupuesto = presupuesto
+
+
+def contar_tokens(texto):
+    """Estimación local de los tokens de Gemini (SentencePiece) de un texto.
+
+    Una palabra cuenta un token por cada 4 caracteres, los signos uno por cada 2 y
+    cada salto de línea o sangría uno; el espacio simple entre palabras no cuenta.
+    En los prompts en español da valores cercanos a los de count_tokens de la API.
+    """
+
+    tokens = 0
+    for pieza in _PIEZAS.findall(texto):
+        if pieza[0].isspace():
+            if pieza != " ":
+                tokens += max(1, pieza.count("\n"))
+        elif pieza[0].isalnum() or pieza[0] == "_":
+            tokens += (len(pieza) + 3) // 4
+        else:
+            tokens += (len(pieza) + 1) // 2
+    return tokens
+
+
+def recortar(texto, max_tokens):
+    """Recorta el texto para que quepa en max_tokens sin partir títulos ni palabras.
+
+    Se conservan líneas completas; de la primera que no cabe se conservan las palabras
+    que quepan, salvo que sea un título. El recorte se señala con MARCA_RECORTE.
+    """
+
+    if contar_tokens(texto) <= max_tokens:
+        return texto
+    lineas = []
+    usados = contar_tokens(MARCA_RECORTE) + 1
+    for linea in texto.splitlines():
+        tokens = contar_tokens(linea) + 1
+        if usados + tokens <= max_tokens:
+            lineas.append(linea)
+            usados += tokens
+            continue
+        if not linea.startswith("#"):
+            palabras = []
+            for palabra in linea.split(" "):
+                tokens = contar_tokens(palabra) + 1
+                if usados + tokens > max_tokens:
+                    break
+                palabras.append(palabra)
+                usados += tokens
+            if palabras:
+                lineas.append(" ".join(palabras))
+        break
+    if not "".join(lineas).strip():
+        return ""
+    return "\n".join(lineas) + " " + MARCA_RECORTE
+
+
+class Prompt:
+    """Prompt dividido en instrucciones fijas (iguales en todas las llamadas de su tipo) y petición"""
+
+    __slots__ = ("tipo", "instrucciones", "peticion")
+
+    def __init__(self, tipo, instrucciones, peticion):
+        self.tipo = tipo
+        self.instrucciones = instrucciones
+        self.peticion = peticion
+
+    def __str__(self):
+        return f"{self.instrucciones}\n\n{self.peticion}"
+
+    def __repr__(self):
+        return f"Prompt({self.tipo}, {contar_tokens(str(self))} tokens)"
+
+
+class Plantilla:
+    """Plantilla compilada: instrucciones fijas sin sangría y string.Template de la petición.
+
+    Las instrucciones no tienen huecos, así que se pueden enviar como system
+    instruction o guardar en la caché de contexto de Gemini (services.cache_contexto).
+    """
+
+    def __init__(self, tipo, instrucciones, peticion):
+        self.tipo = tipo
+        self.instrucciones = textwrap.dedent(instrucciones).strip()
+        self.plantilla = string.Template(textwrap.dedent(peticion).strip())
+        huecos = {nombre: "" for nombre in self.plantilla.get_identifiers()}
+        self.tokens_instrucciones = contar_tokens(self.instrucciones)
+        self.tokens_fijos = self.tokens_instrucciones + contar_tokens(self.plantilla.substitute(huecos)) + 1
+
+    def rellenar(self, presupuesto=None, recortables=(), **valores):
+        """Sustituye los huecos de la petición y ajusta el Prompt resultante al presupuesto.
+
+        recortables son los nombres de los huecos de texto libre que se pueden recortar,
+        por orden de preferencia, si el prompt no cabe.
+        """
+
+        presupuesto = presupuesto or PRESUPUESTO_TOKENS
+        peticion = self.plantilla.substitute(valores).strip()
+        tokens = self.tokens_instrucciones + contar_tokens(peticion) + 1
+        for nombre in recortables:
+            if tokens <= presupuesto:
+                break
+            exceso = tokens - presupuesto
+            valores[nombre] = recortar(valores[nombre], max(0, contar_tokens(valores[nombre]) - exceso))
+            peticion = self.plantilla.substitute(valores).strip()
+            tokens = self.tokens_instrucciones + contar_tokens(peticion) + 1
+        if tokens > presupuesto:
+            raise PresupuestoExcedidoError(self.tipo, tokens, presupuesto)
+        return Prompt(self.tipo, self.instrucciones, peticion)
+
+
+def _lista(elementos):
+    return "\n".join(f"- {e}" for e in elementos)
+
+
+def bloque_datos(datos, campos):
+    """Líneas «**Etiqueta:** valor» y listas de los campos con valor (los vacíos no se envían)"""
+
+    lineas = []
+    for campo, etiqueta in campos:
+        valor = datos.get(campo)
+        if not valor:
+            continue
+        if isinstance(valor, (list, tuple)):
+            lineas.append(f"**{etiqueta}:**\n{_lista(valor)}")
+        else:
+            lineas.append(f"**{etiqueta}:** {' '.join(str(valor).split())}")
+    return "\n".join(lineas)
+
+
+CAMPOS_ESQUEMA = (
+    ("nivel", "Nivel"),
+    ("ciclo", "Ciclo Formativo"),
+    ("modulo", "Módulo Profesional"),
+    ("metodologia", "Metodología Principal"),
+    ("duracion", "Duración"),
+    ("producto_final", "Producto Final"),
+    ("resultados_aprendizaje", "Resultados de Aprendizaje seleccionados"),
+    ("criterios_evaluacion", "Criterios de Evaluación seleccionados"),
+)
+
+CAMPOS_SITUACION = (
+    ("nivel", "Nivel"),
+    ("ciclo", "Ciclo Formativo"),
+    ("modulo", "Módulo Profesional"),
+    ("metodologia", "Metodología Principal"),
+    ("metodologias_secundarias", "Metodologías Complementarias"),
+    ("duracion", "Duración"),
+    ("recursos", "Recursos Necesarios"),
+    ("producto_final", "Producto Final"),
+    ("resultados_aprendizaje", "Resultados de Aprendizaje seleccionados"),
+    ("criterios_evaluacion", "Criterios de Evaluación seleccionados"),
+    ("competencias_profesionales", "Competencias Profesionales"),
+    ("competencias_personales", "Competencias Personales"),
+    ("competencias_sociales", "Competencias Sociales"),
+)
+
+CAMPOS_RUBRICA = (
+    ("modulo", "Módulo"),
+    ("producto_final", "Producto Final"),
+    ("resultados_aprendizaje", "Resultados de Aprendizaje"),
+    ("criterios_evaluacion", "Criterios de Evaluación"),
+    ("competencias_profesionales", "Competencias Profesionales"),
+    ("competencias_personales", "Competencias Personales"),
+    ("competencias_sociales", "Competencias Sociales"),
+)
+
+PLANTILLA_ESQUEMA = Plantilla("esquema", """
+    Actúa como experto en pedagogía de FP Sanitaria en Aragón. Antes de redactar una situación de aprendizaje completa necesito solo su ESQUEMA, breve y en Markdown, a partir de los datos que te indique.
+
+    Responde ÚNICAMENTE con esta estructura:
+
+    # ESQUEMA: [Título atractivo y específico]
+    **Resultados de Aprendizaje:** [RA trabajados, uno por línea]
+    **Criterios de Evaluación:** [CE trabajados, uno por línea]
+    **Producto Final:** [Una frase que lo describa]
+    **Fases:**
+    1. [Nombre de la fase] - [Duración] - [Objetivo en una frase]
+    [Las fases necesarias según la duración]
+""", """
+    ## DATOS
+    $datos
+    $contexto
+""")
+
+PLANTILLA_SITUACION = Plantilla("situacion", """
+    Actúa como experto en pedagogía de FP sanitaria en España. Genera una SITUACIÓN DE APRENDIZAJE completa y detallada para FP Sanitaria en Aragón con los datos que te indique, alineada con la LOMLOE (LO 3/2020), la ORDEN ECD/842/2024 (Grado Medio) o ECD/843/2024 (Grado Superior), el Decreto 91/2024 de Aragón y el Real Decreto de enseñanzas mínimas del ciclo.
+
+    ## ESTRUCTURA (Markdown, con estos títulos)
+    # SITUACIÓN DE APRENDIZAJE: [Título atractivo y específico]
+    ## 1. IDENTIFICACIÓN
+    Título, ciclo formativo, módulo profesional, nivel, duración y temporalización.
+    ## 2. CONTEXTUALIZACIÓN Y JUSTIFICACIÓN
+    Contexto profesional real y justificación pedagógica según la LOMLOE y la normativa aragonesa.
+    ## 3. OBJETIVOS Y COMPETENCIAS
+    ### Objetivos Didácticos: 3-5 objetivos específicos y medibles.
+    ### Competencias a Desarrollar: general del ciclo, profesionales, personales y sociales.
+    ## 4. RESULTADOS DE APRENDIZAJE Y CRITERIOS DE EVALUACIÓN
+    Exactamente los RA y CE seleccionados y cómo se trabaja cada uno.
+    ## 5. SABERES BÁSICOS/CONTENIDOS
+    ### Contenidos Conceptuales, ### Contenidos Procedimentales y ### Contenidos Actitudinales.
+    ## 6. METODOLOGÍA
+    ### Metodología Principal (cómo se aplica en detalle), ### Metodologías Complementarias (su integración) y ### Estrategias Inclusivas (atención a la diversidad y accesibilidad universal).
+    ## 7. SECUENCIA DIDÁCTICA
+    ### Fase N: [Nombre], cada una con Duración, Actividades, Recursos y Evaluación; las fases necesarias según la duración.
+    ## 8. RECURSOS Y MATERIALES
+    ### Recursos Humanos, ### Recursos Materiales, ### Recursos Tecnológicos y ### Espacios.
+    ## 9. EVALUACIÓN
+    ### Instrumentos de Evaluación, ### Criterios de Calificación, ### Procedimientos de Evaluación y ### Evaluación Inclusiva.
+    ## 10. PRODUCTO FINAL
+    El producto esperado, sus criterios de calidad y su presentación.
+    ## 11. BIBLIOGRAFÍA Y REFERENCIAS
+    Referencias normativas y bibliográficas actualizadas.
+    ## 12. ANEXOS
+    ### Anexo I: Fichas de trabajo, ### Anexo II: Lista de verificación y ### Anexo III: Recursos complementarios.
+
+    REQUISITOS:
+    - Realista y aplicable en un centro de FP sanitaria, específica del ámbito sanitario y profesionalizante.
+    - Integra la metodología seleccionada y es innovadora pero factible con los recursos indicados.
+    - Incluye digitalización y sostenibilidad cuando sea pertinente, y la perspectiva de género y diversidad.
+    - Cada ### de la estructura es un subtítulo propio del documento.
+    - El **Punto 7: SECUENCIA DIDÁCTICA** es la sección más larga y detallada (mínimo 500 palabras), con las actividades en una lista numerada o subpuntos.
+    - **TU TAREA MÁS IMPORTANTE ES COMPLETAR ÍNTEGRAMENTE EL DOCUMENTO, DEL PUNTO 1 AL 12, INCLUIDOS EL 7 Y EL 8, SIN DETENERTE POR NINGÚN MOTIVO.**
+""", """
+    ## DATOS
+    $datos
+    $contexto
+    $esquema
+""")
+
+# La rúbrica se genera en paralelo a partir del mismo esquema, así que hay que respetarlo
+BLOQUE_ESQUEMA_SITUACION = """
+Respeta EXACTAMENTE el título, el producto final y las fases de este esquema, que también se usa para elaborar la rúbrica:
+
+{}"""
+
+PLANTILLA_RUBRICA = Plantilla("rubrica", """
+    Actúa como experto en evaluación en FP sanitaria. Crea una RÚBRICA DE EVALUACIÓN completa y detallada de la situación de aprendizaje (o de su esquema) y los datos que te indique.
+
+    ## ESTRUCTURA (Markdown, con estos títulos)
+    # RÚBRICA DE EVALUACIÓN
+    ## Información General
+    Situación de Aprendizaje (título), Módulo, Producto Final, Instrumento (rúbrica analítica) y Peso en la calificación final (%).
+    ## Criterios de Evaluación y Niveles de Desempeño
+    Entre 4 y 6 criterios basados en los CE seleccionados, cada uno así:
+    ### Criterio N: [Nombre]
+    **Peso:** [% sobre nota final]
+
+    | NIVEL | EXCELENTE (4) | SATISFACTORIO (3) | EN DESARROLLO (2) | INSUFICIENTE (1) |
+    |-------|---------------|-------------------|-------------------|------------------|
+    | **Descripción** | [Nivel excelente en detalle] | [...] | [...] | [...] |
+    | **Indicadores** | • [Indicador] <br> • [Indicador] | [...] | [...] | [...] |
+
+    ## Competencias Transversales
+    ### Competencias Profesionales y ### Competencias Personales y Sociales: evaluación de las seleccionadas.
+    ## Evaluación del Proceso
+    ### Participación y Actitud (10%) y ### Trabajo en Equipo (10%): tabla de una fila con columnas EXCELENTE | SATISFACTORIO | EN DESARROLLO | INSUFICIENTE.
+    ## Cálculo de la Calificación Final
+    Fórmula por criterio (Criterio N: ___ × % = ___) y **NOTA FINAL = Σ (Puntuación)**.
+    ## Escala de Calificación
+    - **EXCELENTE (9-10):** Supera ampliamente los objetivos
+    - **SATISFACTORIO (7-8):** Alcanza completamente los objetivos
+    - **EN DESARROLLO (5-6):** Alcanza parcialmente los objetivos
+    - **INSUFICIENTE (0-4):** No alcanza los objetivos mínimos
+    ## Observaciones y Feedback
+    Espacio del evaluador: fortalezas observadas, áreas de mejora y recomendaciones para el desarrollo profesional.
+    ## Autoevaluación del Estudiante
+    Apartado para que el estudiante reflexione sobre su aprendizaje.
+
+    REQUISITOS:
+    - Perfectamente alineada con los RA y CE seleccionados.
+    - Descriptores específicos y observables (sin términos vagos), con indicadores cuantitativos y cualitativos.
+    - Útil para la evaluación formativa y sumativa, comprensible para estudiantes y profesores.
+    - Con aspectos propios del ámbito sanitario.
+""", """
+    Basándote en $referencia:
+
+    $extracto
+
+    ## DATOS PARA LA RÚBRICA
+    $datos
+""")
+
+
+# Modo estructurado (services.estructura): las mismas instrucciones con la respuesta en JSON
+FORMATO_JSON_SITUACION = """
+    FORMATO DE RESPUESTA: JSON con el esquema indicado en lugar del documento Markdown.
+    - `titulo`: el título, sin «SITUACIÓN DE APRENDIZAJE:».
+    - `secciones`: un elemento por cada apartado de la ESTRUCTURA, del 1 al 12 y en orden, con `numero`, `titulo` (sin el número) y `contenido` en Markdown sin repetir el título; los ### van dentro del contenido.
+    - En el apartado 7 el `contenido` es solo la introducción de la secuencia: cada fase va en `fases` con `nombre`, `duracion`, `actividades` (una por elemento, detalladas), `recursos` y `evaluacion`.
+"""
+
+FORMATO_JSON_RUBRICA = """
+    FORMATO DE RESPUESTA: JSON con el esquema indicado en lugar del documento Markdown.
+    - `titulo`: el título de la situación de aprendizaje; `informacion`: el resto de la Información General en Markdown.
+    - `criterios`: cada criterio con `nombre`, `peso` (número, % sobre la nota final), un descriptor por nivel (`excelente`, `satisfactorio`, `en_desarrollo`, `insuficiente`) e `indicadores` observables, uno por elemento.
+    - `secciones`: los apartados siguientes de la ESTRUCTURA, desde Competencias Transversales, con `titulo` y `contenido` en Markdown.
+"""
+
+
+def _estructurada(plantilla, formato):
+    return Plantilla(
+        f"{plantilla.tipo}_json", f"{plantilla.instrucciones}\n\n{textwrap.dedent(formato).strip()}",
+        plantilla.plantilla.template
+    )
+
+
+PLANTILLA_SITUACION_JSON = _estructurada(PLANTILLA_SITUACION, FORMATO_JSON_SITUACION)
+PLANTILLA_RUBRICA_JSON = _estructurada(PLANTILLA_RUBRICA, FORMATO_JSON_RUBRICA)
+
+
+# Regeneración de un solo apartado (services.regeneracion) con el resto del documento resumido
+PLANTILLA_APARTADO = Plantilla("apartado", """
+    Actúa como experto en pedagogía y evaluación de FP sanitaria en España. El docente quiere mejorar UN SOLO apartado de un documento ya generado (una situación de aprendizaje o su rúbrica de evaluación). Reescríbelo manteniendo la coherencia con el resto del documento, del que recibes un resumen.
+
+    REQUISITOS:
+    - Devuelve solo el apartado reescrito, con su mismo título y nivel de título, sin repetir los demás apartados.
+    - Respeta el título, el producto final, los RA y CE y las fases que aparecen en el resto del documento.
+    - Conserva el formato del apartado original (subtítulos ###, listas y tablas) y su extensión o más.
+    - Sigue las indicaciones del docente si las hay; si no, gana en concreción, detalle y aplicabilidad en un centro de FP sanitaria.
+""", """
+    ## DATOS
+    $datos
+
+    ## RESTO DEL DOCUMENTO (resumen)
+    $resto
+
+    ## APARTADO QUE HAY QUE REESCRIBIR
+    $actual
+    $indicaciones
+""")
+
+FORMATO_JSON_APARTADO = """
+    FORMATO DE RESPUESTA: JSON con el esquema indicado en lugar de Markdown, con el `contenido` de texto en Markdown y sin repetir el título dentro de él. En la secuencia didáctica el `contenido` es solo la introducción y cada fase va en `fases`; en un criterio de la rúbrica van el `peso`, un descriptor por nivel y los `indicadores`.
+"""
+
+PLANTILLA_APARTADO_JSON = _estructurada(PLANTILLA_APARTADO, FORMATO_JSON_APARTADO)
+
+
+def resumir(partes, max_tokens):
+    """Junta las partes recortando cada una a su parte proporcional de max_tokens.
+
+    Lo que no gastan las partes cortas se reparte entre las largas, de modo que
+    todas conservan al menos su título y su comienzo.
+    """
+
+    restantes = len(partes)
+    disponibles = max_tokens - restantes
+    resumidas = {}
+    for i, parte in sorted(enumerate(partes), key=lambda par: contar_tokens(par[1])):
+        cuota = max(0, disponibles // restantes)
+        resumidas[i] = recortar(parte, cuota)
+        disponibles -= contar_tokens(resumidas[i])
+        restantes -= 1
+    return "\n\n".join(resumidas[i] for i in range(len(partes)) if resumidas[i])
+
+
+def _contexto(datos):
+    contexto = " ".join(str(datos.get("contexto") or "").split())
+    return f"**Contexto Profesional:** {contexto}\n" if contexto else ""
+
+
+def prompt_esquema(datos, presupuesto=None):
+    """Prompt del esquema previo (título, RA/CE, producto final y fases)"""
+
+    return PLANTILLA_ESQUEMA.rellenar(
+        presupuesto, ("contexto",), datos=bloque_datos(datos, CAMPOS_ESQUEMA), contexto=_contexto(datos)
+    )
+
+
+def prompt_situacion(datos, esquema=None, presupuesto=None, estructurado=False):
+    """Prompt de la situación de aprendizaje completa, opcionalmente ceñida a un esquema"""
+
+    plantilla = PLANTILLA_SITUACION_JSON if estructurado else PLANTILLA_SITUACION
+    return plantilla.rellenar(
+        presupuesto, ("contexto", "esquema"),
+        datos=bloque_datos(datos, CAMPOS_SITUACION),
+        contexto=_contexto(datos),
+        esquema=BLOQUE_ESQUEMA_SITUACION.format(esquema) if esquema else ""
+    )
+
+
+def prompt_rubrica(datos, situacion=None, esquema=None, presupuesto=None, estructurado=False):
+    """Prompt de la rúbrica a partir del esquema o de las secciones relevantes de la situación"""
+
+    plantilla = PLANTILLA_RUBRICA_JSON if estructurado else PLANTILLA_RUBRICA
+    presupuesto = presupuesto or PRESUPUESTO_TOKENS
+    valores = {"datos": bloque_datos(datos, CAMPOS_RUBRICA)}
+    if esquema:
+        valores["referencia"] = "este ESQUEMA de la SITUACIÓN DE APRENDIZAJE (título, RA/CE, producto final y fases)"
+        valores["extracto"] = esquema
+    else:
+        valores["referencia"] = "estas secciones de la SITUACIÓN DE APRENDIZAJE que has generado"
+        # El extracto ocupa el hueco que deja el resto del prompt, sin pasar de TOKENS_EXTRACTO
+        ocupados = plantilla.tokens_fijos + contar_tokens(valores["datos"]) + contar_tokens(valores["referencia"])
+        valores["extracto"] = extracto_relevante(situacion or "", datos, min(TOKENS_EXTRACTO, presupuesto - ocupados))
+    return plantilla.rellenar(presupuesto, ("extracto",), **valores)
+
+
+def prompt_apartado(datos, actual, resto, indicaciones="", presupuesto=None, estructurado=False):
+    """Prompt para reescribir un apartado (sección o criterio) con el resto del documento como contexto.
+
+    resto es la lista de los demás apartados; se resume para que el prompt quepa en
+    el presupuesto.
+    """
+
+    plantilla = PLANTILLA_APARTADO_JSON if estructurado else PLANTILLA_APARTADO
+    presupuesto = presupuesto or PRESUPUESTO_TOKENS
+    indicaciones = " ".join(str(indicaciones or "").split())
+    valores = {
+        "datos": bloque_datos(datos, CAMPOS_SITUACION),
+        "actual": actual,
+        "indicaciones": f"\n**Indicaciones del docente:** {indicaciones}" if indicaciones else "",
+    }
+    ocupados = plantilla.tokens_fijos + sum(contar_tokens(valor) for valor in valores.values())
+    valores["resto"] = resumir(resto, presupuesto - ocupados - 1)
+    return plantilla.rellenar(presupuesto, ("resto",), **valores)
+
+
+def dividir_secciones(markdown):
+    """Divide un documento Markdown por sus títulos de nivel 2.
+
+    Devuelve (cabecera, secciones): la cabecera es el texto anterior al primer «## »
+    (el título del documento) y cada sección es un par (título, texto con su título).
+    """
+
+    cabecera = []
+    secciones = []
+    for linea in markdown.splitlines():
+        if linea.startswith("## "):
+            secciones.append((linea[3:].strip(), [linea]))
+        elif secciones:
+            secciones[-1][1].append(linea)
+        else:
+            cabecera.append(linea)
+    return "\n".join(cabecera).strip(), [(titulo, "\n".join(lineas).strip()) for titulo, lineas in secciones]
+
+
+def peso_seccion(titulo):
+    titulo = normalizar(titulo)
+    for fragmento, peso in PESOS_SECCION:
+        if fragmento in titulo:
+            return peso
+    return PESO_SECCION_DEFECTO
+
+
+def extracto_relevante(situacion, datos, max_tokens=TOKENS_EXTRACTO):
+    """Secciones de la situación más útiles para la rúbrica que caben en max_tokens.
+
+    Cada sección puntúa por su título (RA/CE, evaluación, producto final, secuencia...)
+    y por la proporción de términos de los RA, los CE y el producto final que contiene.
+    Las secciones se incluyen enteras por orden de puntuación; solo la última que entra
+    puede ir recortada por líneas. Se devuelven en el orden del documento.
+    """
+
+    if max_tokens <= 0:
+        return ""
+    cabecera, secciones = dividir_secciones(situacion)
+    if not secciones:
+        return recortar(situacion.strip(), max_tokens)
+
+    cabecera = recortar(cabecera, max_tokens // 4)
+    disponibles = max_tokens - contar_tokens(cabecera)
+    terminos = set(tokenizar(" ".join([
+        *datos.get("resultados_aprendizaje", []),
+        *datos.get("criterios_evaluacion", []),
+        str(datos.get("producto_final") or ""),
+    ])))
+
+    puntuadas = []
+    for i, (titulo, texto) in enumerate(secciones):
+        cobertura = len(terminos & set(tokenizar(texto))) / len(terminos) if terminos else 0.0
+        puntuadas.append((peso_seccion(titulo) + 2 * cobertura, -i))
+
+    elegidas = {}
+    for _, menos_i in sorted(puntuadas, reverse=True):
+        i = -menos_i
+        texto = secciones[i][1]
+        tokens = contar_tokens(texto) + 1
+        if tokens <= disponibles:
+            elegidas[i] = texto
+            disponibles -= tokens
+        elif disponibles >= TOKENS_MINIMOS_SECCION:
+            elegidas[i] = recortar(texto, disponibles - 1)
+            disponibles -= contar_tokens(elegidas[i]) + 1
+
+    partes = [cabecera] if cabecera else []
+    partes += [elegidas[i] for i in sorted(elegidas) if elegidas[i]]
+    return "\n\n".join(partes)
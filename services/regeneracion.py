@@ -0,0 +1,167 @@
+"""Apartados de un documento generado para regenerarlos uno a uno.
+
+Un apartado es una sección de nivel 2 de la situación o de la rúbrica, o uno de los
+criterios de la rúbrica. Cada uno se identifica por una clave (tipo, índice), con
+tipo SECCION o CRITERIO, igual en Markdown que en los documentos estructurados
+(services.estructura), así que el mismo código sirve para los dos modos.
+
+GeminiService.regenerar_apartado reescribe solo ese apartado con el resto del
+documento como contexto; reemplazar() lo inserta en el documento sin tocar el resto
+y afectados() indica qué criterios de la rúbrica pueden haber quedado desfasados
+por un cambio en la situación, para revisar solo esos.
+
+El Markdown de un documento se divide en apartados una sola vez (lru_cache): los
+reruns de Streamlit vuelven a pedir los apartados del mismo texto.
+"""
+
+import copy
+from functools import lru_cache
+
+from services import prompts
+from services.estructura import Rubrica, Situacion
+from utils.curriculum_search import normalizar, tokenizar
+
+SECCION = "seccion"
+CRITERIO = "criterio"
+
+# Comienzo del título de la sección de la rúbrica cuyos ### son los criterios. Tiene que
+# ser el comienzo: la sección 4 de la situación también habla de criterios de evaluación
+TITULO_CRITERIOS = "criterios de evaluacion"
+
+# Las secciones de la situación con menos peso para la rúbrica no la desfasan (ver prompts.PESOS_SECCION)
+PESO_MINIMO_AFECTA = 1.0
+
+# Proporción de términos de un criterio que tienen que cambiar para darlo por afectado
+UMBRAL_AFECTADO = 0.1
+
+
+class Apartado:
+    __slots__ = ("clave", "titulo", "texto")
+
+    def __init__(self, clave, titulo, texto):
+        self.clave = clave
+        self.titulo = titulo
+        self.texto = texto
+
+    def __repr__(self):
+        return f"Apartado({self.clave}, {self.titulo!r})"
+
+
+def _dividir_criterios(texto):
+    """(introducción, [criterios]) de la sección de criterios, partida por sus títulos ###"""
+
+    bloques = [[]]
+    for linea in texto.splitlines():
+        if linea.startswith("### "):
+            bloques.append([])
+        bloques[-1].append(linea)
+    return "\n".join(bloques[0]).strip(), ["\n".join(bloque).strip() for bloque in bloques[1:]]
+
+
+@lru_cache(maxsize=64)
+def _piezas(markdown):
+    """(cabecera, secciones) con cada sección como (título, texto, introducción, criterios).
+
+    introducción y criterios solo tienen valor en la sección de criterios de la rúbrica.
+    """
+
+    cabecera, secciones = prompts.dividir_secciones(markdown)
+    piezas = []
+    for titulo, texto in secciones:
+        introduccion, criterios = None, ()
+        if normalizar(titulo).startswith(TITULO_CRITERIOS):
+            introduccion, criterios = _dividir_criterios(texto)
+            criterios = tuple(criterios)
+        piezas.append((titulo, texto, introduccion, criterios))
+    return cabecera, tuple(piezas)
+
+
+def _titulo_criterio(texto):
+    return texto.splitlines()[0].lstrip("#").strip()
+
+
+def apartados(documento):
+    """Apartados regenerables de un documento en Markdown, Situacion o Rubrica"""
+
+    if isinstance(documento, Situacion):
+        return [Apartado((SECCION, i), f"{s.numero}. {s.titulo}", s.a_markdown())
+                for i, s in enumerate(documento.secciones)]
+    if isinstance(documento, Rubrica):
+        return [
+            *(Apartado((CRITERIO, i), f"Criterio {i + 1}: {c.nombre}", c.a_markdown(i + 1))
+              for i, c in enumerate(documento.criterios)),
+            *(Apartado((SECCION, i), s.titulo, s.a_markdown()) for i, s in enumerate(documento.secciones)),
+        ]
+
+    _, piezas = _piezas(documento)
+    resultado = []
+    for i, (titulo, texto, _, criterios) in enumerate(piezas):
+        if criterios:
+            # Los criterios se regeneran de uno en uno, no la sección entera
+            inicio = sum(len(p[3]) for p in piezas[:i])
+            resultado += [Apartado((CRITERIO, inicio + j), _titulo_criterio(c), c) for j, c in enumerate(criterios)]
+        else:
+            resultado.append(Apartado((SECCION, i), titulo, texto))
+    return resultado
+
+
+def apartado(documento, clave):
+    return next(a for a in apartados(documento) if a.clave == clave)
+
+
+def contexto(documento, clave):
+    """Textos de los demás apartados, para dar contexto al regenerar uno"""
+    return [a.texto for a in apartados(documento) if a.clave != clave]
+
+
+def reemplazar(documento, clave, nuevo):
+    """Documento con el apartado clave sustituido por nuevo (Markdown, Seccion o Criterio).
+
+    No modifica el documento recibido: devuelve uno nuevo del mismo tipo.
+    """
+
+    tipo, indice = clave
+    if isinstance(documento, (Situacion, Rubrica)):
+        # Los apartados no se modifican nunca, se sustituyen: basta con copiar la lista
+        copia = copy.copy(documento)
+        lista = "criterios" if tipo == CRITERIO else "secciones"
+        elementos = list(getattr(documento, lista))
+        elementos[indice] = nuevo
+        setattr(copia, lista, elementos)
+        return copia
+
+    cabecera, piezas = _piezas(documento)
+    partes = [cabecera] if cabecera else []
+    criterio = 0
+    for i, (titulo, texto, introduccion, criterios) in enumerate(piezas):
+        if criterios:
+            bloques = [introduccion] if introduccion else []
+            for c in criterios:
+                bloques.append(nuevo.strip() if (tipo, indice) == (CRITERIO, criterio) else c)
+                criterio += 1
+            texto = "\n\n".join(bloques)
+        elif (tipo, indice) == (SECCION, i):
+            texto = nuevo.strip()
+        partes.append(texto)
+    return "\n\n".join(partes) + "\n"
+
+
+def afectados(rubrica, titulo, anterior, nuevo):
+    """Claves de los criterios de la rúbrica que pueden haber quedado desfasados.
+
+    titulo es el de la sección de la situación que ha cambiado y anterior y nuevo sus
+    textos. Un criterio se da por afectado si entre sus términos aparecen bastantes de
+    los que han entrado o salido de la sección.
+    """
+
+    if prompts.peso_seccion(titulo) < PESO_MINIMO_AFECTA:
+        return []
+    cambiados = set(tokenizar(anterior)) ^ set(tokenizar(nuevo))
+    resultado = []
+    for a in apartados(rubrica):
+        if a.clave[0] != CRITERIO:
+            continue
+        terminos = set(tokenizar(a.texto))
+        if terminos and len(terminos & cambiados) / len(terminos) >= UMBRAL_AFECTADO:
+            resultado.append(a.clave)
+    return resultado
@@ -0,0 +1,155 @@
+"""Registro de servicios compartidos por todo el proceso.
+
+La app de Streamlit (todas sus sesiones) y las herramientas por lotes obtienen aquí
+el GeminiService y el cliente de Gemini, de modo que en cada proceso hay un único
+cliente con un único pool de conexiones HTTP persistentes (keep-alive): las llamadas
+reutilizan las conexiones TLS abiertas en lugar de negociar una nueva cada vez.
+
+    from services.registro import registro
+    servicio = registro.gemini()
+
+Las conexiones no se pueden compartir entre procesos; cada proceso (cada worker de
+Streamlit o cada ejecución por lotes) tiene su propio pool limitado a
+GEMINI_MAX_CONEXIONES.
+
+El cliente es un backend intercambiable: cualquier clase con la interfaz de
+ClienteGemini (genai, salud() y cerrar()). GEMINI_BACKEND=falso usa
+services.backend_falso.ClienteFalso, que responde sin red ni coste.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+MAX_CONEXIONES = int(os.getenv("GEMINI_MAX_CONEXIONES", "20"))
+
+# Segundos que una conexión sin uso se mantiene abierta para reutilizarla
+KEEPALIVE = 60.0
+
+# "api" (google-genai) o "falso" (services.backend_falso, para desarrollo y pruebas de carga)
+BACKEND = os.getenv("GEMINI_BACKEND", "api")
+
+
+class EstadoSalud:
+    __slots__ = ("ok", "latencia", "error", "comprobado")
+
+    def __init__(self, ok, latencia, error=None, comprobado=None):
+        self.ok = ok
+        self.latencia = latencia
+        self.error = error
+        self.comprobado = comprobado if comprobado is not None else time.time()
+
+    def __repr__(self):
+        estado = "ok" if self.ok else f"error: {self.error}"
+        return f"EstadoSalud({estado}, {self.latencia * 1000:.0f} ms)"
+
+
+class ClienteGemini:
+    """genai.Client sobre un httpx.Client propio con pool de conexiones persistentes"""
+
+    def __init__(self, api_key=None, base_url=None, max_conexiones=MAX_CONEXIONES):
+        import httpx
+        from google import genai
+        from google.genai import types
+
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_conexiones = max_conexiones
+        self.http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_conexiones,
+                max_keepalive_connections=max_conexiones,
+                keepalive_expiry=KEEPALIVE
+            ),
+            # El plazo de cada llamada lo fija GeminiService en la petición
+            timeout=None,
+            follow_redirects=True
+        )
+        opciones = types.HttpOptions(base_url=base_url, httpx_client=self.http)
+        if api_key:
+            self.genai = genai.Client(api_key=api_key, http_options=opciones)
+        else:
+            self.genai = genai.Client(http_options=opciones)
+
+        self._salud = None
+        self._salud_lock = threading.Lock()
+
+    def salud(self, modelo, max_antiguedad=30.0, plazo=5.0):
+        """Comprueba que la API responde pidiendo la ficha del modelo (no consume cuota de generación).
+
+        El resultado se reutiliza durante max_antiguedad segundos para no repetir la
+        comprobación en cada rerun.
+        """
+        from google.genai import types
+
+        with self._salud_lock:
+            if self._salud is not None and time.time() - self._salud.comprobado < max_antiguedad:
+                return self._salud
+            inicio = time.perf_counter()
+            try:
+                self.genai.models.get(
+                    model=modelo,
+                    config=types.GetModelConfig(http_options=types.HttpOptions(timeout=int(plazo * 1000)))
+                )
+                self._salud = EstadoSalud(True, time.perf_counter() - inicio)
+            except Exception as e:
+                self._salud = EstadoSalud(False, time.perf_counter() - inicio, str(e))
+            return self._salud
+
+    def cerrar(self):
+        self.http.close()
+
+
+def clase_backend(nombre=None):
+    """Clase del backend de Gemini según su nombre (por defecto GEMINI_BACKEND)"""
+    nombre = nombre or BACKEND
+    if nombre == "falso":
+        from services.backend_falso import ClienteFalso
+
+        return ClienteFalso
+    if nombre != "api":
+        raise ValueError(f"GEMINI_BACKEND desconocido: {nombre!r} (usa 'api' o 'falso')")
+    return ClienteGemini
+
+
+class RegistroServicios:
+    """Instancias únicas por proceso, creadas la primera vez que se piden"""
+
+    def __init__(self):
+        self._clientes = {}
+        self._servicios = {}
+        self._lock = threading.Lock()
+
+    def cliente_gemini(self, api_key=None, base_url=None):
+        """Backend compartido para esa clave y URL (por defecto GEMINI_API_KEY y GEMINI_BASE_URL)"""
+
+        clave = (api_key or os.getenv("GEMINI_API_KEY"), base_url or os.getenv("GEMINI_BASE_URL"))
+        with self._lock:
+            cliente = self._clientes.get(clave)
+            if cliente is None:
+                cliente = self._clientes[clave] = clase_backend()(*clave)
+            return cliente
+
+    def gemini(self, api_key=None, base_url=None):
+        """GeminiService compartido: una caché, un coalescedor y un cortocircuito por proceso"""
+        from services.gemini_service import GeminiService
+
+        clave = (api_key or os.getenv("GEMINI_API_KEY"), base_url or os.getenv("GEMINI_BASE_URL"))
+        with self._lock:
+            servicio = self._servicios.get(clave)
+            if servicio is None:
+                servicio = self._servicios[clave] = GeminiService(*clave)
+            return servicio
+
+    def cerrar(self):
+        """Cierra las conexiones abiertas (se llama al salir del proceso)"""
+        with self._lock:
+            for cliente in self._clientes.values():
+                cliente.cerrar()
+            self._clientes.clear()
+            self._servicios.clear()
+
+
+registro = RegistroServicios()
+atexit.register(registro.cerrar)
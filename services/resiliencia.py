@@ -0,0 +1,269 @@
+"""Capa de llamadas resiliente para la API de Gemini.
+
+Todas las llamadas de GeminiService pasan por LlamadaResiliente, que combina:
+
+- un plazo total por llamada (incluidos reintentos y esperas),
+- reintentos con espera exponencial y jitter completo ante errores transitorios
+  (408, 429, 500, 502, 503, 504, timeouts y fallos de conexión), respetando el
+  retryDelay que indica Gemini en los 429,
+- un limitador de peticiones opcional (utils.rate_limiter); la cuota de cada clave
+  la lleva services.enrutador,
+- un cortocircuito (circuit breaker) que, tras varios fallos seguidos, rechaza las
+  llamadas al momento durante un tiempo en lugar de sumar carga a un servicio caído.
+
+No importa el SDK de Gemini: recibe funciones que hacen la llamada.
+"""
+
+import random
+import re
+import threading
+import time
+
+from services.metricas import metricas
+
+CODIGOS_REINTENTABLES = frozenset((408, 429, 500, 502, 503, 504))
+
+_DURACION = re.compile(r"^(\d+(?:\.\d+)?)s$")
+
+
+class ServicioNoDisponibleError(Exception):
+    """Gemini no ha respondido a tiempo o sigue fallando tras los reintentos"""
+
+    def __init__(self, mensaje, reintentar_en=None):
+        super().__init__(mensaje)
+        # Segundos orientativos tras los que tiene sentido volver a intentarlo
+        self.reintentar_en = reintentar_en
+
+
+class CircuitoAbiertoError(ServicioNoDisponibleError):
+    """El cortocircuito está abierto: se rechaza la llamada sin contactar con Gemini"""
+
+
+def es_reintentable(error):
+    """Indica si un error de la API o de red es transitorio y merece un reintento"""
+
+    codigo = getattr(error, "code", None)
+    if isinstance(codigo, int):
+        return codigo in CODIGOS_REINTENTABLES
+
+    # Los errores de red de httpx (cliente HTTP del SDK) no llevan código
+    try:
+        import httpx
+    except ImportError:
+        return isinstance(error, (TimeoutError, ConnectionError))
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError,
+                              TimeoutError, ConnectionError))
+
+
+def retraso_sugerido(error):
+    """Segundos de espera que indica Gemini en un 429 (RetryInfo.retryDelay), si los indica"""
+
+    detalles = getattr(error, "details", None)
+    if not isinstance(detalles, dict):
+        return None
+    for detalle in detalles.get("error", {}).get("details", []) or []:
+        if isinstance(detalle, dict) and "retryDelay" in detalle:
+            coincidencia = _DURACION.match(str(detalle["retryDelay"]))
+            if coincidencia:
+                return float(coincidencia.group(1))
+    return None
+
+
+class Cortocircuito:
+    """Circuit breaker seguro entre hilos.
+
+    Cerrado: las llamadas pasan. Tras `umbral` fallos transitorios seguidos se abre y
+    rechaza todas las llamadas durante `enfriamiento` segundos. Después deja pasar una
+    única llamada de prueba (semiabierto): si sale bien se cierra y si falla se vuelve
+    a abrir.
+    """
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, umbral=5, enfriamiento=30.0):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.estado = self.CERRADO
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Lanza CircuitoAbiertoError si la llamada no debe intentarse ahora"""
+
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return
+            restante = self._abierto_desde + self.enfriamiento - time.monotonic()
+            if self.estado == self.ABIERTO and restante <= 0:
+                self.estado = self.SEMIABIERTO
+                self._prueba_en_curso = False
+            if self.estado == self.SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return
+        raise CircuitoAbiertoError(
+            "Gemini está fallando de forma continuada; se ha pausado el envío de peticiones",
+            reintentar_en=max(restante, 1.0)
+        )
+
+    def exito(self):
+        with self._lock:
+            self.estado = self.CERRADO
+            self._fallos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self.estado == self.SEMIABIERTO or self._fallos >= self.umbral:
+                self.estado = self.ABIERTO
+                self._abierto_desde = time.monotonic()
+                self._prueba_en_curso = False
+
+    def neutro(self):
+        """La llamada terminó con un error que no dice nada de la salud del servicio"""
+        with self._lock:
+            self._prueba_en_curso = False
+
+
+class LlamadaResiliente:
+    """Ejecuta llamadas a Gemini con plazo, reintentos, limitador y cortocircuito"""
+
+    def __init__(self, limitador=None, cortocircuito=None, intentos=4, espera_base=1.0, espera_maxima=20.0,
+                 plazo=180.0):
+        self.limitador = limitador
+        self.cortocircuito = cortocircuito or Cortocircuito()
+        self.intentos = intentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        # Segundos totales por llamada, incluidos los reintentos
+        self.plazo = plazo
+        # Contadores acumulados desde el arranque (diagnóstico y herramientas de prueba)
+        self.contadores = {"llamadas": 0, "reintentos": 0, "agotadas": 0, "rechazadas": 0}
+        self._contadores_lock = threading.Lock()
+
+    def _contar(self, nombre):
+        with self._contadores_lock:
+            self.contadores[nombre] += 1
+        metricas.contar("resiliencia_total", evento=nombre)
+
+    def _permitir(self):
+        try:
+            self.cortocircuito.permitir()
+        except CircuitoAbiertoError:
+            self._contar("rechazadas")
+            raise
+
+    def _espera(self, intento, error):
+        """Espera exponencial con jitter completo; el retryDelay de Gemini tiene prioridad"""
+        sugerido = retraso_sugerido(error)
+        if sugerido is not None:
+            return sugerido + random.uniform(0, self.espera_base)
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** intento))
+
+    def _turno(self, limite):
+        """Pide una ficha al limitador sin pasarse del plazo"""
+        if self.limitador is None:
+            return
+        if not self.limitador.adquirir(espera_maxima=max(0.0, limite - time.monotonic())):
+            raise ServicioNoDisponibleError(
+                "Se ha alcanzado el límite de peticiones a Gemini; inténtalo de nuevo en unos segundos",
+                reintentar_en=60.0 / max(self.limitador.tasa * 60.0, 1.0)
+            )
+
+    def ejecutar(self, llamada):
+        """Llama a llamada(plazo_restante) hasta que funcione o se agoten intentos o plazo"""
+
+        self._contar("llamadas")
+        limite = time.monotonic() + self.plazo
+        intento = 0
+        while True:
+            # Primero el limitador: si no hay ficha a tiempo, la llamada de prueba del
+            # cortocircuito semiabierto no queda reservada sin que nadie la resuelva
+            self._turno(limite)
+            self._permitir()
+            try:
+                resultado = llamada(limite - time.monotonic())
+            except Exception as e:
+                intento = self._tras_fallo(e, intento, limite)
+                continue
+            self.cortocircuito.exito()
+            return resultado
+
+    def flujo(self, abrir):
+        """Versión en streaming: abrir(plazo_restante) devuelve el iterable de fragmentos.
+
+        Solo se reintenta mientras no ha llegado ningún fragmento; después un fallo se
+        propaga, porque el consumidor ya ha mostrado parte del texto.
+        """
+
+        self._contar("llamadas")
+        limite = time.monotonic() + self.plazo
+        intento = 0
+        while True:
+            # Primero el limitador: si no hay ficha a tiempo, la llamada de prueba del
+            # cortocircuito semiabierto no queda reservada sin que nadie la resuelva
+            self._turno(limite)
+            self._permitir()
+            respuesta = None
+            try:
+                respuesta = abrir(limite - time.monotonic())
+                iterador = iter(respuesta)
+                primero = next(iterador, None)
+            except Exception as e:
+                _cerrar(respuesta)
+                intento = self._tras_fallo(e, intento, limite)
+                continue
+            break
+
+        self.cortocircuito.exito()
+        try:
+            if primero is not None:
+                yield primero
+            for fragmento in iterador:
+                yield fragmento
+        except Exception as e:
+            if es_reintentable(e):
+                self.cortocircuito.fallo()
+            raise
+        finally:
+            _cerrar(respuesta)
+
+    def _tras_fallo(self, error, intento, limite):
+        """Decide si reintentar: devuelve el siguiente número de intento o lanza el error"""
+
+        if not es_reintentable(error):
+            # Errores del cliente (clave inválida, petición mal formada...): no se reintentan
+            self.cortocircuito.neutro()
+            raise error
+        self.cortocircuito.fallo()
+
+        intento += 1
+        espera = self._espera(intento - 1, error)
+        if intento >= self.intentos or time.monotonic() + espera >= limite:
+            self._contar("agotadas")
+            raise ServicioNoDisponibleError(
+                f"Gemini no está disponible ahora mismo ({_describir(error)}). Inténtalo de nuevo en unos minutos.",
+                reintentar_en=espera
+            ) from error
+        self._contar("reintentos")
+        time.sleep(espera)
+        return intento
+
+
+def _describir(error):
+    codigo = getattr(error, "code", None)
+    if codigo == 429:
+        return "demasiadas peticiones"
+    if isinstance(codigo, int):
+        return f"error {codigo}"
+    return type(error).__name__
+
+
+def _cerrar(respuesta):
+    cerrar = getattr(respuesta, "close", None)
+    if cerrar:
+        cerrar()
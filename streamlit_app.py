@@ -1,14 +1,21 @@
 import os
+import time
+import threading
 import streamlit as st
-import pandas as pd
-import json
 from datetime import datetime
-import google.generativeai as genai
 
+from components.historial import render_historial
+from components.regeneracion import render_regeneracion
 from components.selectors import render_selectors
-from services.gemini_service import GeminiService
-from services.pdf_generator import generate_pdf
-from utils.data_loader import load_ciclos_data
+from services.estructura import EstructuraInvalidaError
+from services.gemini_service import Consumo
+from services.historial import HISTORIAL_PATH, HistorialGeneraciones
+from services.resiliencia import ServicioNoDisponibleError
+from services.docx_generator import MIME_DOCX
+from services.metricas import metricas
+from services.pdf_worker import ArtefactoCache, RenderizadorPDF, DOCX, LISTO, ERROR, PDF
+from services.registro import registro
+from utils.data_loader import load_curriculo
 
 # --- Configuración de la clave API ---
 # Lee la clave de Secrets. Si no existe, detiene la app.
@@ -17,25 +24,46 @@ if not API_KEY:
     st.error("¡Ups! Necesitas configurar tu Clave API de Gemini.")
     st.info("Ve a Streamlit Secrets (candado 🔒) y asegúrate de que la clave 'GEMINI_API_KEY' esté guardada correctamente.")
     st.stop()
-else:
-    genai.configure(api_key=API_KEY)
 
 
 # --- Inicialización de Servicios y Datos con caché ---
-@st.cache_resource
 def init_services():
-    """Inicializa el servicio de Gemini con la clave API configurada."""
-    # La clave ya ha sido verificada y configurada arriba
-    return GeminiService()
+    """Servicio de Gemini del registro: uno por proceso, compartido por todas las sesiones."""
+    # La clave ya ha sido verificada arriba; el cliente de Gemini (único, con pool de conexiones)
+    # se crea al generar por primera vez
+    # METRICAS_PATH / METRICAS_PUERTO: exportación de métricas en formato Prometheus (pages/metricas.py las muestra)
+    metricas.iniciar_exportadores()
+    return registro.gemini(api_key=API_KEY)
+
+@st.cache_resource
+def init_renderizador():
+    """Pool de procesos para los PDF y los Word, compartido por todas las sesiones."""
+    return RenderizadorPDF(ArtefactoCache(os.getenv("PDF_CACHE_DIR", ".cache/artefactos")))
 
-@st.cache_data
-def load_data():
-    """Carga los datos de ciclos para los selectores."""
-    return load_ciclos_data()
+@st.cache_resource
+def init_historial():
+    """Historial persistente de generaciones (SQLite), compartido por todas las sesiones."""
+    return HistorialGeneraciones(HISTORIAL_PATH)
 
 # Inicializar
 gemini_service = init_services()
-ciclos_data = load_data()
+renderizador_pdf = init_renderizador()
+historial = init_historial()
+# Versión del currículo para todo este rerun: si el JSON se recarga en segundo plano,
+# el cambio se aplica en el siguiente rerun y nunca a mitad de uno
+curriculo = load_curriculo()
+indice_curriculo = curriculo.indice
+buscador_curriculo = curriculo.buscador
+if st.session_state.get('origen_curriculo', curriculo.origen) != curriculo.origen:
+    st.toast("📚 Se han actualizado los datos del currículo")
+st.session_state['origen_curriculo'] = curriculo.origen
+
+
+# Si el usuario cambia un selector mientras se genera, Streamlit relanza el script:
+# se cancela la generación anterior para no seguir consumiendo tokens
+cancelacion_previa = st.session_state.pop('cancelar_generacion', None)
+if cancelacion_previa is not None:
+    cancelacion_previa.set()
 
 
 # SOLUCION DEFINITIVA PARA NAMEERROR
@@ -73,13 +101,76 @@ with st.sidebar:
     
     Simple, rápido y listo para usar en clase 😊
     """)
+    
+    # Solo se consulta la salud de la API si las últimas llamadas han fallado
+    cortocircuito = gemini_service.resiliencia.cortocircuito
+    if cortocircuito.estado != cortocircuito.CERRADO:
+        salud = gemini_service.salud()
+        if salud.ok:
+            st.warning("⚠️ Gemini ha fallado hace un momento, pero ya vuelve a responder.")
+        else:
+            st.error("⚠️ Gemini no responde ahora mismo. Espera unos minutos antes de generar.")
+    
+    render_historial(historial, renderizador_pdf=renderizador_pdf)
+
+# Formatos de descarga: (etiqueta del botón, nombre, tipo MIME)
+FORMATOS_DESCARGA = {
+    PDF: ("📄 Descargar PDF", "PDF", "application/pdf"),
+    DOCX: ("📝 Descargar Word", "Word", MIME_DOCX),
+}
+
+@st.fragment(run_every=0.5)
+def esperar_artefacto(clave, formato):
+    """Comprueba cada medio segundo si el documento ya está renderizado y entonces refresca la página."""
+    if renderizador_pdf.estado(clave, formato) not in (LISTO, ERROR):
+        st.info(f"⏳ Preparando el {FORMATOS_DESCARGA[formato][1]}...")
+    else:
+        st.rerun()
+
+
+def solicitar_descargas(situacion, rubrica, parametros):
+    """Encarga todos los formatos de descarga en segundo plano antes de que se pidan."""
+    for formato in FORMATOS_DESCARGA:
+        renderizador_pdf.solicitar(situacion, rubrica, parametros, formato=formato)
+
+
+def render_descarga(situacion, rubrica, parametros, formato):
+    etiqueta, nombre, mime = FORMATOS_DESCARGA[formato]
+    # Si ya está en caché o en curso no se encarga de nuevo
+    clave = renderizador_pdf.solicitar(situacion, rubrica, parametros, formato=formato)
+    estado = renderizador_pdf.estado(clave, formato)
+    if estado == LISTO:
+        st.download_button(
+            label=etiqueta,
+            data=renderizador_pdf.obtener(clave, formato=formato),
+            file_name=f"situacion_aprendizaje_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}",
+            mime=mime,
+            on_click="ignore",
+            use_container_width=True
+        )
+    elif estado == ERROR:
+        st.warning(f"No se pudo preparar el {nombre}: {renderizador_pdf.error(clave)}")
+        if st.button(f"🔁 Reintentar {nombre}", use_container_width=True, key=f"reintentar_{formato}"):
+            renderizador_pdf.solicitar(situacion, rubrica, parametros, reintentar=True, formato=formato)
+            st.rerun()
+    else:
+        esperar_artefacto(clave, formato)
+
+
+def render_descargas(situacion, rubrica, parametros):
+    """Opciones de descarga; cada documento sale de la caché de artefactos sin volver a renderizarlo."""
+    st.markdown("### 📥 Opciones de descarga")
+    
+    for columna, formato in zip(st.columns(len(FORMATOS_DESCARGA)), FORMATOS_DESCARGA):
+        with columna:
+            render_descarga(situacion, rubrica, parametros, formato)
 
 # Contenedor principal
 main_container = st.container()
 
 with main_container:
     # Renderizar selectores
-    selection_data = render_selectors(ciclos_data)
+    selection_data = render_selectors(indice_curriculo, buscador_curriculo)
     
     if selection_data:
         col1, col2 = st.columns([2, 1])
@@ -128,6 +219,24 @@ with main_container:
                 step=0.1,
                 help="Mayor valor = más creativo y variado"
             )
+            
+            generacion_paralela = st.checkbox(
+                "Generar situación y rúbrica a la vez",
+                value=True,
+                help="Crea primero un esquema breve y genera la situación y la rúbrica en paralelo a partir de él (más rápido)"
+            )
+            
+            estructurado = st.checkbox(
+                "🧩 Formato estructurado",
+                value=False,
+                help="La IA devuelve secciones, fases y criterios por separado: se comprueba que no falte ninguno y el PDF maqueta las fases y los niveles de la rúbrica como tablas"
+            )
+            
+            regenerar = st.checkbox(
+                "🔄 Regenerar desde cero",
+                value=False,
+                help="Por defecto se reutilizan los resultados ya generados para los mismos parámetros. Márcalo para pedir una versión nueva a la IA."
+            )
 
     # Botón de generación
     if st.button("✨ Generar mi Situación de Aprendizaje", type="primary", use_container_width=True):
@@ -146,49 +255,115 @@ with main_container:
                         "creatividad": creatividad
                     }
                     
-                    # Generar situación de aprendizaje
-                    situacion = gemini_service.generar_situacion_aprendizaje(prompt_data)
-                    
-                    # Generar rúbrica
-                    rubrica = gemini_service.generar_rubrica(prompt_data, situacion)
-                    
-                    # Mostrar resultados
-                    st.success("🎉 ¡Listo! Aquí tienes tu situación de aprendizaje personalizada.")
-                    
                     # Tabs para organizar el contenido
+                    aviso = st.empty()
                     tab1, tab2, tab3 = st.tabs(["📋 Situación de Aprendizaje", "📊 Rúbrica de Evaluación", "📥 Descargar"])
                     
                     with tab1:
-                        st.markdown(situacion)
+                        situacion_placeholder = st.empty()
                         
                     with tab2:
-                        st.markdown(rubrica)
+                        rubrica_placeholder = st.empty()
                     
-                    with tab3:
-                        st.markdown("### 📥 Opciones de descarga")
-                        
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            if st.button("📄 Descargar PDF", use_container_width=True):
-                                pdf_content = generate_pdf(situacion, rubrica, prompt_data)
-                                st.download_button(
-                                    label="⬇️ Descargar PDF",
-                                    data=pdf_content,
-                                    file_name=f"situacion_aprendizaje_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                                    mime="application/pdf"
-                                )
-                        
-                        with col2:
-                            if st.button("📝 Descargar Word", use_container_width=True):
-                                # Para implementar descarga Word más adelante
-                                st.info("Funcionalidad de descarga Word próximamente disponible")
+                    # Los textos se van mostrando según llegan los fragmentos de Gemini
+                    cancelar = threading.Event()
+                    st.session_state['cancelar_generacion'] = cancelar
+                    textos = {"situacion": "", "rubrica": ""}
+                    # En modo estructurado cada fragmento es el documento recibido hasta ese momento
+                    documentos = {"situacion": None, "rubrica": None}
+                    placeholders = {"situacion": situacion_placeholder, "rubrica": rubrica_placeholder}
+                    
+                    consumo = Consumo()
+                    inicio = time.perf_counter()
+                    if generacion_paralela:
+                        # Esquema común y después situación y rúbrica en paralelo
+                        flujo = gemini_service.generar_en_paralelo_stream(
+                            prompt_data, cancelar, regenerar, consumo, estructurado
+                        )
+                    else:
+                        flujo = gemini_service.generar_secuencial_stream(
+                            prompt_data, cancelar, regenerar, consumo, estructurado
+                        )
+                    
+                    try:
+                        for tipo, fragmento in flujo:
+                            if tipo == "esquema":
+                                situacion_placeholder.info("✍️ Redactando la situación de aprendizaje a partir de este esquema...\n\n" + fragmento)
+                                rubrica_placeholder.info("✍️ Elaborando la rúbrica a partir del esquema...")
+                            elif fragmento is None:
+                                placeholders[tipo].markdown(textos[tipo])
+                            elif estructurado:
+                                documentos[tipo] = fragmento
+                                textos[tipo] = fragmento.a_markdown()
+                                placeholders[tipo].markdown(textos[tipo] + " ▌")
+                            else:
+                                textos[tipo] += fragmento
+                                placeholders[tipo].markdown(textos[tipo] + " ▌")
+                    finally:
+                        # Si el script se interrumpe (rerun), se detienen los flujos pendientes
+                        flujo.close()
+                        cancelar.set()
+                        st.session_state.pop('cancelar_generacion', None)
+                    
+                    latencia = time.perf_counter() - inicio
+                    metricas.observar("generacion", latencia, modo="paralelo" if generacion_paralela else "secuencial")
+                    
+                    situacion = textos["situacion"] or "Error: No se pudo generar la situación de aprendizaje"
+                    rubrica = textos["rubrica"] or "Error: No se pudo generar la rúbrica"
+                    
+                    # Se guarda en el historial para poder recuperarla tras recargar la página. Si todo
+                    # ha salido de la caché de respuestas ya estaba guardada: se reutiliza esa entrada
+                    if textos["situacion"] and textos["rubrica"]:
+                        documento_id = None
+                        if consumo.llamadas == 0:
+                            documento_id = historial.buscar(situacion, rubrica, prompt_data)
+                        if documento_id is None:
+                            documento_id = historial.guardar(
+                                situacion, rubrica, prompt_data, consumo.modelo(gemini_service.model_name), latencia,
+                                consumo.tokens_entrada, consumo.tokens_salida
+                            )
+                        st.session_state['documento_historial'] = documento_id
                     
-                    # Guardar en session state para mantener los resultados
+                    # Guardar en session state: los botones de descarga provocan un rerun
+                    # y los resultados se vuelven a mostrar desde aquí sin regenerar
                     st.session_state['ultima_situacion'] = situacion
                     st.session_state['ultima_rubrica'] = rubrica
                     st.session_state['ultimos_parametros'] = prompt_data
                     
+                    # El PDF se maqueta desde los documentos estructurados si han llegado completos
+                    if estructurado and all(d is not None and d.completa for d in documentos.values()):
+                        situacion_pdf, rubrica_pdf = documentos["situacion"], documentos["rubrica"]
+                    else:
+                        situacion_pdf, rubrica_pdf = situacion, rubrica
+                    st.session_state['ultimos_documentos'] = (situacion_pdf, rubrica_pdf)
+                    st.session_state.pop('criterios_desfasados', None)
+                    
+                    # El PDF y el Word se empiezan a renderizar en segundo plano antes de que se pidan
+                    solicitar_descargas(situacion_pdf, rubrica_pdf, prompt_data)
+                    
+                    # Mostrar resultados
+                    aviso.success("🎉 ¡Listo! Aquí tienes tu situación de aprendizaje personalizada.")
+                    if consumo.coalescidas:
+                        st.caption("⚡ Otra sesión estaba generando exactamente lo mismo: se ha compartido su resultado.")
+                    if documentos["rubrica"] is not None:
+                        for advertencia in documentos["rubrica"].advertencias():
+                            st.caption(f"⚠️ {advertencia}")
+                    
+                    with tab3:
+                        render_descargas(situacion_pdf, rubrica_pdf, prompt_data)
+                    
+                    render_regeneracion(gemini_service, historial, renderizador_pdf, prompt_data)
+                    
+                except ServicioNoDisponibleError as e:
+                    # Ya se ha reintentado: volver a pulsar enseguida solo añadiría carga
+                    st.warning(f"⏳ {e}")
+                    if e.reintentar_en:
+                        st.info(f"Prueba de nuevo dentro de {max(1, round(e.reintentar_en))} segundos. Tus parámetros siguen seleccionados.")
+                    
+                except EstructuraInvalidaError as e:
+                    # La respuesta no se ha guardado en caché: al repetir se pide de nuevo
+                    st.warning(f"🧩 La IA devolvió un documento incompleto ({e}). Vuelve a generarlo.")
+                    
                 except Exception as e:
                     error_message = str(e)
                     if "INVALID_ARGUMENT" in error_message or "Invalid API key" in error_message or "API_KEY_INVALID" in error_message:
@@ -213,6 +388,23 @@ with main_container:
                     else:
                         st.error(f"❌ Vaya, algo fue mal: {error_message}")
                         st.info("Revisa que hayas seleccionado todo correctamente. Si sigue fallando, prueba a recargar la página.")
+    
+    elif 'ultima_situacion' in st.session_state:
+        # Resultados de la última generación (p. ej. tras pulsar un botón de descarga)
+        tab1, tab2, tab3 = st.tabs(["📋 Situación de Aprendizaje", "📊 Rúbrica de Evaluación", "📥 Descargar"])
+        with tab1:
+            st.markdown(st.session_state['ultima_situacion'])
+        with tab2:
+            st.markdown(st.session_state['ultima_rubrica'])
+        with tab3:
+            render_descargas(
+                *st.session_state.get(
+                    'ultimos_documentos',
+                    (st.session_state['ultima_situacion'], st.session_state['ultima_rubrica'])
+                ),
+                st.session_state['ultimos_parametros']
+            )
+        render_regeneracion(gemini_service, historial, renderizador_pdf, st.session_state['ultimos_parametros'])
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,94 @@
+"""Fixtures comunes de las pruebas: servidor falso de Gemini, servicio y rutas temporales.
+
+Las pruebas no usan la red ni la caché del proyecto: cada una trabaja con
+tools/fake_gemini_server.py en un hilo y con cachés en un directorio temporal.
+"""
+
+import os
+import threading
+
+import pytest
+
+from services.gemini_service import GeminiService
+from services.pdf_worker import ArtefactoCache, RenderizadorPDF
+from tools.fake_gemini_server import crear_servidor
+
+DATOS = {
+    "nivel": "Grado Medio",
+    "ciclo": "Cuidados Auxiliares de Enfermería",
+    "modulo": "Técnicas básicas de enfermería",
+    "creatividad": 0.7,
+}
+
+
+@pytest.fixture(autouse=True)
+def entorno(tmp_path, monkeypatch):
+    """Cachés en un directorio temporal y sin limitador global, que solo añadiría esperas.
+
+    Cada prueba puede cambiar estas variables con monkeypatch antes de crear el servicio.
+    """
+    monkeypatch.setenv("GEMINI_CACHE_PATH", os.fspath(tmp_path / "respuestas.sqlite3"))
+    # tools/prueba_carga.py la desactiva para todo el proceso al importarse
+    monkeypatch.setenv("GEMINI_CACHE", "1")
+    monkeypatch.setenv("GEMINI_RPM", "0")
+    monkeypatch.setenv("GEMINI_CACHE_CONTEXTO", "0")
+
+
+@pytest.fixture
+def datos():
+    """Copia de los datos de generación de ejemplo"""
+    return dict(DATOS)
+
+
+@pytest.fixture
+def servidores():
+    """Fábrica de servidores falsos de Gemini en un hilo; se paran al terminar la prueba"""
+
+    creados = []
+
+    def crear(**opciones):
+        servidor = crear_servidor(**opciones)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        creados.append(servidor)
+        return servidor
+
+    yield crear
+    for servidor in creados:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+@pytest.fixture
+def servidor(servidores):
+    """Servidor falso de Gemini sin latencia ni fallos"""
+    return servidores()
+
+
+def _url(servidor):
+    """URL base de un servidor falso"""
+    return f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+@pytest.fixture
+def servicio_para():
+    """Fábrica de GeminiService contra un servidor falso"""
+
+    def crear(servidor):
+        return GeminiService(api_key="prueba", base_url=_url(servidor))
+
+    return crear
+
+
+@pytest.fixture
+def servicio(servidor, servicio_para):
+    """GeminiService contra el servidor falso por defecto"""
+    return servicio_para(servidor)
+
+
+@pytest.fixture(scope="session")
+def renderizador(tmp_path_factory):
+    """RenderizadorPDF con una caché de artefactos temporal, compartido por la sesión (arrancar el pool cuesta)"""
+
+    renderizador = RenderizadorPDF(ArtefactoCache(os.fspath(tmp_path_factory.mktemp("artefactos"))))
+    yield renderizador
+    renderizador.cerrar()
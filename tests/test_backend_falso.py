@@ -0,0 +1,98 @@
+"""Backend sin red (services.backend_falso) y arnés de tools/prueba_carga.py"""
+
+import json
+
+import pytest
+
+from services import estructura
+from services.backend_falso import ClienteFalso, Fallos, json_falso, texto_falso
+from services.gemini_service import GeminiService
+from tools import prueba_carga
+from utils.curriculum_loader import cargar_curriculo
+
+
+def _sorteos(fallos, n):
+    return [fallos.sortear() for _ in range(n)]
+
+
+@pytest.fixture
+def backend():
+    return ClienteFalso(latencia=0.01, latencia_fragmento=0, tamano_fragmento=256, fallos=Fallos(semilla=1))
+
+
+def test_textos_deterministas():
+    """El texto depende solo del prompt y el realista tiene el tamaño de una respuesta real"""
+
+    assert texto_falso("SITUACIÓN uno") == texto_falso("SITUACIÓN uno")
+    assert texto_falso("SITUACIÓN uno") != texto_falso("SITUACIÓN dos")
+    situacion = texto_falso("SITUACIÓN uno", realista=True)
+    assert situacion == texto_falso("SITUACIÓN uno", realista=True)
+    assert len(situacion) > 15000
+    assert all(f"\n## {n}. " in situacion for n in range(1, 13))
+    rubrica = texto_falso("RÚBRICA uno", realista=True)
+    assert rubrica.count("### Criterio ") == 5 and len(rubrica) > 5000
+
+
+@pytest.mark.parametrize("realista", [False, True])
+def test_json_valido(realista):
+    """El modo estructurado devuelve documentos que services.estructura acepta"""
+
+    situacion = estructura.Situacion.desde_json(json.loads(json_falso("SITUACIÓN uno", realista)))
+    assert len(situacion.secciones) == 12
+    rubrica = estructura.Rubrica.desde_json(json.loads(json_falso("RÚBRICA uno", realista)))
+    assert rubrica.criterios
+
+
+def test_fallos_con_semilla():
+    """La misma semilla repite la secuencia de fallos; otra la cambia"""
+
+    configuracion = dict(error_503=0.2, error_429=0.1, cuelgue=0.05)
+    primera = _sorteos(Fallos(semilla=7, **configuracion), 200)
+    assert primera == _sorteos(Fallos(semilla=7, **configuracion), 200)
+    assert primera != _sorteos(Fallos(semilla=8, **configuracion), 200)
+
+
+def test_fallos_proporciones():
+    """Las probabilidades se respetan y fallar_primeras fuerza los primeros 503"""
+
+    n = 5000
+    sorteos = _sorteos(Fallos(error_503=0.3, error_429=0.1, cuelgue=0.05, semilla=1), n)
+    assert abs(sorteos.count("503") / n - 0.3) < 0.03
+    assert abs(sorteos.count("429") / n - 0.1) < 0.02
+    assert abs(sorteos.count("cuelgue") / n - 0.05) < 0.015
+    assert set(_sorteos(Fallos(error_429=1.0), 50)) == {"429"}
+    assert _sorteos(Fallos(fallar_primeras=3), 5) == ["503", "503", "503", None, None]
+
+
+def test_servicio_en_streaming(backend, datos):
+    """GeminiService funciona sobre el backend falso, con streaming en varios fragmentos"""
+
+    servicio = GeminiService(api_key="prueba", backend=backend)
+    fragmentos = list(servicio.generar_situacion_aprendizaje_stream(datos))
+    assert len(fragmentos) > 1 and "".join(fragmentos).startswith("# SITUACIÓN DE APRENDIZAJE")
+    # La misma petición devuelve el mismo texto (sin la caché de respuestas)
+    otra = GeminiService(api_key="prueba", backend=ClienteFalso(latencia=0, latencia_fragmento=0))
+    assert otra.generar_situacion_aprendizaje(datos, regenerar=True) == "".join(fragmentos)
+
+
+def test_reintento_tras_503(backend, datos):
+    """Un 503 inyectado se reintenta como con la API real"""
+
+    backend.fallos = Fallos(fallar_primeras=1)
+    servicio = GeminiService(api_key="prueba", backend=backend)
+    servicio.resiliencia.espera_base = 0.01
+    assert servicio.generar_rubrica(datos).startswith("# RÚBRICA")
+    assert backend.fallos.peticiones == 2
+
+
+def test_ronda_de_carga(backend, renderizador):
+    """Una ronda corta del arnés completa flujos y resume latencias, memoria y rutas"""
+
+    servicio = GeminiService(api_key="prueba", backend=backend)
+    trabajos = prueba_carga.listar_trabajos(cargar_curriculo().indice)[:3]
+    resultado = prueba_carga.ronda(servicio, renderizador, trabajos, profesores=2, duracion=1.0, pausa=0,
+                                   secuencial=False, semilla=1)
+    assert resultado["flujos"] >= 2 and resultado["errores"] == {}
+    assert resultado["etapas"]["flujo"]["p95"] >= resultado["etapas"]["flujo"]["p50"] > 0
+    assert resultado["rss_pico_mb"]["principal"] > 0
+    assert sum(resultado["rutas"].values()) >= 2 * resultado["flujos"]
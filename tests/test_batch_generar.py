@@ -0,0 +1,51 @@
+"""Generación por lotes (batch_generar.py) contra el servidor falso"""
+
+import functools
+import json
+
+import pytest
+
+import batch_generar
+from utils.curriculum_loader import cargar_curriculo
+
+CICLO = "Cuidados Auxiliares de Enfermería"
+
+
+@pytest.fixture(autouse=True)
+def entorno_lotes(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "prueba")
+    # Sin caché de respuestas: cada módulo regenerado debe llegar al servidor
+    monkeypatch.setenv("GEMINI_CACHE", "0")
+    monkeypatch.setattr(batch_generar, "cargar_curriculo",
+                        functools.partial(cargar_curriculo, snapshot_path=str(tmp_path / "curriculo.pickle")))
+
+
+def _lanzar(servidor, salida, *opciones):
+    url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    return batch_generar.main(["--ciclo", CICLO, "--salida", str(salida), "--base-url", url,
+                               "--sin-pdf", "--sin-historial", *opciones])
+
+
+def test_reanuda_desde_el_progreso(servidor, tmp_path):
+    salida = tmp_path / "salida"
+    assert _lanzar(servidor, salida, "--rpm", "0") == 0
+    progreso = json.loads((salida / "progreso.json").read_text(encoding="utf-8"))
+    assert len(progreso) == 8 and all(p["estado"] == "ok" for p in progreso.values())
+    peticiones = servidor.fallos.peticiones
+
+    # Relanzar el mismo comando no repite nada
+    assert _lanzar(servidor, salida, "--rpm", "0") == 0
+    assert servidor.fallos.peticiones == peticiones
+
+    # Un módulo sin terminar es lo único que se vuelve a generar
+    pendiente = next(iter(progreso))
+    progreso[pendiente]["estado"] = "error"
+    (salida / "progreso.json").write_text(json.dumps(progreso), encoding="utf-8")
+    assert _lanzar(servidor, salida, "--rpm", "0") == 0
+    assert servidor.fallos.peticiones - peticiones == peticiones // 8
+    assert json.loads((salida / "progreso.json").read_text(encoding="utf-8"))[pendiente]["estado"] == "ok"
+
+
+def test_rpm_negativo(servidor, tmp_path):
+    with pytest.raises(SystemExit):
+        _lanzar(servidor, tmp_path / "salida", "--rpm", "-1")
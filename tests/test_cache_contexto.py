@@ -0,0 +1,61 @@
+"""Caché de contexto de las instrucciones fijas contra el servidor falso"""
+
+import pytest
+
+from services.gemini_service import Consumo
+
+# El servidor falso cuenta 4 caracteres por token: con este mínimo cabe la situación
+MINIMO_TOKENS = 600
+
+
+@pytest.fixture(autouse=True)
+def con_cache_contexto(monkeypatch):
+    monkeypatch.setenv("GEMINI_CACHE", "0")
+    monkeypatch.setenv("GEMINI_CACHE_CONTEXTO", "1")
+
+
+@pytest.fixture
+def servidor(servidores):
+    return servidores(minimo_tokens_cache=MINIMO_TOKENS)
+
+
+@pytest.fixture
+def servicio(servidor, servicio_para):
+    servicio = servicio_para(servidor)
+    servicio.cache_contexto.minimo_tokens = MINIMO_TOKENS
+    return servicio
+
+
+def test_instrucciones_cacheadas(servidor, servicio, datos):
+    """Se crea un único contenido y todas las situaciones lo usan, también en streaming"""
+
+    consumo = Consumo()
+    for i in range(3):
+        servicio.generar_situacion_aprendizaje({**datos, "contexto": f"cacheada {i}"}, consumo=consumo)
+    "".join(servicio.generar_situacion_aprendizaje_stream({**datos, "contexto": "en streaming"}, consumo=consumo))
+    assert servidor.instrucciones_recibidas["cache"] == 4
+    assert servicio.cache_contexto.contadores["creadas"] == 1
+    assert consumo.tokens_cacheados > 0
+
+
+def test_contenido_caducado(servidor, servicio, datos):
+    """Si el contenido ya no existe se reintenta con system instruction y después se recrea"""
+
+    servicio.generar_situacion_aprendizaje({**datos, "contexto": "antes"})
+    servidor.caches.clear()
+    servicio.generar_situacion_aprendizaje({**datos, "contexto": "sin contenido"})
+    servicio.generar_situacion_aprendizaje({**datos, "contexto": "recreado"})
+    contadores = servicio.cache_contexto.contadores
+    assert contadores["invalidadas"] == 1
+    assert contadores["creadas"] == 2
+    assert servidor.instrucciones_recibidas["system_instruction"] == 1
+
+
+def test_sin_soporte(servidor, servicio, datos):
+    """Sin caché de contexto las instrucciones viajan siempre en la petición y no se insiste"""
+
+    servidor.cache_contexto = False
+    for i in range(3):
+        servicio.generar_situacion_aprendizaje({**datos, "contexto": f"sin soporte {i}"})
+    assert servidor.instrucciones_recibidas["system_instruction"] == 3
+    assert servicio.cache_contexto.contadores["fallos"] == 1
@@ -0,0 +1,82 @@
+"""Caché de respuestas de Gemini (RespuestaCache y clave_cache)"""
+
+import pytest
+
+from services import gemini_service
+from services.gemini_service import Consumo, RespuestaCache, clave_cache
+
+MODELO = "gemini-2.5-flash"
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Hora controlada por la prueba: reloj[0] son los segundos actuales"""
+    ahora = [1_000_000.0]
+    monkeypatch.setattr(gemini_service.time, "time", lambda: ahora[0])
+    return ahora
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RespuestaCache(str(tmp_path / "respuestas.sqlite3"), ttl=60, max_entradas=2)
+
+
+def test_clave_cambia_con_la_version_del_prompt(datos, monkeypatch):
+    antes = clave_cache("situacion", datos, MODELO)
+    monkeypatch.setattr(gemini_service, "PROMPT_VERSION", gemini_service.PROMPT_VERSION + "-nueva")
+    assert clave_cache("situacion", datos, MODELO) != antes
+
+
+def test_clave_por_tramo_de_creatividad(datos):
+    clave = clave_cache("situacion", dict(datos, creatividad=0.7), MODELO)
+    # 0.6 y 0.7 caen en el mismo tramo; 0.8 en el siguiente
+    assert clave_cache("situacion", dict(datos, creatividad=0.6), MODELO) == clave
+    assert clave_cache("situacion", dict(datos, creatividad=0.8), MODELO) != clave
+
+
+def test_clave_de_datos_equivalentes(datos):
+    datos = dict(datos, recursos=["Simuladores clínicos", "Material sanitario"], contexto="Un  hospital ")
+    reordenados = dict(reversed(list(datos.items())), recursos=list(reversed(datos["recursos"])),
+                       contexto="Un hospital", producto_final="")
+    assert clave_cache("situacion", reordenados, MODELO) == clave_cache("situacion", datos, MODELO)
+
+
+def test_caducidad(cache, reloj):
+    cache.guardar("clave", "situacion", "texto")
+    reloj[0] += 59
+    assert cache.obtener("clave") == "texto"
+    reloj[0] += 2
+    assert cache.obtener("clave") is None
+
+
+def test_expulsion_lru(cache, reloj):
+    cache.guardar("a", "situacion", "A")
+    reloj[0] += 1
+    cache.guardar("b", "situacion", "B")
+    reloj[0] += 1
+    # Leer "a" la hace más reciente que "b": la tercera entrada expulsa a "b"
+    assert cache.obtener("a") == "A"
+    reloj[0] += 1
+    cache.guardar("c", "situacion", "C")
+    assert cache.obtener("b") is None
+    assert cache.obtener("a") == "A" and cache.obtener("c") == "C"
+
+
+def test_expulsion_por_tamano(tmp_path, reloj):
+    cache = RespuestaCache(str(tmp_path / "respuestas.sqlite3"), max_bytes=10)
+    cache.guardar("a", "situacion", "x" * 6)
+    reloj[0] += 1
+    cache.guardar("b", "situacion", "y" * 6)
+    assert cache.obtener("a") is None and cache.obtener("b") == "y" * 6
+
+
+def test_acierto_con_datos_reordenados(servidor, servicio, datos):
+    """Los mismos datos en otro orden se sirven desde la caché sin llamar a Gemini"""
+
+    datos = dict(datos, recursos=["Simuladores clínicos", "Material sanitario"])
+    primera = servicio.generar_esquema(datos)
+    consumo = Consumo()
+    reordenados = dict(reversed(list(datos.items())), recursos=list(reversed(datos["recursos"])))
+    assert servicio.generar_esquema(reordenados, consumo=consumo) == primera
+    assert consumo.desde_cache == 1 and consumo.llamadas == 0
+    assert servidor.fallos.peticiones == 1
@@ -0,0 +1,90 @@
+"""Muchas sesiones piden a la vez la misma generación con un GeminiService compartido"""
+
+import threading
+import time
+
+import pytest
+
+from services.gemini_service import Consumo
+
+SESIONES = 30
+
+
+@pytest.fixture(autouse=True)
+def sin_cache(monkeypatch):
+    # Sin caché de respuestas: solo se mide la coalescencia de las llamadas en curso
+    monkeypatch.setenv("GEMINI_CACHE", "0")
+
+
+@pytest.fixture
+def servidor(servidores):
+    return servidores(latencia=0.5, latencia_fragmento=0.05)
+
+
+@pytest.fixture
+def datos(datos):
+    return dict(datos, recursos=["Simuladores clínicos", "Material sanitario"])
+
+
+def _lanzar(objetivo):
+    hilos = [threading.Thread(target=objetivo, args=(i,)) for i in range(SESIONES)]
+    for hilo in hilos:
+        hilo.start()
+        # Los profesores no pulsan exactamente a la vez
+        time.sleep(0.005)
+    for hilo in hilos:
+        hilo.join()
+
+
+def test_misma_generacion(servidor, servicio, datos):
+    """Todas las sesiones comparten una única petición en streaming"""
+
+    textos = [None] * SESIONES
+    consumos = [Consumo() for _ in range(SESIONES)]
+    # El orden de los recursos no cambia la petición: también deben agruparse
+    pedidos = [dict(datos, recursos=list(reversed(datos["recursos"])) if i % 2 else datos["recursos"])
+               for i in range(SESIONES)]
+
+    def sesion(i):
+        textos[i] = "".join(servicio.generar_situacion_aprendizaje_stream(pedidos[i], consumo=consumos[i]))
+
+    _lanzar(sesion)
+    assert servidor.fallos.peticiones == 1
+    assert textos[0] and len(set(textos)) == 1
+    assert sum(c.coalescidas for c in consumos) == SESIONES - 1
+
+
+def test_lider_cancelado(servidor, servicio, datos):
+    """Si la sesión que inició el flujo se cancela, las demás siguen recibiendo el texto"""
+
+    datos = dict(datos, contexto="lider cancelado")
+    textos = [None] * SESIONES
+    cancelar_lider = threading.Event()
+
+    def sesion(i):
+        partes = []
+        cancelar = cancelar_lider if i == 0 else None
+        for fragmento in servicio.generar_situacion_aprendizaje_stream(datos, cancelar=cancelar):
+            partes.append(fragmento)
+            if i == 0 and len(partes) == 2:
+                cancelar_lider.set()
+        textos[i] = "".join(partes)
+
+    _lanzar(sesion)
+    esperado = max(textos[1:], key=len)
+    assert servidor.fallos.peticiones == 1
+    assert all(texto == esperado for texto in textos[1:])
+    assert len(textos[0]) < len(esperado)
+
+
+def test_llamadas_bloqueantes(servidor, servicio, datos):
+    """generar_esquema (sin streaming) también se agrupa"""
+
+    esquemas = [None] * SESIONES
+
+    def sesion(i):
+        esquemas[i] = servicio.generar_esquema(datos)
+
+    _lanzar(sesion)
+    assert servidor.fallos.peticiones == 1
+    assert len(set(esquemas)) == 1
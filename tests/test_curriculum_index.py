@@ -0,0 +1,61 @@
+"""Índice del currículo (utils.curriculum_index) sobre data/ciclos_sanitarios.json"""
+
+import json
+
+import pytest
+
+from utils.curriculum_index import NIVELES, CurriculumIndex
+from utils.curriculum_loader import DATA_PATH
+
+
+@pytest.fixture(scope="module")
+def datos_curriculo():
+    with open(DATA_PATH, encoding="utf-8") as file:
+        return json.load(file)
+
+
+@pytest.fixture(scope="module")
+def indice(datos_curriculo):
+    return CurriculumIndex(datos_curriculo)
+
+
+def test_ciclo_y_modulo_por_nombre(indice):
+    ciclo = indice.ciclo("Grado Medio", "Farmacia y Parafarmacia")
+    assert ciclo.nombre == "Farmacia y Parafarmacia" and ciclo.nivel == "Grado Medio"
+    modulo = indice.modulo("Grado Medio", "Farmacia y Parafarmacia", "Dispensación de productos farmacéuticos")
+    assert modulo.codigo == "0031" and modulo.ciclo is ciclo
+    assert modulo.opciones_resultados and modulo.opciones_criterios
+
+
+def test_nombres_desconocidos(indice):
+    assert indice.ciclo("Grado Superior", "Farmacia y Parafarmacia") is None
+    assert indice.ciclo("Doctorado", "Farmacia y Parafarmacia") is None
+    assert indice.modulo("Grado Medio", "Farmacia y Parafarmacia", "No existe") is None
+    assert indice.modulo("Grado Medio", "No existe", "Oficina de farmacia") is None
+
+
+def test_busquedas_por_diccionario(indice, datos_curriculo):
+    """Los nombres se buscan en diccionarios, no recorriendo la lista de ciclos"""
+    for nivel, nivel_key in NIVELES.items():
+        assert set(indice.ciclos[nivel]) == set(datos_curriculo[nivel_key])
+        for nombre, ciclo in indice.ciclos[nivel].items():
+            assert indice.ciclo(nivel, nombre) is ciclo
+            assert indice.ciclos_por_codigo[ciclo.codigo] is ciclo
+            for nombre_modulo, modulo in ciclo.modulos.items():
+                assert indice.modulo(nivel, nombre, nombre_modulo) is modulo
+
+
+def test_codigos_repetidos(indice):
+    """FOL y FCT están en todos los ciclos: el código lleva a cada uno de ellos"""
+    total = sum(len(ciclos) for ciclos in indice.ciclos.values())
+    ciclos = indice.ciclos_de_modulo("FOL")
+    assert 1 < len(ciclos) <= total and len({c.codigo for c in ciclos}) == len(ciclos)
+    assert indice.modulos_con_codigo("no existe") == []
+
+
+def test_iter_modulos_filtrado(indice):
+    farmacia = list(indice.iter_modulos("Grado Medio", "Farmacia y Parafarmacia"))
+    assert farmacia and all(m.ciclo.nombre == "Farmacia y Parafarmacia" for m in farmacia)
+    medio = list(indice.iter_modulos("Grado Medio"))
+    assert len(list(indice.iter_modulos())) > len(medio) > len(farmacia)
+    assert indice.opciones_ciclos["Grado Medio"] == tuple(indice.ciclos["Grado Medio"])
@@ -0,0 +1,105 @@
+"""Carga validada del currículo con instantánea (utils.curriculum_loader)"""
+
+import json
+import os
+import pickle
+import shutil
+
+import pytest
+
+from utils import curriculum_loader
+from utils.curriculum_loader import (
+    DATA_PATH, SNAPSHOT_VERSION, CurriculoInvalidoError, cargar_curriculo, clave_origen, validar_ciclos_data
+)
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    """Copia del JSON del currículo y ruta de su instantánea"""
+    json_path = tmp_path / "ciclos.json"
+    shutil.copy(DATA_PATH, json_path)
+    return str(json_path), str(tmp_path / "curriculo.pickle")
+
+
+def test_datos_reales_validos():
+    with open(DATA_PATH, encoding="utf-8") as file:
+        assert validar_ciclos_data(json.load(file)) == []
+
+
+def test_errores_de_validacion():
+    datos = {
+        "grado_medio": {"Ciclo": {"codigo": 1, "duracion": "2000 horas", "modulos": {
+            "Módulo": {"codigo": "0001", "horas": 100, "resultados_aprendizaje": ["RA1", 2]},
+        }}},
+        "metodologias_activas": [],
+        "competencias": {"profesionales": [], "personales": []},
+    }
+    errores = validar_ciclos_data(datos)
+    assert "grado_medio/Ciclo: 'codigo' debe ser un texto" in errores
+    assert "grado_medio/Ciclo/Módulo: 'resultados_aprendizaje' debe ser una lista de textos" in errores
+    assert "falta el objeto 'grado_superior'" in errores
+    assert "'competencias/sociales' debe ser una lista de textos" in errores
+    assert validar_ciclos_data([]) == ["la raíz debe ser un objeto"]
+
+
+def test_json_invalido(tmp_path):
+    ruta = tmp_path / "ciclos.json"
+    ruta.write_text(json.dumps({"grado_medio": []}), encoding="utf-8")
+    with pytest.raises(CurriculoInvalidoError) as error:
+        cargar_curriculo(str(ruta), snapshot_path=None)
+    assert "falta el objeto 'grado_superior'" in error.value.errores
+
+
+def test_instantanea_con_cabecera(rutas, monkeypatch):
+    json_path, snapshot_path = rutas
+    curriculo = cargar_curriculo(json_path, snapshot_path)
+    with open(snapshot_path, "rb") as file:
+        assert pickle.load(file) == {"version": SNAPSHOT_VERSION, "origen": clave_origen(json_path)}
+
+    # Con la instantánea al día no se vuelve a leer el JSON
+    monkeypatch.setattr(curriculum_loader, "leer_ciclos_json", None)
+    cargado = cargar_curriculo(json_path, snapshot_path)
+    assert cargado is not curriculo and cargado.origen == curriculo.origen
+    assert cargado.indice.ciclo("Grado Medio", "Farmacia y Parafarmacia") is not None
+
+
+def test_instantanea_de_otra_version(rutas, monkeypatch):
+    json_path, snapshot_path = rutas
+    cargar_curriculo(json_path, snapshot_path)
+    monkeypatch.setattr(curriculum_loader, "SNAPSHOT_VERSION", SNAPSHOT_VERSION + 1)
+    leidos = []
+    leer = curriculum_loader.leer_ciclos_json
+    monkeypatch.setattr(curriculum_loader, "leer_ciclos_json", lambda ruta: leidos.append(ruta) or leer(ruta))
+    cargar_curriculo(json_path, snapshot_path)
+    assert leidos == [json_path]
+
+
+def test_json_modificado(rutas):
+    json_path, snapshot_path = rutas
+    cargar_curriculo(json_path, snapshot_path)
+    with open(json_path, encoding="utf-8") as file:
+        datos = json.load(file)
+    datos["grado_medio"].pop("Farmacia y Parafarmacia")
+    with open(json_path, "w", encoding="utf-8") as file:
+        json.dump(datos, file, ensure_ascii=False)
+    assert cargar_curriculo(json_path, snapshot_path).indice.ciclo("Grado Medio", "Farmacia y Parafarmacia") is None
+
+
+@pytest.mark.parametrize("contenido", [b"", b"esto no es un pickle", b"\x80\x05\x95"])
+def test_instantanea_corrupta(rutas, contenido):
+    """Una instantánea dañada se ignora y se reescribe desde el JSON"""
+
+    json_path, snapshot_path = rutas
+    with open(snapshot_path, "wb") as file:
+        file.write(contenido)
+    curriculo = cargar_curriculo(json_path, snapshot_path)
+    assert curriculo.indice.ciclo("Grado Medio", "Farmacia y Parafarmacia") is not None
+    assert os.path.getsize(snapshot_path) > len(contenido)
+
+
+def test_instantanea_truncada(rutas):
+    json_path, snapshot_path = rutas
+    cargar_curriculo(json_path, snapshot_path)
+    with open(snapshot_path, "r+b") as file:
+        file.truncate(os.path.getsize(snapshot_path) // 2)
+    assert cargar_curriculo(json_path, snapshot_path).indice.ciclo("Grado Medio", "Farmacia y Parafarmacia")
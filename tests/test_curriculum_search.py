@@ -0,0 +1,62 @@
+"""Búsqueda BM25 sobre módulos, RA y CE (utils.curriculum_search)"""
+
+import json
+
+import pytest
+
+from utils.curriculum_index import CurriculumIndex
+from utils.curriculum_loader import DATA_PATH
+from utils.curriculum_search import BuscadorCurriculo, lematizar, normalizar, tokenizar
+
+
+@pytest.fixture(scope="module")
+def buscador():
+    with open(DATA_PATH, encoding="utf-8") as file:
+        return BuscadorCurriculo(CurriculumIndex(json.load(file)))
+
+
+def test_normalizar_acentos():
+    assert normalizar("Dispensación ÓPTICA pingüino") == "dispensacion optica pinguino"
+
+
+@pytest.mark.parametrize("variantes", [
+    ("técnica", "Técnicas", "TÉCNICOS"),
+    ("protocolo", "protocolos"),
+    ("dispensación", "dispensaciones", "Dispensar"),
+    ("prótesis", "protesis"),
+])
+def test_lematizar_variantes(variantes):
+    assert len({lematizar(normalizar(palabra)) for palabra in variantes}) == 1
+
+
+def test_raiz_minima():
+    # Las palabras cortas no se quedan sin raíz
+    assert lematizar("ojos") == "ojos"
+
+
+def test_tokenizar_sin_palabras_vacias():
+    assert tokenizar("Higiene del paciente en la unidad") == ["higien", "pacient", "unidad"]
+
+
+def test_ranking_dispensacion(buscador):
+    primero = buscador.buscar("dispensación de medicamentos", limite=3)[0]
+    assert primero.modulo.nombre == "Dispensación de productos farmacéuticos"
+    assert primero.modulo.ciclo.nombre == "Farmacia y Parafarmacia"
+
+
+def test_ranking_protesis(buscador):
+    resultados = buscador.buscar("prótesis dentales")
+    assert resultados[0].modulo.nombre == "Diseño de prótesis dentales"
+    assert [r.puntuacion for r in resultados] == sorted((r.puntuacion for r in resultados), reverse=True)
+
+
+def test_textos_coincidentes(buscador):
+    """Los RA y CE que coinciden se devuelven para preseleccionarlos"""
+    resultado = buscador.buscar("dispensación de medicamentos", limite=1)[0]
+    textos = resultado.resultados + resultado.criterios
+    assert textos and all(set(tokenizar(t)) & {"dispens", "medicament"} for t in textos)
+
+
+def test_sin_coincidencias(buscador):
+    assert buscador.buscar("xyzzy") == []
+    assert buscador.buscar("de la los") == []
@@ -0,0 +1,82 @@
+"""Exportación a Word (services.docx_generator)"""
+
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+
+import pytest
+
+from services.docx_generator import TAMANO_BUFER, escribir_docx, generate_docx
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+SITUACION = """# SITUACIÓN DE APRENDIZAJE: Higiene & <seguridad>
+
+## 1. IDENTIFICACIÓN
+Texto con **negrita**, *cursiva* y un carácter de control\x07 que Word no admite.
+
+- Viñeta
+  - Viñeta anidada
+1. Paso numerado
+"""
+
+RUBRICA = """# RÚBRICA DE EVALUACIÓN
+
+## Criterios de evaluación
+| Criterio | Insuficiente | Suficiente | Notable | Sobresaliente |
+|---|---|---|---|---|
+| Higiene de manos | No la realiza | La realiza | La realiza bien | **Enseña** a otros |
+| Uso de <guantes> & bata | Incorrecto |
+"""
+
+
+@pytest.fixture
+def docx(tmp_path, datos):
+    ruta = tmp_path / "documento.docx"
+    escribir_docx(str(ruta), SITUACION, RUBRICA, datos)
+    with zipfile.ZipFile(ruta) as paquete:
+        yield paquete
+
+
+def _texto(elemento):
+    return "".join(t.text or "" for t in elemento.iter(f"{W}t"))
+
+
+def test_partes_bien_formadas(docx):
+    nombres = set(docx.namelist())
+    assert {"[Content_Types].xml", "_rels/.rels", "word/_rels/document.xml.rels", "word/styles.xml",
+            "docProps/core.xml", "word/document.xml"} == nombres
+    for nombre in nombres:
+        ET.fromstring(docx.read(nombre))
+    assert docx.testzip() is None
+
+
+def test_tabla_de_rubrica(docx):
+    cuerpo = ET.fromstring(docx.read("word/document.xml")).find(f"{W}body")
+    tablas = cuerpo.findall(f"{W}tbl")
+    # La información del ciclo y la tabla de la rúbrica
+    assert len(tablas) == 2
+    filas = tablas[1].findall(f"{W}tr")
+    assert len(filas) == 3
+    assert filas[0].find(f"{W}trPr/{W}tblHeader") is not None
+    assert all(len(fila.findall(f"{W}tc")) == 5 for fila in filas)
+    assert [_texto(celda) for celda in filas[2].findall(f"{W}tc")][:2] == ["Uso de <guantes> & bata", "Incorrecto"]
+    negrita = [r for r in filas[1].iter(f"{W}r") if r.find(f"{W}rPr/{W}b") is not None]
+    assert [_texto(r) for r in negrita] == ["Enseña"]
+
+
+def test_texto_escapado(docx):
+    documento = ET.fromstring(docx.read("word/document.xml"))
+    texto = _texto(documento)
+    assert "Higiene & <seguridad>" in texto
+    assert "\x07" not in texto and "carácter de control que Word" in texto
+
+
+def test_documento_grande_por_partes(datos):
+    """Un documento mayor que el búfer se escribe en varios trozos y sigue siendo XML válido"""
+
+    situacion = SITUACION + "\n".join(f"Párrafo {n} de relleno con varias palabras." for n in range(5000))
+    with zipfile.ZipFile(io.BytesIO(generate_docx(situacion, RUBRICA, datos))) as paquete:
+        documento = paquete.read("word/document.xml")
+    assert len(documento) > 3 * TAMANO_BUFER
+    assert "Párrafo 4999 de relleno" in _texto(ET.fromstring(documento))
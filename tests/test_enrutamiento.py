@@ -0,0 +1,130 @@
+"""Reparto de llamadas entre claves y modelos (services.enrutador) con backends sin red"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.backend_falso import ClienteFalso, Fallos
+from services.enrutador import MODELO, MODELO_RESPALDO, Enrutador, crear_rutas
+from services.gemini_service import Consumo, GeminiService
+from services.metricas import metricas
+from services.resiliencia import ServicioNoDisponibleError
+
+
+@pytest.fixture(autouse=True)
+def metricas_limpias():
+    metricas.reiniciar()
+
+
+@pytest.fixture
+def servicio_con(monkeypatch):
+    """Fábrica de GeminiService cuyas rutas usan un backend por clave ({clave: ClienteFalso})"""
+
+    def crear(backends, rpm=0):
+        servicio = GeminiService(api_key="prueba")
+        monkeypatch.setenv("GEMINI_RPM", str(rpm))
+        servicio.enrutador = Enrutador(crear_rutas(list(backends), backend=backends.__getitem__, cache_contexto=False))
+        servicio.resiliencia.espera_base = 0.05
+        return servicio
+
+    return crear
+
+
+def _contador(nombre, **etiquetas):
+    return sum(
+        valor for (actual, clave), valor in metricas.contadores().items()
+        if actual == nombre and all(dict(clave).get(k) == v for k, v in etiquetas.items())
+    )
+
+
+def test_reparto(servicio_con, datos):
+    """Las llamadas simultáneas se reparten entre las claves"""
+
+    servicio = servicio_con({f"clave-{n}": ClienteFalso(latencia=0.3, realista=False) for n in range(3)})
+    consumo = Consumo()
+    with ThreadPoolExecutor(max_workers=9) as executor:
+        list(executor.map(
+            lambda n: servicio.generar_esquema(dict(datos, contexto=f"grupo {n}"), consumo=consumo), range(18)
+        ))
+    assert len(consumo.rutas) == 3 and min(consumo.rutas.values()) >= 3
+    assert consumo.modelos == {MODELO}
+
+
+def test_latencia(servicio_con, datos):
+    """La clave que responde antes recibe la mayor parte de las llamadas"""
+
+    servicio = servicio_con({
+        "lenta": ClienteFalso(latencia=0.4, realista=False),
+        "rapida": ClienteFalso(latencia=0.05, realista=False),
+    })
+    consumo = Consumo()
+    for n in range(12):
+        servicio.generar_esquema(dict(datos, contexto=f"secuencial {n}"), consumo=consumo)
+    assert consumo.rutas.get(f"clave2:{MODELO}", 0) >= 10
+
+
+def test_429(servicio_con, datos):
+    """Un 429 en una clave se repite al momento por otra, sin la espera de LlamadaResiliente"""
+
+    servicio = servicio_con({
+        "agotada": ClienteFalso(latencia=0.05, realista=False, fallos=Fallos(error_429=1.0)),
+        "libre": ClienteFalso(latencia=0.05, realista=False),
+    })
+    consumo = Consumo()
+    inicio = time.perf_counter()
+    for n in range(6):
+        servicio.generar_esquema(dict(datos, contexto=f"cuota {n}"), consumo=consumo)
+    assert time.perf_counter() - inicio < 1.5
+
+    estado = {r["ruta"]: r for r in servicio.enrutador.estado()}
+    assert consumo.rutas == {f"clave2:{MODELO}": 6}
+    # La clave agotada recibe una sola petición: después queda bloqueada el retryDelay
+    assert estado[f"clave1:{MODELO}"]["errores"] == 1
+    assert servicio.resiliencia.contadores["reintentos"] == 0
+    assert _contador("gemini_rutas_total", ruta=f"clave1:{MODELO}", resultado="error 429") == 1
+
+
+def test_uso_solo_de_llamadas_servidas(servicio_con, datos):
+    """Un flujo que no llega a abrirse no cuenta como llamada en el Consumo"""
+
+    backend = ClienteFalso(latencia=0.01, latencia_fragmento=0, realista=False)
+    servicio = servicio_con({"unica": backend})
+    servicio.resiliencia.intentos = 2
+    servicio.resiliencia.espera_base = 0.01
+
+    backend.fallos = Fallos(error_503=1.0)
+    fallida = Consumo()
+    with pytest.raises(Exception):
+        list(servicio.generar_situacion_aprendizaje_stream(datos, regenerar=True, consumo=fallida))
+    assert backend.fallos.peticiones == 2
+    assert fallida.llamadas == 0 and fallida.rutas == {}
+
+    backend.fallos = Fallos()
+    servida = Consumo()
+    list(servicio.generar_situacion_aprendizaje_stream(datos, regenerar=True, consumo=servida))
+    assert servida.llamadas == 1 and servida.rutas == {f"clave1:{MODELO}": 1}
+
+
+@pytest.mark.skipif(not MODELO_RESPALDO, reason="GEMINI_MODELO_RESPALDO está vacío")
+def test_respaldo(servicio_con, datos):
+    """Sin cuota del modelo principal, la rúbrica pasa al de respaldo y la situación no"""
+
+    # 3 peticiones por minuto: el esquema y dos generaciones más agotan la ráfaga del modelo principal
+    servicio = servicio_con({"unica": ClienteFalso(latencia=0.05, realista=False)}, rpm=3)
+    servicio.resiliencia.plazo = 1.0
+    esquema = servicio.generar_esquema(datos)
+    for n in range(2):
+        servicio.generar_esquema(dict(datos, contexto=f"ráfaga {n}"))
+
+    rubrica = Consumo()
+    servicio.generar_rubrica(datos, esquema=esquema, consumo=rubrica)
+    assert rubrica.modelos == {MODELO_RESPALDO}
+    assert rubrica.modelo(MODELO) == MODELO_RESPALDO
+    # La respuesta del respaldo no se guarda en la caché: la siguiente vuelve a llamar
+    repetida = Consumo()
+    servicio.generar_rubrica(datos, esquema=esquema, consumo=repetida)
+    assert repetida.desde_cache == 0 and repetida.llamadas == 1
+    with pytest.raises(ServicioNoDisponibleError):
+        servicio.generar_situacion_aprendizaje(datos, esquema=esquema)
+    assert _contador("gemini_respaldo_total", tipo="rubrica") == 2
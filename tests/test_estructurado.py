@@ -0,0 +1,86 @@
+"""Modo estructurado (JSON) contra el servidor falso, con caché de respuestas propia"""
+
+import io
+import json
+import time
+import zipfile
+
+import pytest
+
+from services import estructura
+from services.docx_generator import generate_docx
+from services.pdf_generator import generate_pdf
+from tools import fake_gemini_server
+
+json_original = fake_gemini_server.json_falso
+
+
+@pytest.fixture
+def servidor(servidores):
+    return servidores(tamano_fragmento=64)
+
+
+@pytest.fixture
+def datos(datos):
+    return dict(
+        datos,
+        resultados_aprendizaje=["RA1. Aplica técnicas de higiene"],
+        criterios_evaluacion=["a) Se han descrito los protocolos"],
+    )
+
+
+def _json_modificado(monkeypatch, modificar):
+    """Hace que el servidor falso devuelva el JSON de siempre tras pasar por modificar(documento)"""
+
+    def json_falso(prompt, realista=False):
+        documento = json.loads(json_original(prompt, realista))
+        modificar(documento)
+        return json.dumps(documento, ensure_ascii=False)
+
+    monkeypatch.setattr(fake_gemini_server, "json_falso", json_falso)
+
+
+def test_documento_por_partes(servicio, datos):
+    """Cada sección aparece validada según llega y el PDF y el Word se maquetan desde los objetos"""
+
+    parciales = []
+    for situacion in servicio.generar_situacion_estructurada_stream({**datos, "contexto": "por partes"}):
+        parciales.append(len(situacion.secciones))
+    rubrica = servicio.generar_rubrica_estructurada(datos, situacion)
+    pdf = generate_pdf(situacion, rubrica, datos)
+    with zipfile.ZipFile(io.BytesIO(generate_docx(situacion, rubrica, datos))) as docx:
+        tablas = docx.read("word/document.xml").count(b"<w:tbl>")
+
+    assert situacion.completa and len(situacion.secciones) == estructura.SECCIONES_SITUACION
+    assert len(set(parciales)) > 3
+    assert len(situacion.fases) == 3
+    assert rubrica.completa and len(rubrica.criterios) == 4
+    assert pdf.startswith(b"%PDF")
+    # Información del ciclo, una por fase, una por criterio y el resumen de pesos
+    assert tablas >= 1 + len(situacion.fases) + len(rubrica.criterios) + 1
+
+
+def test_seccion_ausente(servidor, servicio, datos, monkeypatch):
+    """Sin la sección 12 el documento se rechaza y la respuesta no se sirve desde la caché"""
+
+    datos = {**datos, "contexto": f"sección ausente {time.time()}"}
+    with monkeypatch.context() as parche:
+        _json_modificado(parche, lambda documento: documento["secciones"].pop())
+        for _ in range(2):
+            with pytest.raises(estructura.EstructuraInvalidaError, match="12"):
+                servicio.generar_situacion_estructurada(datos)
+    situacion = servicio.generar_situacion_estructurada(datos)
+    # Las dos llamadas fallidas y la buena llegan a Gemini: nada inválido se quedó en caché
+    assert situacion.completa
+    assert servidor.fallos.peticiones == 3
+
+
+def test_criterio_invalido(servidor, servicio, datos, monkeypatch):
+    """Un criterio sin descriptores corta el flujo en cuanto se cierra, sin esperar al final"""
+
+    _json_modificado(monkeypatch, lambda documento: documento["criterios"][0].update(insuficiente=""))
+    recibidos = []
+    with pytest.raises(estructura.EstructuraInvalidaError, match="insuficiente"):
+        for rubrica in servicio.generar_rubrica_estructurada_stream(datos, esquema="# ESQUEMA: prueba"):
+            recibidos.append(len(rubrica.criterios))
+    assert len(recibidos) * servidor.tamano_fragmento < len(json_original("RÚBRICA"))
@@ -0,0 +1,89 @@
+"""Exportación por lotes de la programación de un ciclo con situaciones sintéticas (tools/bench_pdf.py)"""
+
+import time
+import tracemalloc
+import zipfile
+
+import pytest
+
+from services.exportacion import exportar_lote
+from services.historial import HistorialGeneraciones
+from tools.bench_pdf import PARAMETROS, rubrica_sintetica, situacion_sintetica
+
+CICLO = "Cuidados Auxiliares de Enfermería"
+
+
+@pytest.fixture
+def historial(tmp_path):
+    return HistorialGeneraciones(str(tmp_path / "historial.sqlite3"))
+
+
+def _ciclo(historial, ciclo, modulos):
+    """Guarda una situación distinta por módulo y devuelve las entradas de la programación"""
+    situacion, rubrica = situacion_sintetica(), rubrica_sintetica()
+    for n in range(modulos):
+        parametros = {**PARAMETROS, "ciclo": ciclo, "modulo": f"Módulo {n + 1:02d} de prueba"}
+        historial.guardar(situacion.replace("SECCIÓN 1", f"SECCIÓN 1 ({n})"), rubrica, parametros, "prueba")
+    return historial.ultimos_por_modulo(ciclo)
+
+
+def _exportar(historial, renderizador, entradas, ciclo):
+    """Exporta y devuelve el resultado, los nombres del zip, la memoria pico y los segundos"""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = exportar_lote(historial, renderizador, entradas, ciclo=ciclo)
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with zipfile.ZipFile(resultado.ruta) as paquete:
+        nombres = paquete.namelist()
+    return resultado, nombres, pico, duracion
+
+
+def test_memoria_plana(historial, renderizador):
+    """20 módulos no necesitan más memoria que 8: los documentos se copian desde disco"""
+
+    picos = []
+    for modulos in (8, 20):
+        ciclo = f"{CICLO} ({modulos})"
+        resultado, nombres, pico, _ = _exportar(historial, renderizador, _ciclo(historial, ciclo, modulos), ciclo)
+        assert resultado.errores == []
+        assert len(nombres) == 2 * modulos + 1 and "indice.md" in nombres
+        picos.append(pico)
+    # Margen para el índice y los nombres, que sí crecen con el número de módulos
+    assert picos[1] < picos[0] * 1.5 + 256 * 1024
+
+
+def test_zip_reutilizado(historial, renderizador):
+    """La misma exportación devuelve el zip ya construido sin volver a escribirlo"""
+
+    ciclo = f"{CICLO} (repetida)"
+    entradas = _ciclo(historial, ciclo, 3)
+    primero = _exportar(historial, renderizador, entradas, ciclo)
+    segundo = _exportar(historial, renderizador, entradas, ciclo)
+    assert segundo[0].ruta == primero[0].ruta
+    assert segundo[0].errores == [] and segundo[0].documentos == 3
+    assert segundo[3] < primero[3]
+    # El índice no lleva nada que caduque al reutilizar el zip
+    with zipfile.ZipFile(segundo[0].ruta) as paquete:
+        indice = paquete.read("indice.md").decode("utf-8")
+    assert indice.startswith(f"# Programación: {ciclo}\n") and "Exportada" not in indice
+    assert all(entrada.modulo in indice for entrada in entradas)
+    # Otro encabezado de índice es otro zip
+    otro = _exportar(historial, renderizador, entradas, f"{ciclo} bis")
+    assert otro[0].ruta != primero[0].ruta
+
+
+def test_cache_y_errores(historial, renderizador):
+    """Tras borrar un documento no se vuelve a renderizar lo demás y el borrado se anota"""
+
+    ciclo = f"{CICLO} (errores)"
+    entradas = _ciclo(historial, ciclo, 4)
+    primero = _exportar(historial, renderizador, entradas, ciclo)
+    historial.borrar(entradas[1].id)
+    resultado, nombres, _, segundo = _exportar(historial, renderizador, entradas, ciclo)
+    assert resultado.ruta != primero[0].ruta and resultado.ruta.endswith("_incompleto.zip")
+    assert resultado.errores and len(resultado.errores) == 1
+    assert resultado.errores[0][0] == entradas[1].modulo
+    assert len(nombres) == 2 * 3 + 1 and resultado.documentos == 4
+    assert segundo < primero[3]
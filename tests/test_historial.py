@@ -0,0 +1,115 @@
+"""Historial de generaciones en SQLite con búsqueda FTS5 (services.historial)"""
+
+import json
+import time
+
+import pytest
+
+from services.historial import HistorialGeneraciones, consulta_fts, extraer_titulo
+
+SITUACION = "# SITUACIÓN DE APRENDIZAJE: {titulo}\n\n## 1. IDENTIFICACIÓN\n\n{texto}\n"
+RUBRICA = "# RÚBRICA DE EVALUACIÓN\n\nCriterios de {texto}\n"
+
+
+@pytest.fixture
+def historial(tmp_path):
+    return HistorialGeneraciones(str(tmp_path / "historial.sqlite3"))
+
+
+def _guardar(historial, datos, titulo="Cuidados seguros", texto="higiene de manos", **parametros):
+    return historial.guardar(SITUACION.format(titulo=titulo, texto=texto), RUBRICA.format(texto=texto),
+                             {**datos, **parametros}, "gemini-2.5-flash")
+
+
+def _ids(historial, texto):
+    return [e.id for e in historial.listar(texto=texto)]
+
+
+def test_titulo_y_consulta():
+    assert extraer_titulo("# SITUACIÓN DE APRENDIZAJE: **Cuidados** seguros\n") == "Cuidados seguros"
+    assert extraer_titulo("texto sin títulos") == ""
+    # Los signos de FTS5 no llegan a la consulta
+    assert consulta_fts('higiene" OR manos*') == '"higiene"* "OR"* "manos"*'
+
+
+def test_insertar_indexa(historial, datos):
+    documento_id = _guardar(historial, datos)
+    assert _ids(historial, "higiene") == [documento_id]
+    # Sin distinguir acentos ni mayúsculas, y por prefijo
+    assert _ids(historial, "HIGIÉN") == [documento_id]
+    assert _ids(historial, "seguros cuidados") == [documento_id]
+    assert _ids(historial, "quirófano") == []
+
+
+def test_actualizar_reindexa(historial, datos):
+    documento_id = _guardar(historial, datos)
+    historial.actualizar(documento_id, SITUACION.format(titulo="Quirófano", texto="asepsia quirúrgica"),
+                         RUBRICA.format(texto="asepsia"), tokens_entrada=10, tokens_salida=5)
+    assert _ids(historial, "higiene") == []
+    assert _ids(historial, "asepsia") == [documento_id]
+    entrada, = historial.listar(texto="quirofano")
+    assert entrada.titulo == "Quirófano" and entrada.tokens_entrada == 10
+
+
+def test_borrar_desindexa(historial, datos):
+    conservado = _guardar(historial, datos, texto="higiene postural")
+    borrado = _guardar(historial, datos)
+    historial.borrar(borrado)
+    assert _ids(historial, "higiene") == [conservado]
+    assert historial.obtener(borrado) is None
+    # El índice de contenido externo sigue coherente con la tabla
+    historial._conexion().execute("INSERT INTO documentos_fts (documentos_fts) VALUES ('integrity-check')")
+
+
+def test_buscar_repetido(historial, datos):
+    documento_id = _guardar(historial, datos)
+    situacion = SITUACION.format(titulo="Cuidados seguros", texto="higiene de manos")
+    rubrica = RUBRICA.format(texto="higiene de manos")
+    assert historial.buscar(situacion, rubrica, datos) == documento_id
+    assert historial.buscar(situacion, rubrica, dict(datos, modulo="Otro módulo")) is None
+    assert historial.buscar(situacion + "\nCambio", rubrica, datos) is None
+    assert historial.obtener(documento_id).parametros == datos
+
+
+def test_listado_paginado_y_filtros(historial, datos):
+    ids = [_guardar(historial, datos, titulo=f"Situación {n}", modulo=f"Módulo {n % 3}") for n in range(7)]
+    assert [e.id for e in historial.listar(0, 3)] == ids[::-1][:3]
+    assert [e.id for e in historial.listar(2, 3)] == ids[:1]
+    assert historial.contar() == 7
+    assert historial.contar(modulo="Módulo 0") == 3
+    assert historial.contar(ciclo=datos["ciclo"], modulo="Módulo 1", texto="higiene") == 2
+    assert historial.modulos() == ["Módulo 0", "Módulo 1", "Módulo 2"]
+    assert [e.id for e in historial.ultimos_por_modulo(datos["ciclo"])] == [ids[6], ids[4], ids[5]]
+
+
+def test_listado_de_10000_documentos(historial):
+    """Una página del listado, filtrada o no, sale en menos de 50 ms con 10 000 documentos"""
+
+    ahora = time.time()
+    filas = [
+        (ahora - n, "Grado Medio", f"Ciclo {n % 5}", f"Módulo {n % 40}", f"Situación {n}", "gemini-2.5-flash",
+         json.dumps({"modulo": f"Módulo {n % 40}"}), SITUACION.format(titulo=f"Situación {n}", texto=f"tema{n % 97}"),
+         RUBRICA.format(texto=f"tema{n % 97}"))
+        for n in range(10_000)
+    ]
+    with historial._conexion() as conn:
+        conn.executemany(
+            "INSERT INTO documentos (creado, nivel, ciclo, modulo, titulo, modelo, parametros, situacion, rubrica) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", filas
+        )
+
+    consultas = [
+        {},
+        {"pagina": 400},
+        {"ciclo": "Ciclo 3", "modulo": "Módulo 23"},
+        {"texto": "tema42"},
+    ]
+    for consulta in consultas:
+        mejor = float("inf")
+        for _ in range(3):
+            inicio = time.perf_counter()
+            entradas = historial.listar(**consulta)
+            total = historial.contar(**{k: v for k, v in consulta.items() if k != "pagina"})
+            mejor = min(mejor, time.perf_counter() - inicio)
+        assert entradas and total
+        assert mejor < 0.05, (consulta, mejor)
@@ -0,0 +1,94 @@
+"""Métricas del servicio (services.metricas) contra el servidor falso"""
+
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from services.gemini_service import Consumo
+from services.metricas import DURACION, PREFIJO, crear_servidor as servidor_metricas, metricas
+from tools.fake_gemini_server import Fallos
+
+
+@pytest.fixture(autouse=True)
+def metricas_limpias():
+    metricas.reiniciar()
+
+
+@pytest.fixture
+def servicio(servicio):
+    servicio.resiliencia.intentos = 2
+    servicio.resiliencia.espera_base = 0.05
+    return servicio
+
+
+@pytest.fixture
+def datos(datos):
+    return dict(datos, recursos=["Simuladores clínicos"])
+
+
+def _contador(nombre, **etiquetas):
+    return sum(
+        valor for (actual, clave), valor in metricas.contadores().items()
+        if actual == nombre and all(dict(clave).get(k) == v for k, v in etiquetas.items())
+    )
+
+
+def test_generacion(servicio, renderizador, datos):
+    """Una generación completa deja tiempos por etapa, tokens y coste"""
+
+    consumo = Consumo()
+    esquema = servicio.generar_esquema(datos, consumo=consumo)
+    situacion = "".join(servicio.generar_situacion_aprendizaje_stream(datos, esquema=esquema, consumo=consumo))
+    rubrica = servicio.generar_rubrica(datos, situacion, esquema=esquema, consumo=consumo)
+    clave = renderizador.solicitar(situacion, rubrica, datos)
+    renderizador.esperar(clave, espera=60)
+    # El callback de la tarea se ejecuta en otro hilo justo después de terminar
+    time.sleep(0.1)
+
+    etapas = {dict(clave)["etapa"] for clave in metricas.percentiles()}
+    assert {"prompt", "gemini", "gemini_primer_fragmento", "render", "render_total"} <= etapas
+    assert _contador("gemini_tokens_total", clase="entrada") == consumo.tokens_entrada
+    assert _contador("gemini_coste_dolares_total") > 0
+
+
+def test_cache_y_errores(servidor, servicio, datos):
+    """La caché de respuestas cuenta aciertos y un 503 persistente cuenta como error"""
+
+    servicio.generar_esquema(datos)
+    servicio.generar_esquema(datos)
+    servidor.fallos = Fallos(error_503=1.0)
+    with pytest.raises(Exception):
+        servicio.generar_esquema(dict(datos, contexto="sin servicio"))
+
+    assert _contador("cache_respuestas_total", resultado="acierto") == 1
+    assert _contador("errores_total", etapa="gemini") == 1
+    assert _contador("resiliencia_total", evento="reintentos") >= 1
+
+
+def test_exportadores(servicio, datos, tmp_path, monkeypatch):
+    """El texto de Prometheus llega al archivo y al endpoint HTTP"""
+
+    ruta = tmp_path / "metricas.prom"
+    monkeypatch.setenv("METRICAS_PATH", str(ruta))
+    monkeypatch.setenv("METRICAS_INTERVALO", "0.2")
+    # Otra prueba (batch_generar.main) puede haberlos arrancado ya en este proceso
+    monkeypatch.setattr(metricas, "_exportadores", False)
+    servicio.generar_esquema(datos)
+    metricas.contar("errores_total", etapa="prueba", tipo="Prueba")
+    metricas.iniciar_exportadores()
+    http = servidor_metricas(metricas, 0)
+    assert http.server_address[0] == "127.0.0.1"
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{http.server_address[1]}/metrics", timeout=5) as respuesta:
+            cuerpo = respuesta.read().decode("utf-8")
+    finally:
+        http.shutdown()
+        http.server_close()
+    time.sleep(0.5)
+
+    histograma = f"# TYPE {PREFIJO}{DURACION} histogram"
+    assert histograma in cuerpo and f"{PREFIJO}errores_total{{" in cuerpo
+    assert histograma in ruta.read_text(encoding="utf-8")
@@ -0,0 +1,80 @@
+"""Tablas de Markdown en el PDF (services.documento.parse_markdown y pdf_generator.bloques_to_flowables)"""
+
+import io
+
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table
+
+from services.documento import PARRAFO, TABLA, parse_markdown
+from services.pdf_generator import bloques_to_flowables, generate_pdf
+
+IRREGULAR = """Antes de la tabla
+| Criterio | Peso | Observaciones |
+|---|:---:|---|
+| **Higiene** de manos | 20 % |
+| Uso de <guantes> & bata | 30 % | Con *cuidado* | sobra |
+Después de la tabla"""
+
+ANCHO = A4[0] - 144
+
+
+def _tablas(flowables):
+    return [f for f in flowables if isinstance(f, Table)]
+
+
+def _textos(tabla):
+    # Al partir la tabla, ReportLab envuelve cada celda en una tupla de flowables
+    return [[(celda[0] if isinstance(celda, tuple) else celda).text for celda in fila] for fila in tabla._cellvalues]
+
+
+def test_tabla_irregular_parseada():
+    bloques = list(parse_markdown(IRREGULAR))
+    assert [b[0] for b in bloques] == [PARRAFO, TABLA, PARRAFO]
+    _, filas, cabecera = bloques[1]
+    assert cabecera
+    assert filas == [
+        ["Criterio", "Peso", "Observaciones"],
+        ["**Higiene** de manos", "20 %"],
+        ["Uso de <guantes> & bata", "30 %", "Con *cuidado*", "sobra"],
+    ]
+
+
+def test_tabla_irregular_en_el_pdf():
+    """Las filas cortas se completan y el formato en línea se escapa o se convierte"""
+
+    tabla, = _tablas(bloques_to_flowables(parse_markdown(IRREGULAR), ANCHO))
+    textos = _textos(tabla)
+    assert all(len(fila) == 4 for fila in textos)
+    assert textos[1][0] == "<b>Higiene</b> de manos" and textos[1][3] == ""
+    assert textos[2][0] == "Uso de &lt;guantes&gt; &amp; bata"
+    assert textos[2][2] == "Con <i>cuidado</i>"
+    assert tabla.repeatRows == 1
+    # Cada celda es un Paragraph que ReportLab sabe maquetar
+    tabla.wrap(ANCHO, A4[1])
+
+
+def test_tabla_sin_cabecera():
+    tabla, = _tablas(bloques_to_flowables(parse_markdown("| a | b |\n| c | d |"), ANCHO))
+    assert tabla.repeatRows == 0
+
+
+def test_tabla_mas_larga_que_una_pagina():
+    """Una tabla larga se parte por filas y repite la cabecera en cada página"""
+
+    filas = "\n".join(f"| Actividad {n} | {'Descripción larga de la actividad. ' * 4} |" for n in range(120))
+    markdown = f"| Actividad | Descripción |\n|---|---|\n{filas}"
+    tabla, = _tablas(bloques_to_flowables(parse_markdown(markdown), ANCHO))
+
+    partes = tabla.split(ANCHO, A4[1] - 144)
+    assert len(partes) == 2
+    assert _textos(partes[1])[0] == ["Actividad", "Descripción"]
+    assert len(_textos(partes[0])) + len(_textos(partes[1])) == 121 + 1
+
+    salida = io.BytesIO()
+    SimpleDocTemplate(salida, pagesize=A4).build(bloques_to_flowables(parse_markdown(markdown), ANCHO))
+    assert salida.getvalue().count(b"/Type /Page\n") > 2
+
+
+def test_pdf_con_tablas(datos):
+    pdf = generate_pdf("# Situación\n\n" + IRREGULAR, IRREGULAR, datos)
+    assert pdf.startswith(b"%PDF")
@@ -0,0 +1,75 @@
+"""Renderizado en segundo plano y caché de artefactos (services.pdf_worker)"""
+
+import os
+
+import pytest
+
+from services.pdf_worker import DOCX, LISTO, PDF, ArtefactoCache, RenderizadorPDF, clave_artefacto
+
+SITUACION = "# SITUACIÓN DE APRENDIZAJE: {}\n\n## 1. IDENTIFICACIÓN\n\nTexto de la situación {}.\n"
+RUBRICA = "# RÚBRICA DE EVALUACIÓN\n\n| Criterio | Peso |\n|---|---|\n| Higiene | 100 % |\n"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArtefactoCache(str(tmp_path / "artefactos"))
+
+
+@pytest.fixture
+def renderizador_propio(cache):
+    """Renderizador con su propia caché, para poder limitar su tamaño"""
+    renderizador = RenderizadorPDF(cache, procesos=1)
+    yield renderizador
+    renderizador.cerrar()
+
+
+def _documento(n):
+    return SITUACION.format(n, n), RUBRICA, {"ciclo": "Ciclo", "modulo": f"Módulo {n}"}
+
+
+def test_clave_por_contenido_y_formato(datos):
+    clave = clave_artefacto("situación", "rúbrica", datos)
+    assert clave == clave_artefacto("situación", "rúbrica", dict(datos))
+    assert clave != clave_artefacto("situación", "rúbrica", datos, DOCX)
+    assert clave != clave_artefacto("otra situación", "rúbrica", datos)
+
+
+def test_expulsion_lru(cache):
+    cache.max_bytes = 10
+    cache.guardar("a", b"12345")
+    os.utime(cache.ruta("a"), (1, 1))
+    cache.guardar("b", b"12345")
+    # "a" se ha usado menos recientemente: es la que sale al superar el límite
+    cache.guardar("c", b"1")
+    assert cache.obtener("a") is None
+    assert cache.obtener("b") == b"12345" and cache.obtener("c") == b"1"
+
+
+def test_renderiza_una_vez(renderizador_propio):
+    clave = renderizador_propio.solicitar(*_documento(1))
+    assert renderizador_propio.esperar(clave, espera=60) == LISTO
+    assert renderizador_propio.solicitar(*_documento(1)) == clave
+    assert renderizador_propio.obtener(clave).startswith(b"%PDF")
+
+
+def test_obtener_artefacto_expulsado(cache, renderizador_propio):
+    """Un artefacto LISTO que la caché ha expulsado se vuelve a renderizar al pedirlo"""
+
+    primera = renderizador_propio.solicitar(*_documento(1))
+    assert renderizador_propio.esperar(primera, espera=60) == LISTO
+    tamano = os.path.getsize(cache.ruta(primera, PDF))
+    os.utime(cache.ruta(primera, PDF), (1, 1))
+
+    # Solo cabe uno de los dos documentos: el segundo expulsa al primero
+    cache.max_bytes = tamano + tamano // 2
+    segunda = renderizador_propio.solicitar(*_documento(2))
+    assert renderizador_propio.esperar(segunda, espera=60) == LISTO
+    assert not os.path.exists(cache.ruta(primera, PDF))
+
+    contenido = renderizador_propio.obtener(primera)
+    assert contenido is not None and contenido.startswith(b"%PDF")
+    assert os.path.exists(cache.ruta(primera, PDF))
+
+
+def test_obtener_sin_encargo(renderizador_propio):
+    assert renderizador_propio.obtener(clave_artefacto("nunca", "pedido", {})) is None
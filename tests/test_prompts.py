@@ -0,0 +1,80 @@
+"""Prompts compilados con presupuesto de tokens (services.prompts)"""
+
+import pytest
+
+from services import prompts
+from services.prompts import MARCA_RECORTE, PRESUPUESTO_TOKENS, PresupuestoExcedidoError, contar_tokens, recortar
+
+TEXTO = "\n".join(
+    ["## 1. Título de la sección"] + [f"Línea {n} con varias palabras sobre higiene hospitalaria." for n in range(200)]
+)
+
+
+def test_contar_tokens():
+    assert contar_tokens("") == 0
+    # Un token por cada 4 letras, por cada 2 signos y por salto de línea; el espacio simple no cuenta
+    assert contar_tokens("casa azul") == 2
+    assert contar_tokens("hospitalaria") == 3
+    assert contar_tokens("a, b\n\nc") == 6
+
+
+@pytest.mark.parametrize("maximo", [5, 20, 57, 300, 1000])
+def test_recortar_cabe(maximo):
+    recortado = recortar(TEXTO, maximo)
+    assert contar_tokens(recortado) <= maximo
+    assert recortado == "" or recortado.endswith(MARCA_RECORTE)
+    # Solo se conservan palabras completas del comienzo
+    assert TEXTO.startswith(recortado[:-len(MARCA_RECORTE)].rstrip())
+
+
+def test_recortar_sin_cambios():
+    assert recortar(TEXTO, contar_tokens(TEXTO)) == TEXTO
+
+
+def test_recortar_no_parte_titulos():
+    texto = "Introducción\n## Un título bastante largo que no cabe entero"
+    assert recortar(texto, 8) == "Introducción " + MARCA_RECORTE
+
+
+def test_contexto_largo_recortado(datos):
+    """El texto libre del contexto se recorta para que el prompt quepa en el presupuesto"""
+
+    datos = dict(datos, contexto="Unidad de hospitalización con pacientes crónicos. " * 2000)
+    for prompt in (prompts.prompt_esquema(datos), prompts.prompt_situacion(datos)):
+        assert contar_tokens(str(prompt)) <= PRESUPUESTO_TOKENS
+        assert MARCA_RECORTE in prompt.peticion
+
+
+def test_presupuesto_excedido(datos):
+    """Los RA y CE no se recortan: si no caben se pide al usuario que seleccione menos"""
+
+    datos = dict(datos, resultados_aprendizaje=[f"RA{n}. Aplica técnicas de higiene y asepsia" * 5 for n in range(300)])
+    with pytest.raises(PresupuestoExcedidoError) as error:
+        prompts.prompt_situacion(datos)
+    assert error.value.tokens > error.value.presupuesto == PRESUPUESTO_TOKENS
+    assert "Selecciona menos" in str(error.value)
+
+
+def test_presupuesto_propio(datos):
+    prompt = prompts.prompt_situacion(datos)
+    tokens = contar_tokens(str(prompt))
+    assert prompts.prompt_situacion(datos, presupuesto=tokens).peticion == prompt.peticion
+    with pytest.raises(PresupuestoExcedidoError):
+        prompts.prompt_situacion(datos, presupuesto=tokens - 10)
+
+
+def test_rubrica_con_situacion_larga(datos):
+    """De una situación larga solo entra el extracto de sus secciones más relevantes"""
+
+    situacion = "\n\n".join(f"## {n}. SECCIÓN {n}\n{TEXTO}" for n in range(1, 13))
+    prompt = prompts.prompt_rubrica(datos, situacion)
+    assert contar_tokens(str(prompt)) <= PRESUPUESTO_TOKENS
+    assert contar_tokens(situacion) > PRESUPUESTO_TOKENS
+
+
+def test_instrucciones_fijas(datos):
+    """Las instrucciones no dependen de los datos: se pueden cachear en Gemini"""
+    otra = prompts.prompt_situacion(dict(datos, modulo="Otro módulo"))
+    prompt = prompts.prompt_situacion(datos)
+    assert prompt.instrucciones == otra.instrucciones
+    assert prompt.peticion != otra.peticion
@@ -0,0 +1,86 @@
+"""Regeneración de un solo apartado contra el servidor falso"""
+
+import pytest
+
+from services import prompts, regeneracion
+from services.gemini_service import Consumo
+from tools.medir_prompts import datos_de, situacion_de_ejemplo
+from utils.data_loader import load_curriculum_index
+
+
+@pytest.fixture(autouse=True)
+def sin_cache(monkeypatch):
+    monkeypatch.setenv("GEMINI_CACHE", "0")
+
+
+def _sin(documento, clave):
+    return [a.texto for a in regeneracion.apartados(documento) if a.clave != clave]
+
+
+def test_markdown(servicio, datos):
+    """Solo cambia el apartado pedido; la rúbrica se reescribe criterio a criterio"""
+
+    situacion = servicio.generar_situacion_aprendizaje(datos)
+    rubrica = servicio.generar_rubrica(datos, situacion)
+    consumo = Consumo()
+
+    secuencia = next(a for a in regeneracion.apartados(situacion) if a.titulo.startswith("7."))
+    nueva = servicio.regenerar_apartado(datos, situacion, secuencia.clave, "Más simulación", consumo)
+    criterio = next(a for a in regeneracion.apartados(rubrica) if a.clave[0] == regeneracion.CRITERIO)
+    nueva_rubrica = servicio.regenerar_apartado(datos, rubrica, criterio.clave, consumo=consumo)
+
+    assert _sin(nueva, secuencia.clave) == _sin(situacion, secuencia.clave)
+    assert "regenerado" in regeneracion.apartado(nueva, secuencia.clave).texto
+    assert regeneracion.apartado(nueva, secuencia.clave).titulo == secuencia.titulo
+    assert "regenerado" in regeneracion.apartado(nueva_rubrica, criterio.clave).texto
+    assert consumo.llamadas == 2
+
+
+def test_estructurado(servicio, datos):
+    """La sección regenerada conserva su número y sus fases; el criterio se valida"""
+
+    situacion = servicio.generar_situacion_estructurada(datos)
+    rubrica = servicio.generar_rubrica_estructurada(datos, situacion)
+    nueva = servicio.regenerar_apartado(datos, situacion, (regeneracion.SECCION, 6))
+    nueva_rubrica = servicio.regenerar_apartado(datos, rubrica, (regeneracion.CRITERIO, 1))
+
+    seccion = nueva.secciones[6]
+    assert seccion.numero == 7 and len(seccion.fases) == 3 and "regenerado" in seccion.contenido
+    assert nueva.secciones[:6] == situacion.secciones[:6] and situacion.secciones[6] is not seccion
+    assert nueva_rubrica.criterios[1].nombre.startswith("Criterio regenerado")
+    assert nueva_rubrica.criterios[0] is rubrica.criterios[0]
+
+
+def _datos_curriculo():
+    """Datos de generación de un módulo del currículo con resultados de aprendizaje"""
+    indice = load_curriculum_index()
+    return datos_de(next(m for m in indice.iter_modulos() if m.opciones_resultados), indice)
+
+
+def test_presupuesto():
+    """El resto del documento se resume para que el prompt quepa en el presupuesto"""
+
+    datos = _datos_curriculo()
+    # Un documento bastante más largo que el presupuesto de tokens
+    situacion = situacion_de_ejemplo(datos).replace("\n\n", "\n\n" + prompts.PLANTILLA_SITUACION.instrucciones + "\n\n", 3)
+    clave = next(a.clave for a in regeneracion.apartados(situacion) if a.titulo.startswith("7."))
+    prompt = prompts.prompt_apartado(
+        datos, regeneracion.apartado(situacion, clave).texto, regeneracion.contexto(situacion, clave)
+    )
+    resto = str(prompt).split("## RESTO DEL DOCUMENTO (resumen)", 1)[1]
+
+    assert prompts.contar_tokens(situacion) > prompts.PRESUPUESTO_TOKENS
+    assert prompts.contar_tokens(str(prompt)) <= prompts.PRESUPUESTO_TOKENS
+    otros = [a for a in regeneracion.apartados(situacion) if a.clave != clave]
+    assert all(f"## {a.titulo}" in resto for a in otros)
+
+
+def test_criterios_de_la_situacion():
+    """La sección 4 de la situación nombra los criterios de evaluación pero no se parte en criterios"""
+
+    situacion = situacion_de_ejemplo(_datos_curriculo()).replace(
+        "CRITERIOS DE EVALUACIÓN\n", "CRITERIOS DE EVALUACIÓN\n### RA1\nTexto del RA1.\n### RA2\nTexto del RA2.\n", 1
+    )
+    claves = [a.clave for a in regeneracion.apartados(situacion)]
+    assert len(claves) == 12
+    assert all(tipo == regeneracion.SECCION for tipo, _ in claves)
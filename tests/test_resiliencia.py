@@ -0,0 +1,110 @@
+"""Capa de llamadas resiliente contra el servidor falso con fallos inyectados"""
+
+import time
+
+import pytest
+
+from services.resiliencia import CircuitoAbiertoError, Cortocircuito, ServicioNoDisponibleError
+from tools.fake_gemini_server import Fallos
+from utils.rate_limiter import TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def sin_cache(monkeypatch):
+    # La caché de respuestas ocultaría las llamadas
+    monkeypatch.setenv("GEMINI_CACHE", "0")
+
+
+@pytest.fixture
+def resiliente(servidor, servicio_para):
+    """Fábrica de servicios con esperas cortas y las opciones de resiliencia indicadas"""
+
+    def crear(**opciones):
+        servicio = servicio_para(servidor)
+        servicio.resiliencia.espera_base = 0.05
+        servicio.resiliencia.espera_maxima = 0.5
+        for nombre, valor in opciones.items():
+            setattr(servicio.resiliencia, nombre, valor)
+        return servicio
+
+    return crear
+
+
+def test_errores_intermitentes(servidor, resiliente, datos):
+    """30 % de 503 y 10 % de 429: todas las generaciones terminan gracias a los reintentos"""
+
+    servidor.fallos = Fallos(error_503=0.3, error_429=0.1, semilla=7)
+    servicio = resiliente(intentos=8)
+    for i in range(10):
+        servicio.generar_situacion_aprendizaje({**datos, "contexto": f"intermitente {i}"})
+    contadores = servicio.resiliencia.contadores
+    assert contadores["reintentos"] > 0
+    assert contadores["agotadas"] == 0
+
+
+def test_caida_total(servidor, resiliente, datos):
+    """Todo da 503: tras el umbral el cortocircuito rechaza al momento sin llamar al servidor"""
+
+    servidor.fallos = Fallos(fallar_primeras=10 ** 6)
+    servicio = resiliente(intentos=3, cortocircuito=Cortocircuito(umbral=3, enfriamiento=60))
+    errores = []
+    for i in range(3):
+        with pytest.raises(ServicioNoDisponibleError) as error:
+            servicio.generar_esquema({**datos, "contexto": f"caida {i}"})
+        errores.append(error.value)
+    assert isinstance(errores[-1], CircuitoAbiertoError)
+    peticiones = servidor.fallos.peticiones
+
+    inicio = time.perf_counter()
+    with pytest.raises(CircuitoAbiertoError):
+        servicio.generar_esquema(datos)
+    assert time.perf_counter() - inicio < 0.05
+    assert servidor.fallos.peticiones == peticiones
+
+
+def test_cuelgue(servidor, resiliente, datos):
+    """El servidor no responde: la llamada falla al agotar su plazo, no se queda colgada"""
+
+    servidor.fallos = Fallos(cuelgue=1.0, duracion_cuelgue=10)
+    servicio = resiliente(plazo=2.0)
+    inicio = time.perf_counter()
+    with pytest.raises(ServicioNoDisponibleError):
+        servicio.generar_esquema(datos)
+    assert time.perf_counter() - inicio < 4.0
+
+
+def test_streaming(servidor, resiliente, datos):
+    """Los fallos antes del primer fragmento se reintentan y el texto llega completo"""
+
+    servidor.fallos = Fallos(fallar_primeras=2)
+    servicio = resiliente()
+    texto = "".join(servicio.generar_situacion_aprendizaje_stream(datos))
+    assert texto == servicio.generar_situacion_aprendizaje(datos)
+
+
+@pytest.mark.parametrize("en_streaming", [False, True])
+def test_limitador_con_circuito_semiabierto(servidor, resiliente, datos, en_streaming):
+    """Sin ficha del limitador, la llamada falla sin dejar reservada la prueba del cortocircuito"""
+
+    cortocircuito = Cortocircuito(umbral=1, enfriamiento=0.05)
+    servicio = resiliente(intentos=1, plazo=0.2, cortocircuito=cortocircuito)
+    servidor.fallos = Fallos(fallar_primeras=1)
+    with pytest.raises(ServicioNoDisponibleError):
+        servicio.generar_esquema(datos)
+    assert cortocircuito.estado == Cortocircuito.ABIERTO
+    time.sleep(0.1)
+
+    # Una ficha cada 0,5 s, ya gastada: la siguiente llamada no la consigue dentro de su plazo
+    servicio.limitador = TokenBucket(2.0, 1)
+    servicio.limitador.adquirir()
+    with pytest.raises(ServicioNoDisponibleError) as error:
+        if en_streaming:
+            "".join(servicio.generar_situacion_aprendizaje_stream(datos))
+        else:
+            servicio.generar_esquema({**datos, "contexto": "sin ficha"})
+    assert not isinstance(error.value, CircuitoAbiertoError)
+
+    # Cuando el limitador se repone, la llamada de prueba pasa y cierra el circuito
+    time.sleep(0.5)
+    servicio.generar_esquema({**datos, "contexto": "con ficha"})
+    assert cortocircuito.estado == Cortocircuito.CERRADO
@@ -0,0 +1,131 @@
+"""Micro-benchmark de la exportación a PDF y a Word.
+
+Genera una situación de aprendizaje y una rúbrica sintéticas del tamaño habitual
+(12 secciones, secuencia didáctica larga y varias tablas de rúbrica, unas 8-12
+páginas) y mide el tiempo de generate_pdf por exportación y por página, el de
+generate_docx y el de exportar los dos formatos seguidos, como hace la app al
+terminar una generación. El DOCX se comprueba abriendo el zip y analizando sus XML.
+
+    python tools/bench_pdf.py --repeticiones 20
+"""
+
+import argparse
+import io
+import os
+import re
+import statistics
+import sys
+import time
+import zipfile
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.docx_generator import generate_docx  # noqa: E402
+from services.pdf_generator import generate_pdf  # noqa: E402
+
+PARAMETROS = {
+    "nivel": "Grado Medio",
+    "ciclo": "Cuidados Auxiliares de Enfermería",
+    "modulo": "Técnicas básicas de enfermería",
+    "metodologia": "Aprendizaje Basado en Problemas (ABP)",
+    "duracion": "3-4 semanas (25-40 horas)",
+}
+
+PARRAFO = (
+    "El alumnado trabaja en equipos sobre un caso clínico realista en la unidad de hospitalización, "
+    "aplicando los protocolos de higiene, movilización y registro con **rigor profesional** y atendiendo "
+    "a la diversidad del grupo y a la perspectiva de género."
+)
+
+
+def situacion_sintetica():
+    """Markdown con la estructura de 12 secciones que pide el prompt de la situación"""
+
+    partes = ["# SITUACIÓN DE APRENDIZAJE: Cuidados seguros en la unidad de hospitalización", ""]
+    for n in range(1, 13):
+        partes += [f"## {n}. SECCIÓN {n}", PARRAFO, PARRAFO, ""]
+        partes += [f"### Apartado {n}.{k}" for k in range(1, 3)]
+        partes += [f"- **Elemento {k}:** {PARRAFO[:90]}" for k in range(1, 6)]
+        if n == 7:
+            # La secuencia didáctica es la sección más larga
+            for fase in range(1, 6):
+                partes += [f"### Fase {fase}: Actividad {fase}", "**Duración:** 4 horas"]
+                partes += [f"{k}. {PARRAFO}" for k in range(1, 5)]
+        partes.append("")
+    return "\n".join(partes)
+
+
+def rubrica_sintetica():
+    """Markdown con la estructura de tablas que pide el prompt de la rúbrica"""
+
+    partes = ["# RÚBRICA DE EVALUACIÓN", "", "## Criterios de Evaluación y Niveles de Desempeño", ""]
+    for n in range(1, 7):
+        partes += [
+            f"### Criterio {n}: Aplicación de protocolos de cuidados",
+            "**Peso:** 15%",
+            "",
+            "| NIVEL | EXCELENTE (4) | SATISFACTORIO (3) | EN DESARROLLO (2) | INSUFICIENTE (1) |",
+            "|-------|---------------|-------------------|-------------------|------------------|",
+            "| **Descripción** | Aplica el protocolo completo sin errores | Aplica el protocolo con errores leves "
+            "| Aplica el protocolo con ayuda | No aplica el protocolo |",
+            "| **Indicadores** | • Identifica riesgos <br> • Registra todo | • Identifica riesgos <br> • Registra casi todo "
+            "| • Identifica algunos riesgos <br> • Registra parcialmente | • No identifica riesgos <br> • No registra |",
+            "",
+        ]
+    partes += ["## Observaciones y Feedback", "- Fortalezas observadas:", "- Áreas de mejora:"]
+    return "\n".join(partes)
+
+
+def _medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def _tablas_docx(docx):
+    """Número de tablas de Word del DOCX; falla si alguna parte no es XML válido"""
+    with zipfile.ZipFile(io.BytesIO(docx)) as paquete:
+        for nombre in paquete.namelist():
+            ElementTree.fromstring(paquete.read(nombre))
+        return paquete.read("word/document.xml").count(b"<w:tbl>")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark de generate_pdf y generate_docx")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    situacion, rubrica = situacion_sintetica(), rubrica_sintetica()
+
+    # La primera exportación incluye la importación de reportlab y la preparación de estilos
+    inicio = time.perf_counter()
+    pdf = generate_pdf(situacion, rubrica, PARAMETROS)
+    primera = time.perf_counter() - inicio
+    paginas = len(re.findall(rb"/Type /Page\b", pdf))
+
+    tiempos = _medir(lambda: generate_pdf(situacion, rubrica, PARAMETROS), args.repeticiones)
+    docx = generate_docx(situacion, rubrica, PARAMETROS)
+    tiempos_docx = _medir(lambda: generate_docx(situacion, rubrica, PARAMETROS), args.repeticiones)
+    tiempos_ambos = _medir(
+        lambda: (generate_pdf(situacion, rubrica, PARAMETROS), generate_docx(situacion, rubrica, PARAMETROS)),
+        args.repeticiones
+    )
+
+    mediana = statistics.median(tiempos)
+    print(f"Páginas por documento:      {paginas}")
+    print(f"Primera exportación:        {primera * 1000:8.1f} ms")
+    print(f"Exportación (mediana):      {mediana * 1000:8.1f} ms")
+    print(f"Exportación (mín / máx):    {min(tiempos) * 1000:8.1f} / {max(tiempos) * 1000:.1f} ms")
+    print(f"Por página (mediana):       {mediana * 1000 / max(paginas, 1):8.2f} ms")
+    print(f"DOCX (mediana):             {statistics.median(tiempos_docx) * 1000:8.1f} ms "
+          f"({len(docx) / 1024:.0f} KB, {_tablas_docx(docx)} tablas)")
+    print(f"PDF + DOCX (mediana):       {statistics.median(tiempos_ambos) * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
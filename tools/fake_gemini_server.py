@@ -0,0 +1,328 @@
+"""Servidor local que imita la API REST de Gemini para pruebas sin coste.
+
+Responde a generateContent y streamGenerateContent con Markdown determinista
+(o con JSON válido según el esquema si se pide responseMimeType application/json),
+de modo que GeminiService, el generador por lotes y la app se pueden probar
+apuntando GEMINI_BASE_URL a este servidor:
+
+    python tools/fake_gemini_server.py --puerto 8765
+    GEMINI_API_KEY=falsa GEMINI_BASE_URL=http://127.0.0.1:8765 python batch_generar.py ...
+
+También inyecta fallos para probar los reintentos y el cortocircuito de
+services/resiliencia.py:
+
+    python tools/fake_gemini_server.py --error-503 0.3 --error-429 0.1 --cuelgue 0.05
+    python tools/fake_gemini_server.py --fallar-primeras 6    # las 6 primeras peticiones dan 503
+
+Admite también la caché de contexto (cachedContents: crear, listar, renovar y
+borrar) con el mínimo de tokens de la API real, o la rechaza con
+--sin-cache-contexto para probar el envío de las instrucciones en la petición.
+"""
+
+import argparse
+import collections
+import datetime
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Los textos y los fallos son los del backend sin red (services.backend_falso)
+from services.backend_falso import Fallos, json_falso, texto_falso  # noqa: E402
+
+RUTA_MODELO = re.compile(r"^/[^/]+/models/(?P<modelo>[^:/]+):(?P<metodo>generateContent|streamGenerateContent)")
+RUTA_INFO_MODELO = re.compile(r"^/[^/]+/models/(?P<modelo>[^:/?]+)(\?.*)?$")
+RUTA_CACHES = re.compile(r"^/[^/]+/cachedContents(?:/(?P<id>[^/?]+))?(\?.*)?$")
+
+
+def _respuesta(texto, prompt, cacheados=0):
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": texto}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": len(prompt) // 4,
+            "candidatesTokenCount": len(texto) // 4,
+            "totalTokenCount": (len(prompt) + len(texto)) // 4,
+            "cachedContentTokenCount": cacheados,
+        },
+    }
+
+
+def _error(codigo, estado, mensaje, detalles=None):
+    return {"error": {"code": codigo, "message": mensaje, "status": estado, "details": detalles or []}}
+
+
+def _texto_de(contenido):
+    """Texto de un Content (o de una lista de ellos) de la API"""
+    if isinstance(contenido, list):
+        return "".join(_texto_de(c) for c in contenido)
+    if not isinstance(contenido, dict):
+        return ""
+    return "".join(parte.get("text", "") for parte in contenido.get("parts", []))
+
+
+def _fecha(instante):
+    return datetime.datetime.fromtimestamp(instante, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _ttl(valor):
+    return float(str(valor).rstrip("s"))
+
+
+class ManejadorGemini(BaseHTTPRequestHandler):
+    """Manejador HTTP con la latencia y los fallos configurados en el servidor"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Cada instancia del manejador es una conexión TCP nueva (sirve para comprobar el keep-alive)
+        with self.server.lock_conexiones:
+            self.server.conexiones += 1
+
+    def do_GET(self):
+        """models.get (comprobaciones de salud del cliente) y caches.list"""
+        if RUTA_CACHES.match(self.path):
+            self._caches("GET")
+            return
+        coincidencia = RUTA_INFO_MODELO.match(self.path)
+        if not coincidencia:
+            self._enviar_json(404, {"error": {"code": 404, "message": "Ruta no encontrada", "status": "NOT_FOUND"}})
+            return
+        modelo = coincidencia.group("modelo")
+        self._enviar_json(200, {
+            "name": f"models/{modelo}",
+            "displayName": modelo,
+            "supportedGenerationMethods": ["generateContent", "streamGenerateContent"],
+        })
+
+    def do_PATCH(self):
+        self._caches("PATCH")
+
+    def do_DELETE(self):
+        self._caches("DELETE")
+
+    def _leer_cuerpo(self):
+        longitud = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(longitud) or b"{}")
+
+    def _caches(self, metodo):
+        """cachedContents: crear (POST), listar (GET), renovar el TTL (PATCH) y borrar (DELETE)"""
+
+        coincidencia = RUTA_CACHES.match(self.path)
+        if not coincidencia:
+            self._enviar_json(404, _error(404, "NOT_FOUND", "Ruta no encontrada"))
+            return
+        cuerpo = self._leer_cuerpo() if metodo in ("POST", "PATCH") else {}
+        servidor = self.server
+        ahora = time.time()
+        with servidor.lock_caches:
+            for nombre in [n for n, c in servidor.caches.items() if c["expira"] <= ahora]:
+                del servidor.caches[nombre]
+
+            if metodo == "GET" and not coincidencia.group("id"):
+                self._enviar_json(200, {"cachedContents": [self._cache_json(c) for c in servidor.caches.values()]})
+                return
+
+            if metodo == "POST":
+                if not servidor.cache_contexto:
+                    self._enviar_json(400, _error(400, "INVALID_ARGUMENT", "Context caching is not supported"))
+                    return
+                texto = _texto_de(cuerpo.get("systemInstruction")) + _texto_de(cuerpo.get("contents", []))
+                if len(texto) // 4 < servidor.minimo_tokens_cache:
+                    self._enviar_json(400, _error(
+                        400, "INVALID_ARGUMENT",
+                        f"Cached content is too small. total_token_count={len(texto) // 4}, "
+                        f"min_total_token_count={servidor.minimo_tokens_cache}"
+                    ))
+                    return
+                nombre = f"cachedContents/{next(servidor.ids_caches)}"
+                cache = servidor.caches[nombre] = {
+                    "nombre": nombre,
+                    "modelo": cuerpo.get("model", ""),
+                    "display_name": cuerpo.get("displayName", ""),
+                    "texto": texto,
+                    "expira": ahora + _ttl(cuerpo.get("ttl", "3600s")),
+                }
+                self._enviar_json(200, self._cache_json(cache))
+                return
+
+            cache = servidor.caches.get(f"cachedContents/{coincidencia.group('id')}")
+            if cache is None:
+                self._enviar_json(404, _error(404, "NOT_FOUND", "CachedContent not found (or permission denied)"))
+                return
+            if metodo == "PATCH":
+                cache["expira"] = ahora + _ttl(cuerpo.get("ttl", "3600s"))
+            elif metodo == "DELETE":
+                del servidor.caches[cache["nombre"]]
+                self._enviar_json(200, {})
+                return
+            self._enviar_json(200, self._cache_json(cache))
+
+    def _cache_json(self, cache):
+        return {
+            "name": cache["nombre"],
+            "model": cache["modelo"],
+            "displayName": cache["display_name"],
+            "expireTime": _fecha(cache["expira"]),
+            "usageMetadata": {"totalTokenCount": len(cache["texto"]) // 4},
+        }
+
+    def do_POST(self):
+        if RUTA_CACHES.match(self.path):
+            self._caches("POST")
+            return
+        coincidencia = RUTA_MODELO.match(self.path)
+        if not coincidencia:
+            self._enviar_json(404, {"error": {"code": 404, "message": "Ruta no encontrada", "status": "NOT_FOUND"}})
+            return
+
+        cuerpo = self._leer_cuerpo()
+
+        fallo = self.server.fallos.sortear()
+        if fallo == "503":
+            self._enviar_json(503, _error(503, "UNAVAILABLE", "The model is overloaded. Please try again later."))
+            return
+        if fallo == "429":
+            self._enviar_json(429, _error(429, "RESOURCE_EXHAUSTED", "Quota exceeded", [
+                {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "1s"}
+            ]))
+            return
+        if fallo == "cuelgue":
+            # El cliente debe cortar por su plazo antes de que esto termine
+            time.sleep(self.server.fallos.duracion_cuelgue)
+
+        # Las instrucciones llegan como systemInstruction o desde un contenido en caché
+        instrucciones = _texto_de(cuerpo.get("systemInstruction"))
+        cacheados = 0
+        if cuerpo.get("cachedContent"):
+            with self.server.lock_caches:
+                cache = self.server.caches.get(cuerpo["cachedContent"])
+                vigente = cache is not None and cache["expira"] > time.time()
+            if not vigente:
+                self._enviar_json(404, _error(404, "NOT_FOUND", "CachedContent not found (or permission denied)"))
+                return
+            instrucciones = cache["texto"] + instrucciones
+            cacheados = len(cache["texto"]) // 4
+        with self.server.lock_caches:
+            self.server.instrucciones_recibidas["cache" if cacheados else
+                                                "system_instruction" if instrucciones else "ninguna"] += 1
+        prompt = instrucciones + _texto_de(cuerpo.get("contents", []))
+        if (cuerpo.get("generationConfig") or {}).get("responseMimeType") == "application/json":
+            texto = json_falso(prompt, self.server.realista)
+        else:
+            texto = texto_falso(prompt, self.server.realista)
+        time.sleep(self.server.latencia)
+
+        if coincidencia.group("metodo") == "generateContent":
+            self._enviar_json(200, _respuesta(texto, prompt, cacheados))
+            return
+
+        # streamGenerateContent con alt=sse: un evento por fragmento de texto. Como la API real,
+        # usa codificación chunked, así que la conexión sigue abierta para la siguiente petición
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        tamano = self.server.tamano_fragmento
+        try:
+            for inicio in range(0, len(texto), tamano):
+                evento = _respuesta(texto[inicio:inicio + tamano], prompt, cacheados)
+                datos = f"data: {json.dumps(evento)}\r\n\r\n".encode("utf-8")
+                self.wfile.write(f"{len(datos):x}\r\n".encode("ascii") + datos + b"\r\n")
+                self.wfile.flush()
+                time.sleep(self.server.latencia_fragmento)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente ha cerrado el flujo antes de terminar (cancelación o respuesta rechazada)
+            self.close_connection = True
+
+    def _enviar_json(self, estado, datos):
+        cuerpo = json.dumps(datos).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        if self.server.verbose:
+            super().log_message(formato, *args)
+
+
+def crear_servidor(host="127.0.0.1", puerto=0, latencia=0.0, latencia_fragmento=0.0, tamano_fragmento=200,
+                   verbose=False, fallos=None, cache_contexto=True, minimo_tokens_cache=1024, realista=False):
+    """Crea el servidor falso (puerto=0 elige uno libre, ver server_address)
+
+    fallos es un objeto Fallos; se puede cambiar después en servidor.fallos.
+    servidor.instrucciones_recibidas cuenta las peticiones cuyas instrucciones llegaron
+    desde la caché de contexto ("cache"), como system instruction o sin ellas ("ninguna").
+    """
+
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorGemini)
+    servidor.daemon_threads = True
+    servidor.latencia = latencia
+    servidor.latencia_fragmento = latencia_fragmento
+    servidor.tamano_fragmento = tamano_fragmento
+    servidor.verbose = verbose
+    servidor.fallos = fallos or Fallos()
+    servidor.conexiones = 0
+    servidor.lock_conexiones = threading.Lock()
+    servidor.cache_contexto = cache_contexto
+    servidor.minimo_tokens_cache = minimo_tokens_cache
+    servidor.caches = {}
+    servidor.ids_caches = itertools.count(1)
+    servidor.lock_caches = threading.Lock()
+    servidor.instrucciones_recibidas = collections.Counter()
+    servidor.realista = realista
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso de la API de Gemini para pruebas locales")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de espera antes de responder")
+    parser.add_argument("--latencia-fragmento", type=float, default=0.0,
+                        help="Segundos entre fragmentos en streaming")
+    parser.add_argument("--error-503", type=float, default=0.0, help="Probabilidad de responder 503 UNAVAILABLE")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Probabilidad de responder 429 con retryDelay")
+    parser.add_argument("--cuelgue", type=float, default=0.0, help="Probabilidad de no responder durante un rato")
+    parser.add_argument("--duracion-cuelgue", type=float, default=30.0, help="Segundos que dura cada cuelgue")
+    parser.add_argument("--fallar-primeras", type=int, default=0, help="Número de peticiones iniciales que dan 503")
+    parser.add_argument("--semilla", type=int, help="Semilla para que los fallos sean reproducibles")
+    parser.add_argument("--sin-cache-contexto", action="store_true",
+                        help="Rechaza la creación de contenidos en caché (cachedContents)")
+    parser.add_argument("--minimo-tokens-cache", type=int, default=1024,
+                        help="Tokens mínimos de un contenido en caché, como en la API real")
+    parser.add_argument("--realista", action="store_true",
+                        help="Respuestas con el tamaño de las reales (para medir el render y la memoria)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    fallos = Fallos(args.error_503, args.error_429, args.cuelgue, args.duracion_cuelgue, args.fallar_primeras,
+                    args.semilla)
+    servidor = crear_servidor(args.host, args.puerto, args.latencia, args.latencia_fragmento, verbose=args.verbose,
+                              fallos=fallos, cache_contexto=not args.sin_cache_contexto,
+                              minimo_tokens_cache=args.minimo_tokens_cache, realista=args.realista)
+    print(f"Gemini falso escuchando en http://{args.host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Mide los tokens de entrada de los prompts de Gemini.
+
+Construye los prompts del esquema, la situación y la rúbrica para los módulos del
+currículo (con todos sus RA y hasta 6 CE) y muestra los tokens estimados por
+services.prompts.contar_tokens frente al presupuesto. Para la rúbrica hecha a partir
+de una situación completa compara las secciones que recibe el modelo con el recorte
+anterior de 2000 caracteres.
+
+    python tools/medir_prompts.py --modulos 10
+    python tools/medir_prompts.py --api    # contrasta la estimación con count_tokens (usa GEMINI_API_KEY)
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import prompts  # noqa: E402
+from utils.data_loader import load_curriculum_index  # noqa: E402
+
+PARRAFO = (
+    "El alumnado trabaja en equipos sobre un caso clínico realista en la unidad de hospitalización, "
+    "aplicando los protocolos de higiene, movilización y registro con rigor profesional."
+)
+
+ESQUEMA = (
+    "# ESQUEMA: Cuidados seguros en la unidad de hospitalización\n"
+    "**Producto Final:** Protocolo de actuación revisado por el equipo\n"
+    "**Fases:**\n1. Análisis del caso - 6 h - Identificar necesidades\n"
+    "2. Práctica simulada - 16 h - Aplicar los procedimientos\n3. Presentación - 4 h - Defender el protocolo"
+)
+
+
+def titulos_situacion():
+    """Títulos de nivel 2 que pide la plantilla de la situación"""
+    return [linea for linea in prompts.PLANTILLA_SITUACION.instrucciones.splitlines() if linea.startswith("## ")
+            and linea[3].isdigit()]
+
+
+def situacion_de_ejemplo(datos):
+    """Situación con las 12 secciones de la plantilla, con los RA y CE en las secciones 4 y 9"""
+
+    partes = ["# SITUACIÓN DE APRENDIZAJE: Cuidados seguros en la unidad de hospitalización", ""]
+    for titulo in titulos_situacion():
+        partes += [titulo, PARRAFO, PARRAFO]
+        if "RESULTADOS" in titulo:
+            partes += [f"- {texto}: se trabaja en las fases 1 y 2." for texto in
+                       datos["resultados_aprendizaje"] + datos["criterios_evaluacion"]]
+        if "SECUENCIA" in titulo:
+            for fase in range(1, 6):
+                partes += [f"### Fase {fase}", "**Duración:** 4 horas", *(f"{k}. {PARRAFO}" for k in range(1, 6))]
+        if "EVALUACIÓN" in titulo and "RESULTADOS" not in titulo:
+            partes += [f"- Rúbrica del criterio: {texto}" for texto in datos["criterios_evaluacion"]]
+        partes.append("")
+    return "\n".join(partes)
+
+
+def datos_de(modulo, indice):
+    return {
+        "nivel": modulo.ciclo.nivel,
+        "ciclo": modulo.ciclo.nombre,
+        "modulo": modulo.nombre,
+        "metodologia": "Aprendizaje Basado en Problemas (ABP)",
+        "duracion": "3-4 semanas (25-40 horas)",
+        "recursos": ["Simuladores clínicos", "Material sanitario"],
+        "contexto": "Unidad de hospitalización de un hospital comarcal",
+        "producto_final": "Protocolo de actuación",
+        "resultados_aprendizaje": list(modulo.opciones_resultados),
+        "criterios_evaluacion": list(modulo.opciones_criterios[:6]),
+        "competencias_profesionales": list(indice.competencias_profesionales[:3]),
+    }
+
+
+def secciones_incluidas(texto):
+    return [linea[3:].split(" ", 1)[0] for linea in texto.splitlines() if linea.startswith("## ")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide los tokens de entrada de los prompts")
+    parser.add_argument("--modulos", type=int, default=10, help="Módulos del currículo que se miden")
+    parser.add_argument("--api", action="store_true", help="Compara con count_tokens de la API de Gemini")
+    args = parser.parse_args(argv)
+
+    indice = load_curriculum_index()
+    modulos = [m for m in indice.iter_modulos() if m.opciones_resultados][:args.modulos]
+    medidas = {"esquema": [], "situacion": [], "rubrica (esquema)": [], "rubrica (situacion)": []}
+    ejemplo = None
+    for modulo in modulos:
+        datos = datos_de(modulo, indice)
+        situacion = situacion_de_ejemplo(datos)
+        generados = {
+            "esquema": prompts.prompt_esquema(datos),
+            "situacion": prompts.prompt_situacion(datos, ESQUEMA),
+            "rubrica (esquema)": prompts.prompt_rubrica(datos, esquema=ESQUEMA),
+            "rubrica (situacion)": prompts.prompt_rubrica(datos, situacion),
+        }
+        for tipo, prompt in generados.items():
+            medidas[tipo].append(prompts.contar_tokens(str(prompt)))
+        ejemplo = ejemplo or (datos, situacion, generados)
+
+    print(f"Presupuesto: {prompts.PRESUPUESTO_TOKENS} tokens por prompt ({len(modulos)} módulos)")
+    print(f"{'prompt':22} {'instrucciones':>13} {'fijos':>6} {'mediana':>8} {'máximo':>7}")
+    fijos = {"esquema": prompts.PLANTILLA_ESQUEMA, "situacion": prompts.PLANTILLA_SITUACION}
+    for tipo, valores in medidas.items():
+        plantilla = fijos.get(tipo, prompts.PLANTILLA_RUBRICA)
+        print(f"{tipo:22} {plantilla.tokens_instrucciones:13} {plantilla.tokens_fijos:6} "
+              f"{statistics.median(valores):8.0f} {max(valores):7}")
+
+    datos, situacion, generados = ejemplo
+    print(f"\nSecciones de la situación que recibe la rúbrica ({datos['modulo']}):")
+    print(f"  recorte de 2000 caracteres: {', '.join(secciones_incluidas(situacion[:2000]))}")
+    extracto = prompts.extracto_relevante(situacion, datos)
+    print(f"  selección por relevancia:   {', '.join(secciones_incluidas(extracto))}")
+
+    if args.api:
+        from services.registro import registro
+
+        cliente = registro.cliente_gemini().genai
+        print("\nEstimación local frente a count_tokens:")
+        for tipo, prompt in generados.items():
+            real = cliente.models.count_tokens(model="gemini-2.5-flash", contents=str(prompt)).total_tokens
+            estimado = prompts.contar_tokens(str(prompt))
+            print(f"  {tipo:22} {estimado:6} / {real:6} ({(estimado - real) / real:+.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
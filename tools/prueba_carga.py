@@ -0,0 +1,261 @@
+"""Prueba de carga: N profesores a la vez usando la app de principio a fin.
+
+Cada profesor es un hilo que repite el flujo de la app mientras dura la prueba:
+elige un módulo al azar del currículo (selección), genera en streaming el esquema,
+la situación y la rúbrica con el GeminiService compartido del proceso (como las
+sesiones de un worker de Streamlit) y encarga el PDF al RenderizadorPDF, esperando
+a que esté listo. Entre flujos hace una pausa, como un profesor que lee el resultado.
+
+Por defecto Gemini es el backend sin red (services.backend_falso) con respuestas del
+tamaño de las reales y la latencia y los fallos indicados; con --base-url se usa un
+servidor HTTP (tools/fake_gemini_server.py --realista o la API real).
+
+    python tools/prueba_carga.py --profesores 5,10,20,40 --duracion 60
+    python tools/prueba_carga.py --profesores 20 --latencia 3 --error-503 0.02 --json carga.json
+    python tools/prueba_carga.py --profesores 20 --claves 3 --rpm 10
+
+Para cada número de profesores informa del rendimiento (flujos por minuto), de p50
+y p95 de cada etapa y del flujo completo, de los errores y de la memoria pico (RSS)
+del proceso principal y de cada proceso del pool de PDF. Con --objetivo indica
+cuántos profesores caben por worker con ese p95 del flujo, lo que sirve para
+dimensionar el despliegue (profesores simultáneos / profesores por worker). Con
+--claves y --rpm se simula un pool de claves con cuota (services.enrutador) y se
+muestra cuántas llamadas ha servido cada ruta.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Cada flujo pide algo distinto: la caché de respuestas solo falsearía los tiempos
+os.environ.setdefault("GEMINI_CACHE", "0")
+
+from batch_generar import construir_prompt_data, listar_trabajos  # noqa: E402
+from services.backend_falso import ClienteFalso, Fallos  # noqa: E402
+from services.gemini_service import Consumo, GeminiService  # noqa: E402
+from services.metricas import percentil  # noqa: E402
+from services.pdf_worker import LISTO, ArtefactoCache, RenderizadorPDF  # noqa: E402
+from utils.curriculum_loader import cargar_curriculo  # noqa: E402
+
+ETAPAS = ("seleccion", "primer_fragmento", "situacion", "rubrica", "pdf", "flujo")
+
+PLANTILLA = {
+    "recursos": ["Simuladores clínicos", "Material sanitario"],
+    "metodologia": "Aprendizaje Basado en Problemas (ABP)",
+}
+
+
+def rss_kb(pid):
+    """Memoria residente actual de un proceso en KB (None si no se puede leer)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as file:
+            for linea in file:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class Memoria:
+    """Muestrea cada poco la RSS del proceso y de los procesos del pool y guarda el pico de cada uno"""
+
+    def __init__(self, renderizador, intervalo=0.25):
+        self.renderizador = renderizador
+        self.intervalo = intervalo
+        self.picos = {}
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _pids(self):
+        pids = {"principal": os.getpid()}
+        executor = self.renderizador._executor
+        # ProcessPoolExecutor no expone sus procesos de otra forma
+        for n, pid in enumerate(sorted(getattr(executor, "_processes", None) or {}), 1):
+            pids[f"pdf_{n}"] = pid
+        return pids
+
+    def _muestrear(self):
+        while not self._parar.is_set():
+            for nombre, pid in self._pids().items():
+                kb = rss_kb(pid)
+                if kb is not None:
+                    self.picos[nombre] = max(self.picos.get(nombre, 0), kb)
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+
+
+def flujo(servicio, renderizador, trabajo, contexto, secuencial, tiempos):
+    """Un profesor de principio a fin; añade a tiempos la duración de cada etapa"""
+
+    inicio = time.perf_counter()
+    prompt_data = construir_prompt_data(trabajo, dict(PLANTILLA, contexto=contexto))
+    tiempos["seleccion"].append(time.perf_counter() - inicio)
+
+    textos = {"situacion": "", "rubrica": ""}
+    generar = servicio.generar_secuencial_stream if secuencial else servicio.generar_en_paralelo_stream
+    for tipo, fragmento in generar(prompt_data, consumo=Consumo()):
+        if tipo == "esquema":
+            continue
+        if fragmento is None:
+            tiempos[tipo].append(time.perf_counter() - inicio)
+            continue
+        if tipo == "situacion" and not textos["situacion"]:
+            tiempos["primer_fragmento"].append(time.perf_counter() - inicio)
+        textos[tipo] += fragmento
+
+    encargo = time.perf_counter()
+    clave = renderizador.solicitar(textos["situacion"], textos["rubrica"], prompt_data)
+    if renderizador.esperar(clave, espera=120) != LISTO:
+        raise RuntimeError(f"El PDF no se ha generado: {renderizador.error(clave)}")
+    tiempos["pdf"].append(time.perf_counter() - encargo)
+    tiempos["flujo"].append(time.perf_counter() - inicio)
+
+
+def ronda(servicio, renderizador, trabajos, profesores, duracion, pausa, secuencial, semilla):
+    """Lanza los profesores durante `duracion` segundos y devuelve el resumen de la ronda"""
+
+    tiempos = defaultdict(list)
+    servidas = {r["ruta"]: r["servidas"] for r in servicio.enrutador.estado()}
+    errores = defaultdict(int)
+    errores_lock = threading.Lock()
+    flujos = [0] * profesores
+    fin = time.perf_counter() + duracion
+
+    def profesor(i):
+        azar = random.Random(semilla * 1000 + i)
+        # Llegadas escalonadas, como profesores que abren la app en momentos distintos
+        time.sleep(azar.uniform(0, min(pausa, duracion / 4)))
+        while time.perf_counter() < fin:
+            try:
+                flujo(servicio, renderizador, azar.choice(trabajos), f"profesor {i}, flujo {flujos[i]}",
+                      secuencial, tiempos)
+                flujos[i] += 1
+            except Exception as e:
+                with errores_lock:
+                    errores[type(e).__name__] += 1
+            time.sleep(azar.expovariate(1 / pausa) if pausa else 0)
+
+    with Memoria(renderizador) as memoria:
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=profesor, args=(i,), daemon=True) for i in range(profesores)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        transcurrido = time.perf_counter() - inicio
+
+    etapas = {}
+    for etapa in ETAPAS:
+        valores = sorted(tiempos[etapa])
+        if valores:
+            etapas[etapa] = {"n": len(valores), "p50": percentil(valores, 0.5), "p95": percentil(valores, 0.95)}
+    return {
+        "profesores": profesores,
+        "flujos": sum(flujos),
+        "flujos_por_minuto": sum(flujos) * 60 / transcurrido,
+        "segundos": transcurrido,
+        "etapas": etapas,
+        "errores": dict(errores),
+        "rss_pico_mb": {nombre: kb / 1024 for nombre, kb in sorted(memoria.picos.items())},
+        "rutas": {r["ruta"]: r["servidas"] - servidas[r["ruta"]] for r in servicio.enrutador.estado()},
+    }
+
+
+def _imprimir(resultado):
+    etapas = resultado["etapas"]
+    memoria = resultado["rss_pico_mb"]
+    pool = [mb for nombre, mb in memoria.items() if nombre.startswith("pdf_")]
+    print(
+        f"\n{resultado['profesores']} profesores: {resultado['flujos']} flujos en {resultado['segundos']:.0f} s "
+        f"({resultado['flujos_por_minuto']:.1f}/min), errores: {resultado['errores'] or 'ninguno'}"
+    )
+    for etapa in ETAPAS:
+        if etapa in etapas:
+            datos = etapas[etapa]
+            print(f"  {etapa:<17} p50 {datos['p50']:7.2f} s   p95 {datos['p95']:7.2f} s   (n={datos['n']})")
+    print(
+        f"  memoria pico      principal {memoria.get('principal', 0):.0f} MB, "
+        f"pool PDF {len(pool)} x {max(pool, default=0):.0f} MB"
+    )
+    print("  rutas             " + ", ".join(f"{ruta} {n}" for ruta, n in resultado["rutas"].items() if n))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del flujo completo con Gemini simulado")
+    parser.add_argument("--profesores", default="5,10,20", help="Profesores simultáneos de cada ronda (lista)")
+    parser.add_argument("--duracion", type=float, default=60, help="Segundos de cada ronda")
+    parser.add_argument("--pausa", type=float, default=5, help="Segundos medios entre flujos de un profesor")
+    parser.add_argument("--secuencial", action="store_true", help="Situación y rúbrica una detrás de otra")
+    parser.add_argument("--procesos-pdf", type=int, default=2, help="Procesos del pool de PDF")
+    parser.add_argument("--latencia", type=float, default=2.0, help="Segundos hasta el primer fragmento")
+    parser.add_argument("--latencia-fragmento", type=float, default=0.03, help="Segundos entre fragmentos")
+    parser.add_argument("--error-503", type=float, default=0.0, help="Probabilidad de 503 por petición")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Probabilidad de 429 por petición")
+    parser.add_argument("--rpm", type=float, default=0, help="GEMINI_RPM de cada clave y modelo (0 = sin límite)")
+    parser.add_argument("--claves", type=int, default=1, help="Claves de API simuladas en el pool")
+    parser.add_argument("--base-url", help="Servidor HTTP en lugar del backend sin red")
+    parser.add_argument("--objetivo", type=float, default=60, help="p95 máximo aceptable del flujo en segundos")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    # Las rutas del enrutador leen la cuota y las claves al crear el servicio
+    os.environ["GEMINI_RPM"] = str(args.rpm)
+    os.environ["GEMINI_API_KEYS"] = ",".join(f"carga-{n}" for n in range(2, args.claves + 1))
+    if args.base_url:
+        servicio = GeminiService(api_key=os.getenv("GEMINI_API_KEY", "carga-1"), base_url=args.base_url)
+    else:
+        backend = ClienteFalso(
+            latencia=args.latencia, latencia_fragmento=args.latencia_fragmento,
+            fallos=Fallos(error_503=args.error_503, error_429=args.error_429, semilla=args.semilla)
+        )
+        servicio = GeminiService(api_key="carga-1", backend=backend)
+    renderizador = RenderizadorPDF(ArtefactoCache(tempfile.mkdtemp(prefix="carga_")), procesos=args.procesos_pdf)
+    trabajos = listar_trabajos(cargar_curriculo().indice)
+
+    print(f"{len(trabajos)} módulos en el currículo; backend: {args.base_url or 'sin red'}, "
+          f"latencia {args.latencia} s, pool de PDF de {args.procesos_pdf} procesos")
+    resultados = []
+    try:
+        for profesores in (int(n) for n in args.profesores.split(",")):
+            resultado = ronda(servicio, renderizador, trabajos, profesores, args.duracion, args.pausa,
+                              args.secuencial, args.semilla)
+            resultados.append(resultado)
+            _imprimir(resultado)
+    finally:
+        renderizador.cerrar()
+
+    validos = [r for r in resultados if "flujo" in r["etapas"] and r["etapas"]["flujo"]["p95"] <= args.objetivo]
+    if validos:
+        mejor = max(validos, key=lambda r: r["profesores"])
+        print(f"\nCon p95 del flujo <= {args.objetivo:.0f} s caben {mejor['profesores']} profesores por worker "
+              f"({mejor['flujos_por_minuto']:.1f} flujos/min, {mejor['rss_pico_mb'].get('principal', 0):.0f} MB "
+              f"+ {args.procesos_pdf} procesos de PDF)")
+    else:
+        print(f"\nNinguna ronda cumple p95 del flujo <= {args.objetivo:.0f} s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"parametros": vars(args), "rondas": resultados}, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
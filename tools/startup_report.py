@@ -0,0 +1,131 @@
+"""Informe de tiempos de arranque de la app.
+
+Importa los mismos módulos que streamlit_app.py en un proceso limpio con
+`python -X importtime`, agrupa el tiempo por paquete y comprueba que los SDK
+pesados (google-genai, reportlab...) no se importan al arrancar. También mide
+la carga del currículo y la creación de GeminiService.
+
+    python tools/startup_report.py
+    python tools/startup_report.py --limite-ms 1500   # sale con código 1 si se supera
+
+Sirve para detectar regresiones del arranque en frío de los contenedores.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que importa streamlit_app.py al arrancar
+MODULOS_APP = (
+    "streamlit",
+    "components.selectors",
+    "services.gemini_service",
+    "services.pdf_worker",
+    "utils.data_loader",
+)
+
+# Solo deben importarse cuando se usan (primera generación, primera exportación)
+PROHIBIDOS_AL_ARRANCAR = ("google.genai", "google.generativeai", "reportlab", "pandas")
+
+MEDICIONES = """
+import json, os, tempfile, time
+from utils.curriculum_loader import cargar_curriculo
+from services.gemini_service import GeminiService
+
+resultados = {}
+t = time.perf_counter()
+cargar_curriculo(snapshot_path=None)
+resultados["Currículo desde JSON (sin instantánea)"] = time.perf_counter() - t
+
+t = time.perf_counter()
+cargar_curriculo()
+resultados["Currículo (instantánea si existe)"] = time.perf_counter() - t
+
+os.environ["GEMINI_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "cache.sqlite3")
+t = time.perf_counter()
+GeminiService(api_key="informe-arranque")
+resultados["GeminiService()"] = time.perf_counter() - t
+print(json.dumps(resultados))
+"""
+
+_LINEA = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def medir_importaciones(modulos):
+    """Devuelve una lista de (modulo, propio_us, acumulado_us, profundidad)"""
+
+    codigo = "; ".join(f"import {m}" for m in modulos)
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True, check=True
+    )
+    filas = []
+    for linea in proceso.stderr.splitlines():
+        coincidencia = _LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, modulo = coincidencia.groups()
+            filas.append((modulo, int(propio), int(acumulado), len(sangria) // 2))
+    return filas
+
+
+def agrupar_por_paquete(filas):
+    """Suma el tiempo acumulado de las importaciones de primer nivel por paquete raíz"""
+
+    paquetes = {}
+    for modulo, _, acumulado, profundidad in filas:
+        if profundidad == 0:
+            raiz = modulo.split(".")[0]
+            paquetes[raiz] = paquetes.get(raiz, 0) + acumulado
+    return sorted(paquetes.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Informe de tiempos de arranque de la app")
+    parser.add_argument("--top", type=int, default=15, help="Número de paquetes a mostrar")
+    parser.add_argument("--limite-ms", type=float, help="Tiempo total de importación máximo permitido")
+    args = parser.parse_args(argv)
+
+    filas = medir_importaciones(MODULOS_APP)
+    paquetes = agrupar_por_paquete(filas)
+    total_ms = sum(acumulado for _, acumulado in paquetes) / 1000
+
+    print("Tiempo de importación por paquete (ms)")
+    print("-" * 44)
+    for paquete, acumulado in paquetes[:args.top]:
+        print(f"{paquete:<32}{acumulado / 1000:>10.1f}")
+    print("-" * 44)
+    print(f"{'TOTAL':<32}{total_ms:>10.1f}")
+
+    import json
+
+    proceso = subprocess.run(
+        [sys.executable, "-c", MEDICIONES], cwd=RAIZ, capture_output=True, text=True, check=True
+    )
+    print("\nInicialización (ms)")
+    print("-" * 44)
+    for nombre, segundos in json.loads(proceso.stdout.strip().splitlines()[-1]).items():
+        print(f"{nombre:<38}{segundos * 1000:>6.1f}")
+
+    fallos = []
+    importados = {modulo for modulo, _, _, _ in filas}
+    for prohibido in PROHIBIDOS_AL_ARRANCAR:
+        if any(m == prohibido or m.startswith(prohibido + ".") for m in importados):
+            fallos.append(f"'{prohibido}' se importa al arrancar; debería importarse al usarse")
+    if args.limite_ms is not None and total_ms > args.limite_ms:
+        fallos.append(f"la importación tarda {total_ms:.0f} ms (límite {args.limite_ms:.0f} ms)")
+
+    if fallos:
+        print("\nREGRESIONES:")
+        for fallo in fallos:
+            print(f"  - {fallo}")
+        return 1
+    print("\nSin regresiones: ningún SDK pesado se importa al arrancar.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Índice en memoria del currículo de ciclos sanitarios.
+
+Se construye una sola vez a partir de ciclos_sanitarios.json y evita recorrer el
+diccionario anidado en cada rerun de Streamlit. Los registros usan __slots__ para
+ocupar poco y conservan en `datos` una referencia al diccionario original.
+"""
+
+NIVELES = {"Grado Medio": "grado_medio", "Grado Superior": "grado_superior"}
+
+
+class Ciclo:
+    __slots__ = ("nombre", "codigo", "duracion", "nivel", "nivel_key", "modulos", "opciones_modulos", "datos")
+
+    def __init__(self, nombre, nivel, datos):
+        self.nombre = nombre
+        self.codigo = datos.get("codigo", "")
+        self.duracion = datos.get("duracion", "")
+        self.nivel = nivel
+        self.nivel_key = NIVELES[nivel]
+        self.datos = datos
+        self.modulos = {
+            nombre_modulo: Modulo(nombre_modulo, self, datos_modulo)
+            for nombre_modulo, datos_modulo in datos.get("modulos", {}).items()
+        }
+        self.opciones_modulos = tuple(self.modulos)
+
+    def __repr__(self):
+        return f"Ciclo({self.codigo} {self.nombre!r})"
+
+
+class Modulo:
+    __slots__ = ("nombre", "codigo", "horas", "ciclo", "resultados", "criterios",
+                 "opciones_resultados", "opciones_criterios", "datos")
+
+    def __init__(self, nombre, ciclo, datos):
+        self.nombre = nombre
+        self.codigo = datos.get("codigo", "")
+        self.horas = datos.get("horas", "")
+        self.ciclo = ciclo
+        self.datos = datos
+        self.resultados = tuple(
+            ResultadoAprendizaje(i, texto, self) for i, texto in enumerate(datos.get("resultados_aprendizaje", []), 1)
+        )
+        self.criterios = tuple(
+            CriterioEvaluacion(i, texto, self) for i, texto in enumerate(datos.get("criterios_evaluacion", []), 1)
+        )
+        self.opciones_resultados = tuple(ra.texto for ra in self.resultados)
+        self.opciones_criterios = tuple(ce.texto for ce in self.criterios)
+
+    def __repr__(self):
+        return f"Modulo({self.codigo} {self.nombre!r})"
+
+
+class ResultadoAprendizaje:
+    __slots__ = ("numero", "texto", "modulo")
+
+    def __init__(self, numero, texto, modulo):
+        self.numero = numero
+        self.texto = texto
+        self.modulo = modulo
+
+    def __repr__(self):
+        return f"RA{self.numero}({self.texto[:40]!r})"
+
+
+class CriterioEvaluacion:
+    __slots__ = ("numero", "texto", "modulo")
+
+    def __init__(self, numero, texto, modulo):
+        self.numero = numero
+        self.texto = texto
+        self.modulo = modulo
+
+    def __repr__(self):
+        return f"CE{self.numero}({self.texto[:40]!r})"
+
+
+class CurriculumIndex:
+    """Búsquedas O(1) de ciclos y módulos por nombre y por código"""
+
+    def __init__(self, ciclos_data):
+        self.datos = ciclos_data
+        self.ciclos = {}
+        self.ciclos_por_codigo = {}
+        self.modulos_por_codigo = {}
+
+        for nivel, nivel_key in NIVELES.items():
+            self.ciclos[nivel] = {}
+            for nombre_ciclo, datos_ciclo in ciclos_data.get(nivel_key, {}).items():
+                ciclo = Ciclo(nombre_ciclo, nivel, datos_ciclo)
+                self.ciclos[nivel][nombre_ciclo] = ciclo
+                self.ciclos_por_codigo[ciclo.codigo] = ciclo
+                for modulo in ciclo.modulos.values():
+                    # Algunos códigos (FOL, FCT, 0020...) se repiten en varios ciclos
+                    self.modulos_por_codigo.setdefault(modulo.codigo, []).append(modulo)
+
+        # Listas de opciones ya calculadas para los selectores
+        self.opciones_niveles = tuple(NIVELES)
+        self.opciones_ciclos = {nivel: tuple(ciclos) for nivel, ciclos in self.ciclos.items()}
+        self.metodologias = tuple(ciclos_data.get("metodologias_activas", []))
+        competencias = ciclos_data.get("competencias", {})
+        self.competencias_profesionales = tuple(competencias.get("profesionales", []))
+        self.competencias_personales = tuple(competencias.get("personales", []))
+        self.competencias_sociales = tuple(competencias.get("sociales", []))
+
+    def ciclo(self, nivel, nombre):
+        """Devuelve el ciclo o None si no existe"""
+        return self.ciclos.get(nivel, {}).get(nombre)
+
+    def modulo(self, nivel, ciclo, nombre):
+        """Devuelve el módulo o None si no existe"""
+        ciclo_obj = self.ciclo(nivel, ciclo)
+        return ciclo_obj.modulos.get(nombre) if ciclo_obj else None
+
+    def modulos_con_codigo(self, codigo):
+        """Devuelve todos los módulos con ese código (p. ej. "0021")"""
+        return self.modulos_por_codigo.get(codigo, [])
+
+    def ciclos_de_modulo(self, codigo):
+        """Devuelve los ciclos que incluyen el módulo con ese código"""
+        return [modulo.ciclo for modulo in self.modulos_con_codigo(codigo)]
+
+    def iter_modulos(self, nivel=None, ciclo=None):
+        """Recorre los módulos, opcionalmente filtrados por nivel y ciclo"""
+        for nombre_nivel, ciclos in self.ciclos.items():
+            if nivel and nivel != nombre_nivel:
+                continue
+            for nombre_ciclo, ciclo_obj in ciclos.items():
+                if ciclo and ciclo != nombre_ciclo:
+                    continue
+                yield from ciclo_obj.modulos.values()
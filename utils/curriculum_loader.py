@@ -0,0 +1,168 @@
+"""Carga validada del currículo con instantánea binaria precompilada.
+
+La primera vez que un proceso carga ciclos_sanitarios.json se valida su estructura,
+se construyen el CurriculumIndex y el BuscadorCurriculo y se guarda todo en una
+instantánea pickle. Los arranques siguientes cargan directamente la instantánea
+mientras el JSON no cambie (se comprueban su mtime y su tamaño) y la versión del
+formato coincida. No depende de Streamlit, así que la usan también las herramientas
+por lotes.
+"""
+
+import json
+import os
+import pickle
+
+from utils.curriculum_index import NIVELES, CurriculumIndex
+from utils.curriculum_search import BuscadorCurriculo
+
+# RUTA CORREGIDA
+DATA_PATH = "data/ciclos_sanitarios.json"
+SNAPSHOT_PATH = os.getenv("CURRICULO_SNAPSHOT_PATH", ".cache/curriculo.pickle")
+
+# Subir al cambiar las clases del índice o del buscador: invalida las instantáneas antiguas
+SNAPSHOT_VERSION = 1
+
+
+class CurriculoInvalidoError(ValueError):
+    """El JSON del currículo no tiene la estructura esperada"""
+
+    def __init__(self, errores):
+        self.errores = errores
+        resumen = "; ".join(errores[:5])
+        if len(errores) > 5:
+            resumen += f" (y {len(errores) - 5} errores más)"
+        super().__init__(f"El currículo no es válido: {resumen}")
+
+
+class Curriculo:
+    """Datos del currículo ya validados junto con sus estructuras de consulta"""
+
+    __slots__ = ("datos", "indice", "buscador", "origen")
+
+    def __init__(self, datos, origen=None):
+        self.datos = datos
+        self.indice = CurriculumIndex(datos)
+        self.buscador = BuscadorCurriculo(self.indice)
+        # Clave (ruta, mtime, tamaño) del JSON del que procede, o None si son datos por defecto
+        self.origen = origen
+
+
+def leer_ciclos_json(data_path=DATA_PATH):
+    """Lee el JSON de ciclos formativos sin depender de Streamlit (herramientas por lotes)"""
+
+    with open(data_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def _lista_de_textos(valor):
+    return isinstance(valor, list) and all(isinstance(v, str) for v in valor)
+
+
+def validar_ciclos_data(datos):
+    """Comprueba la estructura del currículo y devuelve la lista de errores encontrados"""
+
+    if not isinstance(datos, dict):
+        return ["la raíz debe ser un objeto"]
+
+    errores = []
+    for nivel_key in NIVELES.values():
+        ciclos = datos.get(nivel_key)
+        if not isinstance(ciclos, dict):
+            errores.append(f"falta el objeto '{nivel_key}'")
+            continue
+        for nombre_ciclo, ciclo in ciclos.items():
+            ruta = f"{nivel_key}/{nombre_ciclo}"
+            if not isinstance(ciclo, dict):
+                errores.append(f"{ruta}: debe ser un objeto")
+                continue
+            for campo in ("codigo", "duracion"):
+                if not isinstance(ciclo.get(campo), str):
+                    errores.append(f"{ruta}: '{campo}' debe ser un texto")
+            modulos = ciclo.get("modulos")
+            if not isinstance(modulos, dict):
+                errores.append(f"{ruta}: 'modulos' debe ser un objeto")
+                continue
+            for nombre_modulo, modulo in modulos.items():
+                ruta_modulo = f"{ruta}/{nombre_modulo}"
+                if not isinstance(modulo, dict):
+                    errores.append(f"{ruta_modulo}: debe ser un objeto")
+                    continue
+                if not isinstance(modulo.get("codigo"), str):
+                    errores.append(f"{ruta_modulo}: 'codigo' debe ser un texto")
+                if not isinstance(modulo.get("horas"), (int, str)):
+                    errores.append(f"{ruta_modulo}: 'horas' debe ser un número")
+                for campo in ("resultados_aprendizaje", "criterios_evaluacion"):
+                    if not _lista_de_textos(modulo.get(campo, [])):
+                        errores.append(f"{ruta_modulo}: '{campo}' debe ser una lista de textos")
+
+    if not _lista_de_textos(datos.get("metodologias_activas")):
+        errores.append("'metodologias_activas' debe ser una lista de textos")
+
+    competencias = datos.get("competencias")
+    if not isinstance(competencias, dict):
+        errores.append("falta el objeto 'competencias'")
+    else:
+        for tipo in ("profesionales", "personales", "sociales"):
+            if not _lista_de_textos(competencias.get(tipo)):
+                errores.append(f"'competencias/{tipo}' debe ser una lista de textos")
+
+    return errores
+
+
+def clave_origen(data_path):
+    """Identifica la versión en disco del JSON por su ruta, mtime y tamaño"""
+    estado = os.stat(data_path)
+    return (os.path.abspath(data_path), estado.st_mtime_ns, estado.st_size)
+
+
+def _leer_snapshot(snapshot_path, origen):
+    """Devuelve el Curriculo de la instantánea o None si no existe o no corresponde al JSON actual"""
+
+    try:
+        with open(snapshot_path, "rb") as file:
+            # La cabecera es un pickle aparte: se comprueba sin deserializar el resto
+            cabecera = pickle.load(file)
+            if cabecera != {"version": SNAPSHOT_VERSION, "origen": origen}:
+                return None
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def _escribir_snapshot(snapshot_path, curriculo):
+    directorio = os.path.dirname(snapshot_path)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    temporal = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as file:
+        pickle.dump({"version": SNAPSHOT_VERSION, "origen": curriculo.origen}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(curriculo, file, protocol=pickle.HIGHEST_PROTOCOL)
+    # Sustitución atómica: otro proceso nunca lee una instantánea a medias
+    os.replace(temporal, snapshot_path)
+
+
+def cargar_curriculo(data_path=DATA_PATH, snapshot_path=SNAPSHOT_PATH):
+    """Carga el currículo desde la instantánea si está al día o, si no, desde el JSON validado.
+
+    Lanza CurriculoInvalidoError si el JSON no supera la validación.
+    """
+
+    origen = clave_origen(data_path)
+    if snapshot_path:
+        curriculo = _leer_snapshot(snapshot_path, origen)
+        if curriculo is not None:
+            return curriculo
+
+    datos = leer_ciclos_json(data_path)
+    errores = validar_ciclos_data(datos)
+    if errores:
+        raise CurriculoInvalidoError(errores)
+
+    curriculo = Curriculo(datos, origen)
+    if snapshot_path:
+        try:
+            _escribir_snapshot(snapshot_path, curriculo)
+        except OSError:
+            # Sin permisos de escritura se sigue funcionando, solo que sin instantánea
+            pass
+    return curriculo
@@ -0,0 +1,129 @@
+"""Búsqueda de texto completo sobre módulos, RA y CE del currículo.
+
+Índice invertido con normalización sin acentos, un lematizador ligero para el
+español y ranking BM25. Se construye una vez a partir de un CurriculumIndex;
+cada consulta solo recorre las listas de los términos buscados.
+"""
+
+import math
+import re
+import unicodedata
+
+# Palabras vacías más frecuentes en los textos del currículo
+STOPWORDS = frozenset("""
+    a al ante con de del desde e el en entre la las lo los o para por se sin sobre su sus u un una unas unos y
+    ha han he hemos sido ser es son que como segun cada otro otros otra otras este esta estos estas
+""".split())
+
+# Sufijos que se eliminan (lematizador ligero, estilo Savoy); se prueban del más largo al más corto
+SUFIJOS = tuple(sorted((
+    "amientos", "imientos", "aciones", "uciones", "ciones", "amiento", "imiento", "idades",
+    "acion", "ucion", "cion", "mente", "ancia", "encia", "idad", "ismo", "ista", "able", "ible",
+    "adoras", "adores", "adora", "ador", "antes", "ante", "ivas", "ivos", "iva", "ivo", "icas", "icos", "ica", "ico",
+    "ando", "iendo", "ados", "idas", "idos", "adas", "ada", "ado", "ida", "ido", "ores", "or",
+    "ar", "er", "ir", "es", "os", "as", "s", "a", "o", "e",
+), key=len, reverse=True))
+LONGITUD_MINIMA_RAIZ = 4
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto):
+    """Pasa a minúsculas y elimina acentos y diéresis"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def lematizar(palabra):
+    """Reduce una palabra ya normalizada a su raíz aproximada"""
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LONGITUD_MINIMA_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def tokenizar(texto):
+    """Devuelve las raíces de las palabras significativas del texto"""
+    return [lematizar(t) for t in _TOKEN.findall(normalizar(texto)) if t not in STOPWORDS and len(t) > 1]
+
+
+class ResultadoBusqueda:
+    __slots__ = ("modulo", "puntuacion", "resultados", "criterios")
+
+    def __init__(self, modulo, puntuacion, resultados, criterios):
+        self.modulo = modulo
+        self.puntuacion = puntuacion
+        # Textos de RA y CE que coinciden con la búsqueda, para preseleccionarlos
+        self.resultados = resultados
+        self.criterios = criterios
+
+    def __repr__(self):
+        return f"ResultadoBusqueda({self.modulo!r}, {self.puntuacion:.2f})"
+
+
+class BuscadorCurriculo:
+    """Índice invertido BM25 sobre los nombres de módulo, los RA y los CE"""
+
+    # Peso extra de las coincidencias en el nombre del módulo
+    PESO_NOMBRE = 2.0
+
+    def __init__(self, indice, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        # Cada documento es una tupla (modulo, campo, texto) con campo "nombre", "ra" o "ce"
+        self.documentos = []
+        self.longitudes = []
+        self.postings = {}
+
+        for modulo in indice.iter_modulos():
+            self._anadir(modulo, "nombre", modulo.nombre)
+            for ra in modulo.resultados:
+                self._anadir(modulo, "ra", ra.texto)
+            for ce in modulo.criterios:
+                self._anadir(modulo, "ce", ce.texto)
+
+        total = len(self.documentos)
+        self.longitud_media = (sum(self.longitudes) / total) if total else 0.0
+        self.idf = {
+            termino: math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5))
+            for termino, lista in self.postings.items()
+        }
+
+    def _anadir(self, modulo, campo, texto):
+        doc_id = len(self.documentos)
+        terminos = tokenizar(texto)
+        self.documentos.append((modulo, campo, texto))
+        self.longitudes.append(len(terminos))
+
+        frecuencias = {}
+        for termino in terminos:
+            frecuencias[termino] = frecuencias.get(termino, 0) + 1
+        for termino, frecuencia in frecuencias.items():
+            self.postings.setdefault(termino, []).append((doc_id, frecuencia))
+
+    def buscar(self, consulta, limite=10):
+        """Devuelve los módulos más relevantes para la consulta, de mayor a menor puntuación"""
+
+        puntuaciones = {}
+        for termino in set(tokenizar(consulta)):
+            idf = self.idf.get(termino)
+            if idf is None:
+                continue
+            for doc_id, frecuencia in self.postings[termino]:
+                norma = self.k1 * (1 - self.b + self.b * self.longitudes[doc_id] / self.longitud_media)
+                puntuaciones[doc_id] = puntuaciones.get(doc_id, 0.0) + idf * frecuencia * (self.k1 + 1) / (frecuencia + norma)
+
+        # Se agrupan los documentos por módulo; su puntuación es la suma de la de sus textos
+        por_modulo = {}
+        for doc_id, puntuacion in puntuaciones.items():
+            modulo, campo, texto = self.documentos[doc_id]
+            resultado = por_modulo.get(id(modulo))
+            if resultado is None:
+                resultado = por_modulo[id(modulo)] = ResultadoBusqueda(modulo, 0.0, [], [])
+            if campo == "nombre":
+                resultado.puntuacion += puntuacion * self.PESO_NOMBRE
+            else:
+                resultado.puntuacion += puntuacion
+                (resultado.resultados if campo == "ra" else resultado.criterios).append(texto)
+
+        return sorted(por_modulo.values(), key=lambda r: r.puntuacion, reverse=True)[:limite]
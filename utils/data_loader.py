@@ -1,21 +1,89 @@
-import json
-import os
+import threading
 import streamlit as st
 
-@st.cache_data()
+from utils.curriculum_loader import DATA_PATH, Curriculo, cargar_curriculo, clave_origen
+
+class ProveedorCurriculo:
+    """Mantiene el currículo en memoria y lo recarga en segundo plano cuando cambia el JSON.
+
+    Un hilo vigila el mtime y el tamaño del archivo cada `intervalo` segundos. Si cambian,
+    construye y valida un Curriculo nuevo aparte y solo entonces sustituye la referencia,
+    así que quien llame a actual() recibe siempre una versión completa. Si el JSON nuevo
+    no es válido se conserva la versión anterior y el error queda en `error`.
+    """
+
+    def __init__(self, data_path=DATA_PATH, intervalo=2.0):
+        self.data_path = data_path
+        self.intervalo = intervalo
+        self.error = None
+        self._vista = None
+        self._detener = threading.Event()
+        self._curriculo = self._cargar()
+
+        self._hilo = threading.Thread(target=self._vigilar, name="vigilante-curriculo", daemon=True)
+        self._hilo.start()
+
+    def actual(self):
+        """Devuelve la versión vigente; no cambia aunque después se recargue el archivo"""
+        return self._curriculo
+
+    def detener(self):
+        self._detener.set()
+
+    def _cargar(self):
+        try:
+            self._vista = clave_origen(self.data_path)
+            curriculo = cargar_curriculo(self.data_path)
+            self.error = None
+        except Exception as e:
+            self.error = e
+            # Si aún no hay ninguna versión válida se usan los datos por defecto
+            curriculo = getattr(self, "_curriculo", None) or Curriculo(_get_default_data())
+        return curriculo
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                clave = clave_origen(self.data_path)
+            except OSError:
+                # El archivo puede no existir un instante mientras se reemplaza
+                continue
+            if clave != self._vista:
+                # Asignar una referencia es atómico: nadie ve una estructura a medio construir
+                self._curriculo = self._cargar()
+
+@st.cache_resource
+def get_proveedor_curriculo():
+    """Proveedor único por proceso que recarga el currículo cuando cambia el archivo"""
+    return ProveedorCurriculo()
+
+def load_curriculo():
+    """Devuelve la versión vigente del currículo validado, con su índice y su buscador.
+
+    Conviene llamarla una sola vez por rerun y usar ese mismo objeto durante toda la
+    ejecución, para que una recarga a mitad no mezcle dos versiones.
+    """
+
+    proveedor = get_proveedor_curriculo()
+    curriculo = proveedor.actual()
+    if proveedor.error is not None:
+        if curriculo.origen is None:
+            st.error(f"Error al cargar los datos: {str(proveedor.error)}")
+        else:
+            st.warning(f"No se han podido recargar los datos, se mantiene la versión anterior: {str(proveedor.error)}")
+    return curriculo
+
 def load_ciclos_data():
     """Carga los datos de ciclos formativos desde el archivo JSON"""
+    return load_curriculo().datos
 
-    try:
-        # RUTA CORREGIDA
-        data_path = "data/ciclos_sanitarios.json"
+def load_curriculum_index():
+    """Devuelve el índice del currículo vigente"""
+    return load_curriculo().indice
 
-        with open(data_path, "r", encoding="utf-8") as file:
-            return json.load(file)
-
-    except Exception as e:
-        st.error(f"Error al cargar los datos: {str(e)}")
-        return get_default_data()
+def load_curriculum_search():
+    """Devuelve el buscador de texto sobre módulos, RA y CE"""
+    return load_curriculo().buscador
 
 def _get_default_data():
     """Retorna datos básicos por defecto en caso de error"""
@@ -78,7 +146,7 @@ def _get_default_data():
         }
     }
 
-def validate_selection_data(selection_data, ciclos_data):
+def validate_selection_data(selection_data, indice):
     """Valida que los datos seleccionados sean consistentes"""
     
     if not selection_data:
@@ -91,35 +159,29 @@ def validate_selection_data(selection_data, ciclos_data):
             return False, f"Falta el campo requerido: {field}"
     
     # Validar que el ciclo existe
-    nivel_key = "grado_medio" if selection_data["nivel"] == "Grado Medio" else "grado_superior"
-    
-    if selection_data["ciclo"] not in ciclos_data.get(nivel_key, {}):
+    ciclo = indice.ciclo(selection_data["nivel"], selection_data["ciclo"])
+    if ciclo is None:
         return False, "El ciclo seleccionado no es válido"
     
     # Validar que el módulo existe
-    ciclo_data = ciclos_data[nivel_key][selection_data["ciclo"]]
-    if selection_data["modulo"] not in ciclo_data.get("modulos", {}):
+    if selection_data["modulo"] not in ciclo.modulos:
         return False, "El módulo seleccionado no es válido"
     
     return True, "Datos válidos"
 
-def get_modulo_info(selection_data, ciclos_data):
+def get_modulo_info(selection_data, indice):
     """Obtiene información detallada del módulo seleccionado"""
     
     if not selection_data or "nivel" not in selection_data:
         return None
     
-    try:
-        nivel_key = "grado_medio" if selection_data["nivel"] == "Grado Medio" else "grado_superior"
-        ciclo_data = ciclos_data[nivel_key][selection_data["ciclo"]]
-        modulo_data = ciclo_data["modulos"][selection_data["modulo"]]
-        
-        return {
-            "ciclo_info": ciclo_data,
-            "modulo_info": modulo_data,
-            "nivel_formativo": selection_data["nivel"]
-        }
-        
-    except KeyError as e:
-        st.error(f"Error al obtener información del módulo: {str(e)}")
+    modulo = indice.modulo(selection_data["nivel"], selection_data.get("ciclo"), selection_data.get("modulo"))
+    if modulo is None:
+        st.error(f"Error al obtener información del módulo: {selection_data.get('modulo')}")
         return None
+    
+    return {
+        "ciclo_info": modulo.ciclo.datos,
+        "modulo_info": modulo.datos,
+        "nivel_formativo": selection_data["nivel"]
+    }
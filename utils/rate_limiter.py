@@ -0,0 +1,55 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Limitador de peticiones por cubo de fichas, seguro entre hilos.
+
+    Se reponen `tasa` fichas por segundo hasta un máximo de `capacidad`;
+    cada llamada a adquirir() consume una ficha o espera a que haya una.
+    """
+
+    def __init__(self, tasa, capacidad=None):
+        if tasa <= 0:
+            raise ValueError("La tasa del limitador debe ser positiva")
+        self.tasa = float(tasa)
+        self.capacidad = float(capacidad if capacidad is not None else max(1.0, tasa))
+        self._fichas = self.capacidad
+        self._ultima = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def por_minuto(cls, peticiones, capacidad=None):
+        """Crea un limitador a partir de un número de peticiones por minuto"""
+        return cls(peticiones / 60.0, capacidad if capacidad is not None else 1)
+
+    def adquirir(self, fichas=1, espera_maxima=None):
+        """Bloquea hasta poder consumir las fichas indicadas.
+
+        Con espera_maxima (segundos) no espera más de eso: devuelve False si para
+        entonces no habría fichas, sin consumirlas. En otro caso devuelve True.
+        """
+
+        while True:
+            with self._lock:
+                self._reponer()
+                if self._fichas >= fichas:
+                    self._fichas -= fichas
+                    return True
+                espera = (fichas - self._fichas) / self.tasa
+            if espera_maxima is not None:
+                if espera > espera_maxima:
+                    return False
+                espera_maxima -= espera
+            time.sleep(espera)
+
+    def espera(self, fichas=1):
+        """Segundos hasta que haya las fichas indicadas (0 si ya las hay), sin consumirlas"""
+        with self._lock:
+            self._reponer()
+            return max(0.0, (fichas - self._fichas) / self.tasa)
+
+    def _reponer(self):
+        ahora = time.monotonic()
+        self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultima) * self.tasa)
+        self._ultima = ahora